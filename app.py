@@ -5,25 +5,138 @@
 用户管理中心模块
 """
 
-from flask import Flask, jsonify, request, render_template, session, redirect, url_for
+from flask import (Blueprint, Flask, Response, current_app, jsonify, make_response, request, render_template,
+                   session, redirect, url_for, g)
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-import sys
-import os
-import secrets
+import contextvars
+import hashlib
+import hmac
+import queue
 
-# 添加项目根目录到路径
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from models.user import User
+from database import db, ReadConsistency, Deadline, DatabaseUnavailable
+from session_store import create_session_interface, load_config, load_secret_key
+from jobs import jobs
+from single_flight import flights
+from sharding import router
+from directory_engine import engine as directory_engine
+from suggest_index import index as suggest_index
+from events import (broker, subscriber_scope, format_sse, format_sse_comment,
+                    HEARTBEAT_INTERVAL, RETRY_INTERVAL)
+from assets import init_assets
+from models.user import User, DuplicateUserError, UPSERT_FIELDS
+from models.user_stats import UserStats
+from models.change_log import ChangeLog, ChangeLogPurged
+from models.idempotency import IdempotencyKey
+from models.tracked import VersionConflict
 from models.department import Department
+from models.department_tree import tree as department_tree
 from models.position import Position
+from models import identity_map
+from models.identity_map import IdentityMap
 
-app = Flask(__name__)
-app.config['JSON_AS_ASCII'] = False  # 支持中文
-app.config['SECRET_KEY'] = secrets.token_hex(16)  # 用于 session 加密
+# 页面和接口（由 create_app 注册到应用）
+bp = Blueprint('main', __name__)
 
-# 启用 CORS 支持
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Idempotency-Key 请求头的最大长度
+IDEMPOTENCY_KEY_MAX_LENGTH = 100
+# 每个推送连接最多积压的消息数，超过后通知客户端整体刷新
+EVENT_QUEUE_SIZE = 1000
+# 首屏数据中第一页用户数的上限
+BOOTSTRAP_MAX_PAGE_SIZE = 100
+
+# 并行执行同一请求中相互独立的查询
+_query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='request-query')
+
+
+@bp.before_app_request
+def start_background_jobs():
+    """首个请求时启动后台任务（避免导入时访问数据库）"""
+    jobs.start()
+
+
+@bp.before_app_request
+def bind_db_deadline():
+    """为请求设置数据库访问期限，连接和读写超时按剩余时间收紧"""
+    g.db_deadline = Deadline(db.config.request_deadline)
+    g.db_deadline_token = db.bind_deadline(g.db_deadline)
+
+
+@bp.before_app_request
+def bind_read_consistency():
+    """绑定当前会话的读一致性标记（写后读主库）"""
+    g.read_consistency = ReadConsistency.from_dict(session.get('_db_consistency'))
+    g.read_consistency_token = db.bind_consistency(g.read_consistency)
+
+
+@bp.before_app_request
+def bind_identity_map():
+    """绑定请求内的身份映射：同一请求中相同的 get_by_* 查找只查询一次"""
+    g.identity_map = IdentityMap()
+    g.identity_map_token = identity_map.bind(g.identity_map)
+
+
+@bp.after_app_request
+def persist_read_consistency(response):
+    """会话发生写入时保存读一致性标记，使其他 worker 也能读到"""
+    consistency = g.get('read_consistency')
+    if consistency is not None and consistency.changed:
+        session['_db_consistency'] = consistency.to_dict()
+    return response
+
+
+@bp.after_app_request
+def notify_event_broker(response):
+    """写操作成功后立即轮询变更日志，本进程的订阅者无需等待下一个周期"""
+    if request.method in ('POST', 'PUT', 'DELETE') and response.status_code < 400:
+        broker.wake()
+    return response
+
+
+@bp.after_app_request
+def report_identity_map(response):
+    """调试模式下在响应头中报告身份映射避免的重复查询次数"""
+    identity = g.get('identity_map')
+    if current_app.debug and identity is not None:
+        counters = identity.counters
+        response.headers['X-Identity-Map'] = (
+            f"hits={counters['hits']}, misses={counters['misses']}, invalidations={counters['invalidations']}"
+        )
+    return response
+
+
+@bp.after_app_request
+def fail_fast_on_db_unavailable(response):
+    """请求期间数据库不可用（熔断、超时、连接失败）导致的 500 改为 503，提示客户端稍后重试"""
+    deadline = g.get('db_deadline')
+    if deadline is not None and deadline.failed and response.status_code == 500:
+        return db_unavailable_response()
+    return response
+
+
+@bp.teardown_app_request
+def unbind_db_deadline(exc=None):
+    """解绑数据库访问期限"""
+    token = g.pop('db_deadline_token', None)
+    if token is not None:
+        db.unbind_deadline(token)
+
+
+@bp.teardown_app_request
+def unbind_read_consistency(exc=None):
+    """解绑读一致性标记"""
+    token = g.pop('read_consistency_token', None)
+    if token is not None:
+        db.unbind_consistency(token)
+
+
+@bp.teardown_app_request
+def unbind_identity_map(exc=None):
+    """解绑身份映射（映射随请求结束丢弃）"""
+    token = g.pop('identity_map_token', None)
+    if token is not None:
+        identity_map.unbind(token)
 
 
 def login_required(f):
@@ -32,7 +145,7 @@ def login_required(f):
     def decorated_function(*args, **kwargs):
         # 检查 session 中是否有用户信息
         if 'user_id' not in session:
-            return redirect(url_for('login_page'))
+            return redirect(url_for('main.login_page'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -50,7 +163,7 @@ def permission_required(permission):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if 'user_id' not in session:
-                return redirect(url_for('login_page'))
+                return redirect(url_for('main.login_page'))
             
             user_role = session.get('role', 'user')
             
@@ -76,6 +189,218 @@ def permission_required(permission):
     return decorator
 
 
+def sync_access_required(f):
+    """变更同步接口的访问控制：下游系统使用同步令牌，浏览器会话需要超级管理员"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = current_app.config['APP_CONFIG'].get('changes', {}).get('sync_token')
+        provided = request.headers.get('X-Sync-Token')
+        if token and provided and hmac.compare_digest(provided, token):
+            return f(*args, **kwargs)
+        if 'user_id' not in session:
+            return jsonify({
+                'success': False,
+                'message': '请先登录或提供同步令牌'
+            }), 401
+        if session.get('role') != 'super_admin':
+            return jsonify({
+                'success': False,
+                'message': '需要超级管理员权限'
+            }), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def idempotent(f):
+    """支持 Idempotency-Key 请求头：使用同一个键重试时直接返回首次请求的响应
+    
+    键按当前用户和请求路径区分；同一个键用于不同的请求体时返回 422。
+    服务器错误（5xx）不保存，客户端可以使用同一个键重试。
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return jsonify({
+                'success': False,
+                'message': f'Idempotency-Key 长度不能超过 {IDEMPOTENCY_KEY_MAX_LENGTH}'
+            }), 400
+        
+        scope = f"{session.get('user_id')}:{request.method} {request.path}"
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        record = IdempotencyKey.reserve(scope, key, request_hash)
+        if record is not None:
+            if record['request_hash'] != request_hash:
+                return jsonify({
+                    'success': False,
+                    'message': 'Idempotency-Key 已用于其他请求'
+                }), 422
+            if record['status_code'] is None:
+                return jsonify({
+                    'success': False,
+                    'message': '相同 Idempotency-Key 的请求正在处理，请稍后重试'
+                }), 409
+            response = current_app.response_class(record['response'], status=record['status_code'],
+                                          mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            IdempotencyKey.release(scope, key)
+            raise
+        if response.status_code >= 500:
+            IdempotencyKey.release(scope, key)
+        else:
+            IdempotencyKey.complete(scope, key, response.status_code, response.get_data(as_text=True))
+        return response
+    return decorated_function
+
+
+def db_unavailable_response():
+    """数据库暂时不可用的响应（503，带 Retry-After）"""
+    response = jsonify({
+        'success': False,
+        'message': '数据库暂时不可用，请稍后重试'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(db.breaker.retry_after() + 0.5)))
+    return response
+
+
+def if_match_version():
+    """If-Match 请求头中的版本（未提供或为 * 时返回 None）"""
+    if_match = request.if_match
+    if not if_match or if_match.star_tag:
+        return None
+    versions = sorted(if_match.as_set())
+    return versions[0] if versions else None
+
+
+def duplicate_response(error):
+    """唯一键冲突的响应（指明冲突的字段）"""
+    return jsonify({
+        'success': False,
+        'message': str(error),
+        'field': error.field
+    }), 400
+
+
+def conditional_json(payload):
+    """返回带 ETag 的 JSON 响应，客户端携带 If-None-Match 且未变化时返回 304"""
+    response = jsonify(payload)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def json_etag(payload):
+    """计算与 conditional_json 相同的 ETag（页面内嵌数据时供前端缓存重新验证）"""
+    response = jsonify(payload)
+    response.add_etag()
+    return response.headers['ETag']
+
+
+def list_users_page(page=1, page_size=20, status=None, department_id=None, keyword=None, before_id=None,
+                    include_archived=False, include_subdepartments=False):
+    """按当前会话的权限查询一页用户，返回与 GET /api/users 相同的 data 结构"""
+    # 获取当前用户的部门和角色（用于权限过滤）
+    current_user = User.get_by_id(session.get('user_id'))
+    user_department_id = current_user.department_id if current_user else None
+    user_role = session.get('role', 'user')
+    
+    result = User.get_all(
+        page=page,
+        page_size=page_size,
+        status=status,
+        department_id=department_id,
+        keyword=keyword,
+        user_department_id=user_department_id,
+        user_role=user_role,
+        before_id=before_id,
+        include_archived=include_archived,
+        include_subdepartments=include_subdepartments
+    )
+    
+    return {
+        'users': [user.to_dict() for user in result['users']],
+        'pagination': {
+            'total': result['total'],
+            'page': result['page'],
+            'page_size': result['page_size'],
+            'total_pages': result['total_pages'],
+            'next_cursor': result['next_cursor']
+        }
+    }
+
+
+def gather(*funcs):
+    """并行执行相互独立的查询，按顺序返回结果
+    
+    每个任务复制当前上下文：请求、会话、请求期限、读一致性和身份映射在工作线程中同样可用。
+    """
+    futures = [_query_executor.submit(contextvars.copy_context().run, func) for func in funcs[1:]]
+    # 第一个任务在当前线程执行
+    results = [funcs[0]()] if funcs else []
+    return results + [future.result() for future in futures]
+
+
+def department_rows(departments):
+    """部门列表按层级排列（上级在前、同级按 ID），depth 为层级（顶级为 0）"""
+    return [dict(dept.to_dict(), depth=depth) for dept, depth in Department.tree_order(departments)]
+
+
+def build_users_bootstrap(page_size=20, include_users=True):
+    """用户管理页面首屏数据：第一页用户和部门、职位选项（并行查询）
+    
+    内嵌到页面中或由 GET /api/bootstrap 返回，前端不必再依次请求三个接口。
+    URL 与前端首次加载时构造的地址一致，前端据此填充缓存。
+    """
+    tasks = [lambda: Department.get_all(status=1), lambda: Position.get_all(status=1)]
+    if include_users:
+        tasks.append(lambda: list_users_page(page=1, page_size=page_size))
+    department_list, position_list, *users_page = gather(*tasks)
+    
+    departments = {
+        'success': True,
+        'data': department_rows(department_list)
+    }
+    positions = {
+        'success': True,
+        'data': [pos.to_dict() for pos in position_list]
+    }
+    return {
+        'users': {
+            'url': f'/api/users?page=1&page_size={page_size}',
+            'response': {'success': True, 'data': users_page[0]}
+        } if include_users else None,
+        'departments': {
+            'url': '/api/departments?status=1',
+            'etag': json_etag(departments),
+            'response': departments
+        },
+        'positions': {
+            'url': '/api/positions?status=1',
+            'etag': json_etag(positions),
+            'response': positions
+        }
+    }
+
+
+def user_permissions():
+    """当前会话的页面权限（用户管理页面和 /api/bootstrap 使用）"""
+    user_role = session.get('role', 'user')
+    return {
+        'role': user_role,
+        'can_edit': user_role in ['super_admin', 'admin'],
+        'can_delete': user_role == 'super_admin',
+        'can_disable': user_role in ['super_admin', 'admin']
+    }
+
+
 def can_edit():
     """检查当前用户是否有编辑权限"""
     if 'user_id' not in session:
@@ -92,56 +417,63 @@ def can_delete():
     return user_role == 'super_admin'
 
 
-@app.route('/login', methods=['GET'])
+@bp.route('/login', methods=['GET'])
 def login_page():
     """登录页面"""
     # 如果已登录，重定向到首页
     if 'user_id' in session:
-        return redirect(url_for('index_page'))
+        return redirect(url_for('main.index_page'))
     return render_template('login.html')
 
 
-@app.route('/register', methods=['GET'])
+@bp.route('/register', methods=['GET'])
 def register_page():
     """注册页面"""
     # 如果已登录，重定向到首页
     if 'user_id' in session:
-        return redirect(url_for('index_page'))
+        return redirect(url_for('main.index_page'))
     return render_template('register.html')
 
 
-@app.route('/logout', methods=['GET', 'POST'])
+@bp.route('/logout', methods=['GET', 'POST'])
 def logout():
     """登出"""
     session.clear()
-    return redirect(url_for('login_page'))
+    return redirect(url_for('main.login_page'))
 
 
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 @login_required
 def index_page():
     """首页"""
     return render_template('index.html')
 
 
-@app.route('/users', methods=['GET'])
+@bp.route('/users', methods=['GET'])
 @login_required
 def users_page():
     """用户管理页面"""
     # 传递当前用户权限信息到模板
-    user_role = session.get('role', 'user')
-    can_edit_user = user_role in ['super_admin', 'admin']
-    can_delete_user = user_role == 'super_admin'
-    can_disable_user = user_role in ['super_admin', 'admin']
+    permissions = user_permissions()
+    
+    # 首屏数据内嵌到页面（失败时由前端照常请求接口）
+    bootstrap = None
+    if current_app.config['APP_CONFIG'].get('ui', {}).get('bootstrap', True):
+        try:
+            bootstrap = build_users_bootstrap()
+        except Exception as e:
+            print(f"生成用户页面首屏数据失败: {e}")
+    
     return render_template('users.html', 
-                         can_edit=can_edit_user, 
-                         can_delete=can_delete_user,
-                         can_disable=can_disable_user,
+                         can_edit=permissions['can_edit'], 
+                         can_delete=permissions['can_delete'],
+                         can_disable=permissions['can_disable'],
                          current_user_id=session.get('user_id'),
-                         user_role=user_role)
+                         user_role=permissions['role'],
+                         bootstrap=bootstrap)
 
 
-@app.route('/api', methods=['GET'])
+@bp.route('/api', methods=['GET'])
 def api_index():
     """API 首页"""
     return jsonify({
@@ -154,22 +486,30 @@ def api_index():
             'GET /': '首页',
             'GET /users': '用户管理页面',
             'GET /api': 'API 信息',
-            'GET /api/users': '获取用户列表（支持 status / department_id 筛选）',
+            'GET /api/users': '获取用户列表（支持 status / department_id 筛选，include_subdepartments=1 包含下级部门，include_archived=1 包含已归档用户）',
             'GET /api/users/<id>': '获取用户详情',
             'POST /api/users': '创建用户（需 department_id、position_id）',
             'PUT /api/users/<id>': '更新用户',
+            'PUT /api/users/by-employee-id/<employee_id>': '按工号新增或更新用户（支持 Idempotency-Key）',
             'DELETE /api/users/<id>': '删除用户（彻底删除，仅超级管理员）',
             'POST /api/users/<id>/disable': '停用用户（禁用登录）',
             'POST /api/users/<id>/enable': '启用用户（恢复登录）',
             'POST /api/users/login': '用户登录',
             'GET /api/users/search': '搜索用户',
-            'GET /api/departments': '获取部门列表',
-            'GET /api/positions': '获取职位列表'
+            'GET /api/users/suggest': '输入提示（按用户名、工号、姓名及拼音前缀）',
+            'GET /api/users/stats': '用户统计（按部门、职位、角色、状态）',
+            'GET /api/bootstrap': '页面初始化数据（当前用户、权限、部门、职位、第一页用户）',
+            'GET /api/departments': '获取部门列表（按层级排列，format=tree 返回嵌套结构）',
+            'PUT /api/departments/<id>': '修改部门（可调整上级部门，仅超级管理员）',
+            'GET /api/positions': '获取职位列表',
+            'GET /api/changes': '增量变更（since 序号之后的用户、部门、职位变更）',
+            'GET /api/events': '实时变更推送（Server-Sent Events）',
+            'GET /api/health': '健康检查（数据库熔断状态、重试计数）'
         }
     })
 
 
-@app.route('/api/users', methods=['GET'])
+@bp.route('/api/users', methods=['GET'])
 @permission_required('view')
 def get_users():
     """获取用户列表（支持分页和筛选）"""
@@ -179,36 +519,28 @@ def get_users():
         status = request.args.get('status')
         department_id = request.args.get('department_id', type=int)
         keyword = request.args.get('keyword')
+        # 键集分页游标：上一页返回的 next_cursor
+        before_id = request.args.get('before_id', type=int)
+        # 是否包含已归档的停用用户
+        include_archived = request.args.get('include_archived') == '1'
+        # 部门筛选是否包含下级部门
+        include_subdepartments = request.args.get('include_subdepartments') == '1'
         
         if status is not None:
             status = int(status)
         
-        # 获取当前用户的部门和角色（用于权限过滤）
-        current_user = User.get_by_id(session.get('user_id'))
-        user_department_id = current_user.department_id if current_user else None
-        user_role = session.get('role', 'user')
-        
-        result = User.get_all(
-            page=page,
-            page_size=page_size,
-            status=status,
-            department_id=department_id,
-            keyword=keyword,
-            user_department_id=user_department_id,
-            user_role=user_role
-        )
-        
         return jsonify({
             'success': True,
-            'data': {
-                'users': [user.to_dict() for user in result['users']],
-                'pagination': {
-                    'total': result['total'],
-                    'page': result['page'],
-                    'page_size': result['page_size'],
-                    'total_pages': result['total_pages']
-                }
-            }
+            'data': list_users_page(
+                page=page,
+                page_size=page_size,
+                status=status,
+                department_id=department_id,
+                keyword=keyword,
+                before_id=before_id,
+                include_archived=include_archived,
+                include_subdepartments=include_subdepartments
+            )
         })
     except Exception as e:
         return jsonify({
@@ -217,7 +549,7 @@ def get_users():
         }), 500
 
 
-@app.route('/api/users/<int:user_id>', methods=['GET'])
+@bp.route('/api/users/<int:user_id>', methods=['GET'])
 @permission_required('view')
 def get_user(user_id):
     """获取用户详情"""
@@ -229,7 +561,7 @@ def get_user(user_id):
                 'message': '用户不存在'
             }), 404
         
-        # 权限检查：非超级管理员只能查看本部门的用户
+        # 权限检查：非超级管理员只能查看本部门及下级部门的用户
         current_user = User.get_by_id(session.get('user_id'))
         user_role = session.get('role', 'user')
         if user_role != 'super_admin' and current_user:
@@ -238,16 +570,22 @@ def get_user(user_id):
                     'success': False,
                     'message': '您还没有被分配部门，请联系管理员'
                 }), 403
-            if user.department_id != current_user.department_id:
+            if not department_tree.contains(current_user.department_id, user.department_id):
                 return jsonify({
                     'success': False,
-                    'message': '您只能查看本部门的用户信息'
+                    'message': '您只能查看本部门及下级部门的用户信息'
                 }), 403
         
-        return jsonify({
+        data = user.to_dict()
+        # 版本号用于编辑时的 If-Match（乐观并发控制）
+        data['version'] = user.version
+        response = jsonify({
             'success': True,
-            'data': user.to_dict()
+            'data': data
         })
+        if user.version:
+            response.set_etag(user.version)
+        return response
     except Exception as e:
         return jsonify({
             'success': False,
@@ -255,7 +593,7 @@ def get_user(user_id):
         }), 500
 
 
-@app.route('/api/users/register', methods=['POST'])
+@bp.route('/api/users/register', methods=['POST'])
 def register_user():
     """用户注册（公开接口，不需要权限）"""
     try:
@@ -270,22 +608,15 @@ def register_user():
                     'message': f'缺少必需字段: {field}'
                 }), 400
         
-        # 检查用户名是否已存在
-        if User.get_by_username(data['username']):
-            return jsonify({
-                'success': False,
-                'message': '用户名已存在'
-            }), 400
-        
-        # 创建用户（注册用户默认为普通用户，部门、职位、工号等为空）
+        # 创建用户（用户名唯一由数据库唯一索引保证；注册用户默认为普通用户，部门、职位、工号等为空）
         user = User(
             username=data['username'],
             password=data['password'],
             real_name=data['real_name'],
             email=data.get('email'),
             phone=data.get('phone'),
-            department=None,  # 注册时不设置部门
-            position=None,    # 注册时不设置职位
+            department_id=None,  # 注册时不设置部门
+            position_id=None,    # 注册时不设置职位
             employee_id=None, # 注册时不设置工号
             status=1,         # 默认状态为启用
             role='user'       # 注册用户默认为普通用户
@@ -299,6 +630,8 @@ def register_user():
             'data': user.to_dict()
         }), 201
         
+    except DuplicateUserError as e:
+        return duplicate_response(e)
     except ValueError as e:
         return jsonify({
             'success': False,
@@ -311,8 +644,9 @@ def register_user():
         }), 500
 
 
-@app.route('/api/users', methods=['POST'])
+@bp.route('/api/users', methods=['POST'])
 @permission_required('admin')
+@idempotent
 def create_user():
     """创建用户"""
     try:
@@ -327,20 +661,6 @@ def create_user():
                     'message': f'缺少必需字段: {field}'
                 }), 400
         
-        # 检查用户名是否已存在
-        if User.get_by_username(data['username']):
-            return jsonify({
-                'success': False,
-                'message': '用户名已存在'
-            }), 400
-        
-        # 检查工号是否已存在（如果提供了工号）
-        if data.get('employee_id') and User.get_by_employee_id(data['employee_id']):
-            return jsonify({
-                'success': False,
-                'message': '工号已存在'
-            }), 400
-        
         # 处理部门、职位
         department_id = data.get('department_id')
         position_id = data.get('position_id')
@@ -388,6 +708,7 @@ def create_user():
             role=None  # 角色会根据职位自动设置
         )
         
+        # 用户名、工号的唯一性由数据库保证，冲突时返回对应字段
         user.save()
         
         return jsonify({
@@ -396,6 +717,8 @@ def create_user():
             'data': user.to_dict()
         }), 201
         
+    except DuplicateUserError as e:
+        return duplicate_response(e)
     except ValueError as e:
         return jsonify({
             'success': False,
@@ -408,7 +731,7 @@ def create_user():
         }), 500
 
 
-@app.route('/api/users/<int:user_id>', methods=['PUT'])
+@bp.route('/api/users/<int:user_id>', methods=['PUT'])
 @permission_required('admin')
 def update_user(user_id):
     """更新用户"""
@@ -420,14 +743,14 @@ def update_user(user_id):
                 'message': '用户不存在'
             }), 404
         
-        # 权限检查：部长只能修改本部门的用户
+        # 权限检查：部长只能修改本部门及下级部门的用户
         current_user = User.get_by_id(session.get('user_id'))
         user_role = session.get('role', 'user')
         if user_role == 'admin' and current_user:
-            if user.department_id != current_user.department_id:
+            if not department_tree.contains(current_user.department_id, user.department_id):
                 return jsonify({
                     'success': False,
-                    'message': '您只能修改本部门的用户'
+                    'message': '您只能修改本部门及下级部门的用户'
                 }), 403
         
         data = request.get_json()
@@ -475,13 +798,7 @@ def update_user(user_id):
             user.position_id = new_position_id
             # 职位改变时，角色会自动更新
         if 'employee_id' in data:
-            # 检查工号是否已被其他用户使用
-            existing_user = User.get_by_employee_id(data['employee_id'])
-            if existing_user and existing_user.id != user_id:
-                return jsonify({
-                    'success': False,
-                    'message': '工号已被其他用户使用'
-                }), 400
+            # 工号冲突由数据库唯一约束发现
             user.employee_id = data['employee_id']
         if 'status' in data:
             # 权限检查：部长不能修改状态
@@ -495,14 +812,26 @@ def update_user(user_id):
         if 'password' in data and data['password']:
             user.password = data['password']
         
-        user.save()
+        # 只写入发生变化的字段；携带 If-Match 时校验版本
+        changed = user.save(expected_version=if_match_version())
+        if changed and user.status == 0:
+            current_app.session_interface.invalidate_user(user_id)
         
+        data = user.to_dict()
+        data['version'] = user.version
         return jsonify({
             'success': True,
-            'message': '用户更新成功',
-            'data': user.to_dict()
+            'message': '用户更新成功' if changed else '没有需要保存的修改',
+            'data': data
         })
         
+    except VersionConflict as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 412
+    except DuplicateUserError as e:
+        return duplicate_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -510,7 +839,106 @@ def update_user(user_id):
         }), 500
 
 
-@app.route('/api/users/<int:user_id>', methods=['DELETE'])
+@bp.route('/api/users/by-employee-id/<employee_id>', methods=['PUT'])
+@permission_required('super_admin')
+@idempotent
+def upsert_user_by_employee_id(employee_id):
+    """按工号新增或更新用户（供人事系统同步，可安全重试）
+    
+    工号不存在时新增（需 username、real_name），存在时只修改请求中提供的字段。
+    提供了 username、real_name 时由一条 INSERT ... ON DUPLICATE KEY UPDATE 完成；
+    未提供时只能修改已有的用户（只写入提供的字段），工号不存在时返回 400。
+    """
+    try:
+        data = request.get_json() or {}
+        employee_id = employee_id.strip()
+        if not employee_id:
+            return jsonify({
+                'success': False,
+                'message': '工号不能为空'
+            }), 400
+        
+        fields = [field for field in UPSERT_FIELDS if field in data]
+        for field in ('username', 'real_name'):
+            if field in data and not data[field]:
+                return jsonify({
+                    'success': False,
+                    'message': f'缺少必需字段: {field}'
+                }), 400
+        
+        try:
+            department_id = int(data['department_id']) if data.get('department_id') is not None else None
+            position_id = int(data['position_id']) if data.get('position_id') is not None else None
+            status = int(data.get('status', 1))
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': '部门、职位或状态格式不正确'
+            }), 400
+        if department_id is not None and not Department.get_by_id(department_id):
+            return jsonify({
+                'success': False,
+                'message': '部门不存在'
+            }), 400
+        if position_id is not None and not Position.get_by_id(position_id):
+            return jsonify({
+                'success': False,
+                'message': '职位不存在'
+            }), 400
+        
+        values = {
+            'username': data.get('username'),
+            'password': data.get('password'),
+            'real_name': data.get('real_name'),
+            'email': data.get('email'),
+            'phone': data.get('phone'),
+            'department_id': department_id,
+            'position_id': position_id,
+            'status': status
+        }
+        if data.get('username') and data.get('real_name'):
+            user = User(employee_id=employee_id, role=None, **values)  # 角色会根据职位自动设置
+            created = user.upsert_by_employee_id(fields)
+        else:
+            # 部分字段：只修改已有的用户
+            user = User.get_by_employee_id(employee_id)
+            if user is None:
+                missing = 'username' if not data.get('username') else 'real_name'
+                return jsonify({
+                    'success': False,
+                    'message': f'缺少必需字段: {missing}（工号不存在，新增用户需要）'
+                }), 400
+            for field in fields:
+                # 未提供新密码时保持原密码
+                if field != 'password' or values['password']:
+                    setattr(user, field, values[field])
+            user.save()
+            created = False
+        if not created and 'status' in fields and status == 0:
+            current_app.session_interface.invalidate_user(user.id)
+        
+        saved = User.get_by_id(user.id)
+        return jsonify({
+            'success': True,
+            'message': '用户创建成功' if created else '用户更新成功',
+            'data': saved.to_dict() if saved else user.to_dict()
+        }), 201 if created else 200
+        
+    except DuplicateUserError as e:
+        return duplicate_response(e)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'保存用户失败: {str(e)}'
+        }), 500
+
+
+@bp.route('/api/users/<int:user_id>', methods=['DELETE'])
 @permission_required('super_admin')
 def delete_user(user_id):
     """删除用户（彻底删除，仅超级管理员可用）"""
@@ -523,6 +951,8 @@ def delete_user(user_id):
             }), 404
         
         user.delete()
+        # 清除该用户的全部会话
+        current_app.session_interface.invalidate_user(user_id)
         
         return jsonify({
             'success': True,
@@ -536,7 +966,7 @@ def delete_user(user_id):
         }), 500
 
 
-@app.route('/api/users/<int:user_id>/disable', methods=['POST'])
+@bp.route('/api/users/<int:user_id>/disable', methods=['POST'])
 @permission_required('admin')
 def disable_user(user_id):
     """停用用户（设置为禁用状态）"""
@@ -551,17 +981,17 @@ def disable_user(user_id):
         current_user = User.get_by_id(session.get('user_id'))
         user_role = session.get('role', 'user')
         
-        # 管理员只能停用本部门用户
+        # 管理员只能停用本部门及下级部门的用户
         if user_role == 'admin':
             if not current_user or not current_user.department_id:
                 return jsonify({
                     'success': False,
                     'message': '您还没有被分配部门，无法执行此操作'
                 }), 403
-            if user.department_id != current_user.department_id:
+            if not department_tree.contains(current_user.department_id, user.department_id):
                 return jsonify({
                     'success': False,
-                    'message': '您只能停用本部门的用户'
+                    'message': '您只能停用本部门及下级部门的用户'
                 }), 403
         
         if user.status == 0:
@@ -570,10 +1000,11 @@ def disable_user(user_id):
                 'message': '该用户已是禁用状态'
             }), 400
         
-        # 设置状态为禁用
+        # 设置状态为禁用（只更新 status 列）
         user.status = 0
-        user.password = None  # 避免更新密码字段
         user.save()
+        # 停用后立即下线该用户的全部会话
+        current_app.session_interface.invalidate_user(user_id)
         
         return jsonify({
             'success': True,
@@ -587,7 +1018,7 @@ def disable_user(user_id):
         }), 500
 
 
-@app.route('/api/users/<int:user_id>/enable', methods=['POST'])
+@bp.route('/api/users/<int:user_id>/enable', methods=['POST'])
 @permission_required('admin')
 def enable_user(user_id):
     """启用用户（恢复为可登录状态）"""
@@ -602,17 +1033,17 @@ def enable_user(user_id):
         current_user = User.get_by_id(session.get('user_id'))
         user_role = session.get('role', 'user')
         
-        # 管理员只能启用本部门用户
+        # 管理员只能启用本部门及下级部门的用户
         if user_role == 'admin':
             if not current_user or not current_user.department_id:
                 return jsonify({
                     'success': False,
                     'message': '您还没有被分配部门，无法执行此操作'
                 }), 403
-            if user.department_id != current_user.department_id:
+            if not department_tree.contains(current_user.department_id, user.department_id):
                 return jsonify({
                     'success': False,
-                    'message': '您只能启用本部门的用户'
+                    'message': '您只能启用本部门及下级部门的用户'
                 }), 403
         
         if user.status == 1:
@@ -622,7 +1053,6 @@ def enable_user(user_id):
             }), 400
         
         user.status = 1
-        user.password = None  # 避免更新密码字段
         user.save()
         
         return jsonify({
@@ -637,7 +1067,7 @@ def enable_user(user_id):
         }), 500
 
 
-@app.route('/api/users/login', methods=['POST'])
+@bp.route('/api/users/login', methods=['POST'])
 def login():
     """用户登录"""
     try:
@@ -668,7 +1098,8 @@ def login():
                 'message': '用户名或密码错误'
             }), 401
         
-        # 设置 session
+        # 设置 session（更换会话 ID，防止会话固定）
+        session.regenerate()
         session['user_id'] = user.id
         session['username'] = user.username
         session['real_name'] = user.real_name
@@ -687,7 +1118,7 @@ def login():
         }), 500
 
 
-@app.route('/api/users/current', methods=['GET'])
+@bp.route('/api/users/current', methods=['GET'])
 def get_current_user():
     """获取当前登录用户信息"""
     if 'user_id' not in session:
@@ -710,7 +1141,43 @@ def get_current_user():
     })
 
 
-@app.route('/api/users/search', methods=['GET'])
+@bp.route('/api/bootstrap', methods=['GET'])
+@permission_required('view')
+def get_bootstrap():
+    """页面初始化数据：当前用户、权限、启用的部门和职位，以及第一页用户（users=0 时不返回）
+    
+    一次请求代替 /api/users/current、/api/departments、/api/positions、/api/users 四次请求，
+    部门、职位和用户列表在服务端并行查询。
+    """
+    try:
+        page_size = request.args.get('page_size', 20, type=int)
+        page_size = min(max(page_size, 1), BOOTSTRAP_MAX_PAGE_SIZE)
+        include_users = request.args.get('users', '1') != '0'
+        
+        # 先读取当前用户：列表的数据权限依赖其部门（身份映射中已有，列表查询不会再次读取）
+        current_user = User.get_by_id(session['user_id'])
+        if not current_user:
+            session.clear()
+            return jsonify({
+                'success': False,
+                'message': '用户不存在'
+            }), 401
+        
+        data = build_users_bootstrap(page_size, include_users)
+        data['current_user'] = current_user.to_dict()
+        data['permissions'] = dict(user_permissions(), current_user_id=current_user.id)
+        return jsonify({
+            'success': True,
+            'data': data
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'获取页面初始化数据失败: {str(e)}'
+        }), 500
+
+
+@bp.route('/api/users/search', methods=['GET'])
 @permission_required('view')
 def search_users():
     """搜索用户"""
@@ -731,7 +1198,8 @@ def search_users():
             keyword=keyword, 
             page_size=50,
             user_department_id=user_department_id,
-            user_role=user_role
+            user_role=user_role,
+            include_archived=request.args.get('include_archived') == '1'
         )
         
         return jsonify({
@@ -749,20 +1217,89 @@ def search_users():
         }), 500
 
 
+@bp.route('/api/users/suggest', methods=['GET'])
+@permission_required('view')
+def suggest_users():
+    """输入提示：按用户名、工号、姓名（或姓名拼音）前缀返回少量用户"""
+    try:
+        prefix = request.args.get('q', '').strip()
+        if not prefix:
+            return jsonify({
+                'success': False,
+                'message': '请提供输入内容'
+            }), 400
+        limit = request.args.get('limit', suggest_index.default_limit, type=int)
+        limit = min(max(limit, 1), suggest_index.max_limit)
+        
+        user_role = session.get('role', 'user')
+        user_department_id = None
+        if user_role != 'super_admin':
+            # 当前用户的部门优先从索引读取，避免每次输入都查询数据库
+            known, user_department_id = suggest_index.department_of(session.get('user_id'))
+            if not known:
+                current_user = User.get_by_id(session.get('user_id'))
+                user_department_id = current_user.department_id if current_user else None
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'users': User.suggest(prefix, limit, user_department_id, user_role)
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'获取输入提示失败: {str(e)}'
+        }), 500
+
+
+@bp.route('/api/users/stats', methods=['GET'])
+@permission_required('view')
+def get_user_stats():
+    """用户统计（按部门、职位、角色、状态汇总）"""
+    try:
+        # 非超级管理员只能查看本部门及下级部门的统计
+        user_role = session.get('role', 'user')
+        department_id = None
+        if user_role != 'super_admin':
+            current_user = User.get_by_id(session.get('user_id'))
+            if not current_user or not current_user.department_id:
+                return jsonify({
+                    'success': False,
+                    'message': '您还没有被分配部门，请联系管理员'
+                }), 403
+            department_id = current_user.department_id
+        
+        return jsonify({
+            'success': True,
+            'data': UserStats.get_summary(department_id=department_id, include_subdepartments=True)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'获取用户统计失败: {str(e)}'
+        }), 500
+
+
 # 部门和职位管理API
-@app.route('/api/departments', methods=['GET'])
+@bp.route('/api/departments', methods=['GET'])
 @permission_required('view')
 def get_departments():
-    """获取所有部门列表"""
+    """获取所有部门（按层级排列；format=tree 时返回嵌套结构）"""
     try:
         status = request.args.get('status')
         status = int(status) if status is not None else None
         
         departments = Department.get_all(status=status)
+        if request.args.get('format') == 'tree':
+            data = Department.to_tree(departments)
+        else:
+            data = department_rows(departments)
         
-        return jsonify({
+        return conditional_json({
             'success': True,
-            'data': [dept.to_dict() for dept in departments]
+            'data': data
         })
     except Exception as e:
         return jsonify({
@@ -771,7 +1308,52 @@ def get_departments():
         }), 500
 
 
-@app.route('/api/positions', methods=['GET'])
+@bp.route('/api/departments/<int:department_id>', methods=['PUT'])
+@permission_required('super_admin')
+def update_department(department_id):
+    """修改部门（名称、描述、上级部门；调整上级部门时下级部门随之移动）"""
+    try:
+        department = Department.get_by_id(department_id)
+        if not department:
+            return jsonify({
+                'success': False,
+                'message': '部门不存在'
+            }), 404
+        
+        data = request.get_json() or {}
+        if 'name' in data:
+            department.name = data['name']
+        if 'description' in data:
+            department.description = data['description']
+        if 'parent_id' in data:
+            try:
+                department.parent_id = int(data['parent_id']) if data['parent_id'] is not None else None
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'message': '上级部门参数不正确'
+                }), 400
+        
+        department.save()
+        
+        return jsonify({
+            'success': True,
+            'message': '部门已更新',
+            'data': department.to_dict()
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'更新部门失败: {str(e)}'
+        }), 500
+
+
+@bp.route('/api/positions', methods=['GET'])
 @permission_required('view')
 def get_positions():
     """获取所有职位列表"""
@@ -781,7 +1363,7 @@ def get_positions():
         
         positions = Position.get_all(status=status)
         
-        return jsonify({
+        return conditional_json({
             'success': True,
             'data': [pos.to_dict() for pos in positions]
         })
@@ -792,7 +1374,133 @@ def get_positions():
         }), 500
 
 
-@app.errorhandler(404)
+@bp.route('/api/changes', methods=['GET'])
+@sync_access_required
+def get_changes():
+    """增量变更：返回序号大于 since 的用户、部门、职位变更（同一实体只返回最新快照）
+    
+    分片模式下每个分片有独立的序号，用 shard 参数指定分片（默认为 default）。
+    """
+    try:
+        shard = request.args.get('shard', 'default')
+        if shard not in router.names():
+            return jsonify({
+                'success': False,
+                'message': f'未知的分片: {shard}'
+            }), 400
+        since = request.args.get('since', 0, type=int)
+        limit = request.args.get('limit', 500, type=int)
+        if since < 0 or limit <= 0:
+            return jsonify({
+                'success': False,
+                'message': 'since 不能为负数，limit 必须大于 0'
+            }), 400
+        limit = min(limit, 5000)
+        
+        return jsonify({
+            'success': True,
+            'data': ChangeLog.get_changes(since=since, limit=limit, database=router.get(shard))
+        })
+    except ChangeLogPurged as e:
+        return jsonify({
+            'success': False,
+            'message': '同步位置已过期，请从 since=0 重新全量同步',
+            'data': {'purged_through': e.purged_through}
+        }), 410
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'获取变更失败: {str(e)}'
+        }), 500
+
+
+@bp.route('/api/events', methods=['GET'])
+@permission_required('view')
+def event_stream():
+    """实时变更推送（Server-Sent Events），按当前用户的部门范围过滤
+    
+    每个连接占用一个工作线程，适合开发和小规模部署；大量连接时运行 events_server.py
+    （asyncio 实现，单线程承载大量空闲连接），并由反向代理把 /api/events 转发过去。
+    """
+    role = session.get('role', 'user')
+    current_user = User.get_by_id(session.get('user_id'))
+    department_id = current_user.department_id if current_user else None
+    if role != 'super_admin' and not department_id:
+        return jsonify({
+            'success': False,
+            'message': '您还没有被分配部门，请联系管理员'
+        }), 403
+    
+    events = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+    overflowed = []
+    
+    def deliver(event):
+        try:
+            events.put_nowait(event)
+        except queue.Full:
+            overflowed.append(True)
+    
+    def stream():
+        subscription = broker.subscribe(subscriber_scope(role, department_id), deliver)
+        try:
+            yield f"retry: {RETRY_INTERVAL}\n\n"
+            yield format_sse({'type': 'ready'})
+            while True:
+                try:
+                    event = events.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield format_sse_comment('ping')
+                    continue
+                if overflowed:
+                    # 客户端消费过慢，丢弃积压的消息并通知整体刷新
+                    overflowed.clear()
+                    while not events.empty():
+                        events.get_nowait()
+                    event = {'type': 'reset'}
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@bp.route('/api/health', methods=['GET'])
+def health():
+    """健康检查：熔断器状态、重试和超时计数（超级管理员可查看副本、后台任务和查询合并详情）"""
+    status = db.resilience_status()
+    data = {
+        'database': status['breaker']['state'],
+        'breaker': status['breaker'],
+        'counters': status['counters']
+    }
+    if session.get('role') == 'super_admin':
+        data['timeouts'] = status['timeouts']
+        data['replicas'] = db.replica_status()
+        data['jobs'] = jobs.status()
+        data['single_flight'] = flights.status()
+        if router.enabled:
+            data['shards'] = router.status()
+        if directory_engine.enabled:
+            data['directory_engine'] = directory_engine.status()
+        if suggest_index.enabled:
+            data['suggest_index'] = suggest_index.status()
+    healthy = status['breaker']['state'] == 'closed'
+    return jsonify({
+        'success': healthy,
+        'data': data
+    }), 200 if healthy else 503
+
+
+@bp.app_errorhandler(DatabaseUnavailable)
+def database_unavailable(error):
+    """未被视图捕获的数据库不可用错误"""
+    return db_unavailable_response()
+
+
+@bp.app_errorhandler(404)
 def not_found(error):
     """404 错误处理"""
     return jsonify({
@@ -801,7 +1509,7 @@ def not_found(error):
     }), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     """500 错误处理"""
     return jsonify({
@@ -810,6 +1518,109 @@ def internal_error(error):
     }), 500
 
 
+def register_jobs(config):
+    """按配置注册后台任务（首个请求时启动；已注册的任务先全部停止并移除）"""
+    jobs.reset()
+    # 定期从 users 表重新统计，纠正统计表的偏差（分片模式下逐个分片）
+    jobs.register(
+        'user_stats_reconcile',
+        config.get('stats', {}).get('reconcile_interval', 600),
+        UserStats.reconcile_all
+    )
+    
+    # 定期压缩变更日志（同一实体只保留最新记录，过期的删除标记被清理）
+    changes_config = config.get('changes', {})
+    jobs.register(
+        'change_log_compact',
+        changes_config.get('compact_interval', 3600),
+        lambda: sum(
+            ChangeLog.compact(changes_config.get('tombstone_retention_days', 30) * 86400, database)
+            for database in router.databases()
+        )
+    )
+    
+    # 分片模式下定期把部门、职位全量同步到各分片（补齐写入后同步失败的情况）
+    if router.enabled:
+        jobs.register(
+            'shard_reference_sync',
+            config.get('sharding', {}).get('reference_sync_interval', 300),
+            router.sync_reference
+        )
+    
+    # 内存用户目录：启用后定期增量同步（启动时全量加载，未加载完成前列表查询走数据库）
+    directory_engine.configure(config.get('directory_engine', {}))
+    if directory_engine.enabled:
+        jobs.register(
+            'directory_engine_refresh',
+            directory_engine.poll_interval,
+            directory_engine.refresh
+        )
+    
+    # 输入提示索引：首次运行时全量加载，之后按变更日志增量同步其他进程的写入
+    suggest_index.configure(config.get('suggest', {}))
+    if suggest_index.enabled:
+        jobs.register(
+            'suggest_index_sync',
+            suggest_index.sync_interval,
+            suggest_index.refresh
+        )
+    
+    # 长期停用的用户分批移入归档表
+    archive_config = config.get('archive', {})
+    if archive_config.get('enabled', True):
+        jobs.register(
+            'user_archive',
+            archive_config.get('interval', 3600),
+            lambda: User.archive_disabled(
+                archive_config.get('disabled_days', 180),
+                archive_config.get('batch_size', 500)
+            )
+        )
+    
+    # 定期清理过期的幂等请求记录
+    idempotency_config = config.get('idempotency', {})
+    jobs.register(
+        'idempotency_purge',
+        idempotency_config.get('purge_interval', 3600),
+        lambda: IdempotencyKey.purge(idempotency_config.get('ttl', 86400))
+    )
+
+
+def create_app(config=None):
+    """创建应用
+    
+    只读取配置、注册路由和后台任务，不访问数据库：数据库在首次使用时连接并建表，
+    数据库暂时不可用时 worker 仍能启动（期间的请求返回 503，恢复后自动继续）。
+    数据库、分片和后台任务按传入的配置重新设置，重复调用时替换上一次的设置（旧的后台任务停止）。
+    
+    Args:
+        config: config.json 的完整内容（默认读取 config.json）
+    """
+    if config is None:
+        config = load_config()
+    
+    # 数据库连接和分片按本次的配置设置（首次使用时连接）
+    db.configure(config)
+    router.reload()
+    
+    app = Flask(__name__)
+    app.config['JSON_AS_ASCII'] = False  # 支持中文
+    app.config['SECRET_KEY'] = load_secret_key(config)  # 稳定的会话签名密钥（重启和多 worker 共享）
+    app.config['APP_CONFIG'] = config
+    # 服务端会话存储（Cookie 中只保存签名后的会话 ID）
+    app.session_interface = create_session_interface(config, db)
+    # 静态资源指纹与预压缩（先运行 build_assets.py 生成 static/dist/）
+    init_assets(app)
+    # 启用 CORS 支持
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    app.register_blueprint(bp)
+    
+    register_jobs(config)
+    # 实时推送：轮询变更日志的间隔（秒）
+    broker.poll_interval = config.get('events', {}).get('poll_interval', 1.0)
+    return app
+
+
 if __name__ == '__main__':
-    # 开发环境运行
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # 开发环境运行（WSGI 服务器使用 gunicorn 'app:create_app()'）
+    create_app().run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态资源指纹与预压缩文件服务
+
+读取 build_assets.py 生成的 static/dist/manifest.json：
+- url_for('static', filename='js/main.js') 自动解析为带指纹的 dist/js/main.<hash>.js
+- 指纹文件按 Accept-Encoding 返回 .br / .gz 预压缩版本，并设置一年的 immutable 缓存
+- 未构建（或调试模式）时仍返回原始文件，并附加内容哈希作为版本参数，避免旧缓存
+"""
+
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from flask import current_app, request, send_from_directory
+
+DIST_PREFIX = 'dist/'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# 按优先级排列的预压缩格式：(Accept-Encoding 名称, 文件后缀)
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+class AssetManifest:
+    """静态资源 manifest"""
+    
+    def __init__(self, static_folder, manifest_path=None):
+        self.static_folder = static_folder
+        self.manifest_path = manifest_path or os.path.join(static_folder, 'dist', 'manifest.json')
+        self.entries = {}
+        self.encodings = {}
+        # 未构建时使用的内容哈希缓存：filename -> (mtime, hash)
+        self._source_hashes = {}
+        self._lock = threading.Lock()
+        self.load()
+    
+    def load(self):
+        """加载 manifest（不存在时为空）"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except (OSError, ValueError) as e:
+            print(f"读取静态资源 manifest 失败: {e}")
+            manifest = {}
+        
+        self.entries = {path: entry['file'] for path, entry in manifest.items()}
+        self.encodings = {entry['file']: set(entry.get('encodings', [])) for entry in manifest.values()}
+    
+    def resolve(self, filename):
+        """返回指纹文件名（不在 manifest 中时返回 None）"""
+        return self.entries.get(filename)
+    
+    def source_hash(self, filename):
+        """原始文件的内容哈希（按 mtime 缓存）"""
+        path = os.path.join(self.static_folder, filename)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        cached = self._source_hashes.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:10]
+        with self._lock:
+            self._source_hashes[filename] = (mtime, digest)
+        return digest
+
+
+def _rewrite_static_url(endpoint, values):
+    """url_for('static') 时把文件名替换为指纹文件名"""
+    if endpoint != 'static' or 'filename' not in values:
+        return
+    manifest = current_app.extensions.get('asset_manifest')
+    if manifest is None:
+        return
+    
+    filename = values['filename']
+    if filename.startswith(DIST_PREFIX):
+        return
+    hashed = None if current_app.debug else manifest.resolve(filename)
+    if hashed:
+        values['filename'] = hashed
+    elif 'v' not in values:
+        digest = manifest.source_hash(filename)
+        if digest:
+            values['v'] = digest
+
+
+def _serve_static(filename):
+    """静态文件视图：指纹文件优先返回预压缩版本并长期缓存"""
+    app = current_app._get_current_object()
+    if not filename.startswith(DIST_PREFIX):
+        return app.send_static_file(filename)
+    
+    manifest = app.extensions['asset_manifest']
+    available = manifest.encodings.get(filename, set())
+    accepted = request.accept_encodings
+    
+    served = filename
+    content_encoding = None
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding in available and accepted[encoding]:
+            served = filename + suffix
+            content_encoding = encoding
+            break
+    
+    mimetype = None
+    if content_encoding:
+        # 按原始文件类型返回，而不是 .gz/.br 对应的类型
+        mimetype = mimetypes.guess_type(filename)[0]
+    
+    response = send_from_directory(
+        app.static_folder, served, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE
+    )
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app, manifest_path=None):
+    """为应用启用静态资源指纹和预压缩服务"""
+    manifest = AssetManifest(app.static_folder, manifest_path)
+    app.extensions['asset_manifest'] = manifest
+    app.url_defaults(_rewrite_static_url)
+    app.view_functions['static'] = _serve_static
+    return manifest
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试用例
+
+每个用例是一个准备函数：完成准备工作后返回要计时的无参函数。
+导入本模块时先安装内存数据库连接，再导入应用。
+"""
+
+import itertools
+
+from benchmarks import fake_db
+
+DATASET = fake_db.install()
+
+import app as app_module  # noqa: E402  需在安装内存数据库连接之后导入
+from jobs import jobs  # noqa: E402
+from models.user import User  # noqa: E402
+
+app = app_module.create_app()
+# 基准测试不运行后台任务（统计校准、变更日志压缩等）
+jobs.jobs.clear()
+
+PAGE_SIZES = (20, 100, 500)
+
+# 用例名称 -> (分组, 准备函数)
+CASES = {}
+
+
+def case(name, group):
+    """注册用例"""
+    def decorator(setup):
+        CASES[name] = (group, setup)
+        return setup
+    return decorator
+
+
+def _user_rows(count):
+    return [dict(row) for row in DATASET.users[:count]]
+
+
+def _users(count):
+    return [User._from_dict(row) for row in _user_rows(count)]
+
+
+# ----------------------------------------------------------------------
+# 行映射
+# ----------------------------------------------------------------------
+
+@case('mapping.from_dict', 'mapping')
+def mapping_single():
+    row = _user_rows(1)[0]
+    return lambda: User._from_dict(row)
+
+
+def _register_mapping_page(size):
+    @case(f'mapping.from_dict_page_{size}', 'mapping')
+    def setup():
+        rows = _user_rows(size)
+        return lambda: [User._from_dict(row) for row in rows]
+
+
+# ----------------------------------------------------------------------
+# 序列化
+# ----------------------------------------------------------------------
+
+def _register_serialize_page(size):
+    @case(f'serialize.to_dict_page_{size}', 'serialize')
+    def to_dict():
+        users = _users(size)
+        return lambda: [user.to_dict() for user in users]
+    
+    @case(f'serialize.jsonify_page_{size}', 'serialize')
+    def jsonify_page():
+        users = _users(size)
+        
+        def run():
+            with app.app_context():
+                return app_module.jsonify({
+                    'success': True,
+                    'data': {'users': [user.to_dict() for user in users]}
+                }).get_data()
+        return run
+
+
+for _size in PAGE_SIZES:
+    _register_mapping_page(_size)
+    _register_serialize_page(_size)
+
+
+# ----------------------------------------------------------------------
+# 权限装饰器
+# ----------------------------------------------------------------------
+
+def _view():
+    return None
+
+
+def _decorated(decorator):
+    """在已登录（超级管理员）的请求上下文中调用被装饰的视图"""
+    view = decorator(_view)
+    context = app.test_request_context('/api/users')
+    context.push()
+    app_module.session['user_id'] = 1
+    app_module.session['role'] = 'super_admin'
+    # 请求上下文保持到进程结束，计时只包含装饰器本身
+    return view
+
+
+@case('decorator.bare_view', 'decorator')
+def decorator_bare():
+    return _view
+
+
+@case('decorator.login_required', 'decorator')
+def decorator_login():
+    return _decorated(app_module.login_required)
+
+
+@case('decorator.permission_view', 'decorator')
+def decorator_permission_view():
+    return _decorated(app_module.permission_required('view'))
+
+
+@case('decorator.permission_super_admin', 'decorator')
+def decorator_permission_super_admin():
+    return _decorated(app_module.permission_required('super_admin'))
+
+
+# ----------------------------------------------------------------------
+# 完整请求（Flask 测试客户端，超级管理员会话）
+# ----------------------------------------------------------------------
+
+def _client():
+    client = app.test_client()
+    response = client.post('/api/users/login', json={
+        'username': 'user1', 'password': fake_db.ADMIN_PASSWORD
+    })
+    if response.status_code != 200:
+        raise RuntimeError(f'基准测试登录失败: {response.status_code} {response.get_data(as_text=True)}')
+    return client
+
+
+def _register_request(name, method, path, body=None):
+    """注册一个请求用例；body 可以是返回请求体的函数（需要唯一值时）"""
+    @case(f'request.{name}', 'request')
+    def setup():
+        client = _client()
+        send = getattr(client, method)
+        
+        def run():
+            data = body() if callable(body) else body
+            response = send(path, json=data) if data is not None else send(path)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{method.upper()} {path} 返回 {response.status_code}: '
+                                   f'{response.get_data(as_text=True)[:200]}')
+            return response
+        # 先执行一次，确认请求成功（避免测到错误处理路径）
+        run()
+        return run
+
+
+_serial = itertools.count(1)
+
+
+def _new_user():
+    n = next(_serial)
+    return {
+        'username': f'bench{n}', 'password': '123456', 'real_name': f'基准{n}',
+        'department_id': 2, 'position_id': 3, 'employee_id': f'B{n:08d}'
+    }
+
+
+# /api/events（长连接推送）和 /logout（结束会话）不在测试范围内
+REQUESTS = [
+    ('login_page', 'get', '/login', None),
+    ('users_page', 'get', '/users', None),
+    ('api_index', 'get', '/api', None),
+    ('list_users', 'get', '/api/users', None),
+    ('list_users_100', 'get', '/api/users?page_size=100', None),
+    ('list_users_cursor', 'get', '/api/users?before_id=500', None),
+    ('get_user', 'get', '/api/users/2', None),
+    ('current_user', 'get', '/api/users/current', None),
+    ('search_users', 'get', '/api/users/search?keyword=user1', None),
+    ('suggest_users', 'get', '/api/users/suggest?q=user1', None),
+    ('user_stats', 'get', '/api/users/stats', None),
+    ('bootstrap', 'get', '/api/bootstrap', None),
+    ('departments', 'get', '/api/departments?status=1', None),
+    ('positions', 'get', '/api/positions?status=1', None),
+    ('changes', 'get', '/api/changes', None),
+    ('health', 'get', '/api/health', None),
+    ('login', 'post', '/api/users/login', {'username': 'user1', 'password': fake_db.ADMIN_PASSWORD}),
+    ('create_user', 'post', '/api/users', _new_user),
+    ('register_user', 'post', '/api/users/register', _new_user),
+    ('update_user', 'put', '/api/users/2', {'real_name': '基准修改', 'phone': '13900000000'}),
+    ('upsert_user', 'put', '/api/users/by-employee-id/E000002', {'username': 'user2', 'real_name': '基准同步'}),
+    ('disable_user', 'post', '/api/users/3/disable', None),
+    ('enable_user', 'post', '/api/users/5/enable', None),
+    ('delete_user', 'delete', '/api/users/4', None)
+]
+
+for _request in REQUESTS:
+    _register_request(*_request)
+
+
+# ----------------------------------------------------------------------
+# 密码哈希
+# ----------------------------------------------------------------------
+
+@case('hash.hash_password', 'hash')
+def hash_password():
+    return lambda: User.hash_password(fake_db.ADMIN_PASSWORD)
+
+
+@case('hash.verify_password', 'hash')
+def verify_password():
+    hashed = User.hash_password(fake_db.ADMIN_PASSWORD)
+    return lambda: User.verify_password(fake_db.ADMIN_PASSWORD, hashed)
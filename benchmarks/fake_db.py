@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试使用的内存数据库连接
+
+按 SQL 的形状返回固定的数据（用户、部门、职位、统计），不连接 MySQL，
+测得的是应用自身（映射、序列化、路由、装饰器）的开销。
+在导入 database 之前调用 install()，全局 db 和各分片都会使用这里的连接。
+"""
+
+import datetime
+import re
+
+import pymysql
+
+DEPARTMENTS = [
+    {'id': i, 'name': f'部门{i}', 'description': f'部门{i}说明', 'status': 1,
+     'created_at': None, 'updated_at': None}
+    for i in range(1, 11)
+]
+POSITIONS = [
+    {'id': 1, 'name': '总经理', 'role': 'super_admin', 'description': '', 'status': 1,
+     'created_at': None, 'updated_at': None},
+    {'id': 2, 'name': '部长', 'role': 'admin', 'description': '', 'status': 1,
+     'created_at': None, 'updated_at': None},
+    {'id': 3, 'name': '员工', 'role': 'user', 'description': '', 'status': 1,
+     'created_at': None, 'updated_at': None}
+]
+# 用户 1 为超级管理员，密码 123456（基准测试登录使用）；ID 为 5 的倍数的用户已禁用
+ADMIN_PASSWORD = '123456'
+
+_LIMIT_RE = re.compile(r'LIMIT %s OFFSET %s$')
+
+
+def make_user_row(user_id):
+    """一行与 users 关联查询结构相同的数据"""
+    department = DEPARTMENTS[user_id % len(DEPARTMENTS)]
+    position = POSITIONS[0] if user_id == 1 else POSITIONS[1 + user_id % 2]
+    timestamp = datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=user_id)
+    return {
+        'id': user_id,
+        'username': f'user{user_id}',
+        'password': '8d969eef6ecad3c29a3a629280e686cf0c3f5d5a86aff3ca12020c923adc6c92',
+        'real_name': f'用户{user_id}',
+        'email': f'user{user_id}@example.com',
+        'phone': f'138{user_id:08d}',
+        'department_id': department['id'],
+        'position_id': position['id'],
+        'employee_id': f'E{user_id:06d}',
+        'status': 0 if user_id % 5 == 0 else 1,
+        'role': position['role'],
+        'created_at': timestamp,
+        'updated_at': timestamp,
+        'department_name': department['name'],
+        'position_name': position['name'],
+        'position_role': position['role']
+    }
+
+
+class FakeDataset:
+    """固定数据集，按 SQL 返回 (行, 影响行数, 自增 ID)"""
+    
+    def __init__(self, user_count=1000):
+        self.users = [make_user_row(i) for i in range(user_count, 0, -1)]
+        self.index = {key: {row[key]: row for row in self.users} for key in ('id', 'username', 'employee_id')}
+        self.next_id = user_count + 1
+        self.seq = 0
+    
+    def respond(self, sql, params):
+        params = params or ()
+        if sql.startswith(('INSERT', 'REPLACE')):
+            self.next_id += 1
+            return [], 1, self.next_id - 1
+        if sql.startswith(('UPDATE', 'DELETE')):
+            return [], 1, 0
+        if 'LAST_INSERT_ID() AS seq' in sql:
+            self.seq += 1
+            return [{'seq': self.seq}], 1, 0
+        if 'FROM change_log_state' in sql:
+            return [{'name': 'seq', 'value': self.seq}, {'name': 'purged_through', 'value': 0}], 2, 0
+        if sql.startswith('SELECT 1 FROM change_log'):
+            return [{'1': 1}], 1, 0
+        if 'DATETIME_PRECISION' in sql:
+            return [{'precision': 3}], 1, 0
+        if 'GET_LOCK' in sql:
+            return [{'locked': 1}], 1, 0
+        if 'FROM users u' in sql:
+            return self._users(sql, params)
+        if 'FROM users WHERE id=%s' in sql:
+            row = self.index['id'].get(params[0])
+            return ([dict(row)], 1, 0) if row else ([], 0, 0)
+        if 'FROM user_stats s' in sql:
+            return self._stats(), 1, 0
+        if 'FROM departments' in sql:
+            return self._filter_by_id(DEPARTMENTS, sql, params)
+        if 'FROM positions' in sql:
+            return self._filter_by_id(POSITIONS, sql, params)
+        return [], 0, 0
+    
+    def _users(self, sql, params):
+        if 'COUNT(*)' in sql:
+            return [{'total': len(self.users)}], 1, 0
+        if _LIMIT_RE.search(sql):
+            limit, offset = params[-2], params[-1]
+            return [dict(row) for row in self.users[offset:offset + limit]], limit, 0
+        for key in ('id', 'username', 'employee_id'):
+            if f'WHERE u.{key}=%s' in sql:
+                row = self.index[key].get(params[0])
+                return ([dict(row)], 1, 0) if row else ([], 0, 0)
+        return [], 0, 0
+    
+    def _stats(self):
+        return [
+            {'department_id': department['id'], 'position_id': position['id'], 'role': position['role'],
+             'status': 1, 'total': 10, 'department_name': department['name'], 'position_name': position['name']}
+            for department in DEPARTMENTS for position in POSITIONS
+        ]
+    
+    @staticmethod
+    def _filter_by_id(rows, sql, params):
+        if 'WHERE id=%s' in sql:
+            rows = [row for row in rows if row['id'] == params[0]]
+        return [dict(row) for row in rows], len(rows), 0
+
+
+class FakeCursor:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = 0
+    
+    def execute(self, sql, params=None):
+        self.rows, self.rowcount, self.lastrowid = self.dataset.respond(' '.join(sql.split()), params)
+        return self.rowcount
+    
+    def executemany(self, sql, seq_of_params):
+        for params in seq_of_params:
+            self.execute(sql, params)
+    
+    def fetchall(self):
+        return list(self.rows)
+    
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeConnection:
+    def __init__(self, dataset):
+        self.dataset = dataset
+    
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self.dataset)
+    
+    def begin(self):
+        pass
+    
+    def commit(self):
+        pass
+    
+    def rollback(self):
+        pass
+    
+    def ping(self, reconnect=False):
+        pass
+    
+    def close(self):
+        pass
+
+
+def install(dataset=None):
+    """用内存数据集替换 pymysql.connect（需在导入 database 之前调用），返回数据集"""
+    dataset = dataset or FakeDataset()
+    pymysql.connect = lambda **kwargs: FakeConnection(dataset)
+    return dataset
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导入耗时检查
+
+在独立进程中用 python -X importtime 导入指定模块（模块提供 create_app 时再创建一次应用，
+即 worker 的启动过程），超出启动预算或启动时访问了数据库则失败（退出码为 1），
+用于保证 worker 启动不依赖数据库、不被慢导入拖累。
+每个模块分别按 config.json 和配置了分片的副本各检查一次（分片路由同样不能在启动时访问数据库）。
+
+用法（在项目根目录运行）：
+    python -m benchmarks.importtime                         # 检查 app、models.user
+    python -m benchmarks.importtime app --budget-ms 300 --top 15
+"""
+
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ['app', 'models.user']
+
+DEFAULT_BUDGET_MS = 500
+
+# 子进程：禁止连接数据库后导入模块并创建应用（连接失败被调用方捕获时同样算作失败）
+IMPORT_SNIPPET = """
+import importlib
+import pymysql
+
+attempts = []
+
+def _refuse(**kwargs):
+    attempts.append(kwargs.get('host'))
+    raise RuntimeError('启动时访问了数据库')
+
+pymysql.connect = _refuse
+import {module}
+create_app = getattr(importlib.import_module('{module}'), 'create_app', None)
+if create_app is not None:
+    create_app()
+if attempts:
+    raise SystemExit('启动时访问了数据库（连接 %d 次）' % len(attempts))
+"""
+
+
+def sharded_config():
+    """在 config.json 的基础上增加一个分片"""
+    with open(os.path.join(ROOT, 'config.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config = copy.deepcopy(config)
+    database = config.setdefault('database', {})
+    database['shards'] = [{'name': 'shard1', 'database': f"{database.get('database', 'salary_management')}_shard1"}]
+    return config
+
+
+def parse_importtime(output):
+    """解析 -X importtime 的输出：[(模块名, 自身耗时 us, 累计耗时 us, 层级)]"""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        level = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return entries
+
+
+def measure_import(module, config=None):
+    """导入一次模块，返回 (耗时明细, 错误信息)
+    
+    Args:
+        config: 使用的配置（在临时目录中作为 config.json），None 表示项目根目录的 config.json
+    """
+    command = [sys.executable, '-X', 'importtime', '-c', IMPORT_SNIPPET.format(module=module)]
+    if config is None:
+        process = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            with open(os.path.join(workdir, 'config.json'), 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False)
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+            process = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    entries = parse_importtime(process.stderr)
+    if process.returncode != 0:
+        errors = [line for line in process.stderr.splitlines() if not line.startswith('import time:')]
+        return entries, '\n'.join(errors[-5:])
+    return entries, None
+
+
+def total_us(entries, module):
+    """模块（含其依赖）的累计导入耗时"""
+    for name, _, cumulative_us, _ in reversed(entries):
+        if name == module:
+            return cumulative_us
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='导入耗时检查')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help='要检查的模块')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help='每个模块的导入预算（毫秒）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个模块导入的次数（取最短）')
+    parser.add_argument('--top', type=int, default=0, help='列出自身耗时最多的模块数量（超出预算时至少 10 个）')
+    args = parser.parse_args(argv)
+    
+    failed = False
+    cases = [(module, None, '') for module in args.modules]
+    cases += [(module, sharded_config(), '（分片配置）') for module in args.modules]
+    for module, config, label in cases:
+        best, error = None, None
+        for _ in range(args.repeat):
+            entries, error = measure_import(module, config)
+            if error:
+                break
+            if best is None or total_us(entries, module) < total_us(best, module):
+                best = entries
+        if error:
+            print(f"{module}{label}: 导入失败\n{error}")
+            failed = True
+            continue
+        
+        elapsed_ms = total_us(best, module) / 1000
+        over = elapsed_ms > args.budget_ms
+        failed = failed or over
+        print(f"{module}{label}: {elapsed_ms:.1f}ms（预算 {args.budget_ms:g}ms）{'  超出预算' if over else ''}")
+        top = max(args.top, 10 if over else 0)
+        for name, self_us, cumulative_us, _ in sorted(best, key=lambda entry: -entry[1])[:top]:
+            print(f"    {name:<40} 自身 {self_us / 1000:>7.1f}ms  累计 {cumulative_us / 1000:>7.1f}ms")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
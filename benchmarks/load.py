@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压测：按加权的用户旅程通过 HTTP 驱动运行中的服务
+
+准备（本地数据库）：
+    python3 init_db.py
+    python3 create_test_users.py --load-users 200
+    python3 app.py
+
+运行：
+    python -m benchmarks.load --rate 5 --duration 60 --load-users 200
+    python -m benchmarks.load --rate 5,10,20,40 --duration 30 --report load.json   # 逐级加压寻找拐点
+
+到达为开环（泊松过程）：旅程按 --rate 到达，不等待前一个旅程完成，
+服务变慢时并发随之上升。工作线程全部占用时新旅程排队等待，排队时间记为调度延迟，
+调度延迟持续上升说明已超过服务（或压测机）的承载能力。
+
+账号来自 create_test_users.py：示例账号和压测账号（登录使用），
+序号除以 10 余 5 的压测账号作为编辑、停用/启用的目标，不用于登录。
+每个接口统计请求数、吞吐、p50/p99 延迟和错误率（状态码不符合预期或请求失败）。
+"""
+
+import argparse
+import collections
+import http.client
+import json
+import math
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from create_test_users import (TEST_USERS, DEFAULT_POSITIONS, LOAD_USER_PREFIX,  # noqa: E402
+                               build_load_users)
+
+POSITION_ROLES = {item['name']: item['role'] for item in DEFAULT_POSITIONS}
+SEARCH_KEYWORDS = ['小', '部长', '压测', 'user', 'load00', 'E00']
+
+Account = collections.namedtuple('Account', 'username password role department')
+
+
+def load_accounts(load_users):
+    """登录账号和目标账号（按部门分组）"""
+    accounts, targets = [], collections.defaultdict(list)
+    for data in TEST_USERS + build_load_users(load_users):
+        account = Account(data['username'], data['password'], POSITION_ROLES[data['position']], data['department'])
+        index = data['username'][len(LOAD_USER_PREFIX):]
+        if data['username'].startswith(LOAD_USER_PREFIX) and int(index) % 10 == 5:
+            targets[account.department].append(account.username)
+        else:
+            accounts.append(account)
+    return accounts, targets
+
+
+def percentile(sorted_values, fraction):
+    """最近秩百分位"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Stats:
+    """按接口统计延迟和错误"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.statuses = collections.defaultdict(collections.Counter)
+        self.journeys = collections.Counter()
+        self.lags = []
+    
+    def record(self, name, latency, status, ok):
+        with self._lock:
+            self.latencies[name].append(latency)
+            self.statuses[name][status] += 1
+            if not ok:
+                self.errors[name] += 1
+    
+    def record_journey(self, name, lag):
+        with self._lock:
+            self.journeys[name] += 1
+            self.lags.append(lag)
+    
+    def summary(self, elapsed):
+        endpoints = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            endpoints[name] = {
+                'requests': len(values),
+                'throughput': len(values) / elapsed,
+                'p50': percentile(values, 0.50),
+                'p99': percentile(values, 0.99),
+                'max': values[-1],
+                'error_rate': self.errors[name] / len(values),
+                'statuses': {str(status): count for status, count in self.statuses[name].items()}
+            }
+        lags = sorted(self.lags)
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            'elapsed': elapsed,
+            'journeys': dict(self.journeys),
+            'requests': total,
+            'throughput': total / elapsed,
+            'error_rate': sum(self.errors.values()) / total if total else 0.0,
+            'schedule_lag_p50': percentile(lags, 0.50),
+            'schedule_lag_p99': percentile(lags, 0.99),
+            'endpoints': endpoints
+        }
+
+
+class JourneyAborted(Exception):
+    """旅程中的请求失败，后续步骤无法继续"""
+
+
+class Session:
+    """一个虚拟用户：独立的连接和 Cookie"""
+    
+    def __init__(self, base_url, stats, timeout):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.stats = stats
+        self.cookies = {}
+    
+    def request(self, method, path, name, body=None, expect=(200,)):
+        """发送请求并计入统计，返回解析后的 JSON（非 JSON 响应返回 None）
+        
+        状态码不在 expect 中时计为错误并中止旅程。
+        """
+        headers = {'Accept': 'application/json'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in self.cookies.items())
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.stats.record(name, time.perf_counter() - started, 'error', False)
+            self.connection.close()
+            raise JourneyAborted(name)
+        latency = time.perf_counter() - started
+        for header in response.headers.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie(header)
+            for key, morsel in cookie.items():
+                self.cookies[key] = morsel.value
+        ok = response.status in expect
+        self.stats.record(name, latency, response.status, ok)
+        if not ok:
+            raise JourneyAborted(name)
+        if response.headers.get_content_type() == 'application/json':
+            return json.loads(data)
+        return None
+    
+    def close(self):
+        self.connection.close()
+
+
+class TargetPool:
+    """编辑、停用/启用的目标账号（同一时间只分配给一个旅程）"""
+    
+    def __init__(self, targets):
+        self.queues = {department: queue.Queue() for department in targets}
+        for department, usernames in targets.items():
+            for username in usernames:
+                self.queues[department].put(username)
+    
+    def acquire(self, department=None):
+        """取一个目标账号：指定部门时只取该部门的，没有空闲时返回 None"""
+        departments = [department] if department else random.sample(list(self.queues), len(self.queues))
+        for name in departments:
+            try:
+                return name, self.queues[name].get_nowait()
+            except (KeyError, queue.Empty):
+                continue
+        return None
+    
+    def release(self, target):
+        self.queues[target[0]].put(target[1])
+
+
+# ----------------------------------------------------------------------
+# 用户旅程
+# ----------------------------------------------------------------------
+
+def login(session, account):
+    session.request('POST', '/api/users/login', 'POST /api/users/login',
+                    {'username': account.username, 'password': account.password})
+
+
+def browse(session, account, context):
+    """打开用户管理页面，加载选项和前两页列表"""
+    login(session, account)
+    session.request('GET', '/users', 'GET /users')
+    session.request('GET', '/api/departments?status=1', 'GET /api/departments')
+    session.request('GET', '/api/positions?status=1', 'GET /api/positions')
+    result = session.request('GET', '/api/users?page=1&page_size=20', 'GET /api/users')
+    cursor = result['data']['pagination'].get('next_cursor')
+    if cursor:
+        session.request('GET', f'/api/users?page_size=20&before_id={cursor}', 'GET /api/users?before_id')
+
+
+def filter_and_view(session, account, context):
+    """筛选、搜索，查看一个用户的详情"""
+    login(session, account)
+    departments = session.request('GET', '/api/departments?status=1', 'GET /api/departments')['data']
+    session.request('GET', '/api/users?status=1', 'GET /api/users?status')
+    if departments:
+        department_id = random.choice(departments)['id']
+        session.request('GET', f'/api/users?department_id={department_id}', 'GET /api/users?department_id')
+    query = urlencode({'keyword': random.choice(SEARCH_KEYWORDS)})
+    users = session.request('GET', f'/api/users/search?{query}', 'GET /api/users/search')['data']['users']
+    if users:
+        user_id = random.choice(users)['id']
+        session.request('GET', f'/api/users/{user_id}', 'GET /api/users/<id>')
+
+
+def _find_target(session, username):
+    """按用户名搜索目标账号"""
+    query = urlencode({'keyword': username})
+    users = session.request('GET', f'/api/users/search?{query}', 'GET /api/users/search')['data']['users']
+    for user in users:
+        if user['username'] == username:
+            return user
+    return None
+
+
+def edit(session, account, context):
+    """管理员修改本部门（超级管理员任意部门）用户的联系方式"""
+    target = context.acquire(None if account.role == 'super_admin' else account.department)
+    if target is None:
+        return
+    try:
+        login(session, account)
+        user = _find_target(session, target[1])
+        if user is None:
+            return
+        session.request('GET', f"/api/users/{user['id']}", 'GET /api/users/<id>')
+        session.request('PUT', f"/api/users/{user['id']}", 'PUT /api/users/<id>',
+                        {'phone': f'137{random.randrange(10 ** 8):08d}'})
+    finally:
+        context.release(target)
+
+
+def toggle(session, account, context):
+    """管理员停用再启用一个用户"""
+    target = context.acquire(None if account.role == 'super_admin' else account.department)
+    if target is None:
+        return
+    try:
+        login(session, account)
+        user = _find_target(session, target[1])
+        if user is None:
+            return
+        if user['status'] == 0:
+            # 上次压测中断时可能停留在停用状态
+            session.request('POST', f"/api/users/{user['id']}/enable", 'POST /api/users/<id>/enable')
+        session.request('POST', f"/api/users/{user['id']}/disable", 'POST /api/users/<id>/disable')
+        session.request('POST', f"/api/users/{user['id']}/enable", 'POST /api/users/<id>/enable')
+    finally:
+        context.release(target)
+
+
+def forbidden_edit(session, account, context):
+    """普通用户尝试修改用户，应被拒绝（403）"""
+    login(session, account)
+    users = session.request('GET', '/api/users', 'GET /api/users')['data']['users']
+    if users:
+        session.request('PUT', f"/api/users/{users[0]['id']}", 'PUT /api/users/<id> (403)',
+                        {'phone': '13700000000'}, expect=(403,))
+
+
+# (名称, 权重, 函数, 适用角色)
+JOURNEYS = [
+    ('browse', 40, browse, ('super_admin', 'admin', 'user')),
+    ('filter', 30, filter_and_view, ('super_admin', 'admin', 'user')),
+    ('edit', 15, edit, ('super_admin', 'admin')),
+    ('toggle', 5, toggle, ('super_admin', 'admin')),
+    ('forbidden_edit', 10, forbidden_edit, ('user',))
+]
+
+
+class LoadTest:
+    def __init__(self, base_url, accounts, targets, workers, timeout, seed=None):
+        self.base_url = base_url
+        self.accounts = accounts
+        self.pool = TargetPool(targets)
+        self.workers = workers
+        self.timeout = timeout
+        self.random = random.Random(seed)
+    
+    def _choose(self):
+        account = self.random.choice(self.accounts)
+        journeys = [journey for journey in JOURNEYS if account.role in journey[3]]
+        journey = self.random.choices(journeys, weights=[journey[1] for journey in journeys])[0]
+        return account, journey
+    
+    def _run_journey(self, stats, scheduled, account, journey):
+        stats.record_journey(journey[0], time.perf_counter() - scheduled)
+        session = Session(self.base_url, stats, self.timeout)
+        try:
+            journey[2](session, account, self.pool)
+        except JourneyAborted:
+            pass
+        finally:
+            session.close()
+    
+    def run_stage(self, rate, duration):
+        """以 rate 个旅程/秒的开环到达运行 duration 秒，返回统计摘要"""
+        stats = Stats()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        started = time.perf_counter()
+        next_at = started
+        while next_at < started + duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            account, journey = self._choose()
+            executor.submit(self._run_journey, stats, next_at, account, journey)
+            next_at += self.random.expovariate(rate)
+        executor.shutdown(wait=True)
+        summary = stats.summary(time.perf_counter() - started)
+        summary['rate'] = rate
+        return summary
+
+
+def print_summary(summary):
+    """打印一个阶段的结果"""
+    ms = 1000
+    print(f"\n到达率 {summary['rate']:g} 旅程/秒：{sum(summary['journeys'].values())} 个旅程，"
+          f"{summary['requests']} 个请求，{summary['throughput']:.1f} 请求/秒，"
+          f"错误率 {summary['error_rate']:.2%}，"
+          f"调度延迟 p50 {summary['schedule_lag_p50'] * ms:.1f}ms / p99 {summary['schedule_lag_p99'] * ms:.1f}ms")
+    print(f"{'接口':<36} {'请求数':>6} {'吞吐/秒':>8} {'p50(ms)':>9} {'p99(ms)':>9} {'错误率':>7}")
+    for name, item in summary['endpoints'].items():
+        print(f"{name:<38} {item['requests']:>8} {item['throughput']:>10.1f} {item['p50'] * ms:>9.1f} "
+              f"{item['p99'] * ms:>9.1f} {item['error_rate']:>9.2%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按用户旅程压测运行中的服务')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5001', help='服务地址')
+    parser.add_argument('--rate', default='5', help='到达率（旅程/秒），逗号分隔时逐级运行')
+    parser.add_argument('--duration', type=float, default=60, help='每级持续时间（秒）')
+    parser.add_argument('--load-users', type=int, default=0,
+                        help='create_test_users.py --load-users 创建的压测账号数量')
+    parser.add_argument('--workers', type=int, default=200, help='最大并发旅程数')
+    parser.add_argument('--timeout', type=float, default=30, help='单个请求的超时（秒）')
+    parser.add_argument('--seed', type=int, help='随机种子（复现同样的旅程序列）')
+    parser.add_argument('--report', help='把各级结果保存为 JSON 文件')
+    args = parser.parse_args(argv)
+    
+    accounts, targets = load_accounts(args.load_users)
+    rates = [float(rate) for rate in args.rate.split(',') if rate.strip()]
+    test = LoadTest(args.base_url, accounts, targets, args.workers, args.timeout, args.seed)
+    print(f"目标 {args.base_url}，登录账号 {len(accounts)} 个，目标账号 {sum(map(len, targets.values()))} 个")
+    
+    summaries = []
+    for rate in rates:
+        summary = test.run_stage(rate, args.duration)
+        print_summary(summary)
+        summaries.append(summary)
+    
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'base_url': args.base_url, 'duration': args.duration, 'stages': summaries},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.report}")
+    return 1 if any(summary['error_rate'] for summary in summaries) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
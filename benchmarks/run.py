@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+微基准测试
+
+用法（在项目根目录运行）：
+    python -m benchmarks.run                               # 运行全部用例
+    python -m benchmarks.run -k request --save base.json   # 只运行名称包含 request 的用例并保存结果
+    python -m benchmarks.run --compare base.json           # 运行后与基线比较
+    python -m benchmarks.run compare base.json new.json    # 比较两次保存的结果
+
+每个用例先自动确定循环次数（单轮不少于 --min-time 秒），再重复 --repeat 轮，
+取每次调用的最短和中位耗时。比较使用最短耗时，变慢超过 --threshold 判定为退化，
+存在退化时退出码为 1。
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(func, repeat, min_time):
+    """测量一次调用的耗时（秒）"""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / elapsed) + 1) if elapsed else number * 10
+    times = [elapsed / number] + [t / number for t in timer.repeat(repeat - 1, number)]
+    return {'min': min(times), 'median': statistics.median(times), 'number': number}
+
+
+def run_cases(pattern=None, repeat=5, min_time=0.2):
+    """运行用例，返回结果字典"""
+    from benchmarks.cases import CASES
+    
+    results = {}
+    for name, (group, setup) in CASES.items():
+        if pattern and pattern not in name:
+            continue
+        result = measure(setup(), repeat, min_time)
+        result['group'] = group
+        results[name] = result
+        print(f"{name:<42} {format_time(result['min']):>10} {format_time(result['median']):>10}", flush=True)
+    return {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def format_time(seconds):
+    """按量级显示耗时"""
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f}{unit}'
+    return f'{seconds / 1e-9:.0f}ns'
+
+
+def compare(baseline, current, threshold):
+    """比较两次结果，打印变化并返回退化的用例名称"""
+    regressions = []
+    print(f"{'用例':<40} {'基线':>10} {'当前':>10} {'变化':>8}")
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"{name:<42} {'-':>10} {format_time(result['min']):>10}      新增")
+            continue
+        change = result['min'] / base['min'] - 1
+        mark = ''
+        if change > threshold:
+            mark = '  退化'
+            regressions.append(name)
+        elif change < -threshold:
+            mark = '  提升'
+        print(f"{name:<42} {format_time(base['min']):>10} {format_time(result['min']):>10} "
+              f"{change:>+8.1%}{mark}")
+    missing = sorted(set(baseline['results']) - set(current['results']))
+    if missing:
+        print(f"基线中有 {len(missing)} 个用例未运行: {', '.join(missing)}")
+    if regressions:
+        print(f"\n{len(regressions)} 个用例变慢超过 {threshold:.0%}")
+    return regressions
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='微基准测试')
+    threshold = argparse.ArgumentParser(add_help=False)
+    threshold.add_argument('--threshold', type=float, default=0.10, help='判定退化的变慢比例（默认 0.10）')
+    parser.add_argument('--threshold', type=float, default=0.10, help='判定退化的变慢比例（默认 0.10）')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    compare_parser = subparsers.add_parser('compare', help='比较两次保存的结果', parents=[threshold])
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    
+    parser.add_argument('-k', dest='pattern', help='只运行名称包含该字符串的用例')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例重复的轮数')
+    parser.add_argument('--min-time', type=float, default=0.2, help='每轮的最短时间（秒）')
+    parser.add_argument('--save', help='保存结果的 JSON 文件')
+    parser.add_argument('--compare', dest='baseline', help='运行后与该基线比较')
+    args = parser.parse_args(argv)
+    
+    if args.command == 'compare':
+        regressions = compare(load_results(args.baseline), load_results(args.current), args.threshold)
+        return 1 if regressions else 0
+    
+    # 应用从当前目录读取 config.json，结果路径按切换前的目录解析
+    save = os.path.abspath(args.save) if args.save else None
+    baseline = load_results(args.baseline) if args.baseline else None
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    print(f"{'用例':<40} {'最短':>10} {'中位':>10}")
+    results = run_cases(args.pattern, args.repeat, args.min_time)
+    if save:
+        save_results(save, results)
+    if baseline:
+        print()
+        regressions = compare(baseline, results, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态资源构建脚本
+
+压缩 static/ 下的 CSS、JS 文件，按内容哈希生成带指纹的文件名，写入 static/dist/，
+同时生成 .gz（以及安装了 brotli 时的 .br）预压缩文件和 manifest.json。
+模板中的 url_for('static', filename=...) 会通过 manifest 自动解析为指纹文件名。
+
+用法:
+    python build_assets.py          # 构建
+    python build_assets.py --clean  # 删除 static/dist/
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只生成 .gz
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIRNAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# 参与构建的扩展名，以及不参与构建的目录
+ASSET_EXTENSIONS = ('.css', '.js')
+EXCLUDED_DIRS = {DIST_DIRNAME, 'bench'}
+
+# 小于该大小的文件不生成压缩版本
+MIN_COMPRESS_SIZE = 256
+
+
+def minify_css(source):
+    """压缩 CSS：去掉注释和多余空白"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    source = source.replace(';}', '}')
+    return source.strip() + '\n'
+
+
+def minify_js(source):
+    """压缩 JS：去掉缩进、空行和整行注释
+    
+    只做不改变语义的保守处理（不改写语句内部，不处理行尾注释），
+    避免误伤字符串和模板字符串中的 // 与 /* 。
+    """
+    lines = []
+    in_block_comment = False
+    for line in source.splitlines():
+        stripped = line.strip()
+        if in_block_comment:
+            if '*/' in stripped:
+                in_block_comment = False
+            continue
+        if not stripped or stripped.startswith('//'):
+            continue
+        if stripped.startswith('/*'):
+            if '*/' not in stripped:
+                in_block_comment = True
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js
+}
+
+
+def collect_assets(static_dir=STATIC_DIR):
+    """列出需要构建的资源（相对 static/ 的路径，统一使用 /）"""
+    assets = []
+    for root, dirs, files in os.walk(static_dir):
+        rel_root = os.path.relpath(root, static_dir)
+        if rel_root == '.':
+            dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+        for name in files:
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.normpath(os.path.join(rel_root, name))
+                assets.append(path.replace(os.sep, '/'))
+    return sorted(assets)
+
+
+def fingerprint(path, content):
+    """根据内容生成指纹文件名，例如 js/main.js -> js/main.1a2b3c4d5e.js"""
+    digest = hashlib.sha256(content).hexdigest()[:10]
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest}{ext}"
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_compressed(path, content):
+    """生成预压缩文件，只保留确实变小的版本"""
+    variants = []
+    if len(content) < MIN_COMPRESS_SIZE:
+        return variants
+    
+    gz = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(gz) < len(content):
+        write_file(path + '.gz', gz)
+        variants.append('gzip')
+    
+    if brotli is not None:
+        br = brotli.compress(content, quality=11)
+        if len(br) < len(content):
+            write_file(path + '.br', br)
+            variants.append('br')
+    return variants
+
+
+def build(static_dir=STATIC_DIR, minify=True):
+    """构建全部资源并写入 manifest，返回 manifest 字典"""
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    manifest = {}
+    
+    for path in collect_assets(static_dir):
+        with open(os.path.join(static_dir, path), 'r', encoding='utf-8') as f:
+            source = f.read()
+        ext = os.path.splitext(path)[1]
+        if minify:
+            source = MINIFIERS[ext](source)
+        content = source.encode('utf-8')
+        
+        hashed = fingerprint(path, content)
+        target = os.path.join(dist_dir, hashed)
+        if not os.path.exists(target):
+            write_file(target, content)
+        encodings = write_compressed(target, content)
+        
+        manifest[path] = {
+            'file': f"{DIST_DIRNAME}/{hashed}",
+            'size': len(content),
+            'encodings': encodings
+        }
+        print(f"  {path} -> {DIST_DIRNAME}/{hashed} ({len(content)} 字节, 预压缩: {', '.join(encodings) or '无'})")
+    
+    write_file(
+        os.path.join(dist_dir, MANIFEST_NAME),
+        json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8')
+    )
+    prune(dist_dir, manifest)
+    return manifest
+
+
+def prune(dist_dir, manifest):
+    """删除不再被 manifest 引用的旧指纹文件"""
+    keep = {MANIFEST_NAME}
+    for entry in manifest.values():
+        name = entry['file'][len(DIST_DIRNAME) + 1:]
+        keep.update({name, name + '.gz', name + '.br'})
+    
+    for root, _dirs, files in os.walk(dist_dir):
+        for name in files:
+            path = os.path.relpath(os.path.join(root, name), dist_dir).replace(os.sep, '/')
+            if path not in keep:
+                os.remove(os.path.join(root, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='构建带指纹、预压缩的静态资源')
+    parser.add_argument('--clean', action='store_true', help='删除构建产物')
+    parser.add_argument('--no-minify', action='store_true', help='不压缩源码（便于排查问题）')
+    args = parser.parse_args()
+    
+    dist_dir = os.path.join(STATIC_DIR, DIST_DIRNAME)
+    if args.clean:
+        shutil.rmtree(dist_dir, ignore_errors=True)
+        print(f"已删除 {dist_dir}")
+        return 0
+    
+    print("构建静态资源...")
+    if brotli is None:
+        print("  未安装 brotli，只生成 .gz 预压缩文件")
+    manifest = build(minify=not args.no_minify)
+    print(f"完成，共 {len(manifest)} 个文件，manifest: {os.path.join(dist_dir, MANIFEST_NAME)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,16 +2,20 @@
 # -*- coding: utf-8 -*-
 """
 创建测试数据：部门、职位、用户
+
+用法：
+    python3 create_test_users.py                    # 创建示例账号
+    python3 create_test_users.py --load-users 200   # 另外创建 200 个压测账号（benchmarks/load.py 使用）
+
+账号数据可直接导入（不连接数据库），模型在创建时才导入。
 """
 
+import argparse
 import sys
 import os
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from models.user import User
-from models.department import Department
-from models.position import Position
 
 DEFAULT_DEPARTMENTS = [
     {'name': '综合部', 'description': '综合管理部门'},
@@ -129,7 +133,40 @@ TEST_USERS = [
 ]
 
 
+# 压测账号：用户名前缀和统一密码
+LOAD_USER_PREFIX = 'load'
+LOAD_USER_PASSWORD = '123456'
+
+
+def build_load_users(count):
+    """压测账号：轮流分配到各部门，职位以员工为主，夹杂部长、部门管理员和总经理"""
+    users = []
+    for i in range(1, count + 1):
+        if i % 25 == 0:
+            position = '总经理'
+        elif i % 20 == 1:
+            position = '部长'
+        elif i % 20 == 11:
+            position = '部门管理员'
+        else:
+            position = '员工'
+        users.append({
+            'username': f'{LOAD_USER_PREFIX}{i:04d}',
+            'password': LOAD_USER_PASSWORD,
+            'real_name': f'压测用户{i}',
+            'email': f'{LOAD_USER_PREFIX}{i:04d}@example.com',
+            'phone': f'139{i:08d}',
+            'department': DEFAULT_DEPARTMENTS[i % len(DEFAULT_DEPARTMENTS)]['name'],
+            'position': position,
+            'employee_id': f'L{i:05d}',
+            'status': 1,
+        })
+    return users
+
+
 def ensure_departments():
+    from models.department import Department
+    
     mapping = {}
     for item in DEFAULT_DEPARTMENTS:
         dept = Department.get_by_name(item['name'])
@@ -142,6 +179,8 @@ def ensure_departments():
 
 
 def ensure_positions():
+    from models.position import Position
+    
     mapping = {}
     for item in DEFAULT_POSITIONS:
         pos = Position.get_by_name(item['name'])
@@ -153,8 +192,10 @@ def ensure_positions():
     return mapping
 
 
-def create_users():
+def create_users(users=TEST_USERS):
     """创建测试用户"""
+    from models.user import User
+    
     print("开始创建测试数据...")
     print("=" * 60)
     
@@ -164,7 +205,7 @@ def create_users():
     success_count = 0
     error_count = 0
     
-    for user_data in TEST_USERS:
+    for user_data in users:
         try:
             existing_user = User.get_by_username(user_data['username'])
             if existing_user:
@@ -206,7 +247,13 @@ def create_users():
     print("-" * 60)
     for user_data in TEST_USERS:
         print(f"{user_data['username']:<15} {'123456':<10} {user_data['position']:<10} {user_data['department']:<10}")
+    load_count = len(users) - len(TEST_USERS)
+    if load_count > 0:
+        print(f"{LOAD_USER_PREFIX}0001 ~ {LOAD_USER_PREFIX}{load_count:04d}（压测账号，密码 {LOAD_USER_PASSWORD}）")
 
 
 if __name__ == '__main__':
-    create_users()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='创建测试数据')
+    parser.add_argument('--load-users', type=int, default=0, help='另外创建的压测账号数量')
+    args = parser.parse_args()
+    create_users(TEST_USERS + build_load_users(args.load_users))
\ No newline at end of file
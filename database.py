@@ -2,12 +2,33 @@
 # -*- coding: utf-8 -*-
 """
 数据库连接模块
+
+支持一主多从的读写分离：
+- 写操作与事务内的读操作始终走主库
+- execute_query 的普通读操作按副本健康状态和复制延迟路由到从库
+- 同一会话写入后，在配置的时间窗口内（或从库追上记录的 GTID 之前）读操作回到主库
+
+快速失败：
+- 每个请求有处理期限，连接、读、写超时按剩余时间收紧
+- 主库连续失败后熔断，熔断期间请求立即失败（应用返回 503），到期后放行探测请求
+- 连接失败和只读查询有限次重试，写事务在死锁或锁等待超时时整体重试（带随机退避）
+
+热点读取：execute_shared_query 把并发的相同只读查询合并为一次（见 single_flight.py）。
+
+按部门分片时每个分片库对应一个 Database 实例，路由见 sharding.py。
 """
 
 import json
+import random
+import threading
+import time
 import pymysql
+from collections import Counter
 from pymysql.cursors import DictCursor
 from contextlib import contextmanager
+from contextvars import ContextVar
+
+from single_flight import flights, WaitTimeout
 
 DEFAULT_DEPARTMENTS = [
     ('综合部', '综合管理部门'),
@@ -21,22 +42,188 @@ DEFAULT_POSITIONS = [
     ('员工', 'user', '普通员工')
 ]
 
+# 索引迁移：(表名, 索引名, 索引列, 操作)
+# add: 列表查询 WHERE department_id=? AND status=? ORDER BY id DESC 使用的复合索引，
+#      同时覆盖对应的 COUNT(*)
+# drop: 与 UNIQUE 约束重复的普通索引
+INDEX_MIGRATIONS = [
+    ('users', 'idx_department_status_id', '(`department_id`, `status`, `id`)', 'add'),
+    ('users', 'idx_username', '(`username`)', 'drop'),
+    ('users', 'idx_employee_id', '(`employee_id`)', 'drop'),
+    ('departments', 'idx_name', '(`name`)', 'drop'),
+    ('positions', 'idx_name', '(`name`)', 'drop')
+]
+
+# 变更日志记录的实体：实体名 -> (表名, 快照字段)
+CHANGE_LOG_ENTITIES = {
+    'department': ('departments', ['id', 'name', 'parent_id', 'description', 'status']),
+    'position': ('positions', ['id', 'name', 'role', 'description', 'status']),
+    'user': ('users', ['id', 'username', 'real_name', 'email', 'phone', 'department_id',
+                       'position_id', 'employee_id', 'status', 'role'])
+}
+
+
+def change_snapshot_sql(entity, extra=None):
+    """生成某实体当前行的 JSON 快照表达式和表名
+    
+    Args:
+        extra: 快照中附加的键 -> SQL 表达式（可包含 %s 参数，按键的顺序排在列之后）
+    """
+    table, columns = CHANGE_LOG_ENTITIES[entity]
+    fields = [f"'{column}', `{column}`" for column in columns]
+    fields += [f"'{key}', {expression}" for key, expression in (extra or {}).items()]
+    return f"JSON_OBJECT({', '.join(fields)})", table
+
+
+# 当前请求（会话）的读一致性标记，由应用层在请求开始时绑定
+_read_consistency = ContextVar('db_read_consistency', default=None)
+# 当前请求的处理期限，由应用层在请求开始时绑定
+_deadline = ContextVar('db_deadline', default=None)
+# 写入后的回调（如清空请求内的身份映射）
+_write_listeners = []
+
+# 连接类错误：无法连接、连接断开、读写超时、连接数已满、服务器正在关闭
+CONNECTION_ERRORS = {1040, 1053, 2003, 2006, 2013, 2055}
+# 可整体重试的写事务错误：死锁、锁等待超时
+LOCK_ERRORS = {1213, 1205}
+# 不修改数据的语句（事务中只执行这些语句时不算写入）
+READ_STATEMENTS = ('SELECT', 'SHOW', 'SET', 'START', 'WITH', 'DO', 'EXPLAIN', 'DESCRIBE')
+
+
+def on_write(listener):
+    """注册写入后的回调（提交或回滚后，在执行写入的线程和上下文中调用，不接收参数）
+    
+    只在确实修改了数据时通知；写语句失败回滚时同样通知：写入失败通常意味着并发修改
+    （如唯一键冲突），之前读到的记录可能已过期。
+    """
+    _write_listeners.append(listener)
+
+
+def error_code(error):
+    """pymysql 异常的错误码（无法识别时返回 None）"""
+    if isinstance(error, (pymysql.err.OperationalError, pymysql.err.InterfaceError)) and error.args:
+        code = error.args[0]
+        return code if isinstance(code, int) else None
+    return None
+
+
+def is_connection_error(error):
+    """是否为连接类错误（计入熔断）"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    return error_code(error) in CONNECTION_ERRORS
+
+
+def is_write_statement(sql):
+    """语句是否可能修改数据（按第一个关键字判断）"""
+    return not sql.lstrip(' \t\r\n(').upper().startswith(READ_STATEMENTS)
+
+
+class WriteTrackingCursor:
+    """事务游标：记录事务中的语句是否修改了数据
+    
+    只读事务（一致性快照导出、统计核对中未发现偏差等）提交后不记录会话写入，
+    会话不会因此在时间窗口内改读主库，也不会为记录 GTID 多建立一次连接。
+    """
+    
+    def __init__(self, cursor):
+        self._cursor = cursor
+        # attempted: 执行过写语句（包括失败的）；wrote: 有写语句影响了数据行
+        self.attempted = False
+        self.wrote = False
+    
+    def execute(self, sql, params=None):
+        write = is_write_statement(sql)
+        self.attempted = self.attempted or write
+        result = self._cursor.execute(sql, params)
+        if write and self._cursor.rowcount > 0:
+            self.wrote = True
+        return result
+    
+    def executemany(self, sql, seq_of_params):
+        write = is_write_statement(sql)
+        self.attempted = self.attempted or write
+        result = self._cursor.executemany(sql, seq_of_params)
+        if write and self._cursor.rowcount > 0:
+            self.wrote = True
+        return result
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class DatabaseUnavailable(Exception):
+    """数据库暂时不可用（熔断中或请求已超出处理期限），调用方应快速失败"""
+    
+    def __init__(self, message='数据库暂时不可用，请稍后重试', retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
 
 class DatabaseConfig:
     """数据库配置类"""
     
-    def __init__(self, config_file='config.json'):
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            db_config = config.get('database', {})
-            
+    def __init__(self, config_file='config.json', config=None):
+        """
+        Args:
+            config_file: 配置文件路径
+            config: config.json 的完整内容（提供时不读取 config_file）
+        """
+        if config is None:
+            with open(config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        db_config = config.get('database', {})
+        
         self.host = db_config.get('host', 'localhost')
         self.port = db_config.get('port', 3306)
         self.username = db_config.get('username', 'root')
         self.password = db_config.get('password', '')
         self.database = db_config.get('database', 'salary_management')
         self.charset = db_config.get('charset', 'utf8mb4')
-        self.connection_timeout = db_config.get('connection_timeout', 30)
+        self.connection_timeout = db_config.get('connection_timeout', 5)
+        # 单次读、写的网络超时（秒）
+        self.read_timeout = db_config.get('read_timeout', 10)
+        self.write_timeout = db_config.get('write_timeout', 10)
+        # 每个请求访问数据库的总期限（秒）
+        self.request_deadline = db_config.get('request_deadline', 15)
+        # 主库连续失败多少次后熔断，熔断持续多少秒后放行探测请求
+        self.breaker_failure_threshold = db_config.get('breaker_failure_threshold', 5)
+        self.breaker_reset_timeout = db_config.get('breaker_reset_timeout', 10)
+        # 重试次数和退避基数（秒）：连接失败、只读查询、死锁或锁等待超时的写事务
+        self.connect_retries = db_config.get('connect_retries', 1)
+        self.read_retries = db_config.get('read_retries', 2)
+        self.write_retries = db_config.get('write_retries', 3)
+        self.retry_backoff = db_config.get('retry_backoff', 0.05)
+        
+        # 只读副本：未填写的字段继承主库配置
+        self.replicas = db_config.get('replicas', [])
+        # 会话写入后强制读主库的时间窗口（秒）
+        self.read_your_writes_window = db_config.get('read_your_writes_window', 5)
+        # 允许的最大复制延迟（秒），超过则不再向该副本路由
+        self.replica_max_lag = db_config.get('replica_max_lag', 5)
+        # 副本延迟检查间隔（秒）
+        self.replica_check_interval = db_config.get('replica_check_interval', 5)
+        # 副本故障后暂停路由的时间（秒）
+        self.replica_retry_interval = db_config.get('replica_retry_interval', 30)
+        # 写入后记录 GTID，从库追上后即可提前恢复读从库
+        self.gtid_tracking = db_config.get('gtid_tracking', False)
+        
+        # 按部门分片：其他分片库（未填写的字段继承主库配置），主库为默认分片
+        self.shards = db_config.get('shards', [])
+        # 部门分片映射的缓存时间（秒），迁移部门时等待该时间后再清理源分片
+        self.shard_map_ttl = db_config.get('shard_map_ttl', 5)
+    
+    def apply_shard(self, shard):
+        """使用分片的连接配置（未填写的字段保持主库配置，只读副本不继承）"""
+        self.host = shard.get('host', self.host)
+        self.port = shard.get('port', self.port)
+        self.username = shard.get('username', self.username)
+        self.password = shard.get('password', self.password)
+        self.database = shard['database']
+        self.replicas = shard.get('replicas', [])
+        self.shards = []
     
     def get_connection_params(self):
         """获取数据库连接参数"""
@@ -50,14 +237,346 @@ class DatabaseConfig:
             'connect_timeout': self.connection_timeout,
             'cursorclass': DictCursor
         }
+    
+    def get_replica_params(self, replica):
+        """获取只读副本的连接参数（未配置的字段使用主库配置）"""
+        params = self.get_connection_params()
+        params['host'] = replica.get('host', self.host)
+        params['port'] = replica.get('port', self.port)
+        params['user'] = replica.get('username', self.username)
+        params['password'] = replica.get('password', self.password)
+        return params
+
+
+class ReadConsistency:
+    """会话级读一致性标记（read-your-writes）
+    
+    记录会话最近一次写入的时间和 GTID，可序列化后保存在会话中，
+    从而在多个 worker 之间保持一致。
+    """
+    
+    def __init__(self, written_at=0.0, gtid=None):
+        self.written_at = written_at
+        self.gtid = gtid
+        self.changed = False
+    
+    def mark_write(self, gtid=None):
+        """记录一次写入"""
+        self.written_at = time.time()
+        self.gtid = gtid
+        self.changed = True
+    
+    def requires_primary(self, window):
+        """是否仍处于写后读主库的时间窗口内"""
+        return bool(self.written_at) and time.time() - self.written_at < window
+    
+    def to_dict(self):
+        """转换为字典（用于保存到会话）"""
+        return {'written_at': self.written_at, 'gtid': self.gtid}
+    
+    @staticmethod
+    def from_dict(data):
+        """从字典恢复"""
+        data = data or {}
+        return ReadConsistency(written_at=data.get('written_at', 0.0), gtid=data.get('gtid'))
+
+
+class ReplicaNode:
+    """只读副本节点（记录健康状态与复制延迟）"""
+    
+    def __init__(self, name, params, weight=1):
+        self.name = name
+        self.params = params
+        self.weight = weight
+        self.lag = None
+        self.checked_at = 0.0
+        self.down_until = 0.0
+        self.failures = 0
+    
+    def is_available(self, max_lag):
+        """副本当前是否可以接收读请求"""
+        if self.down_until > time.monotonic():
+            return False
+        return self.lag is not None and self.lag <= max_lag
+    
+    def mark_failure(self, retry_interval):
+        """记录一次连接或查询失败，暂停路由一段时间"""
+        self.failures += 1
+        self.down_until = time.monotonic() + retry_interval
+    
+    def status(self):
+        """副本状态（用于监控）"""
+        return {
+            'name': self.name,
+            'host': self.params['host'],
+            'port': self.params['port'],
+            'lag': self.lag,
+            'failures': self.failures,
+            'available': self.down_until <= time.monotonic()
+        }
+
+
+class Deadline:
+    """请求的数据库访问期限"""
+    
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+        # 请求期间是否遇到数据库不可用（应用层据此返回 503）
+        self.failed = False
+    
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+
+class CircuitBreaker:
+    """熔断器
+    
+    closed: 正常放行，连续失败达到阈值后打开
+    open: 直接拒绝，reset_timeout 秒后进入 half_open
+    half_open: 只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+    
+    def __init__(self, name, failure_threshold=5, reset_timeout=10):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejections = 0
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """是否放行本次请求"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self.rejections += 1
+            return False
+    
+    def retry_after(self):
+        """距离下次探测的秒数"""
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+    
+    def release_probe(self):
+        """探测请求未实际访问数据库（如请求已超时），允许下一个请求探测"""
+        with self._lock:
+            self._probing = False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != 'closed':
+                self.state = 'closed'
+                print(f"数据库熔断已恢复: {self.name}")
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                print(f"数据库连续失败 {self.failures} 次，熔断 {self.reset_timeout} 秒: {self.name}")
+    
+    def status(self):
+        """熔断器状态（用于监控）"""
+        return {
+            'name': self.name,
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'trips': self.trips,
+            'rejections': self.rejections,
+            'retry_after': round(self.retry_after(), 1) if self.state != 'closed' else 0
+        }
 
 
 class Database:
     """数据库操作类"""
     
-    def __init__(self, config_file='config.json'):
-        self.config = DatabaseConfig(config_file)
-        self._init_database()
+    def __init__(self, config_file='config.json', connector=None, database=None, shard=None, config=None):
+        self.config_file = config_file
+        # 可指定其他数据库名（如索引分析使用的临时库）
+        self._database_name = database
+        # 分片库：shard 为 database.shards 中的一项
+        self._shard = shard
+        self.shard_name = shard['name'] if shard else 'default'
+        # 连接函数可替换（便于使用桩后端测试路由逻辑）
+        self.connector = connector or pymysql.connect
+        self._replica_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self.configure(config)
+    
+    def configure(self, config=None):
+        """按配置设置连接参数、副本和熔断器（不访问数据库）
+        
+        create_app 用传入的配置重新设置全局 db，应在处理请求之前调用；
+        之后首次连接主库时按新配置建库建表。
+        
+        Args:
+            config: config.json 的完整内容，None 表示读取 config_file
+        """
+        self.source_config = config
+        self.config = DatabaseConfig(self.config_file, config)
+        if self._database_name:
+            self.config.database = self._database_name
+        if self._shard:
+            self.config.apply_shard(self._shard)
+        self.replicas = [
+            ReplicaNode(
+                replica.get('name') or f"replica{index + 1}",
+                self.config.get_replica_params(replica),
+                replica.get('weight', 1)
+            )
+            for index, replica in enumerate(self.config.replicas)
+        ]
+        self.breaker = CircuitBreaker(
+            'primary',
+            self.config.breaker_failure_threshold,
+            self.config.breaker_reset_timeout
+        )
+        # 重试、超时等计数（用于监控），与熔断器一样随配置重置
+        self.counters = Counter()
+        # 建库建表在首次连接主库时执行（导入和创建实例不访问数据库）
+        self._initialized = False
+    
+    def _connect(self, params):
+        """建立数据库连接（超时按当前请求的剩余期限收紧）"""
+        return self.connector(**dict(params, **self._timeouts()))
+    
+    # ------------------------------------------------------------------
+    # 期限、熔断与重试
+    # ------------------------------------------------------------------
+    
+    def bind_deadline(self, deadline):
+        """为当前请求绑定处理期限，返回用于解绑的 token"""
+        return _deadline.set(deadline)
+    
+    def unbind_deadline(self, token):
+        _deadline.reset(token)
+    
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            self.counters[name] += amount
+    
+    def mark_unavailable(self):
+        """记录当前请求遇到数据库不可用"""
+        deadline = _deadline.get()
+        if deadline is not None:
+            deadline.failed = True
+    
+    def _timeouts(self):
+        """按当前请求的剩余期限计算连接和读写超时"""
+        config = self.config
+        timeouts = {
+            'connect_timeout': config.connection_timeout,
+            'read_timeout': config.read_timeout,
+            'write_timeout': config.write_timeout
+        }
+        deadline = _deadline.get()
+        if deadline is None:
+            return timeouts
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            self._count('deadline_exceeded')
+            self.mark_unavailable()
+            raise DatabaseUnavailable('数据库响应超时，请稍后重试')
+        return {name: min(value, remaining) for name, value in timeouts.items()}
+    
+    def _backoff(self, attempt):
+        """第 attempt 次重试前的等待时间（指数退避 + 全随机抖动），超出请求期限时返回 None"""
+        delay = random.uniform(0, self.config.retry_backoff * (2 ** attempt))
+        deadline = _deadline.get()
+        if deadline is not None and deadline.remaining() <= delay:
+            return None
+        return delay
+    
+    def _connect_primary(self):
+        """连接主库：熔断时立即失败，连接失败时有限次重试"""
+        if not self.breaker.allow():
+            self.mark_unavailable()
+            raise DatabaseUnavailable(retry_after=self.breaker.retry_after())
+        self.initialize()
+        attempt = 0
+        while True:
+            try:
+                return self._connect(self.config.get_connection_params())
+            except DatabaseUnavailable:
+                # 请求超出期限，没有对主库做出判断，归还探测名额
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not is_connection_error(e) or attempt >= self.config.connect_retries:
+                    raise
+                delay = self._backoff(attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                self._count('connect_retries')
+                time.sleep(delay)
+    
+    def _with_retry(self, kind, func, *args):
+        """执行 func，失败时按类型有限次重试
+        
+        Args:
+            kind: 'read' 只读操作（连接类错误可重试）；'write' 写操作（仅死锁、锁等待超时可重试，
+                  此时整个事务已回滚，重新执行不会重复写入）
+        """
+        retries = self.config.read_retries if kind == 'read' else self.config.write_retries
+        attempt = 0
+        while True:
+            try:
+                return func(*args)
+            except DatabaseUnavailable:
+                raise
+            except Exception as e:
+                if kind == 'read':
+                    retryable = is_connection_error(e) or error_code(e) in LOCK_ERRORS
+                else:
+                    retryable = error_code(e) in LOCK_ERRORS
+                if not retryable or attempt >= retries or self.breaker.state == 'open':
+                    raise
+                delay = self._backoff(attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                self._count(f'{kind}_retries')
+                time.sleep(delay)
+    
+    def resilience_status(self):
+        """熔断、重试和超时状态（用于监控）"""
+        with self._counter_lock:
+            counters = dict(self.counters)
+        return {
+            'breaker': self.breaker.status(),
+            'counters': counters,
+            'timeouts': {
+                'connect': self.config.connection_timeout,
+                'read': self.config.read_timeout,
+                'write': self.config.write_timeout,
+                'request_deadline': self.config.request_deadline
+            }
+        }
+    
+    def initialize(self):
+        """确保数据库和表已创建（首次连接主库时自动调用；失败时下次连接重试）"""
+        if self._initialized:
+            return
+        with self._init_lock:
+            if not self._initialized:
+                self._init_database()
+                self._initialized = True
     
     def _init_database(self):
         """初始化数据库（如果不存在则创建）"""
@@ -66,7 +585,7 @@ class Database:
             params = self.config.get_connection_params()
             database_name = params.pop('database')
             
-            conn = pymysql.connect(**params)
+            conn = self._connect(params)
             cursor = conn.cursor()
             
             # 创建数据库（如果不存在）
@@ -77,7 +596,7 @@ class Database:
             
             # 重新连接指定数据库
             params['database'] = database_name
-            conn = pymysql.connect(**params)
+            conn = self._connect(params)
             cursor = conn.cursor()
             
             # 创建基础表（先创建部门表和职位表）
@@ -85,7 +604,24 @@ class Database:
             self._create_position_table(cursor)
             # 创建用户表（依赖部门和职位表）
             self._create_user_table(cursor)
-            self._seed_reference_data(cursor)
+            # 归档表（长期停用的用户从用户表移出）
+            self._create_user_archive_table(cursor)
+            # 创建用户统计表（由用户写入增量维护）
+            self._create_user_stats_table(cursor)
+            # 变更日志（供下游系统增量同步）
+            self._create_change_log_tables(cursor)
+            # 幂等请求记录（Idempotency-Key 重试时返回首次响应）
+            self._create_idempotency_table(cursor)
+            # 按部门分片（分片库的部门和职位从默认分片同步，不写入初始数据）
+            self._create_shard_tables(cursor)
+            # 已有数据库按当前索引设计调整
+            self.migrate_indexes(cursor)
+            self._migrate_user_version_column(cursor)
+            self._migrate_department_parent_column(cursor)
+            if self.shard_name == 'default':
+                self._seed_reference_data(cursor)
+                self._backfill_department_closure(cursor)
+            self._backfill_change_log(cursor)
             conn.commit()
             cursor.close()
             conn.close()
@@ -100,15 +636,26 @@ class Database:
         CREATE TABLE IF NOT EXISTS `departments` (
             `id` INT AUTO_INCREMENT PRIMARY KEY,
             `name` VARCHAR(100) NOT NULL UNIQUE COMMENT '部门名称',
+            `parent_id` INT COMMENT '上级部门ID（顶级部门为空）',
             `description` VARCHAR(255) COMMENT '部门描述',
             `status` TINYINT DEFAULT 1 COMMENT '状态：1-启用，0-禁用',
             `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
             `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-            INDEX `idx_name` (`name`),
-            INDEX `idx_status` (`status`)
+            INDEX `idx_status` (`status`),
+            INDEX `idx_parent_id` (`parent_id`)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='部门表';
         """
         cursor.execute(create_table_sql)
+        # 部门层级的闭包表：每个部门与它自身及全部上级各一行
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `department_closure` (
+            `ancestor_id` INT NOT NULL COMMENT '上级部门ID（包括部门自身）',
+            `descendant_id` INT NOT NULL COMMENT '下级部门ID',
+            `depth` INT NOT NULL COMMENT '层级差（自身为 0）',
+            PRIMARY KEY (`ancestor_id`, `descendant_id`),
+            INDEX `idx_descendant_depth` (`descendant_id`, `depth`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='部门层级闭包表';
+        """)
     
     def _create_position_table(self, cursor):
         """创建职位表"""
@@ -121,7 +668,6 @@ class Database:
             `status` TINYINT DEFAULT 1 COMMENT '状态：1-启用，0-禁用',
             `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
             `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-            INDEX `idx_name` (`name`),
             INDEX `idx_role` (`role`),
             INDEX `idx_status` (`status`)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='职位表';
@@ -144,11 +690,10 @@ class Database:
             `status` TINYINT DEFAULT 1 COMMENT '状态：1-启用，0-禁用',
             `role` VARCHAR(20) DEFAULT 'user' COMMENT '角色：super_admin-超级管理员，admin-管理员，user-普通用户',
             `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
-            `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-            INDEX `idx_username` (`username`),
-            INDEX `idx_employee_id` (`employee_id`),
+            `updated_at` DATETIME(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) COMMENT '更新时间（毫秒精度，用作乐观锁版本）',
             INDEX `idx_status` (`status`),
             INDEX `idx_department_id` (`department_id`),
+            INDEX `idx_department_status_id` (`department_id`, `status`, `id`),
             INDEX `idx_position_id` (`position_id`),
             FOREIGN KEY (`department_id`) REFERENCES `departments`(`id`) ON DELETE SET NULL,
             FOREIGN KEY (`position_id`) REFERENCES `positions`(`id`) ON DELETE SET NULL
@@ -156,6 +701,204 @@ class Database:
         """
         cursor.execute(create_table_sql)
     
+    def _create_user_archive_table(self, cursor):
+        """创建用户归档表：列与用户表相同，用户名和工号同样唯一（不设外键，部门删除后保留原值）"""
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS `users_archive` (
+            `id` INT PRIMARY KEY,
+            `username` VARCHAR(50) NOT NULL UNIQUE COMMENT '用户名',
+            `password` VARCHAR(255) NOT NULL COMMENT '密码（加密）',
+            `real_name` VARCHAR(50) NOT NULL COMMENT '真实姓名',
+            `email` VARCHAR(100) COMMENT '邮箱',
+            `phone` VARCHAR(20) COMMENT '手机号',
+            `department_id` INT COMMENT '部门ID',
+            `position_id` INT COMMENT '职位ID',
+            `employee_id` VARCHAR(50) UNIQUE COMMENT '工号',
+            `status` TINYINT DEFAULT 0 COMMENT '状态：归档的用户均为禁用',
+            `role` VARCHAR(20) DEFAULT 'user' COMMENT '角色',
+            `created_at` DATETIME COMMENT '创建时间',
+            `updated_at` DATETIME(3) COMMENT '归档前的更新时间',
+            `archived_at` DATETIME(3) DEFAULT CURRENT_TIMESTAMP(3) COMMENT '归档时间',
+            INDEX `idx_department_id` (`department_id`),
+            INDEX `idx_archived_at` (`archived_at`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户归档表';
+        """
+        cursor.execute(create_table_sql)
+    
+    def _create_user_stats_table(self, cursor):
+        """创建用户统计表"""
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS `user_stats` (
+            `department_id` INT NOT NULL COMMENT '部门ID（0 表示未分配）',
+            `position_id` INT NOT NULL COMMENT '职位ID（0 表示未分配）',
+            `role` VARCHAR(20) NOT NULL COMMENT '角色',
+            `status` TINYINT NOT NULL COMMENT '状态：1-启用，0-禁用',
+            `total` INT NOT NULL DEFAULT 0 COMMENT '人数',
+            PRIMARY KEY (`department_id`, `position_id`, `role`, `status`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户统计表';
+        """
+        cursor.execute(create_table_sql)
+    
+    def _create_change_log_tables(self, cursor):
+        """创建变更日志表和序号表"""
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `change_log` (
+            `seq` BIGINT NOT NULL PRIMARY KEY COMMENT '变更序号（按提交顺序单调递增）',
+            `entity` VARCHAR(20) NOT NULL COMMENT '实体：user / department / position',
+            `entity_id` INT NOT NULL COMMENT '实体ID',
+            `op` VARCHAR(10) NOT NULL COMMENT '操作：upsert-新增或修改，delete-删除',
+            `data` JSON COMMENT '变更后的完整快照（删除时为空，删除用户时为所在部门）',
+            `created_at` DATETIME(3) DEFAULT CURRENT_TIMESTAMP(3) COMMENT '变更时间',
+            INDEX `idx_entity_seq` (`entity`, `entity_id`, `seq`),
+            INDEX `idx_op_created_at` (`op`, `created_at`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='变更日志表';
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `change_log_state` (
+            `name` VARCHAR(50) NOT NULL PRIMARY KEY COMMENT '名称：seq-已分配的最大序号，purged_through-已清理的删除记录序号',
+            `value` BIGINT NOT NULL DEFAULT 0 COMMENT '值'
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='变更日志状态表';
+        """)
+        cursor.execute(
+            "INSERT IGNORE INTO change_log_state (name, value) VALUES ('seq', 0), ('purged_through', 0)"
+        )
+    
+    def _create_idempotency_table(self, cursor):
+        """创建幂等请求记录表"""
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `idempotency_keys` (
+            `scope` VARCHAR(191) NOT NULL COMMENT '范围：用户ID + 请求方法和路径',
+            `idem_key` VARCHAR(100) NOT NULL COMMENT 'Idempotency-Key 请求头',
+            `request_hash` CHAR(64) NOT NULL COMMENT '请求体的 SHA256',
+            `status_code` SMALLINT COMMENT '响应状态码（处理中为空）',
+            `response` MEDIUMTEXT COMMENT '响应体',
+            `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+            PRIMARY KEY (`scope`, `idem_key`),
+            INDEX `idx_created_at` (`created_at`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='幂等请求记录表';
+        """)
+    
+    def _create_shard_tables(self, cursor):
+        """创建分片相关的表：部门迁移状态（每个分片），部门分片映射和用户目录（默认分片）"""
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `shard_departments` (
+            `department_id` INT NOT NULL PRIMARY KEY COMMENT '部门ID',
+            `state` VARCHAR(10) NOT NULL COMMENT '状态：incoming-正在迁入，frozen-迁移中禁止写入，moved-已迁出',
+            `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='分片部门迁移状态表';
+        """)
+        if self.shard_name != 'default':
+            return
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `shard_map` (
+            `department_id` INT NOT NULL PRIMARY KEY COMMENT '部门ID',
+            `shard` VARCHAR(50) NOT NULL COMMENT '分片名称（未登记的部门属于默认分片）',
+            `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='部门分片映射表';
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `user_directory` (
+            `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '用户ID（分片模式下在此分配）',
+            `username` VARCHAR(50) NOT NULL UNIQUE COMMENT '用户名',
+            `employee_id` VARCHAR(50) UNIQUE COMMENT '工号',
+            `department_id` INT COMMENT '部门ID（决定用户所在分片）',
+            INDEX `idx_department_id` (`department_id`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户目录表（分片模式下保证用户名、工号全局唯一）';
+        """)
+    
+    def lock_name(self, name):
+        """命名锁按库区分（多个分片库可能在同一 MySQL 实例上）"""
+        return name if self.shard_name == 'default' else f"{name}:{self.config.database}"
+    
+    def _backfill_change_log(self, cursor):
+        """变更日志为空时写入现有数据的快照，下游首次同步即可取得全量数据"""
+        cursor.execute("SELECT value FROM change_log_state WHERE name='seq' FOR UPDATE")
+        seq = cursor.fetchone()['value']
+        cursor.execute("SELECT 1 FROM change_log LIMIT 1")
+        if seq or cursor.fetchone():
+            return
+        for entity in CHANGE_LOG_ENTITIES:
+            snapshot, table = change_snapshot_sql(entity)
+            cursor.execute(
+                f"""
+                INSERT INTO change_log (seq, entity, entity_id, op, data)
+                SELECT %s + ROW_NUMBER() OVER (ORDER BY id), %s, id, 'upsert', {snapshot}
+                FROM {table}
+                """,
+                (seq, entity)
+            )
+            seq += cursor.rowcount
+        cursor.execute("UPDATE change_log_state SET value=%s WHERE name='seq'", (seq,))
+    
+    def existing_indexes(self, cursor):
+        """当前数据库中已有的索引：{(表名, 索引名)}"""
+        cursor.execute("""
+        SELECT DISTINCT TABLE_NAME AS table_name, INDEX_NAME AS index_name
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+        """)
+        return {(row['table_name'], row['index_name']) for row in cursor.fetchall()}
+    
+    def migrate_indexes(self, cursor, revert=False):
+        """按 INDEX_MIGRATIONS 调整索引（可重复执行），返回执行的语句
+        
+        Args:
+            cursor: 数据库游标
+            revert: 为 True 时恢复到调整前的索引（索引分析对比前后耗时时使用）
+        """
+        existing = self.existing_indexes(cursor)
+        statements = []
+        for table, name, columns, action in INDEX_MIGRATIONS:
+            add = (action == 'add') != revert
+            present = (table, name) in existing
+            if add and not present:
+                statements.append(f"ALTER TABLE `{table}` ADD INDEX `{name}` {columns}")
+            elif not add and present:
+                statements.append(f"ALTER TABLE `{table}` DROP INDEX `{name}`")
+        for sql in statements:
+            cursor.execute(sql)
+        return statements
+    
+    def _migrate_user_version_column(self, cursor):
+        """users.updated_at 改为毫秒精度（同一秒内的两次修改也能区分版本）"""
+        cursor.execute("""
+        SELECT DATETIME_PRECISION AS `precision`
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'users' AND COLUMN_NAME = 'updated_at'
+        """)
+        row = cursor.fetchone()
+        if row and not row['precision']:
+            cursor.execute("""
+            ALTER TABLE `users` MODIFY `updated_at` DATETIME(3)
+                DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) COMMENT '更新时间（毫秒精度，用作乐观锁版本）'
+            """)
+    
+    def _migrate_department_parent_column(self, cursor):
+        """已有的部门表增加 parent_id（原有部门均为顶级部门）"""
+        cursor.execute("""
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'departments' AND COLUMN_NAME = 'parent_id'
+        """)
+        if not cursor.fetchone():
+            cursor.execute("""
+            ALTER TABLE `departments`
+                ADD COLUMN `parent_id` INT COMMENT '上级部门ID（顶级部门为空）' AFTER `name`,
+                ADD INDEX `idx_parent_id` (`parent_id`)
+            """)
+    
+    def _backfill_department_closure(self, cursor):
+        """按 parent_id 补齐闭包表中缺少的路径（新建的库、初始化数据和升级前的部门）"""
+        cursor.execute("""
+        INSERT IGNORE INTO department_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE paths AS (
+            SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth FROM departments
+            UNION ALL
+            SELECT p.ancestor_id, d.id, p.depth + 1
+            FROM paths p JOIN departments d ON d.parent_id = p.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM paths
+        """)
+    
     def _seed_reference_data(self, cursor):
         """初始化基础数据"""
         for name, description in DEFAULT_DEPARTMENTS:
@@ -172,38 +915,292 @@ class Database:
     
     @contextmanager
     def get_connection(self):
-        """获取数据库连接的上下文管理器"""
+        """获取数据库连接的上下文管理器（主库）
+        
+        连接类错误计入熔断；其他错误（如唯一键冲突）说明主库可用，计为成功。
+        """
         conn = None
         try:
-            conn = pymysql.connect(**self.config.get_connection_params())
+            conn = self._connect_primary()
             yield conn
             conn.commit()
-        except Exception as e:
+        except DatabaseUnavailable:
+            # 熔断或超出期限：连接前发生时由 _connect_primary 处理
             if conn:
                 conn.rollback()
+                self.breaker.record_success()
+            raise
+        except Exception as e:
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            if is_connection_error(e):
+                self._count('connection_errors')
+                self.mark_unavailable()
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
             raise e
+        else:
+            self.breaker.record_success()
         finally:
             if conn:
                 conn.close()
     
-    def execute_query(self, sql, params=None):
-        """执行查询语句"""
-        with self.get_connection() as conn:
+    @contextmanager
+    def transaction(self):
+        """在主库上执行事务，返回游标
+        
+        事务内的读写都在同一连接上完成。修改了数据的事务提交后记录会话写入标记并通知回调；
+        执行过写语句的事务回滚时同样通知，只读事务两者都不做。
+        """
+        cursor = None
+        try:
+            with self.get_connection() as conn:
+                cursor = WriteTrackingCursor(conn.cursor())
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+        except BaseException:
+            if cursor is not None and cursor.attempted:
+                self._notify_write()
+            raise
+        if cursor.wrote:
+            self._notify_write()
+            self._record_write()
+    
+    def run_in_transaction(self, func):
+        """在事务中执行 func(cursor) 并返回其结果
+        
+        死锁或锁等待超时时整个事务已回滚，按退避策略重新执行 func（func 需可重复执行）。
+        """
+        def attempt():
+            with self.transaction() as cursor:
+                return func(cursor)
+        return self._with_retry('write', attempt)
+    
+    # ------------------------------------------------------------------
+    # 读一致性
+    # ------------------------------------------------------------------
+    
+    def bind_consistency(self, consistency):
+        """为当前请求绑定读一致性标记，返回用于解绑的 token"""
+        return _read_consistency.set(consistency)
+    
+    def unbind_consistency(self, token):
+        """解绑读一致性标记"""
+        _read_consistency.reset(token)
+    
+    def in_write_window(self):
+        """当前会话是否处于写后读主库的时间窗口内"""
+        consistency = _read_consistency.get()
+        return consistency is not None and consistency.requires_primary(self.config.read_your_writes_window)
+    
+    def _notify_write(self):
+        """写入提交或回滚后调用回调"""
+        for listener in _write_listeners:
+            listener()
+    
+    def _record_write(self):
+        """写入提交后更新当前会话的读一致性标记"""
+        consistency = _read_consistency.get()
+        if consistency is None:
+            return
+        gtid = None
+        if self.replicas and self.config.gtid_tracking:
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT @@GLOBAL.gtid_executed AS gtid")
+                    row = cursor.fetchone()
+                    cursor.close()
+                    gtid = row['gtid'] if row else None
+            except Exception as e:
+                print(f"获取 GTID 失败: {e}")
+        consistency.mark_write(gtid)
+    
+    # ------------------------------------------------------------------
+    # 副本路由
+    # ------------------------------------------------------------------
+    
+    def _refresh_replica(self, replica):
+        """检查副本的复制延迟"""
+        conn = None
+        try:
+            conn = self._connect(replica.params)
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+                row = cursor.fetchone()
+                lag = row.get('Seconds_Behind_Source') if row else None
+            except pymysql.err.ProgrammingError:
+                # MySQL 8.0.22 之前的版本
+                cursor.execute("SHOW SLAVE STATUS")
+                row = cursor.fetchone()
+                lag = row.get('Seconds_Behind_Master') if row else None
+            cursor.close()
+            # 复制线程停止时延迟为 NULL，视为不可用
+            replica.lag = lag
+        except Exception as e:
+            print(f"副本 {replica.name} 状态检查失败: {e}")
+            replica.lag = None
+            replica.mark_failure(self.config.replica_retry_interval)
+        finally:
+            replica.checked_at = time.monotonic()
+            if conn:
+                conn.close()
+    
+    def _available_replicas(self):
+        """返回当前可用的副本（按需刷新延迟信息）"""
+        now = time.monotonic()
+        stale = [
+            r for r in self.replicas
+            if now - r.checked_at >= self.config.replica_check_interval and r.down_until <= now
+        ]
+        if stale and self._replica_lock.acquire(blocking=False):
+            try:
+                for replica in stale:
+                    self._refresh_replica(replica)
+            finally:
+                self._replica_lock.release()
+        return [r for r in self.replicas if r.is_available(self.config.replica_max_lag)]
+    
+    def _choose_replica(self):
+        """按权重随机选择一个可用副本，没有可用副本时返回 None"""
+        candidates = self._available_replicas()
+        if not candidates:
+            return None
+        weights = [max(r.weight, 0) or 1 for r in candidates]
+        return random.choices(candidates, weights=weights)[0]
+    
+    def _read_from_replica(self, replica, sql, params, consistency):
+        """在副本上执行查询；副本未追上会话写入的 GTID 时返回 None"""
+        conn = self._connect(replica.params)
+        try:
             cursor = conn.cursor()
+            if consistency is not None and consistency.gtid:
+                cursor.execute(
+                    "SELECT GTID_SUBSET(%s, @@GLOBAL.gtid_executed) AS caught_up",
+                    (consistency.gtid,)
+                )
+                row = cursor.fetchone()
+                if not row or not row['caught_up']:
+                    cursor.close()
+                    return None
             cursor.execute(sql, params)
             result = cursor.fetchall()
             cursor.close()
             return result
+        finally:
+            conn.close()
+    
+    def replica_status(self):
+        """副本状态列表（用于监控）"""
+        return [replica.status() for replica in self.replicas]
+    
+    # ------------------------------------------------------------------
+    # 查询接口
+    # ------------------------------------------------------------------
+    
+    def execute_query(self, sql, params=None, use_primary=False):
+        """执行查询语句
+        
+        默认路由到可用副本；use_primary=True、没有可用副本或会话处于
+        写后读主库窗口内时走主库。
+        """
+        if self.replicas and not use_primary:
+            consistency = _read_consistency.get()
+            window_active = consistency is not None and consistency.requires_primary(
+                self.config.read_your_writes_window
+            )
+            # 窗口内只有记录了 GTID 时才可能提前读从库
+            if not window_active or consistency.gtid:
+                replica = self._choose_replica()
+                if replica:
+                    try:
+                        result = self._read_from_replica(
+                            replica, sql, params, consistency if window_active else None
+                        )
+                        if result is not None:
+                            return result
+                    except DatabaseUnavailable:
+                        raise
+                    except Exception as e:
+                        # 连接类错误（连接被重置、超时、套接字错误）和副本自身的运行错误回退到主库；
+                        # SQL 语法等错误在主库上同样会失败，直接抛出
+                        if not (is_connection_error(e) or isinstance(e, pymysql.err.OperationalError)):
+                            raise
+                        print(f"副本 {replica.name} 查询失败，回退到主库: {e}")
+                        replica.mark_failure(self.config.replica_retry_interval)
+        
+        return self._with_retry('read', self._execute, sql, params, 'fetchall')
+    
+    def execute_shared_query(self, sql, params=None, label='query'):
+        """执行只读查询，并发的相同查询合并为一次，结果由调用方共享（不得修改）
+        
+        会话处于写后读主库窗口内时单独查询，不与其他会话共享结果；
+        等待其他请求的查询时同样受当前请求的处理期限约束。
+        
+        Args:
+            label: 合并统计使用的标签
+        """
+        if self.in_write_window():
+            return self.execute_query(sql, params)
+        deadline = _deadline.get()
+        key = (self.shard_name, self.config.database, sql, tuple(params or ()))
+        try:
+            return flights.do(
+                key,
+                lambda: self.execute_query(sql, params),
+                label,
+                timeout=max(deadline.remaining(), 0) if deadline is not None else None
+            )
+        except WaitTimeout:
+            self._count('deadline_exceeded')
+            self.mark_unavailable()
+            raise DatabaseUnavailable('数据库响应超时，请稍后重试')
     
     def execute_update(self, sql, params=None):
-        """执行更新语句"""
+        """执行更新语句（死锁或锁等待超时时重试），没有影响任何行时不记录写入"""
+        try:
+            affected_rows = self._with_retry('write', self._execute, sql, params, 'rowcount')
+        except BaseException:
+            self._notify_write()
+            raise
+        if affected_rows > 0:
+            self._notify_write()
+            self._record_write()
+        return affected_rows
+    
+    def execute_insert(self, sql, params=None):
+        """执行插入语句，返回新记录的自增 ID（死锁或锁等待超时时重试），没有插入任何行时不记录写入"""
+        try:
+            affected_rows, last_id = self._with_retry('write', self._execute, sql, params, 'insert')
+        except BaseException:
+            self._notify_write()
+            raise
+        if affected_rows > 0:
+            self._notify_write()
+            self._record_write()
+        return last_id
+    
+    def _execute(self, sql, params, result):
+        """在主库上执行单条语句，返回 fetchall 结果、影响行数、自增 ID 或 (影响行数, 自增 ID)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(sql, params)
-            affected_rows = cursor.rowcount
+            if result == 'fetchall':
+                value = cursor.fetchall()
+            elif result == 'insert':
+                value = (cursor.rowcount, cursor.lastrowid)
+            else:
+                value = getattr(cursor, result)
             cursor.close()
-            return affected_rows
+        return value
 
 
-# 全局数据库实例
+# 全局数据库实例（首次访问时连接）
 db = Database()
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存列式用户目录
+
+把 users（及部门、职位名称）加载到进程内的列式结构中，直接在内存中回答
+User.get_all 的筛选和分页，不访问 MySQL：
+- 定长列：ID、部门、职位用 int 数组（按 ID 升序），字符串列保存驻留后的 str
+- 位图：存活、各状态、各部门各一个整数位图（第 i 位对应第 i 行），筛选即位运算；
+  包含下级部门时把子树中各部门的位图合并
+- 关键字：用户名、姓名、工号的二元组倒排索引（保存用户 ID），取最短的倒排表后逐条校验
+- 分页：按 ID 倒序，支持键集游标（before_id）和页码
+
+保持最新：本进程的写入由模型层通知后立即重新加载该用户；其他进程的写入由定时任务
+按 updated_at 增量轮询（删除从变更日志读取），并定期全量重新加载。
+未加载、轮询落后超过 max_staleness 秒、或当前会话处于写后读主库窗口内时返回 None，
+调用方回退到 SQL 查询。
+"""
+
+import bisect
+import sys
+import threading
+import time
+from array import array
+
+from database import db
+from models.department_tree import tree as department_tree
+from sharding import router
+
+# 用户列（与 users 表一致）
+USER_COLUMNS = ('id', 'username', 'real_name', 'email', 'phone', 'department_id',
+                'position_id', 'employee_id', 'status', 'role', 'created_at', 'updated_at')
+USER_SELECT_SQL = f"SELECT {', '.join('u.' + column for column in USER_COLUMNS)} FROM users u"
+# 全量加载时每批读取的用户数
+LOAD_BATCH_SIZE = 10000
+
+
+def _grams(text):
+    """关键字索引使用的二元组（不区分大小写，与 utf8mb4_unicode_ci 的 LIKE 一致）"""
+    text = text.casefold()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _set_bit(bits, row):
+    return bits | (1 << row)
+
+
+def _clear_bit(bits, row):
+    return bits & ~(1 << row)
+
+
+def _insert_bit(bits, row, value):
+    """在第 row 位插入一位，更高的位整体左移"""
+    low = bits & ((1 << row) - 1)
+    return low | ((bits >> row) << (row + 1)) | (int(value) << row)
+
+
+def _bitmap(rows, size):
+    """由行号集合构造位图"""
+    data = bytearray((size + 7) // 8)
+    for row in rows:
+        data[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(data, 'little')
+
+
+def _rows_desc(bits):
+    """按行号从大到小遍历位图中为 1 的行"""
+    if not bits:
+        return
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for index in range(len(data) - 1, -1, -1):
+        byte = data[index]
+        if byte:
+            for bit in range(7, -1, -1):
+                if byte & (1 << bit):
+                    yield index * 8 + bit
+
+
+class _Columns:
+    """一份完整的列式数据（全量加载时整体替换）"""
+    
+    def __init__(self):
+        self.ids = array('i')
+        self.department_ids = array('i')
+        self.position_ids = array('i')
+        self.statuses = array('b')
+        self.strings = {name: [] for name in ('username', 'real_name', 'email', 'phone', 'employee_id', 'role')}
+        self.created_at = []
+        self.updated_at = []
+        # 位图
+        self.alive = 0
+        self.by_status = {}
+        self.by_department = {}
+        # 二元组 -> 用户 ID 数组（可能包含过期的 ID，查询时校验）
+        self.grams = {}
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def row_of(self, user_id):
+        row = bisect.bisect_left(self.ids, user_id)
+        if row < len(self.ids) and self.ids[row] == user_id:
+            return row
+        return None
+    
+    def row_dict(self, row):
+        return {
+            'id': self.ids[row],
+            'username': self.strings['username'][row],
+            'real_name': self.strings['real_name'][row],
+            'email': self.strings['email'][row],
+            'phone': self.strings['phone'][row],
+            'department_id': self.department_ids[row] or None,
+            'position_id': self.position_ids[row] or None,
+            'employee_id': self.strings['employee_id'][row],
+            'status': self.statuses[row],
+            'role': self.strings['role'][row],
+            'created_at': self.created_at[row],
+            'updated_at': self.updated_at[row]
+        }
+    
+    def matches_keyword(self, row, keyword):
+        for name in ('username', 'real_name', 'employee_id'):
+            value = self.strings[name][row]
+            if value and keyword in value.casefold():
+                return True
+        return False
+    
+    def _index_keywords(self, user_id, data):
+        grams = set()
+        for name in ('username', 'real_name', 'employee_id'):
+            if data[name]:
+                grams |= _grams(data[name])
+        for gram in grams:
+            self.grams.setdefault(gram, array('i')).append(user_id)
+    
+    def append_all(self, rows):
+        """全量加载：rows 按 ID 升序，最后一次性构造位图"""
+        statuses, departments = {}, {}
+        for data in rows:
+            row = len(self.ids)
+            self._store(row, data, insert=True)
+            statuses.setdefault(self.statuses[row], []).append(row)
+            departments.setdefault(self.department_ids[row], []).append(row)
+            self._index_keywords(data['id'], data)
+        size = len(self.ids)
+        self.alive = (1 << size) - 1
+        self.by_status = {status: _bitmap(rows, size) for status, rows in statuses.items()}
+        self.by_department = {department: _bitmap(rows, size) for department, rows in departments.items()}
+    
+    def _store(self, row, data, insert):
+        """写入一行的列值（insert 为 True 时在 row 处插入）"""
+        values = {
+            'ids': data['id'],
+            'department_ids': data['department_id'] or 0,
+            'position_ids': data['position_id'] or 0,
+            'statuses': data['status'] or 0
+        }
+        for name, value in values.items():
+            column = getattr(self, name)
+            if insert:
+                column.insert(row, value)
+            else:
+                column[row] = value
+        for name, column in self.strings.items():
+            value = data[name]
+            value = sys.intern(value) if isinstance(value, str) else value
+            if insert:
+                column.insert(row, value)
+            else:
+                column[row] = value
+        for name in ('created_at', 'updated_at'):
+            if insert:
+                getattr(self, name).insert(row, data[name])
+            else:
+                getattr(self, name)[row] = data[name]
+    
+    def upsert(self, data):
+        """写入一个用户（新 ID 按顺序插入，位图中更高的行整体左移）"""
+        row = self.row_of(data['id'])
+        if row is None:
+            row = bisect.bisect_left(self.ids, data['id'])
+            self._store(row, data, insert=True)
+            self.alive = _insert_bit(self.alive, row, 1)
+            for key in self.by_status:
+                self.by_status[key] = _insert_bit(self.by_status[key], row, 0)
+            for key in self.by_department:
+                self.by_department[key] = _insert_bit(self.by_department[key], row, 0)
+        else:
+            self._clear_row_bits(row)
+            self._store(row, data, insert=False)
+            self.alive = _set_bit(self.alive, row)
+        status, department = self.statuses[row], self.department_ids[row]
+        self.by_status[status] = _set_bit(self.by_status.get(status, 0), row)
+        self.by_department[department] = _set_bit(self.by_department.get(department, 0), row)
+        self._index_keywords(data['id'], data)
+    
+    def remove(self, user_id):
+        """删除用户（行保留，清除位，下次全量加载时回收）"""
+        row = self.row_of(user_id)
+        if row is not None:
+            self._clear_row_bits(row)
+            self.alive = _clear_bit(self.alive, row)
+    
+    def departments_mask(self, departments):
+        """属于这些部门之一的行"""
+        mask = 0
+        for department in departments:
+            mask |= self.by_department.get(department, 0)
+        return mask
+    
+    def _clear_row_bits(self, row):
+        status, department = self.statuses[row], self.department_ids[row]
+        if status in self.by_status:
+            self.by_status[status] = _clear_bit(self.by_status[status], row)
+        if department in self.by_department:
+            self.by_department[department] = _clear_bit(self.by_department[department], row)
+
+
+class DirectoryEngine:
+    """内存列式用户目录"""
+    
+    def __init__(self):
+        self.enabled = False
+        self.poll_interval = 2
+        self.poll_overlap = 10
+        self.max_staleness = 10
+        self.full_reload_interval = 3600
+        self._columns = None
+        self._departments = {}
+        self._positions = {}
+        # 各分片的轮询位置：(updated_at 下界, 变更日志序号)
+        self._watermarks = {}
+        self._fresh_at = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.counters = {'served': 0, 'fallbacks': 0, 'polled_rows': 0}
+    
+    def configure(self, config):
+        """按 config.json 的 directory_engine 配置启用"""
+        self.enabled = config.get('enabled', False)
+        self.poll_interval = config.get('poll_interval', self.poll_interval)
+        self.poll_overlap = config.get('poll_overlap', self.poll_overlap)
+        self.max_staleness = config.get('max_staleness', self.max_staleness)
+        self.full_reload_interval = config.get('full_reload_interval', self.full_reload_interval)
+    
+    @property
+    def loaded(self):
+        return self.enabled and self._columns is not None
+    
+    def ready(self):
+        """是否可以直接回答查询"""
+        if not self.loaded or self._fresh_at is None:
+            return False
+        if time.monotonic() - self._fresh_at > self.max_staleness:
+            return False
+        # 刚写入的会话读主库，避免读不到其他进程刚写入的数据
+        return not db.in_write_window()
+    
+    # ------------------------------------------------------------------
+    # 加载与同步
+    # ------------------------------------------------------------------
+    
+    def refresh(self):
+        """定时任务入口：未加载或到期时全量加载，否则增量轮询"""
+        if not self.enabled:
+            return 0
+        if self._columns is None or time.monotonic() - self._loaded_at >= self.full_reload_interval:
+            return self.reload()
+        return self.poll()
+    
+    def _load_reference(self):
+        departments = db.execute_query("SELECT id, name FROM departments", use_primary=True)
+        positions = db.execute_query("SELECT id, name, role FROM positions", use_primary=True)
+        self._departments = {row['id']: row['name'] for row in departments}
+        self._positions = {row['id']: (row['name'], row['role']) for row in positions}
+    
+    def _load_shard(self, database):
+        """在一致性快照中读取一个分片的全部用户，返回 (用户列表, 轮询位置)"""
+        rows = []
+        with database.transaction() as cursor:
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            cursor.execute("SELECT NOW(3) AS now")
+            now = cursor.fetchone()['now']
+            cursor.execute("SELECT value FROM change_log_state WHERE name='seq'")
+            row = cursor.fetchone()
+            seq = row['value'] if row else 0
+            last_id = 0
+            while True:
+                cursor.execute(
+                    f"{USER_SELECT_SQL} WHERE u.id > %s ORDER BY u.id LIMIT %s",
+                    (last_id, LOAD_BATCH_SIZE)
+                )
+                batch = cursor.fetchall()
+                if not batch:
+                    break
+                rows.extend(batch)
+                last_id = batch[-1]['id']
+        return rows, (now, seq)
+    
+    def reload(self):
+        """全量加载（加载期间继续使用旧数据，完成后整体替换），返回用户数"""
+        with self._reload_lock:
+            watermarks, rows = {}, {}
+            for database in router.databases():
+                shard_rows, watermarks[database.shard_name] = self._load_shard(database)
+                # 部门迁移过程中同一用户可能出现在两个分片，按 ID 去重
+                for row in shard_rows:
+                    rows[row['id']] = row
+            self._load_reference()
+            columns = _Columns()
+            columns.append_all(rows[user_id] for user_id in sorted(rows))
+            with self._lock:
+                self._columns = columns
+                self._watermarks = watermarks
+                self._loaded_at = self._fresh_at = time.monotonic()
+            # 加载期间本进程的写入由下一次轮询补齐（轮询下界早于加载开始时间）
+            return len(columns)
+    
+    def poll(self):
+        """按 updated_at 增量同步其他进程的写入，按变更日志同步删除和归档，返回处理的行数"""
+        with self._reload_lock:
+            self._load_reference()
+            applied = 0
+            for database in router.databases():
+                name = database.shard_name
+                since, seq = self._watermarks.get(name, (None, 0))
+                rows = database.execute_query("SELECT NOW(3) AS now", use_primary=True)
+                now = rows[0]['now']
+                deleted = database.execute_query(
+                    """
+                    SELECT seq, entity_id FROM change_log
+                    WHERE entity='user' AND op IN ('delete', 'archive') AND seq > %s
+                    ORDER BY seq
+                    """,
+                    (seq,),
+                    use_primary=True
+                )
+                # 语句开始到提交之间有时间差，重叠 poll_overlap 秒重新读取
+                changed = database.execute_query(
+                    f"{USER_SELECT_SQL} WHERE u.updated_at >= %s - INTERVAL %s SECOND ORDER BY u.id",
+                    (since or now, self.poll_overlap),
+                    use_primary=True
+                )
+                with self._lock:
+                    for row in deleted:
+                        self._columns.remove(row['entity_id'])
+                    for row in changed:
+                        self._columns.upsert(row)
+                    self._watermarks[name] = (now, deleted[-1]['seq'] if deleted else seq)
+                applied += len(deleted) + len(changed)
+            self._fresh_at = time.monotonic()
+            self.counters['polled_rows'] += applied
+            return applied
+    
+    def refresh_user(self, user_id, database):
+        """本进程写入用户后调用：从所在分片重新读取该用户"""
+        if not self.loaded:
+            return
+        try:
+            rows = database.execute_query(f"{USER_SELECT_SQL} WHERE u.id=%s", (user_id,), use_primary=True) \
+                if database else []
+        except Exception:
+            # 写入已经成功，读取失败时改为回退到 SQL，直到下一次轮询
+            self._fresh_at = None
+            return
+        with self._lock:
+            if rows:
+                self._columns.upsert(rows[0])
+            else:
+                self._columns.remove(user_id)
+    
+    def remove_user(self, user_id):
+        """本进程删除用户后调用"""
+        if not self.loaded:
+            return
+        with self._lock:
+            self._columns.remove(user_id)
+    
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    
+    def query(self, status=None, department_id=None, keyword=None, user_department_id=None,
+              user_role='user', before_id=None, offset=0, limit=20, include_subdepartments=False):
+        """按 User.get_all 的语义查询一页用户（部门层级取自 department_tree 缓存）
+        
+        Returns:
+            (total, rows)：rows 为与 SQL 查询结构相同的字典；无法回答时返回 None
+        """
+        if not self.ready():
+            if self.enabled:
+                self.counters['fallbacks'] += 1
+            return None
+        if keyword and ('%' in keyword or '_' in keyword):
+            # LIKE 通配符按 SQL 语义处理
+            self.counters['fallbacks'] += 1
+            return None
+        
+        if department_id:
+            departments = department_tree.subtree(department_id) if include_subdepartments else (department_id,)
+        # 管理员和普通用户只能查看本部门及下级部门的用户，没有部门时看不到任何用户
+        visible = department_tree.subtree(user_department_id) if user_role in ['admin', 'user'] else None
+        
+        with self._lock:
+            columns = self._columns
+            mask = columns.alive
+            if status is not None:
+                mask &= columns.by_status.get(status, 0)
+            if department_id:
+                mask &= columns.departments_mask(departments)
+            if visible is not None:
+                mask &= columns.departments_mask(visible)
+            
+            if keyword:
+                keyword = keyword.casefold()
+                mask = self._keyword_mask(columns, mask, keyword)
+            total = mask.bit_count()
+            
+            if before_id:
+                mask &= (1 << bisect.bisect_left(columns.ids, before_id)) - 1
+            result = []
+            for row in _rows_desc(mask):
+                if offset:
+                    offset -= 1
+                    continue
+                result.append(self._row_with_names(columns.row_dict(row)))
+                if len(result) >= limit:
+                    break
+        self.counters['served'] += 1
+        return total, result
+    
+    @staticmethod
+    def _keyword_mask(columns, mask, keyword):
+        """关键字筛选：两个字符以上使用倒排索引，单个字符逐行校验"""
+        grams = _grams(keyword)
+        if not grams:
+            return _bitmap(
+                (row for row in _rows_desc(mask) if columns.matches_keyword(row, keyword)),
+                len(columns)
+            )
+        postings = [columns.grams.get(gram) for gram in grams]
+        if not all(postings):
+            return 0
+        # 逐位判断时按字节读取位图，避免对大整数反复移位
+        data = mask.to_bytes((len(columns) + 7) // 8, 'little')
+        rows = set()
+        for user_id in set(min(postings, key=len)):
+            row = columns.row_of(user_id)
+            if row is not None and data[row >> 3] >> (row & 7) & 1 and columns.matches_keyword(row, keyword):
+                rows.add(row)
+        return _bitmap(rows, len(columns))
+    
+    def _row_with_names(self, row):
+        position = self._positions.get(row['position_id'])
+        row['department_name'] = self._departments.get(row['department_id'])
+        row['position_name'] = position[0] if position else None
+        row['position_role'] = position[1] if position else None
+        return row
+    
+    def status(self):
+        """加载和同步状态（用于监控）"""
+        columns = self._columns
+        return {
+            'enabled': self.enabled,
+            'ready': self.ready() if self.enabled else False,
+            'users': columns.alive.bit_count() if columns else 0,
+            'rows': len(columns) if columns else 0,
+            'staleness': round(time.monotonic() - self._fresh_at, 3) if self._fresh_at else None,
+            'counters': dict(self.counters)
+        }
+
+
+# 全局内存目录（由应用按配置启用）
+engine = DirectoryEngine()
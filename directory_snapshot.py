@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+人员目录快照
+
+薪酬计算、批处理脚本需要大量按工号、用户名查询部门、职位和角色，逐条调用接口或
+User.get_by_employee_id 太慢。导出工具把用户、部门、职位写成一个只读的二进制快照，
+读取方用 mmap 打开后直接在文件上查找：
+- 定长列：每列一个连续数组（小端 int32 / uint32 / uint8），按用户 ID 排序
+- 字符串表：所有字符串按 UTF-8 连续存放，列中保存字符串编号
+- 索引：ID 在有序的 ID 列上二分查找；用户名、工号为开放寻址哈希表（CRC32）
+- 多个进程打开同一文件时共享页缓存；导出写入临时文件后原子替换，读取方发现文件
+  变化后切换到新快照，已取得的记录仍引用旧快照
+
+读取部分只依赖标准库，可直接复制到其他项目使用：
+
+    reader = SnapshotReader('instance/directory.snapshot')
+    user = reader.get_by_employee_id('E001')
+    if user:
+        print(user.department, user.position, user.role)
+
+导出：python directory_snapshot.py export；跟随变更日志持续更新：python directory_snapshot.py watch
+"""
+
+import argparse
+import bisect
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+# 文件头：魔数、格式版本、段数量、保留
+MAGIC = b'XLDIRSNP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHI')
+# 段目录：段名、偏移、长度
+SECTION = struct.Struct('<8sQQ')
+# 段起始位置按 8 字节对齐
+ALIGNMENT = 8
+# 字符串编号 0 表示空值
+NULL_STRING = 0
+
+# 段名 -> 数组类型（meta 和 strings 为字节）
+COLUMNS = {
+    'stroff': 'I',
+    'u.id': 'i', 'u.user': 'I', 'u.real': 'I', 'u.emp': 'I',
+    'u.dept': 'i', 'u.pos': 'i', 'u.role': 'B', 'u.status': 'B',
+    'h.user': 'I', 'h.emp': 'I',
+    'd.id': 'i', 'd.name': 'I', 'd.status': 'B',
+    'p.id': 'i', 'p.name': 'I', 'p.role': 'B', 'p.status': 'B'
+}
+
+DEFAULT_PATH = os.path.join('instance', 'directory.snapshot')
+
+
+class SnapshotFormatError(Exception):
+    """文件不是有效的快照或格式版本不支持"""
+
+
+def _hash(data):
+    return zlib.crc32(data)
+
+
+class UserRecord:
+    """快照中的一个用户（字段在访问时才从文件中解码）"""
+    
+    __slots__ = ('_snapshot', '_row')
+    
+    def __init__(self, snapshot, row):
+        self._snapshot = snapshot
+        self._row = row
+    
+    @property
+    def id(self):
+        return self._snapshot._columns['u.id'][self._row]
+    
+    @property
+    def username(self):
+        return self._snapshot.string(self._snapshot._columns['u.user'][self._row])
+    
+    @property
+    def real_name(self):
+        return self._snapshot.string(self._snapshot._columns['u.real'][self._row])
+    
+    @property
+    def employee_id(self):
+        return self._snapshot.string(self._snapshot._columns['u.emp'][self._row])
+    
+    @property
+    def department_id(self):
+        return self._snapshot._columns['u.dept'][self._row] or None
+    
+    @property
+    def position_id(self):
+        return self._snapshot._columns['u.pos'][self._row] or None
+    
+    @property
+    def role(self):
+        return self._snapshot.roles[self._snapshot._columns['u.role'][self._row]]
+    
+    @property
+    def status(self):
+        return self._snapshot._columns['u.status'][self._row]
+    
+    @property
+    def department(self):
+        """部门名称"""
+        return self._snapshot.department_name(self.department_id)
+    
+    @property
+    def position(self):
+        """职位名称"""
+        return self._snapshot.position_name(self.position_id)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'real_name': self.real_name,
+            'employee_id': self.employee_id,
+            'department_id': self.department_id,
+            'department': self.department,
+            'position_id': self.position_id,
+            'position': self.position,
+            'role': self.role,
+            'status': self.status
+        }
+    
+    def __repr__(self):
+        return f"UserRecord(id={self.id}, username={self.username!r})"
+
+
+class DirectorySnapshot:
+    """以 mmap 打开的快照文件"""
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        # 由 _view 派生的段和数组视图（关闭时先逐个释放）
+        self._views = []
+        self._columns = {}
+        try:
+            self._load()
+        except Exception:
+            self.close()
+            raise
+    
+    def _load(self):
+        if len(self._view) < HEADER.size:
+            raise SnapshotFormatError('快照文件不完整')
+        magic, version, count, _ = HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise SnapshotFormatError('不是人员目录快照文件')
+        if version != FORMAT_VERSION:
+            raise SnapshotFormatError(f'不支持的快照格式版本: {version}')
+        sections = {}
+        for index in range(count):
+            name, offset, length = SECTION.unpack_from(self._view, HEADER.size + index * SECTION.size)
+            if offset + length > len(self._view):
+                raise SnapshotFormatError('快照文件不完整')
+            sections[name.rstrip(b'\0').decode('ascii')] = self._slice(offset, offset + length)
+        
+        self.meta = json.loads(bytes(sections.pop('meta')).decode('utf-8'))
+        self.roles = self.meta['roles']
+        self._strings = sections.pop('strings')
+        for name, typecode in COLUMNS.items():
+            self._columns[name] = self._cast(sections[name], typecode)
+        self._offsets = self._columns['stroff']
+    
+    def _slice(self, start, end):
+        view = self._view[start:end]
+        self._views.append(view)
+        return view
+    
+    def _cast(self, view, typecode):
+        """把段转换为数组视图（小端主机上不复制数据）"""
+        if sys.byteorder == 'little':
+            values = view.cast(typecode)
+            self._views.append(values)
+            return values
+        values = array(typecode, bytes(view))
+        values.byteswap()
+        return values
+    
+    @property
+    def seqs(self):
+        """导出时各分片的变更日志序号"""
+        return self.meta['seqs']
+    
+    @property
+    def user_count(self):
+        return len(self._columns['u.id'])
+    
+    def close(self):
+        """释放映射（之后不能再访问本快照的记录）"""
+        self._columns.clear()
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self._view.release()
+        self._mmap.close()
+    
+    def string(self, index):
+        """按编号解码字符串（0 为空值）"""
+        if index == NULL_STRING:
+            return None
+        return str(self._strings[self._offsets[index - 1]:self._offsets[index]], 'utf-8')
+    
+    def _string_equals(self, index, data):
+        if index == NULL_STRING:
+            return False
+        return self._strings[self._offsets[index - 1]:self._offsets[index]] == data
+    
+    def _find(self, table, column, key):
+        """在哈希索引中查找 key 所在的行"""
+        if not key or not len(table):
+            return None
+        data = key.encode('utf-8')
+        mask = len(table) - 1
+        slot = _hash(data) & mask
+        while True:
+            entry = table[slot]
+            if not entry:
+                return None
+            if self._string_equals(self._columns[column][entry - 1], data):
+                return entry - 1
+            slot = (slot + 1) & mask
+    
+    @staticmethod
+    def _search(ids, value):
+        """在有序 ID 列中二分查找"""
+        if value is None:
+            return None
+        row = bisect.bisect_left(ids, value)
+        if row < len(ids) and ids[row] == value:
+            return row
+        return None
+    
+    def get_by_id(self, user_id):
+        row = self._search(self._columns['u.id'], user_id)
+        return UserRecord(self, row) if row is not None else None
+    
+    def get_by_username(self, username):
+        row = self._find(self._columns['h.user'], 'u.user', username)
+        return UserRecord(self, row) if row is not None else None
+    
+    def get_by_employee_id(self, employee_id):
+        row = self._find(self._columns['h.emp'], 'u.emp', employee_id)
+        return UserRecord(self, row) if row is not None else None
+    
+    def department_name(self, department_id):
+        row = self._search(self._columns['d.id'], department_id)
+        return self.string(self._columns['d.name'][row]) if row is not None else None
+    
+    def position_name(self, position_id):
+        row = self._search(self._columns['p.id'], position_id)
+        return self.string(self._columns['p.name'][row]) if row is not None else None
+    
+    def position_role(self, position_id):
+        row = self._search(self._columns['p.id'], position_id)
+        return self.roles[self._columns['p.role'][row]] if row is not None else None
+    
+    def __iter__(self):
+        for row in range(self.user_count):
+            yield UserRecord(self, row)
+
+
+class SnapshotReader:
+    """跟随最新快照的读取器
+    
+    每 check_interval 秒检查一次文件是否被替换，是则打开新快照并切换；
+    旧快照在不再被引用后由垃圾回收释放。
+    """
+    
+    def __init__(self, path=DEFAULT_PATH, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._current = DirectorySnapshot(path)
+        self._checked_at = time.monotonic()
+    
+    @property
+    def snapshot(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self.refresh()
+        return self._current
+    
+    def refresh(self):
+        """文件已被替换时切换到新快照，返回是否切换"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self._current.identity:
+            return False
+        try:
+            self._current = DirectorySnapshot(self.path)
+        except (OSError, SnapshotFormatError) as e:
+            print(f"打开新快照失败，继续使用当前快照: {e}", file=sys.stderr)
+            return False
+        return True
+    
+    def get_by_id(self, user_id):
+        return self.snapshot.get_by_id(user_id)
+    
+    def get_by_username(self, username):
+        return self.snapshot.get_by_username(username)
+    
+    def get_by_employee_id(self, employee_id):
+        return self.snapshot.get_by_employee_id(employee_id)
+
+
+# ----------------------------------------------------------------------
+# 导出
+# ----------------------------------------------------------------------
+
+class _StringTable:
+    """去重的字符串表（编号从 1 开始）"""
+    
+    def __init__(self):
+        self._ids = {}
+        self.data = bytearray()
+        self.offsets = array('I', [0])
+    
+    def add(self, value):
+        if value is None:
+            return NULL_STRING
+        index = self._ids.get(value)
+        if index is None:
+            self.data += value.encode('utf-8')
+            self.offsets.append(len(self.data))
+            index = self._ids[value] = len(self.offsets) - 1
+        return index
+
+
+def _build_hash_index(keys):
+    """为字符串列建立开放寻址哈希表（槽位保存行号 + 1，0 为空槽）"""
+    size = 8
+    while size < len(keys) * 2:
+        size *= 2
+    table = array('I', bytes(4 * size))
+    mask = size - 1
+    for row, key in enumerate(keys):
+        if key is None:
+            continue
+        slot = _hash(key.encode('utf-8')) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = row + 1
+    return table
+
+
+def _little_endian(values):
+    """数组的小端字节"""
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def write_snapshot(path, users, departments, positions, seqs):
+    """写入快照文件（先写临时文件再原子替换）
+    
+    Args:
+        users: 按 id 升序的用户元组 (id, username, real_name, employee_id, department_id, position_id, role, status)
+        departments: 部门元组 (id, name, status)
+        positions: 职位元组 (id, name, role, status)
+        seqs: 各分片的变更日志序号
+    """
+    strings = _StringTable()
+    roles = ['user', 'admin', 'super_admin']
+    
+    def role_code(role):
+        role = role or 'user'
+        if role not in roles:
+            roles.append(role)
+        return roles.index(role)
+    
+    columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+    usernames, employee_ids = [], []
+    for user_id, username, real_name, employee_id, department_id, position_id, role, status in users:
+        columns['u.id'].append(user_id)
+        columns['u.user'].append(strings.add(username))
+        columns['u.real'].append(strings.add(real_name))
+        columns['u.emp'].append(strings.add(employee_id))
+        columns['u.dept'].append(department_id or 0)
+        columns['u.pos'].append(position_id or 0)
+        columns['u.role'].append(role_code(role))
+        columns['u.status'].append(status or 0)
+        usernames.append(username)
+        employee_ids.append(employee_id)
+    for department_id, name, status in sorted(departments):
+        columns['d.id'].append(department_id)
+        columns['d.name'].append(strings.add(name))
+        columns['d.status'].append(status or 0)
+    for position_id, name, role, status in sorted(positions):
+        columns['p.id'].append(position_id)
+        columns['p.name'].append(strings.add(name))
+        columns['p.role'].append(role_code(role))
+        columns['p.status'].append(status or 0)
+    columns['h.user'] = _build_hash_index(usernames)
+    columns['h.emp'] = _build_hash_index(employee_ids)
+    columns['stroff'] = strings.offsets
+    
+    meta = {
+        'seqs': seqs,
+        'roles': roles,
+        'users': len(usernames),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    sections = [('meta', json.dumps(meta, ensure_ascii=False).encode('utf-8')),
+                ('strings', bytes(strings.data))]
+    sections += [(name, _little_endian(columns[name])) for name in COLUMNS]
+    
+    offset = HEADER.size + SECTION.size * len(sections)
+    directory, chunks = [], []
+    for name, data in sections:
+        padding = -offset % ALIGNMENT
+        chunks.append(b'\0' * padding)
+        offset += padding
+        directory.append(SECTION.pack(name.encode('ascii'), offset, len(data)))
+        chunks.append(data)
+        offset += len(data)
+    
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), 0))
+        f.writelines(directory)
+        f.writelines(chunks)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return meta
+
+
+def _shard_users(database, visible_sql, seqs, batch_size):
+    """在一致性快照中读取一个分片的变更序号和用户（按 id 升序分批读取）"""
+    with database.transaction() as cursor:
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        cursor.execute("SELECT value FROM change_log_state WHERE name='seq'")
+        row = cursor.fetchone()
+        seqs[database.shard_name] = row['value'] if row else 0
+        last_id = 0
+        while True:
+            cursor.execute(
+                f"""
+                SELECT u.id, u.username, u.real_name, u.employee_id, u.department_id,
+                       u.position_id, u.role, u.status
+                FROM users u
+                WHERE u.id > %s {visible_sql}
+                ORDER BY u.id
+                LIMIT %s
+                """,
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield (row['id'], row['username'], row['real_name'], row['employee_id'],
+                       row['department_id'], row['position_id'], row['role'], row['status'])
+            last_id = rows[-1]['id']
+
+
+def export_snapshot(path=DEFAULT_PATH, batch_size=10000):
+    """从数据库导出快照，返回快照元数据"""
+    from database import db
+    from sharding import router, VISIBLE_USERS_SQL
+    
+    visible_sql = f"AND {VISIBLE_USERS_SQL}" if router.enabled else ""
+    seqs = {}
+    # 各分片的用户按 id 归并（分片模式下用户 ID 全局唯一）
+    users = heapq.merge(*[
+        _shard_users(database, visible_sql, seqs, batch_size) for database in router.databases()
+    ])
+    departments = [
+        (row['id'], row['name'], row['status'])
+        for row in db.execute_query("SELECT id, name, status FROM departments", use_primary=True)
+    ]
+    positions = [
+        (row['id'], row['name'], row['role'], row['status'])
+        for row in db.execute_query("SELECT id, name, role, status FROM positions", use_primary=True)
+    ]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return write_snapshot(path, users, departments, positions, seqs)
+
+
+def current_seqs():
+    """各分片当前的变更日志序号"""
+    from sharding import router
+    
+    seqs = {}
+    for database in router.databases():
+        rows = database.execute_query(
+            "SELECT value FROM change_log_state WHERE name='seq'", use_primary=True
+        )
+        seqs[database.shard_name] = rows[0]['value'] if rows else 0
+    return seqs
+
+
+def watch(path=DEFAULT_PATH, poll_interval=5, batch_size=10000):
+    """变更日志前进后重新导出快照（常驻运行）"""
+    exported = None
+    if os.path.exists(path):
+        try:
+            snapshot = DirectorySnapshot(path)
+            exported = snapshot.seqs
+            snapshot.close()
+        except (OSError, SnapshotFormatError):
+            exported = None
+    while True:
+        try:
+            seqs = current_seqs()
+            if seqs != exported:
+                meta = export_snapshot(path, batch_size)
+                exported = meta['seqs']
+                print(f"已导出快照：{meta['users']} 个用户，序号 {exported}")
+        except Exception as e:
+            print(f"导出快照失败: {e}", file=sys.stderr)
+        time.sleep(poll_interval)
+
+
+def main():
+    try:
+        with open('config.json', 'r', encoding='utf-8') as f:
+            config = json.load(f).get('snapshot', {})
+    except OSError:
+        config = {}
+    parser = argparse.ArgumentParser(description='人员目录快照：导出、跟随变更日志更新、查询')
+    parser.add_argument('--path', default=config.get('path', DEFAULT_PATH), help='快照文件路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help='导出一次快照')
+    export.add_argument('--batch-size', type=int, default=10000, help='每批读取的用户数')
+    follow = subparsers.add_parser('watch', help='变更日志前进后重新导出（常驻运行）')
+    follow.add_argument('--interval', type=float, default=config.get('poll_interval', 5), help='检查间隔（秒）')
+    follow.add_argument('--batch-size', type=int, default=10000, help='每批读取的用户数')
+    lookup = subparsers.add_parser('lookup', help='在快照中查询用户')
+    lookup.add_argument('--id', type=int, help='用户ID')
+    lookup.add_argument('--username', help='用户名')
+    lookup.add_argument('--employee-id', help='工号')
+    args = parser.parse_args()
+    
+    if args.command == 'export':
+        meta = export_snapshot(args.path, args.batch_size)
+        print(f"已导出快照 {args.path}：{meta['users']} 个用户，序号 {meta['seqs']}")
+        return 0
+    if args.command == 'watch':
+        try:
+            watch(args.path, args.interval, args.batch_size)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    
+    snapshot = DirectorySnapshot(args.path)
+    if args.id is not None:
+        user = snapshot.get_by_id(args.id)
+    elif args.username:
+        user = snapshot.get_by_username(args.username)
+    elif args.employee_id:
+        user = snapshot.get_by_employee_id(args.employee_id)
+    else:
+        parser.error('请指定 --id、--username 或 --employee-id')
+    if user is None:
+        print('未找到用户', file=sys.stderr)
+        return 1
+    print(json.dumps(user.to_dict(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
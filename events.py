@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时变更推送模块（Server-Sent Events）
+
+每个进程一个 EventBroker：后台线程按序号轮询 change_log，把用户、部门、职位的
+变更转换为精简的失效消息，分发给本进程的订阅者。change_log 由所有 worker 在写入
+事务中追加，因此轮询即实现了跨 worker 的扇出；本进程发生写入时调用 wake()
+立即轮询，不必等待下一个周期。按部门分片时依次轮询每个分片的变更日志。
+
+消息只包含实体、操作、ID 和部门，不包含用户资料；按订阅者的部门范围过滤。
+"""
+
+import json
+import threading
+
+from models.change_log import ChangeLog, ChangeLogPurged
+from models.department_tree import tree as department_tree
+from sharding import router
+
+# 心跳间隔（秒），防止代理关闭空闲连接
+HEARTBEAT_INTERVAL = 20
+# 客户端断线后的重连间隔（毫秒）
+RETRY_INTERVAL = 5000
+
+
+def event_visible(event, scope):
+    """判断消息是否对某个部门范围可见
+    
+    Args:
+        event: 变更消息
+        scope: 订阅者可见的部门 ID 集合（本部门及下级部门），None 表示全部（超级管理员）
+    """
+    if scope is None or event.get('type') != 'change' or event['entity'] != 'user':
+        return True
+    if event['department_id'] is None and event['previous_department_id'] is None:
+        # 删除且不知道原部门：只包含 ID，发给所有人
+        return event['op'] == 'delete'
+    return event['department_id'] in scope or event['previous_department_id'] in scope
+
+
+def format_sse(event):
+    """编码为 SSE 报文"""
+    lines = []
+    if event.get('seq'):
+        lines.append(f"id: {event['seq']}")
+    lines.append(f"event: {event.get('type', 'change')}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def format_sse_comment(text=''):
+    """SSE 注释行（用作心跳）"""
+    return f": {text}\n\n"
+
+
+class Subscription:
+    """订阅者"""
+    
+    def __init__(self, scope, deliver):
+        self.scope = scope
+        self.deliver = deliver
+
+
+class EventBroker:
+    """进程内消息中心"""
+    
+    def __init__(self, poll_interval=1.0, batch_size=500):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        # 各分片已分发到的变更序号
+        self.last_seqs = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def subscribe(self, scope, deliver):
+        """订阅消息，deliver(event) 在轮询线程中调用，不能阻塞"""
+        subscription = Subscription(scope, deliver)
+        with self._lock:
+            self._subscribers.add(subscription)
+        self.start()
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+    
+    def subscriber_count(self):
+        return len(self._subscribers)
+    
+    def start(self):
+        """启动轮询线程（重复调用无副作用）"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='event-broker', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+    
+    def wake(self):
+        """本进程发生写入后调用，立即轮询一次"""
+        if self._thread is not None:
+            self._wake.set()
+    
+    def _loop(self):
+        while not self._stop.is_set():
+            if not self._subscribers:
+                # 没有订阅者时不查询数据库，下次有订阅者时从最新位置开始
+                self.last_seqs = {}
+            else:
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    print(f"变更推送轮询失败: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+    
+    def poll_once(self):
+        """读取各分片新的变更并分发，返回分发的消息数"""
+        return sum(self._poll_shard(name, router.get(name)) for name in router.names())
+    
+    def _poll_shard(self, name, database):
+        """读取一个分片的新变更并分发"""
+        if name not in self.last_seqs:
+            # 只推送启动之后的变更
+            rows = database.execute_query("SELECT COALESCE(MAX(seq), 0) AS seq FROM change_log")
+            self.last_seqs[name] = rows[0]['seq'] if rows else 0
+            return 0
+        
+        count = 0
+        while True:
+            try:
+                result = ChangeLog.get_changes(
+                    since=self.last_seqs[name], limit=self.batch_size, database=database
+                )
+            except ChangeLogPurged as e:
+                # 落后太多：通知客户端整体刷新
+                self.last_seqs[name] = e.purged_through
+                self.publish({'type': 'reset'})
+                return count
+            for change in result['changes']:
+                event = self._to_event(change)
+                if event is None:
+                    continue
+                self.publish(event)
+                count += 1
+            self.last_seqs[name] = result['next_since']
+            if not result['has_more']:
+                return count
+    
+    def _to_event(self, change):
+        """把变更记录转换为精简消息（迁移到其他分片的记录不推送，目标分片会记录新的快照）"""
+        if change['op'] == 'move':
+            return None
+        entity, entity_id, data = change['entity'], change['id'], change['data'] or {}
+        if entity == 'user' and change['op'] == 'delete':
+            # 删除记录的 data 为删除前所在的部门
+            department_id, previous = None, data.get('department_id')
+        elif entity == 'user':
+            # 调岗时快照中带有原部门
+            department_id, previous = data.get('department_id'), data.get('previous_department_id')
+        elif entity == 'department':
+            department_id, previous = entity_id, None
+        else:
+            department_id, previous = None, None
+        return {
+            'type': 'change',
+            'seq': change['seq'],
+            'entity': entity,
+            'op': change['op'],
+            'id': entity_id,
+            'department_id': department_id,
+            'previous_department_id': previous if previous != department_id else None
+        }
+    
+    def publish(self, event):
+        """分发消息给范围内的订阅者"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if event_visible(event, subscription.scope):
+                try:
+                    subscription.deliver(event)
+                except Exception as e:
+                    print(f"推送消息失败: {e}")
+
+
+def subscriber_scope(role, department_id):
+    """订阅者可见的部门范围：超级管理员为 None（全部），其他人为本部门及下级部门
+    
+    订阅时确定，之后部门层级的调整在重新连接后生效。
+    """
+    if role == 'super_admin':
+        return None
+    return department_tree.subtree(department_id)
+
+
+# 全局消息中心
+broker = EventBroker()
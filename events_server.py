@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时变更推送服务（asyncio）
+
+独立进程提供 GET /api/events：所有连接由一个事件循环管理，空闲连接不占用线程，
+单进程即可承载数千个长连接。登录状态通过与主应用共享的会话 Cookie 校验，
+变更来自 events.broker（轮询 change_log，覆盖所有 worker 的写入）。
+
+部署时由反向代理把 /api/events 转发到本服务，例如 nginx:
+
+    location /api/events {
+        proxy_pass http://127.0.0.1:5002;
+        proxy_http_version 1.1;
+        proxy_set_header Connection '';
+        proxy_buffering off;
+        proxy_read_timeout 1h;
+    }
+
+用法:
+    python events_server.py --host 127.0.0.1 --port 5002
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from http.cookies import CookieError, SimpleCookie
+
+from app import create_app
+from events import (broker, event_visible, subscriber_scope, format_sse, format_sse_comment,
+                    HEARTBEAT_INTERVAL, RETRY_INTERVAL)
+from models.user import User
+
+# 读取请求头的超时时间（秒）
+REQUEST_TIMEOUT = 10
+# 单个连接允许积压的发送字节数，超过后断开（客户端会自动重连并整体刷新）
+MAX_PENDING_BYTES = 256 * 1024
+
+
+class EventClient:
+    """一个推送连接"""
+    
+    def __init__(self, writer, scope):
+        self.writer = writer
+        self.scope = scope
+    
+    def send(self, payload):
+        """非阻塞发送；积压过多时断开连接"""
+        transport = self.writer.transport
+        if transport.is_closing():
+            return False
+        if transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+            transport.abort()
+            return False
+        self.writer.write(payload)
+        return True
+
+
+class EventServer:
+    """SSE 推送服务"""
+    
+    def __init__(self, flask_app, max_clients=10000):
+        self.app = flask_app
+        self.max_clients = max_clients
+        self.clients = set()
+        self.loop = None
+        self.cookie_name = flask_app.config.get('SESSION_COOKIE_NAME', 'session')
+    
+    async def serve(self, host, port):
+        self.loop = asyncio.get_running_loop()
+        # 只向消息中心注册一个订阅者，连接级的过滤和发送都在事件循环中完成
+        broker.subscribe(None, lambda event: self.loop.call_soon_threadsafe(self.dispatch, event))
+        server = await asyncio.start_server(self.handle, host, port)
+        heartbeat = asyncio.create_task(self.heartbeat())
+        print(f"实时推送服务已启动: http://{host}:{port}/api/events")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            heartbeat.cancel()
+            broker.stop()
+    
+    def dispatch(self, event):
+        """把消息发给范围内的连接"""
+        payload = format_sse(event).encode('utf-8')
+        for client in list(self.clients):
+            if event_visible(event, client.scope) and not client.send(payload):
+                self.clients.discard(client)
+    
+    async def heartbeat(self):
+        """定期发送心跳，防止代理关闭空闲连接"""
+        payload = format_sse_comment('ping').encode('utf-8')
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            for client in list(self.clients):
+                if not client.send(payload):
+                    self.clients.discard(client)
+    
+    def authenticate(self, cookie_header):
+        """校验会话，返回 (状态码, 部门范围或错误信息)；在线程池中执行"""
+        try:
+            cookies = SimpleCookie(cookie_header or '')
+        except CookieError:
+            return 401, '请先登录'
+        morsel = cookies.get(self.cookie_name)
+        if morsel is None:
+            return 401, '请先登录'
+        data = self.app.session_interface.load_cookie(self.app.secret_key, morsel.value)
+        if not data or 'user_id' not in data:
+            return 401, '请先登录'
+        
+        user = User.get_by_id(data['user_id'])
+        if not user or user.status != 1:
+            return 401, '请先登录'
+        role = data.get('role', 'user')
+        if role != 'super_admin' and not user.department_id:
+            return 403, '您还没有被分配部门，请联系管理员'
+        return 200, subscriber_scope(role, user.department_id)
+    
+    async def read_request(self, reader):
+        """读取请求行和请求头"""
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return request_line, headers
+    
+    def write_error(self, writer, status, reason, message):
+        body = json.dumps({'success': False, 'message': message}, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+    
+    async def handle(self, reader, writer):
+        client = None
+        try:
+            try:
+                request_line, headers = await asyncio.wait_for(self.read_request(reader), REQUEST_TIMEOUT)
+            except (asyncio.TimeoutError, ValueError, asyncio.LimitOverrunError):
+                return
+            
+            parts = request_line.split()
+            if len(parts) < 2 or parts[0] != 'GET' or parts[1].split('?', 1)[0] != '/api/events':
+                self.write_error(writer, 404, 'Not Found', '请求的资源不存在')
+                return
+            if len(self.clients) >= self.max_clients:
+                self.write_error(writer, 503, 'Service Unavailable', '连接数已满，请稍后重试')
+                return
+            
+            status, result = await self.loop.run_in_executor(None, self.authenticate, headers.get('cookie'))
+            if status != 200:
+                reason = 'Unauthorized' if status == 401 else 'Forbidden'
+                self.write_error(writer, status, reason, result)
+                return
+            
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream; charset=utf-8\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"Connection: keep-alive\r\n"
+                b"X-Accel-Buffering: no\r\n\r\n"
+            )
+            writer.write(f"retry: {RETRY_INTERVAL}\n\n".encode('utf-8'))
+            writer.write(format_sse({'type': 'ready'}).encode('utf-8'))
+            client = EventClient(writer, result)
+            self.clients.add(client)
+            
+            # 等待客户端断开（SSE 客户端不会再发送数据）
+            while await reader.read(1024):
+                pass
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            if client is not None:
+                self.clients.discard(client)
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='实时变更推送服务（Server-Sent Events）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=5002, help='监听端口（默认 5002）')
+    parser.add_argument('--max-clients', type=int, default=10000, help='最大连接数（默认 10000）')
+    args = parser.parse_args()
+    
+    try:
+        asyncio.run(EventServer(create_app(), args.max_clients).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
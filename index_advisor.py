@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引分析工具
+
+在临时数据库中生成测试数据，收集模型层实际生成的每一种查询，
+逐条执行 EXPLAIN FORMAT=JSON，报告全表扫描、filesort、临时表，
+以及未被使用或冗余的索引；--compare 时对比索引迁移前后的查询耗时。
+
+用法:
+    python index_advisor.py                  # 分析当前索引设计
+    python index_advisor.py --compare        # 迁移前后耗时对比
+    python index_advisor.py --users 200000   # 指定测试数据量
+    python index_advisor.py --drop           # 分析结束后删除临时库
+"""
+
+import argparse
+import json
+import random
+import sys
+import os
+import time
+from contextlib import contextmanager
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from database import Database, db, INDEX_MIGRATIONS
+from models.user import User
+from models.user_stats import UserStats
+from models.department import Department
+from models.position import Position
+
+
+class _Row(dict):
+    """记录模式下 fetchone 返回的行：任意字段都返回 1"""
+    
+    def __missing__(self, key):
+        return 1
+    
+    def __bool__(self):
+        return True
+
+
+class RecordingCursor:
+    """记录执行的 SQL，不访问数据库"""
+    
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.lastrowid = 0
+        self.rowcount = 0
+    
+    def execute(self, sql, params=None):
+        self.recorder.add(sql, params)
+    
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        if rows:
+            self.recorder.add(sql, rows[0])
+    
+    def fetchone(self):
+        return _Row()
+    
+    def fetchall(self):
+        return []
+    
+    def close(self):
+        pass
+
+
+class QueryRecorder:
+    """替换全局 db 的查询入口，收集模型生成的查询形态"""
+    
+    def __init__(self):
+        self.queries = []
+        self.label = None
+        self._seen = set()
+    
+    def add(self, sql, params):
+        sql = ' '.join(sql.split())
+        key = (self.label, sql)
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self.queries.append({'label': self.label, 'sql': sql, 'params': params})
+    
+    @contextmanager
+    def patched(self, database):
+        """记录期间替换 execute_query / execute_update / execute_insert / transaction"""
+        recorder = self
+        
+        def execute_query(sql, params=None, use_primary=False):
+            recorder.add(sql, params)
+            return []
+        
+        def execute_write(sql, params=None):
+            recorder.add(sql, params)
+            return 0
+        
+        @contextmanager
+        def transaction():
+            yield RecordingCursor(recorder)
+        
+        originals = {name: database.__dict__.get(name) for name in
+                     ('execute_query', 'execute_update', 'execute_insert', 'transaction')}
+        database.execute_query = execute_query
+        database.execute_update = execute_write
+        database.execute_insert = execute_write
+        database.transaction = transaction
+        try:
+            yield self
+        finally:
+            for name, value in originals.items():
+                if value is None:
+                    database.__dict__.pop(name, None)
+                else:
+                    setattr(database, name, value)
+    
+    def run(self, label, func):
+        self.label = label
+        try:
+            func()
+        except Exception as e:
+            print(f"  记录 {label} 时出错（已跳过）: {e}")
+        finally:
+            self.label = None
+
+
+def record_model_queries(sample):
+    """调用模型方法，收集全部查询形态"""
+    dept_id = sample['department_id']
+    user = User(
+        username='advisor_user', password='x', real_name='索引分析',
+        department_id=dept_id, position_id=sample['position_id'],
+        employee_id='ADV0001', status=1, role='user'
+    )
+    
+    def update_user():
+        user.id = sample['user_id']
+        user.save()
+    
+    def create_user():
+        user.id = None
+        user.save()
+    
+    def delete_user():
+        user.id = sample['user_id']
+        user.delete()
+    
+    recorder = QueryRecorder()
+    with recorder.patched(db):
+        cases = [
+            ('User.get_by_id', lambda: User.get_by_id(sample['user_id'])),
+            ('User.get_by_username', lambda: User.get_by_username(sample['username'])),
+            ('User.get_by_employee_id', lambda: User.get_by_employee_id(sample['employee_id'])),
+            ('User.get_all 超级管理员', lambda: User.get_all(user_role='super_admin')),
+            ('User.get_all 超级管理员+状态', lambda: User.get_all(status=1, user_role='super_admin')),
+            ('User.get_all 超级管理员+部门', lambda: User.get_all(department_id=dept_id, user_role='super_admin')),
+            ('User.get_all 本部门', lambda: User.get_all(user_department_id=dept_id, user_role='admin')),
+            ('User.get_all 本部门+状态', lambda: User.get_all(status=1, user_department_id=dept_id, user_role='admin')),
+            ('User.get_all 本部门+状态 深分页', lambda: User.get_all(page=50, status=1, user_department_id=dept_id, user_role='admin')),
+            ('User.get_all 关键字', lambda: User.get_all(keyword='user1', user_role='super_admin')),
+            ('User.save 更新', update_user),
+            ('User.save 新增', create_user),
+            ('User.delete', delete_user),
+            ('Department.get_all', lambda: Department.get_all(status=1)),
+            ('Department.get_by_name', lambda: Department.get_by_name('综合部')),
+            ('Position.get_all', lambda: Position.get_all(status=1)),
+            ('Position.get_by_name', lambda: Position.get_by_name('员工')),
+            ('UserStats.get_summary', lambda: UserStats.get_summary()),
+            ('UserStats.get_summary 部门', lambda: UserStats.get_summary(department_id=dept_id)),
+            ('UserStats.reconcile', UserStats.reconcile)
+        ]
+        for label, func in cases:
+            recorder.run(label, func)
+    return recorder.queries
+
+
+def generate_dataset(database, users, departments):
+    """在临时库中生成测试数据（数据量一致时复用）"""
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS total FROM users")
+        if cursor.fetchone()['total'] == users:
+            print(f"复用已有测试数据（{users} 个用户）")
+        else:
+            print(f"生成测试数据：{departments} 个部门，{users} 个用户...")
+            cursor.execute("DELETE FROM users")
+            cursor.execute("DELETE FROM user_stats")
+            cursor.executemany(
+                "INSERT IGNORE INTO departments (name, description, status) VALUES (%s, %s, 1)",
+                [(f'测试部门{i}', '索引分析测试数据') for i in range(1, departments + 1)]
+            )
+            cursor.execute("SELECT id FROM departments")
+            dept_ids = [row['id'] for row in cursor.fetchall()]
+            cursor.execute("SELECT id, role FROM positions")
+            positions = [(row['id'], row['role']) for row in cursor.fetchall()]
+            
+            rng = random.Random(42)
+            batch = []
+            for i in range(1, users + 1):
+                position_id, role = rng.choice(positions)
+                batch.append((
+                    f'user{i}', 'x' * 64, f'测试用户{i}', f'user{i}@example.com',
+                    f'138{i:08d}', rng.choice(dept_ids), position_id,
+                    f'E{i:07d}', 1 if rng.random() < 0.9 else 0, role
+                ))
+                if len(batch) >= 2000 or i == users:
+                    cursor.executemany(
+                        """
+                        INSERT INTO users (username, password, real_name, email, phone,
+                                           department_id, position_id, employee_id, status, role)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        """,
+                        batch
+                    )
+                    conn.commit()
+                    batch = []
+        
+        cursor.execute("ANALYZE TABLE users, departments, positions")
+        cursor.fetchall()
+        cursor.execute("""
+        SELECT u.id, u.username, u.employee_id, u.department_id, u.position_id
+        FROM users u
+        JOIN (SELECT department_id FROM users GROUP BY department_id ORDER BY COUNT(*) DESC LIMIT 1) d
+          ON u.department_id = d.department_id
+        LIMIT 1
+        """)
+        row = cursor.fetchone()
+        cursor.close()
+    return {
+        'user_id': row['id'],
+        'username': row['username'],
+        'employee_id': row['employee_id'],
+        'department_id': row['department_id'],
+        'position_id': row['position_id']
+    }
+
+
+def walk_plan(node, found):
+    """遍历 EXPLAIN JSON，收集使用的索引和问题"""
+    if isinstance(node, dict):
+        if 'table_name' in node and 'access_type' in node:
+            table = node['table_name']
+            key = node.get('key')
+            if key:
+                found['keys'].add((table, key))
+            if node['access_type'] == 'ALL':
+                rows = node.get('rows_examined_per_scan', '?')
+                found['issues'].append(f"全表扫描 {table}（约 {rows} 行）")
+            elif node['access_type'] == 'index' and not node.get('using_index'):
+                found['issues'].append(f"全索引扫描 {table}.{key}")
+        if node.get('using_filesort'):
+            found['issues'].append('filesort')
+        if node.get('using_temporary_table'):
+            found['issues'].append('临时表')
+        for value in node.values():
+            walk_plan(value, found)
+    elif isinstance(node, list):
+        for item in node:
+            walk_plan(item, found)
+
+
+def explain_queries(database, queries):
+    """逐条 EXPLAIN，返回分析结果"""
+    results = []
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        for query in queries:
+            sql = query['sql']
+            verb = sql.split(None, 1)[0].upper()
+            if verb not in ('SELECT', 'UPDATE', 'DELETE') or 'GET_LOCK' in sql or 'RELEASE_LOCK' in sql:
+                continue
+            found = {'keys': set(), 'issues': []}
+            try:
+                cursor.execute(f"EXPLAIN FORMAT=JSON {sql}", query['params'])
+                plan = json.loads(next(iter(cursor.fetchone().values())))
+                walk_plan(plan, found)
+                cost = plan.get('query_block', {}).get('cost_info', {}).get('query_cost')
+            except Exception as e:
+                found['issues'].append(f"EXPLAIN 失败: {e}")
+                cost = None
+            results.append(dict(query, verb=verb, cost=cost, **found))
+        conn.rollback()
+        cursor.close()
+    return results
+
+
+def load_indexes(database):
+    """读取索引定义：{(表名, 索引名): {'columns': [...], 'unique': bool}}"""
+    indexes = {}
+    rows = database.execute_query("""
+    SELECT TABLE_NAME AS table_name, INDEX_NAME AS index_name,
+           COLUMN_NAME AS column_name, NON_UNIQUE AS non_unique
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+    """, use_primary=True)
+    for row in rows:
+        entry = indexes.setdefault((row['table_name'], row['index_name']), {
+            'columns': [],
+            'unique': not row['non_unique']
+        })
+        entry['columns'].append(row['column_name'])
+    return indexes
+
+
+def find_redundant_indexes(indexes):
+    """普通索引的列是同表另一个索引的前缀（或完全相同）时视为冗余"""
+    redundant = []
+    for (table, name), entry in indexes.items():
+        if entry['unique']:
+            continue
+        for (other_table, other_name), other in indexes.items():
+            if other_table != table or other_name == name:
+                continue
+            cols, other_cols = entry['columns'], other['columns']
+            if other_cols[:len(cols)] == cols and (len(other_cols) > len(cols) or other['unique']):
+                redundant.append((table, name, other_name))
+                break
+    return redundant
+
+
+def time_queries(database, results, repeat):
+    """执行每条 SELECT 查询 repeat 次，返回 {(label, sql): 平均毫秒}"""
+    timings = {}
+    with database.get_connection() as conn:
+        cursor = conn.cursor()
+        for result in results:
+            if result['verb'] != 'SELECT' or 'FOR UPDATE' in result['sql']:
+                continue
+            start = time.perf_counter()
+            for _ in range(repeat):
+                cursor.execute(result['sql'], result['params'])
+                cursor.fetchall()
+            timings[(result['label'], result['sql'])] = (time.perf_counter() - start) * 1000 / repeat
+        cursor.close()
+    return timings
+
+
+def print_report(results, indexes):
+    """打印分析报告"""
+    print("\n=== 查询分析 ===")
+    for result in results:
+        status = '; '.join(dict.fromkeys(result['issues'])) or 'OK'
+        keys = ', '.join(f"{t}.{k}" for t, k in sorted(result['keys'])) or '-'
+        print(f"[{result['label']}] {status}")
+        print(f"    索引: {keys}  代价: {result['cost'] or '-'}")
+        print(f"    {result['sql'][:160]}")
+    
+    used = set().union(*(r['keys'] for r in results)) if results else set()
+    
+    print("\n=== 冗余索引 ===")
+    redundant = find_redundant_indexes(indexes)
+    for table, name, covered_by in redundant:
+        print(f"  {table}.{name} 被 {covered_by} 覆盖，可删除")
+    if not redundant:
+        print("  无")
+    
+    print("\n=== 未使用的索引 ===")
+    unused = [
+        (table, name) for (table, name), entry in sorted(indexes.items())
+        if name != 'PRIMARY' and not entry['unique'] and (table, name) not in used
+    ]
+    for table, name in unused:
+        print(f"  {table}.{name} ({', '.join(indexes[(table, name)]['columns'])})"
+              "（外键列上的索引删除前请确认仍有其他索引以该列开头）")
+    if not unused:
+        print("  无")
+    
+    print("\n=== 迁移（database.INDEX_MIGRATIONS） ===")
+    for table, name, columns, action in INDEX_MIGRATIONS:
+        state = '已存在' if (table, name) in indexes else '不存在'
+        print(f"  {action:4} {table}.{name} {columns}（当前{state}）")
+
+
+def print_comparison(before, after):
+    """打印迁移前后耗时对比"""
+    print("\n=== 迁移前后平均耗时（毫秒） ===")
+    print(f"  {'查询':<32} {'迁移前':>10} {'迁移后':>10} {'变化':>8}")
+    for key, old in before.items():
+        new = after.get(key)
+        if new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.0f}%" if old else '-'
+        print(f"  {key[0][:32]:<32} {old:>10.2f} {new:>10.2f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分析模型查询的执行计划并给出索引建议')
+    parser.add_argument('--users', type=int, default=100000, help='测试用户数量（默认 100000）')
+    parser.add_argument('--departments', type=int, default=30, help='测试部门数量（默认 30）')
+    parser.add_argument('--database', help='临时数据库名（默认为配置的数据库名加 _index_advisor）')
+    parser.add_argument('--repeat', type=int, default=20, help='计时时每条查询的执行次数')
+    parser.add_argument('--compare', action='store_true', help='对比索引迁移前后的查询耗时')
+    parser.add_argument('--drop', action='store_true', help='结束后删除临时数据库')
+    args = parser.parse_args()
+    
+    database_name = args.database or f"{db.config.database}_index_advisor"
+    if database_name == db.config.database:
+        print("错误: 临时数据库不能与业务数据库相同")
+        return 1
+    
+    print(f"使用临时数据库: {database_name}")
+    scratch = Database(database=database_name)
+    sample = generate_dataset(scratch, args.users, args.departments)
+    queries = record_model_queries(sample)
+    print(f"收集到 {len(queries)} 种查询")
+    
+    try:
+        if args.compare:
+            with scratch.get_connection() as conn:
+                cursor = conn.cursor()
+                reverted = scratch.migrate_indexes(cursor, revert=True)
+                cursor.close()
+            print(f"恢复迁移前的索引: {len(reverted)} 条语句")
+            before = time_queries(scratch, explain_queries(scratch, queries), args.repeat)
+            
+            with scratch.get_connection() as conn:
+                cursor = conn.cursor()
+                for sql in scratch.migrate_indexes(cursor):
+                    print(f"  {sql}")
+                cursor.execute("ANALYZE TABLE users, departments, positions")
+                cursor.fetchall()
+                cursor.close()
+            results = explain_queries(scratch, queries)
+            after = time_queries(scratch, results, args.repeat)
+            print_report(results, load_indexes(scratch))
+            print_comparison(before, after)
+        else:
+            results = explain_queries(scratch, queries)
+            print_report(results, load_indexes(scratch))
+    finally:
+        if args.drop:
+            with scratch.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"DROP DATABASE `{database_name}`")
+                cursor.close()
+            print(f"已删除临时数据库 {database_name}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,6 +10,7 @@ if __name__ == '__main__':
     print("正在初始化数据库...")
     try:
         db = Database()
+        db.initialize()
         print("数据库初始化成功！")
         print("用户表已创建")
     except Exception as e:
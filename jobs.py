@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台定时任务模块
+
+任务在后台守护线程中按固定间隔执行，单次失败只记录日志，不影响下一次执行。
+"""
+
+import threading
+import time
+
+
+class PeriodicJob:
+    """定时任务"""
+    
+    def __init__(self, name, interval, func, run_at_start=True):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.run_at_start = run_at_start
+        self.last_run = None
+        self.last_error = None
+        self.runs = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """启动任务线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name=f"job-{self.name}", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止任务线程"""
+        self._stop.set()
+    
+    def run_once(self):
+        """立即执行一次"""
+        try:
+            result = self.func()
+            self.last_error = None
+            return result
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"后台任务 {self.name} 执行失败: {e}")
+        finally:
+            self.runs += 1
+            self.last_run = time.time()
+    
+    def _loop(self):
+        if not self.run_at_start and self._stop.wait(self.interval):
+            return
+        while not self._stop.is_set():
+            self.run_once()
+            if self._stop.wait(self.interval):
+                return
+    
+    def status(self):
+        """任务状态（用于监控）"""
+        return {
+            'name': self.name,
+            'interval': self.interval,
+            'runs': self.runs,
+            'last_run': self.last_run,
+            'last_error': self.last_error
+        }
+
+
+class JobRunner:
+    """定时任务注册表"""
+    
+    def __init__(self):
+        self.jobs = {}
+        self._started = False
+        self._lock = threading.Lock()
+    
+    def register(self, name, interval, func, run_at_start=True):
+        """注册任务（已启动时立即开始执行；同名的旧任务先停止）"""
+        job = PeriodicJob(name, interval, func, run_at_start)
+        with self._lock:
+            previous = self.jobs.get(name)
+            if previous is not None:
+                previous.stop()
+            self.jobs[name] = job
+            if self._started:
+                job.start()
+        return job
+    
+    def start(self):
+        """启动全部任务（重复调用无副作用）"""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for job in self.jobs.values():
+                job.start()
+    
+    def stop(self):
+        """停止全部任务"""
+        with self._lock:
+            for job in self.jobs.values():
+                job.stop()
+    
+    def reset(self):
+        """停止并移除全部任务，之后注册的任务在下次 start() 时启动（重新创建应用时使用）"""
+        with self._lock:
+            for job in self.jobs.values():
+                job.stop()
+            self.jobs.clear()
+            self._started = False
+    
+    def status(self):
+        """全部任务状态"""
+        return [job.status() for job in self.jobs.values()]
+
+
+# 全局任务注册表
+jobs = JobRunner()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变更日志模型
+
+用户、部门、职位的每次写入在同一事务中追加一条变更记录（新增或修改时保存
+完整快照，删除时保存删除标记），下游系统按序号增量同步。
+
+序号从 change_log_state 的计数行分配，行锁持有到事务提交，因此序号顺序与
+提交顺序一致：读到序号 N 时，所有小于 N 的变更都已提交，消费方不会漏读。
+
+用户的记录带有部门信息，推送据此通知调出、删除用户所在部门的订阅者：upsert 快照中的
+previous_department_id 为调岗前的部门（未调岗时为 null），delete 的 data 为删除前的部门。
+
+按部门分片时每个分片有独立的变更日志和序号；用户迁移到其他分片后，源分片记录
+一条 move（data 中为目标分片名称和迁移前的部门），之后的变更在目标分片的日志中。
+
+长期停用的用户移入归档表时记录 archive（data 为归档时的快照）：用户仍然存在，
+但不再出现在默认的列表和索引中；恢复启用后记录新的 upsert。
+"""
+
+import json
+
+from database import db, CHANGE_LOG_ENTITIES, change_snapshot_sql
+
+# 压缩时每批删除的记录数
+COMPACT_BATCH_SIZE = 5000
+
+
+class ChangeLogPurged(Exception):
+    """消费方的同步位置早于已清理的删除记录，需要重新全量同步"""
+    
+    def __init__(self, purged_through):
+        super().__init__(f"变更日志已清理到序号 {purged_through}")
+        self.purged_through = purged_through
+
+
+class ChangeLog:
+    """变更日志类"""
+    
+    @staticmethod
+    def _next_seq(cursor):
+        """在当前事务中分配下一个序号（锁定计数行直到提交）"""
+        cursor.execute(
+            "UPDATE change_log_state SET value = LAST_INSERT_ID(value + 1) WHERE name='seq'"
+        )
+        cursor.execute("SELECT LAST_INSERT_ID() AS seq")
+        return cursor.fetchone()['seq']
+    
+    @staticmethod
+    def record_upsert(cursor, entity, entity_id, previous_department_id=None):
+        """记录新增或修改：保存写入后的完整快照
+        
+        Args:
+            cursor: 写入所在事务的游标（应在事务的最后调用，缩短计数行的锁定时间）
+            entity: 实体名（user / department / position）
+            entity_id: 实体ID
+            previous_department_id: 用户写入前所在的部门；与写入后不同（调岗）时记录在快照的
+                                    previous_department_id 中，否则为 null
+        """
+        seq = ChangeLog._next_seq(cursor)
+        params = [seq, entity]
+        extra = None
+        if entity == 'user':
+            extra = {'previous_department_id': "NULLIF(%s, `department_id`)"}
+            params.append(previous_department_id)
+        snapshot, table = change_snapshot_sql(entity, extra)
+        cursor.execute(
+            f"""
+            INSERT INTO change_log (seq, entity, entity_id, op, data)
+            SELECT %s, %s, id, 'upsert', {snapshot} FROM {table} WHERE id=%s
+            """,
+            params + [entity_id]
+        )
+        return seq
+    
+    @staticmethod
+    def record_delete(cursor, entity, entity_id, department_id=None):
+        """记录删除（用户的 data 中保存删除前所在的部门，其他实体为 NULL）"""
+        if entity not in CHANGE_LOG_ENTITIES:
+            raise ValueError(f"未知的实体: {entity}")
+        seq = ChangeLog._next_seq(cursor)
+        data, params = "NULL", [seq, entity, entity_id]
+        if entity == 'user':
+            data = "JSON_OBJECT('department_id', %s)"
+            params.append(department_id)
+        cursor.execute(
+            f"INSERT INTO change_log (seq, entity, entity_id, op, data) VALUES (%s, %s, %s, 'delete', {data})",
+            params
+        )
+        return seq
+    
+    @staticmethod
+    def record_move(cursor, entity, entity_id, shard, department_id=None):
+        """记录实体迁移到其他分片（data 中为目标分片和迁移前所在的部门）"""
+        if entity not in CHANGE_LOG_ENTITIES:
+            raise ValueError(f"未知的实体: {entity}")
+        seq = ChangeLog._next_seq(cursor)
+        cursor.execute(
+            """
+            INSERT INTO change_log (seq, entity, entity_id, op, data)
+            VALUES (%s, %s, %s, 'move', JSON_OBJECT('shard', %s, 'department_id', %s))
+            """,
+            (seq, entity, entity_id, shard, department_id)
+        )
+        return seq
+    
+    @staticmethod
+    def record_archive(cursor, user_ids):
+        """记录一批用户归档：每个用户一条 archive，快照取自归档表"""
+        if not user_ids:
+            return
+        cursor.execute(
+            "UPDATE change_log_state SET value = LAST_INSERT_ID(value + %s) WHERE name='seq'",
+            (len(user_ids),)
+        )
+        cursor.execute("SELECT LAST_INSERT_ID() AS seq")
+        first = cursor.fetchone()['seq'] - len(user_ids)
+        snapshot, _ = change_snapshot_sql('user')
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        cursor.execute(
+            f"""
+            INSERT INTO change_log (seq, entity, entity_id, op, data)
+            SELECT %s + ROW_NUMBER() OVER (ORDER BY id), 'user', id, 'archive', {snapshot}
+            FROM users_archive WHERE id IN ({placeholders})
+            """,
+            [first] + list(user_ids)
+        )
+    
+    @staticmethod
+    def get_changes(since=0, limit=500, database=None):
+        """获取序号大于 since 的变更（同一实体只保留最新一条）
+        
+        Args:
+            since: 消费方已同步到的序号，0 表示从头同步
+            limit: 本次最多读取的变更条数
+            database: 读取哪个分片的变更日志（默认为 db）
+        
+        Returns:
+            dict: changes（按序号排列）、next_since（下次请求使用的序号）、has_more
+        
+        Raises:
+            ChangeLogPurged: since 早于已清理的删除记录
+        """
+        database = database or db
+        rows = database.execute_query(
+            """
+            SELECT seq, entity, entity_id, op, data, created_at
+            FROM change_log
+            WHERE seq > %s
+            ORDER BY seq
+            LIMIT %s
+            """,
+            (since, limit)
+        )
+        
+        # 在读取变更之后检查清理位置：读取期间发生的清理也能被发现
+        state = database.execute_query(
+            "SELECT name, value FROM change_log_state WHERE name IN ('seq', 'purged_through')"
+        )
+        state = {row['name']: row['value'] for row in state}
+        purged_through = state.get('purged_through', 0)
+        if since and since < purged_through:
+            raise ChangeLogPurged(purged_through)
+        
+        latest = {}
+        for row in rows:
+            latest[(row['entity'], row['entity_id'])] = row
+        changes = [
+            {
+                'seq': row['seq'],
+                'entity': row['entity'],
+                'id': row['entity_id'],
+                'op': row['op'],
+                'data': ChangeLog._load_data(row['data']),
+                'changed_at': row['created_at'].isoformat() if row['created_at'] else None
+            }
+            for row in sorted(latest.values(), key=lambda r: r['seq'])
+        ]
+        return {
+            'changes': changes,
+            'next_since': rows[-1]['seq'] if rows else since,
+            'has_more': len(rows) == limit,
+            'latest_seq': state.get('seq', 0)
+        }
+    
+    @staticmethod
+    def _load_data(data):
+        """JSON 列在 PyMySQL 中以字符串返回"""
+        if data is None or isinstance(data, dict):
+            return data
+        return json.loads(data)
+    
+    @staticmethod
+    def compact(tombstone_retention=30 * 86400, database=None):
+        """压缩变更日志，返回删除的记录数
+        
+        - 同一实体只保留最新一条记录（快照是完整数据，旧记录对任何消费方都不再需要）
+        - 删除标记保留 tombstone_retention 秒后清理，并记录清理位置；
+          同步位置早于该位置的消费方需要重新全量同步
+        每批删除是一个独立的事务（不长时间持有锁）；清理删除标记与更新清理位置在同一事务中。
+        多个 worker 同时运行时通过命名锁保证只有一个执行（命名锁属于连接，在单独的连接上持有）。
+        """
+        database = database or db
+        lock = database.lock_name('change_log_compact')
+        removed = 0
+        with database.get_connection() as lock_conn:
+            lock_cursor = lock_conn.cursor()
+            try:
+                lock_cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (lock,))
+                row = lock_cursor.fetchone()
+                if not row or not row['locked']:
+                    return 0
+                try:
+                    while True:
+                        deleted = database.run_in_transaction(ChangeLog._compact_batch)
+                        if not deleted:
+                            break
+                        removed += deleted
+                    removed += database.run_in_transaction(
+                        lambda cursor: ChangeLog._purge_tombstones(cursor, tombstone_retention)
+                    )
+                finally:
+                    lock_cursor.execute("SELECT RELEASE_LOCK(%s)", (lock,))
+            finally:
+                lock_cursor.close()
+        return removed
+    
+    @staticmethod
+    def _compact_batch(cursor):
+        """删除一批已有更新记录的旧记录，返回删除的记录数"""
+        cursor.execute(
+            """
+            SELECT c.seq
+            FROM change_log c
+            WHERE EXISTS (
+                SELECT 1 FROM change_log n
+                WHERE n.entity = c.entity AND n.entity_id = c.entity_id AND n.seq > c.seq
+            )
+            LIMIT %s
+            """,
+            (COMPACT_BATCH_SIZE,)
+        )
+        seqs = [r['seq'] for r in cursor.fetchall()]
+        if not seqs:
+            return 0
+        placeholders = ', '.join(['%s'] * len(seqs))
+        cursor.execute(f"DELETE FROM change_log WHERE seq IN ({placeholders})", seqs)
+        return len(seqs)
+    
+    @staticmethod
+    def _purge_tombstones(cursor, tombstone_retention):
+        """清理超过保留期的删除标记并记录清理位置，返回删除的记录数
+        
+        保留期按数据库时间计算（created_at 由数据库写入，与应用服务器的时区无关）。
+        """
+        cursor.execute(
+            """
+            SELECT MAX(seq) AS seq FROM change_log
+            WHERE op='delete' AND created_at < NOW(3) - INTERVAL %s SECOND
+            """,
+            (tombstone_retention,)
+        )
+        row = cursor.fetchone()
+        if not row or not row['seq']:
+            return 0
+        cursor.execute(
+            "DELETE FROM change_log WHERE op='delete' AND seq <= %s",
+            (row['seq'],)
+        )
+        purged = cursor.rowcount
+        cursor.execute(
+            "UPDATE change_log_state SET value = GREATEST(value, %s) WHERE name='purged_through'",
+            (row['seq'],)
+        )
+        return purged
@@ -2,22 +2,33 @@
 # -*- coding: utf-8 -*-
 """
 部门模型
+
+部门按 parent_id 组成树，层级关系由闭包表 department_closure 维护（与部门在同一事务中写入），
+查询某部门的全部下级部门是一次主键范围读取；内存中的层级缓存见 department_tree。
 """
 
-import sys
-import os
+import pymysql
 
-# 添加项目根目录到路径
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import db
+from models.change_log import ChangeLog
+from models.tracked import TrackedModel
+from models import identity_map
+from models.department_tree import tree as department_tree
+from sharding import router
+
+# MySQL 唯一键冲突的错误码（部门表上唯一的非主键唯一键是 name）
+ER_DUP_ENTRY = 1062
 
 
-class Department:
+class Department(TrackedModel):
     """部门模型类"""
     
-    def __init__(self, name=None, description=None, status=1, department_id=None):
+    TRACKED_FIELDS = ('name', 'parent_id', 'description', 'status')
+    
+    def __init__(self, name=None, description=None, status=1, department_id=None, parent_id=None):
         self.id = department_id
         self.name = name
+        self.parent_id = parent_id
         self.description = description
         self.status = status
     
@@ -26,56 +37,143 @@ class Department:
         return {
             'id': self.id,
             'name': self.name,
+            'parent_id': self.parent_id,
             'description': self.description,
             'status': self.status
         }
     
     def save(self):
-        """保存部门（新增或更新）"""
+        """保存部门（新增或更新），没有字段变化时不写入，返回是否写入
+        
+        上级部门变化时在同一事务中移动整个子树；不能移动到自己或自己的下级部门之下。
+        """
         if self.id:
-            # 更新
-            sql = """
-            UPDATE departments SET 
-                name=%s, description=%s, status=%s
-            WHERE id=%s
-            """
-            params = (self.name, self.description, self.status, self.id)
-            db.execute_update(sql, params)
+            # 更新：只写入发生变化的字段
+            changes = {field: getattr(self, field) for field in self.changed_fields()}
+            if not changes:
+                return False
+            sql, params = TrackedModel.build_update('departments', changes, {'id': self.id})
+            
+            def write(cursor):
+                if 'parent_id' in changes:
+                    Department._move_subtree(cursor, self.id, self.parent_id)
+                cursor.execute(sql, params)
+                ChangeLog.record_upsert(cursor, 'department', self.id)
+            
+            Department._run_write(write)
+            hierarchy_changed = 'parent_id' in changes
         else:
             # 新增
             sql = """
             INSERT INTO departments 
-            (name, description, status)
-            VALUES (%s, %s, %s)
+            (name, parent_id, description, status)
+            VALUES (%s, %s, %s, %s)
             """
-            params = (self.name, self.description, self.status)
-            db.execute_update(sql, params)
-            # 获取新插入的ID
-            result = db.execute_query("SELECT LAST_INSERT_ID() as id")
-            if result:
-                self.id = result[0]['id']
+            params = (self.name, self.parent_id, self.description, self.status)
+            
+            def write(cursor):
+                if self.parent_id is not None:
+                    cursor.execute("SELECT id FROM departments WHERE id=%s LOCK IN SHARE MODE", (self.parent_id,))
+                    if not cursor.fetchone():
+                        raise ValueError('上级部门不存在')
+                cursor.execute(sql, params)
+                # 在同一连接上获取新插入的ID
+                self.id = cursor.lastrowid
+                # 新部门的路径：上级部门的全部路径各延长一级，加上自身
+                cursor.execute(
+                    """
+                    INSERT INTO department_closure (ancestor_id, descendant_id, depth)
+                    SELECT ancestor_id, %s, depth + 1 FROM department_closure WHERE descendant_id=%s
+                    UNION ALL
+                    SELECT %s, %s, 0
+                    """,
+                    (self.id, self.parent_id, self.id, self.id)
+                )
+                ChangeLog.record_upsert(cursor, 'department', self.id)
+            
+            Department._run_write(write)
+            hierarchy_changed = True
+        # 分片模式下同步到各分片（用户查询的关联和外键使用）
+        router.replicate('departments', self.id)
+        if hierarchy_changed:
+            router.replicate_closure()
+            department_tree.invalidate()
+        self.mark_clean()
+        return True
+    
+    @staticmethod
+    def _run_write(write):
+        """在事务中执行写入，部门名称重复时抛出 ValueError"""
+        try:
+            db.run_in_transaction(write)
+        except pymysql.err.IntegrityError as e:
+            if e.args[0] == ER_DUP_ENTRY:
+                raise ValueError('部门名称已存在') from e
+            raise
+    
+    @staticmethod
+    def _move_subtree(cursor, department_id, parent_id):
+        """在事务中把部门及其全部下级移动到 parent_id 之下（None 表示成为顶级部门）"""
+        # 锁定子树和新上级的路径：并发的移动依次执行，之后的环检查才可靠
+        cursor.execute(
+            "SELECT descendant_id FROM department_closure WHERE ancestor_id=%s FOR UPDATE",
+            (department_id,)
+        )
+        subtree = [row['descendant_id'] for row in cursor.fetchall()] or [department_id]
+        if parent_id is not None:
+            cursor.execute(
+                "SELECT ancestor_id FROM department_closure WHERE descendant_id=%s FOR UPDATE",
+                (parent_id,)
+            )
+            if not cursor.fetchall():
+                raise ValueError('上级部门不存在')
+            if parent_id in subtree:
+                raise ValueError('不能把部门移动到它自己或它的下级部门之下')
+        
+        # 去掉子树与原上级之间的路径，再与新上级的每条路径相连
+        placeholders = ', '.join(['%s'] * len(subtree))
+        cursor.execute(
+            f"""
+            DELETE FROM department_closure
+            WHERE descendant_id IN ({placeholders}) AND ancestor_id NOT IN ({placeholders})
+            """,
+            subtree + subtree
+        )
+        if parent_id is not None:
+            cursor.execute(
+                """
+                INSERT INTO department_closure (ancestor_id, descendant_id, depth)
+                SELECT p.ancestor_id, s.descendant_id, p.depth + s.depth + 1
+                FROM department_closure p
+                JOIN department_closure s ON s.ancestor_id = %s
+                WHERE p.descendant_id = %s
+                """,
+                (department_id, parent_id)
+            )
     
     @staticmethod
     def get_by_id(department_id):
         """根据ID获取部门"""
-        sql = "SELECT * FROM departments WHERE id=%s"
-        result = db.execute_query(sql, (department_id,))
-        if result:
-            return Department._from_dict(result[0])
-        return None
+        return Department._get_by('id', department_id)
     
     @staticmethod
     def get_by_name(name):
         """根据名称获取部门"""
-        sql = "SELECT * FROM departments WHERE name=%s"
-        result = db.execute_query(sql, (name,))
-        if result:
-            return Department._from_dict(result[0])
-        return None
+        return Department._get_by('name', name)
+    
+    @staticmethod
+    def _get_by(column, value):
+        """按唯一列获取部门：同一请求内相同的查找只查询一次（见 identity_map）"""
+        def load():
+            result = db.execute_query(f"SELECT * FROM departments WHERE {column}=%s", (value,))
+            return result[0] if result else None
+        
+        row = identity_map.lookup('department', column, value, load, keys=('id', 'name'))
+        return Department._from_dict(row) if row else None
     
     @staticmethod
     def get_all(status=None):
-        """获取所有部门列表"""
+        """获取所有部门列表（并发的相同查询合并为一次）"""
         where_clauses = []
         params = []
         
@@ -89,9 +187,40 @@ class Department:
         SELECT * FROM departments {where_sql}
         ORDER BY id ASC
         """
-        result = db.execute_query(sql, params)
+        result = db.execute_shared_query(sql, params, 'departments.list')
         return [Department._from_dict(row) for row in result]
     
+    @staticmethod
+    def tree_order(departments):
+        """按层级排列部门：上级在前、同级按 ID（先序遍历），返回 [(部门, 层级)]
+        
+        上级部门不在列表中（例如按状态筛选时上级已禁用）的部门作为顶级部门。
+        """
+        ids = {department.id for department in departments}
+        children = {}
+        for department in departments:
+            parent = department.parent_id if department.parent_id in ids else None
+            children.setdefault(parent, []).append(department)
+        
+        result = []
+        stack = [(department, 0) for department in reversed(children.get(None, []))]
+        while stack:
+            department, depth = stack.pop()
+            result.append((department, depth))
+            stack.extend((child, depth + 1) for child in reversed(children.get(department.id, [])))
+        return result
+    
+    @staticmethod
+    def to_tree(departments):
+        """部门列表转换为嵌套结构（每个部门的 children 为下级部门）"""
+        nodes, roots = {}, []
+        for department, depth in Department.tree_order(departments):
+            node = dict(department.to_dict(), depth=depth, children=[])
+            nodes[department.id] = node
+            parent = nodes.get(department.parent_id)
+            (parent['children'] if parent is not None else roots).append(node)
+        return roots
+    
     def delete(self):
         """删除部门（软删除，设置为禁用）"""
         self.status = 0
@@ -100,10 +229,13 @@ class Department:
     @staticmethod
     def _from_dict(data):
         """从字典创建部门对象"""
-        return Department(
+        department = Department(
             department_id=data.get('id'),
             name=data.get('name'),
+            parent_id=data.get('parent_id'),
             description=data.get('description'),
             status=data.get('status', 1)
         )
+        department.mark_clean()
+        return department
 
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+部门层级缓存
+
+部门按 parent_id 组成树（例如 公司 > 事业部 > 船舶），层级保存在闭包表 department_closure 中：
+每个部门与它自身及全部上级部门各一行。SQL 查询按闭包表做一次索引连接即可限定到子树；
+不查询数据库的路径（输入提示、内存用户目录、实时推送、分片路由、权限判断）使用本缓存：
+- 一次读取整个闭包表（部门数量有限），缓存 ttl 秒
+- 本进程修改部门层级后立即失效，其他进程的修改最多 ttl 秒后生效
+"""
+
+import threading
+import time
+
+from database import db
+
+
+class DepartmentTree:
+    """部门 ID -> 本部门及全部下级部门的 ID"""
+    
+    def __init__(self, ttl=5):
+        self.ttl = ttl
+        self._subtrees = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+    
+    def _load(self):
+        """读取闭包表（缓存 ttl 秒）"""
+        now = time.monotonic()
+        loaded_at = self._loaded_at
+        if loaded_at is not None and now - loaded_at < self.ttl:
+            return self._subtrees
+        with self._lock:
+            if self._loaded_at is None or now - self._loaded_at >= self.ttl:
+                rows = db.execute_query(
+                    "SELECT ancestor_id, descendant_id FROM department_closure", use_primary=True
+                )
+                subtrees = {}
+                for row in rows:
+                    subtrees.setdefault(row['ancestor_id'], set()).add(row['descendant_id'])
+                self._subtrees = {ancestor: frozenset(ids) for ancestor, ids in subtrees.items()}
+                self._loaded_at = time.monotonic()
+        return self._subtrees
+    
+    def invalidate(self):
+        """下次使用时重新读取"""
+        self._loaded_at = None
+    
+    def subtree(self, department_id):
+        """本部门及全部下级部门的 ID（没有部门时为空，闭包表中没有记录时只包含部门自身）"""
+        if department_id is None:
+            return frozenset()
+        return self._load().get(department_id) or frozenset((department_id,))
+    
+    def contains(self, ancestor_id, department_id):
+        """department_id 是否为 ancestor_id 本身或它的下级部门"""
+        if ancestor_id is None or department_id is None:
+            return False
+        return department_id == ancestor_id or department_id in self.subtree(ancestor_id)
+
+
+def subtree_sql(column):
+    """把 column 限定到某部门子树的条件（参数为上级部门 ID）：按闭包表主键的一次半连接"""
+    return f"{column} IN (SELECT descendant_id FROM department_closure WHERE ancestor_id=%s)"
+
+
+# 全局部门层级缓存
+tree = DepartmentTree()
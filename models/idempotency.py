@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+幂等请求记录模型
+
+客户端在写请求上携带 Idempotency-Key 请求头，首次请求先插入一条“处理中”的记录
+（主键冲突即说明该键已被使用），处理完成后保存响应；网络超时等情况下重试时
+直接返回保存的响应，不会重复执行写入。
+"""
+
+import pymysql
+
+from database import db
+
+# 处理中的记录超过该时间（秒）仍未完成，视为进程中断，允许重试接管
+STALE_RESERVATION_SECONDS = 60
+
+
+class IdempotencyKey:
+    """幂等请求记录类"""
+    
+    @staticmethod
+    def reserve(scope, key, request_hash):
+        """预留幂等键
+        
+        Returns:
+            None: 预留成功，调用方执行请求后调用 complete 或 release
+            dict: 该键已有的记录（request_hash、status_code、response）
+        """
+        try:
+            db.execute_update(
+                "INSERT INTO idempotency_keys (scope, idem_key, request_hash) VALUES (%s, %s, %s)",
+                (scope, key, request_hash)
+            )
+            return None
+        except pymysql.err.IntegrityError:
+            pass
+        
+        # 接管中断的请求留下的记录
+        taken = db.execute_update(
+            """
+            UPDATE idempotency_keys SET request_hash=%s, created_at=NOW()
+            WHERE scope=%s AND idem_key=%s AND status_code IS NULL
+              AND created_at < NOW() - INTERVAL %s SECOND
+            """,
+            (request_hash, scope, key, STALE_RESERVATION_SECONDS)
+        )
+        if taken:
+            return None
+        
+        rows = db.execute_query(
+            "SELECT request_hash, status_code, response FROM idempotency_keys WHERE scope=%s AND idem_key=%s",
+            (scope, key),
+            use_primary=True
+        )
+        if not rows:
+            # 记录刚被清理，按首次请求处理
+            return IdempotencyKey.reserve(scope, key, request_hash)
+        return rows[0]
+    
+    @staticmethod
+    def complete(scope, key, status_code, response):
+        """保存响应"""
+        db.execute_update(
+            "UPDATE idempotency_keys SET status_code=%s, response=%s WHERE scope=%s AND idem_key=%s",
+            (status_code, response, scope, key)
+        )
+    
+    @staticmethod
+    def release(scope, key):
+        """请求未能完成（服务器错误），删除预留记录，允许使用同一键重试"""
+        db.execute_update(
+            "DELETE FROM idempotency_keys WHERE scope=%s AND idem_key=%s AND status_code IS NULL",
+            (scope, key)
+        )
+    
+    @staticmethod
+    def purge(ttl=86400):
+        """清理超过保留时间的记录，返回删除的条数"""
+        return db.execute_update(
+            "DELETE FROM idempotency_keys WHERE created_at < NOW() - INTERVAL %s SECOND",
+            (ttl,)
+        )
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求内的身份映射
+
+同一请求中按唯一键查找同一条记录（例如更新用户时目标用户和当前用户是同一人，
+职位在校验和保存时各读取一次）只查询一次数据库：模型的 get_by_* 先查本映射。
+
+- 应用层在请求开始时绑定一个 IdentityMap（保存在 flask.g 上），请求结束时解绑；
+  未绑定时（脚本、后台任务）直接查询
+- 映射保存查询到的行，每次查找都由行构造新的模型对象，调用方修改未保存的字段
+  不会影响同一请求中的其他查找
+- 一行按它的全部唯一键登记（例如按用户名查到的用户，再按 ID 查找时直接命中）；
+  未找到的结果同样记录
+- 请求中发生任何写入（提交后）即清空映射
+"""
+
+from contextvars import ContextVar
+from collections import Counter
+
+from database import on_write
+
+# 当前请求的身份映射，由应用层在请求开始时绑定
+_current = ContextVar('identity_map', default=None)
+
+
+class IdentityMap:
+    """一个请求内按 (实体, 唯一键, 值) 记录的行"""
+    
+    def __init__(self):
+        self._rows = {}
+        # hits 避免的重复查询、misses 实际查询、invalidations 因写入清空
+        self.counters = Counter()
+    
+    def lookup(self, entity, field, value, load, keys=()):
+        """返回记录（dict，不存在为 None）；未记录时调用 load() 查询
+        
+        Args:
+            entity: 实体名称
+            field: 查找使用的唯一键
+            value: 唯一键的值
+            load: 查询函数，返回行或 None
+            keys: 该实体的全部唯一键，查到的行按这些键一并登记
+        """
+        key = (entity, field, value)
+        if key in self._rows:
+            self.counters['hits'] += 1
+            return self._rows[key]
+        self.counters['misses'] += 1
+        row = load()
+        self._rows[key] = row
+        if row:
+            for name in keys:
+                if row.get(name) is not None:
+                    self._rows[(entity, name, row[name])] = row
+        return row
+    
+    def clear(self):
+        if self._rows:
+            self._rows.clear()
+            self.counters['invalidations'] += 1
+
+
+def bind(identity_map):
+    """为当前请求绑定身份映射，返回用于解绑的 token"""
+    return _current.set(identity_map)
+
+
+def unbind(token):
+    _current.reset(token)
+
+
+def lookup(entity, field, value, load, keys=()):
+    """在当前请求的身份映射中查找，未绑定时直接调用 load()"""
+    identity_map = _current.get()
+    if identity_map is None:
+        return load()
+    return identity_map.lookup(entity, field, value, load, keys)
+
+
+def _invalidate():
+    identity_map = _current.get()
+    if identity_map is not None:
+        identity_map.clear()
+
+
+# 写入提交后清空当前请求的映射（包括模型之外的直接写入）
+on_write(_invalidate)
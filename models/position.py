@@ -4,17 +4,18 @@
 职位模型
 """
 
-import sys
-import os
-
-# 添加项目根目录到路径
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import db
+from models.change_log import ChangeLog
+from models.tracked import TrackedModel
+from models import identity_map
+from sharding import router
 
 
-class Position:
+class Position(TrackedModel):
     """职位模型类"""
     
+    TRACKED_FIELDS = ('name', 'role', 'description', 'status')
+    
     def __init__(self, name=None, role=None, description=None, status=1, position_id=None):
         self.id = position_id
         self.name = name
@@ -33,16 +34,19 @@ class Position:
         }
     
     def save(self):
-        """保存职位（新增或更新）"""
+        """保存职位（新增或更新），没有字段变化时不写入，返回是否写入"""
         if self.id:
-            # 更新
-            sql = """
-            UPDATE positions SET 
-                name=%s, role=%s, description=%s, status=%s
-            WHERE id=%s
-            """
-            params = (self.name, self.role, self.description, self.status, self.id)
-            db.execute_update(sql, params)
+            # 更新：只写入发生变化的字段
+            changes = {field: getattr(self, field) for field in self.changed_fields()}
+            if not changes:
+                return False
+            sql, params = TrackedModel.build_update('positions', changes, {'id': self.id})
+            
+            def write(cursor):
+                cursor.execute(sql, params)
+                ChangeLog.record_upsert(cursor, 'position', self.id)
+            
+            db.run_in_transaction(write)
         else:
             # 新增
             sql = """
@@ -51,33 +55,42 @@ class Position:
             VALUES (%s, %s, %s, %s)
             """
             params = (self.name, self.role, self.description, self.status)
-            db.execute_update(sql, params)
-            # 获取新插入的ID
-            result = db.execute_query("SELECT LAST_INSERT_ID() as id")
-            if result:
-                self.id = result[0]['id']
+            
+            def write(cursor):
+                cursor.execute(sql, params)
+                # 在同一连接上获取新插入的ID
+                self.id = cursor.lastrowid
+                ChangeLog.record_upsert(cursor, 'position', self.id)
+            
+            db.run_in_transaction(write)
+        # 分片模式下同步到各分片（用户查询的关联和外键使用）
+        router.replicate('positions', self.id)
+        self.mark_clean()
+        return True
     
     @staticmethod
     def get_by_id(position_id):
         """根据ID获取职位"""
-        sql = "SELECT * FROM positions WHERE id=%s"
-        result = db.execute_query(sql, (position_id,))
-        if result:
-            return Position._from_dict(result[0])
-        return None
+        return Position._get_by('id', position_id)
     
     @staticmethod
     def get_by_name(name):
         """根据名称获取职位"""
-        sql = "SELECT * FROM positions WHERE name=%s"
-        result = db.execute_query(sql, (name,))
-        if result:
-            return Position._from_dict(result[0])
-        return None
+        return Position._get_by('name', name)
+    
+    @staticmethod
+    def _get_by(column, value):
+        """按唯一列获取职位：同一请求内相同的查找只查询一次（见 identity_map）"""
+        def load():
+            result = db.execute_query(f"SELECT * FROM positions WHERE {column}=%s", (value,))
+            return result[0] if result else None
+        
+        row = identity_map.lookup('position', column, value, load, keys=('id', 'name'))
+        return Position._from_dict(row) if row else None
     
     @staticmethod
     def get_all(status=None):
-        """获取所有职位列表"""
+        """获取所有职位列表（并发的相同查询合并为一次）"""
         where_clauses = []
         params = []
         
@@ -91,7 +104,7 @@ class Position:
         SELECT * FROM positions {where_sql}
         ORDER BY id ASC
         """
-        result = db.execute_query(sql, params)
+        result = db.execute_shared_query(sql, params, 'positions.list')
         return [Position._from_dict(row) for row in result]
     
     def delete(self):
@@ -102,11 +115,13 @@ class Position:
     @staticmethod
     def _from_dict(data):
         """从字典创建职位对象"""
-        return Position(
+        position = Position(
             position_id=data.get('id'),
             name=data.get('name'),
             role=data.get('role'),
             description=data.get('description'),
             status=data.get('status', 1)
         )
+        position.mark_clean()
+        return position
 
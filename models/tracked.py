@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字段变更跟踪
+
+模型从数据库加载（或保存）后记录各字段的原值，保存时只更新发生变化的字段；
+没有字段变化时不执行写入。
+"""
+
+
+class VersionConflict(Exception):
+    """记录在读取之后已被其他请求修改（乐观并发控制）"""
+    
+    def __init__(self, message='数据已被其他人修改，请刷新后重试'):
+        super().__init__(message)
+
+
+class TrackedModel:
+    """记录自加载以来被修改的字段"""
+    
+    # 参与跟踪的字段（与数据表列名一致）
+    TRACKED_FIELDS = ()
+    
+    def mark_clean(self):
+        """记录当前值为原值（加载或保存后调用）"""
+        self._original = {field: getattr(self, field) for field in self.TRACKED_FIELDS}
+    
+    def changed_fields(self):
+        """返回发生变化的字段；未加载过的对象（新建）返回全部字段"""
+        original = getattr(self, '_original', None)
+        if original is None:
+            return list(self.TRACKED_FIELDS)
+        return [field for field in self.TRACKED_FIELDS if getattr(self, field) != original[field]]
+    
+    @staticmethod
+    def build_update(table, changes, where):
+        """生成只包含变化字段的 UPDATE 语句
+        
+        Args:
+            table: 表名
+            changes: 列名 -> 新值
+            where: 条件列名 -> 值
+        """
+        assignments = ', '.join(f"{column}=%s" for column in changes)
+        conditions = ' AND '.join(f"{column}=%s" for column in where)
+        sql = f"UPDATE {table} SET {assignments} WHERE {conditions}"
+        return sql, tuple(changes.values()) + tuple(where.values())
@@ -2,24 +2,84 @@
 # -*- coding: utf-8 -*-
 """
 用户模型
+
+长期停用的用户由后台任务移入归档表 users_archive（冷数据），用户表只保留在用的用户：
+- 按 ID、用户名、工号查找时用户表中没有再查归档表，得到的用户 archived 为 True
+- 列表和搜索默认不包含归档用户，include_archived=True 时同时查询两张表
+- 用户名和工号在两张表之间同样唯一（分片模式下由用户目录保证）
+- 修改归档的用户（包括重新启用）时在同一事务中先移回用户表
+- 统计只包含用户表中的用户，归档时扣除、恢复时加回
 """
 
 import hashlib
-import sys
-import os
+import re
+from collections import Counter
+
+import pymysql
 
-# 添加项目根目录到路径
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import db
+from models.user_stats import UserStats
+from models.change_log import ChangeLog
+from models.tracked import TrackedModel, VersionConflict
+from models import identity_map
+from models.department_tree import tree as department_tree, subtree_sql
+from sharding import router, upsert_rows, VISIBLE_USERS_SQL
+from directory_engine import engine as directory_engine
+from suggest_index import index as suggest_index, SUGGEST_FIELDS
+
+# 唯一键冲突时对应的字段和提示（键名与建表语句中的 UNIQUE 列一致）
+UNIQUE_FIELDS = {
+    'username': '用户名已存在',
+    'employee_id': '工号已存在'
+}
+# 按工号新增或更新时可修改的字段
+UPSERT_FIELDS = ('username', 'password', 'real_name', 'email', 'phone',
+                 'department_id', 'position_id', 'status')
+
+# 用户表和归档表共有的列（归档、恢复时整行复制）
+ARCHIVE_COLUMNS = ('id', 'username', 'password', 'real_name', 'email', 'phone', 'department_id',
+                   'position_id', 'employee_id', 'status', 'role', 'created_at', 'updated_at')
+# 列表查询读取的列
+LIST_COLUMNS = ('id', 'username', 'real_name', 'email', 'phone', 'department_id', 'position_id',
+                'employee_id', 'status', 'role', 'created_at', 'updated_at')
+
+# MySQL 1062 错误信息中的键名：8.0.19 起为 'users.username'，之前为 'username'
+_DUPLICATE_KEY_RE = re.compile(r"for key '(?:[^'.]+\.)?([^']+)'")
+ER_DUP_ENTRY = 1062
+
+
+class DuplicateUserError(ValueError):
+    """用户名或工号与其他用户重复"""
+    
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+
+
+def as_duplicate_error(error):
+    """把唯一键冲突转换为对应字段的 DuplicateUserError，其他错误原样返回"""
+    if not isinstance(error, pymysql.err.IntegrityError) or error.args[0] != ER_DUP_ENTRY:
+        return error
+    match = _DUPLICATE_KEY_RE.search(str(error.args[1]))
+    field = match.group(1) if match else None
+    if field not in UNIQUE_FIELDS:
+        return error
+    return DuplicateUserError(field, UNIQUE_FIELDS[field])
 
 
-class User:
+class User(TrackedModel):
     """用户模型类"""
     
+    TRACKED_FIELDS = ('username', 'password', 'real_name', 'email', 'phone',
+                      'department_id', 'position_id', 'employee_id', 'status', 'role')
+    
+    # 写入前锁定原记录并读取统计维度和版本
+    _STATS_BEFORE_SQL = "SELECT department_id, position_id, role, status, updated_at FROM users WHERE id=%s FOR UPDATE"
+    
     def __init__(self, username=None, password=None, real_name=None, 
                  email=None, phone=None, department_id=None, position_id=None,
                  employee_id=None, status=1, role='user', user_id=None,
-                 department_name=None, position_name=None):
+                 department_name=None, position_name=None, updated_at=None, archived=False):
         self.id = user_id
         self.username = username
         self.password = password
@@ -33,6 +93,9 @@ class User:
         self.role = role or 'user'
         self.department = department_name
         self.position = position_name
+        self.updated_at = updated_at
+        # 是否在归档表中（保存时先恢复到用户表）
+        self.archived = archived
     
     @staticmethod
     def hash_password(password):
@@ -44,6 +107,15 @@ class User:
         """验证密码"""
         return User.hash_password(password) == hashed
     
+    @staticmethod
+    def version_of(updated_at):
+        """由更新时间生成版本号（用作 ETag / If-Match）"""
+        return updated_at.strftime('%Y%m%d%H%M%S%f') if updated_at else None
+    
+    @property
+    def version(self):
+        return User.version_of(self.updated_at)
+    
     def to_dict(self, exclude_password=True):
         """转换为字典"""
         data = {
@@ -58,129 +130,462 @@ class User:
             'position': getattr(self, 'position', None),
             'employee_id': self.employee_id,
             'status': self.status,
-            'role': self.role
+            'role': self.role,
+            'archived': self.archived
         }
         if not exclude_password:
             data['password'] = self.password
         return data
     
-    def save(self):
-        """保存用户（新增或更新）"""
-        # 如果提供了position_id，根据职位更新角色
-        if self.position_id:
+    def save(self, expected_version=None):
+        """保存用户（新增或更新）
+        
+        更新时只写入加载后发生变化的字段，没有变化时不执行写入；
+        职位变化时才根据职位重新设置角色。归档的用户在同一事务中先恢复到用户表。
+        
+        Args:
+            expected_version: 客户端读取时的版本（If-Match），与当前版本不一致时抛出 VersionConflict
+        
+        Returns:
+            bool: 是否执行了写入
+        """
+        changed = self.changed_fields()
+        # 新增或职位变化时根据职位设置角色
+        if self.position_id and (not self.id or 'position_id' in changed):
             from models.position import Position
             pos = Position.get_by_id(self.position_id)
             if pos:
                 self.role = pos.role
+                changed = self.changed_fields()
         
         if self.id:
             # 更新
-            sql = """
-            UPDATE users SET 
-                username=%s, real_name=%s, email=%s, phone=%s,
-                department_id=%s, position_id=%s, employee_id=%s,
-                status=%s, role=%s
-            WHERE id=%s
-            """
-            params = (
-                self.username, self.real_name, self.email, self.phone,
-                self.department_id, self.position_id, self.employee_id,
-                self.status, self.role, self.id
-            )
-            if self.password:
-                sql = """
-                UPDATE users SET 
-                    username=%s, password=%s, real_name=%s, email=%s, phone=%s,
-                    department_id=%s, position_id=%s, employee_id=%s,
-                    status=%s, role=%s
-                WHERE id=%s
-                """
-                params = (
-                    self.username, User.hash_password(self.password),
-                    self.real_name, self.email, self.phone,
-                    self.department_id, self.position_id, self.employee_id,
-                    self.status, self.role, self.id
-                )
-            db.execute_update(sql, params)
+            changes = {field: getattr(self, field) for field in changed}
+            # 加载得到的是加密后的密码，只有设置了新密码才写入
+            if 'password' in changes:
+                if changes['password']:
+                    changes['password'] = User.hash_password(changes['password'])
+                else:
+                    del changes['password']
+            if not changes and expected_version is None:
+                return False
+            
+            try:
+                if router.enabled:
+                    written = self._update_sharded(changes, expected_version)
+                else:
+                    written = db.run_in_transaction(
+                        lambda cursor: self._write_update(cursor, changes, expected_version)
+                    )
+            except pymysql.err.IntegrityError as e:
+                raise as_duplicate_error(e) from e
+            if not written:
+                return False
         else:
             # 新增
             if not self.password:
                 raise ValueError("新用户必须设置密码")
-            
-            sql = """
-            INSERT INTO users 
-            (username, password, real_name, email, phone, department_id, position_id, employee_id, status, role)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            params = (
-                self.username, User.hash_password(self.password),
-                self.real_name, self.email, self.phone,
-                self.department_id, self.position_id, self.employee_id,
-                self.status, self.role
-            )
+            self._insert(User.hash_password(self.password))
+        self.archived = False
+        self._sync_memory_indexes()
+        self.mark_clean()
+        return True
+    
+    def _write_update(self, cursor, changes, expected_version):
+        """在事务中更新用户所在分片上的记录，返回是否执行了写入"""
+        # 锁定原记录，取得更新前的统计维度和版本（已归档时先恢复）
+        cursor.execute(User._STATS_BEFORE_SQL, (self.id,))
+        before = cursor.fetchone()
+        if not before and User._restore(cursor, self.id):
+            cursor.execute(User._STATS_BEFORE_SQL, (self.id,))
+            before = cursor.fetchone()
+        if before and expected_version is not None \
+                and User.version_of(before['updated_at']) != expected_version:
+            raise VersionConflict('用户已被其他人修改，请刷新后重试')
+        if not changes or not before:
+            return False
+        router.guard(cursor, before['department_id'])
+        if 'department_id' in changes:
+            router.guard(cursor, self.department_id)
+        if not router.enabled:
+            User._check_archive_unique(cursor, changes, self.id)
+        sql, params = TrackedModel.build_update('users', changes, {'id': self.id})
+        cursor.execute(sql, params)
+        UserStats.apply_change(cursor, before, self._stat_values())
+        ChangeLog.record_upsert(cursor, 'user', self.id, before['department_id'])
+        cursor.execute("SELECT updated_at FROM users WHERE id=%s", (self.id,))
+        row = cursor.fetchone()
+        self.updated_at = row['updated_at'] if row else None
+        return True
+    
+    def _update_sharded(self, changes, expected_version):
+        """分片模式下的更新：先在用户目录占用新的用户名、工号，再写入分片
+        
+        部门调整到其他分片的部门时，记录从原分片移到目标分片；分片写入失败时恢复用户目录。
+        """
+        router.prepare()
+        rows = db.execute_query(
+            "SELECT username, employee_id, department_id FROM user_directory WHERE id=%s",
+            (self.id,),
+            use_primary=True
+        )
+        if not rows:
+            return False
+        entry = rows[0]
+        directory_changes = {
+            column: changes[column] for column in ('username', 'employee_id', 'department_id')
+            if column in changes
+        }
+        if directory_changes:
+            sql, params = TrackedModel.build_update('user_directory', directory_changes, {'id': self.id})
             db.execute_update(sql, params)
-            # 获取新插入的ID
-            result = db.execute_query("SELECT LAST_INSERT_ID() as id")
-            if result:
-                self.id = result[0]['id']
+        
+        written = False
+        try:
+            source = router.shard_for(entry['department_id'])
+            target = router.shard_for(self.department_id)
+            if source is target:
+                written = source.run_in_transaction(
+                    lambda cursor: self._write_update(cursor, changes, expected_version)
+                )
+            else:
+                written = source.run_in_transaction(
+                    lambda cursor: self._write_relocate(cursor, target, changes, expected_version)
+                )
+        finally:
+            if directory_changes and not written:
+                sql, params = TrackedModel.build_update(
+                    'user_directory', {column: entry[column] for column in directory_changes}, {'id': self.id}
+                )
+                db.execute_update(sql, params)
+        return written
+    
+    def _write_relocate(self, cursor, target, changes, expected_version):
+        """在原分片的事务中把用户移到目标分片：先写入目标分片并提交，再删除原记录"""
+        cursor.execute("SELECT * FROM users WHERE id=%s FOR UPDATE", (self.id,))
+        row = cursor.fetchone()
+        if not row and User._restore(cursor, self.id):
+            cursor.execute("SELECT * FROM users WHERE id=%s FOR UPDATE", (self.id,))
+            row = cursor.fetchone()
+        if row and expected_version is not None \
+                and User.version_of(row['updated_at']) != expected_version:
+            raise VersionConflict('用户已被其他人修改，请刷新后重试')
+        if not row:
+            return False
+        router.guard(cursor, row['department_id'])
+        before = {key: row[key] for key in ('department_id', 'position_id', 'role', 'status')}
+        row.update(changes)
+        # 目标分片写入时生成新的版本
+        del row['updated_at']
+        
+        def insert(target_cursor):
+            router.guard(target_cursor, self.department_id)
+            # 原分片事务重试时目标分片上已有该记录
+            target_cursor.execute(User._STATS_BEFORE_SQL, (self.id,))
+            existing = target_cursor.fetchone()
+            upsert_rows(target_cursor, 'users', [row])
+            UserStats.apply_change(target_cursor, existing, self._stat_values())
+            ChangeLog.record_upsert(target_cursor, 'user', self.id, before['department_id'])
+            target_cursor.execute("SELECT updated_at FROM users WHERE id=%s", (self.id,))
+            return target_cursor.fetchone()['updated_at']
+        
+        self.updated_at = target.run_in_transaction(insert)
+        cursor.execute("DELETE FROM users WHERE id=%s", (self.id,))
+        UserStats.apply_change(cursor, before, None)
+        ChangeLog.record_move(cursor, 'user', self.id, target.shard_name, before['department_id'])
+        return True
+    
+    def _insert(self, hashed_password):
+        """插入新用户（分片模式下先在用户目录分配 ID，并占用用户名和工号）"""
+        columns = ['username', 'password', 'real_name', 'email', 'phone',
+                   'department_id', 'position_id', 'employee_id', 'status', 'role']
+        values = [
+            self.username, hashed_password,
+            self.real_name, self.email, self.phone,
+            self.department_id, self.position_id, self.employee_id,
+            self.status, self.role
+        ]
+        database, user_id = db, None
+        if router.enabled:
+            router.prepare()
+            try:
+                user_id = db.execute_insert(
+                    "INSERT INTO user_directory (username, employee_id, department_id) VALUES (%s, %s, %s)",
+                    (self.username, self.employee_id, self.department_id)
+                )
+            except pymysql.err.IntegrityError as e:
+                raise as_duplicate_error(e) from e
+            columns.insert(0, 'id')
+            values.insert(0, user_id)
+            database = router.shard_for(self.department_id)
+        
+        sql = f"""
+        INSERT INTO users
+        ({', '.join(columns)})
+        VALUES ({', '.join(['%s'] * len(columns))})
+        """
+        
+        def write(cursor):
+            router.guard(cursor, self.department_id)
+            if not router.enabled:
+                User._check_archive_unique(cursor, {'username': self.username, 'employee_id': self.employee_id})
+            cursor.execute(sql, values)
+            # 在同一连接上获取新插入的ID
+            self.id = user_id or cursor.lastrowid
+            UserStats.apply_change(cursor, None, self._stat_values())
+            ChangeLog.record_upsert(cursor, 'user', self.id)
+        
+        try:
+            database.run_in_transaction(write)
+        except Exception as e:
+            if user_id:
+                # 分片写入失败，释放用户目录中占用的用户名和工号
+                db.execute_update("DELETE FROM user_directory WHERE id=%s", (user_id,))
+                self.id = None
+            if isinstance(e, pymysql.err.IntegrityError):
+                raise as_duplicate_error(e) from e
+            raise
+        self.password = hashed_password
+    
+    def upsert_by_employee_id(self, fields):
+        """按工号新增或更新用户（一条 INSERT ... ON DUPLICATE KEY UPDATE）
+        
+        工号不存在时新增（未提供密码的新用户无法登录，需管理员设置密码）；
+        已存在时只修改 fields 中列出的字段（已归档的用户先恢复到用户表）。用户名与其他用户冲突时不会修改那个用户：
+        每个赋值都以“冲突行的工号等于本次工号”为条件。
+        
+        Args:
+            fields: 更新已有用户时要修改的字段（UPSERT_FIELDS 的子集）
+        
+        Returns:
+            bool: True 表示新增，False 表示更新（或数据无变化）
+        
+        Raises:
+            DuplicateUserError: 用户名已被其他用户使用
+        """
+        if not self.employee_id:
+            raise ValueError("工号不能为空")
+        fields = [f for f in UPSERT_FIELDS if f in fields]
+        if 'password' in fields and not self.password:
+            fields.remove('password')
+        if self.position_id:
+            from models.position import Position
+            pos = Position.get_by_id(self.position_id)
+            if pos:
+                self.role = pos.role
+        if 'position_id' in fields:
+            # 角色由职位决定
+            fields.append('role')
+        if router.enabled:
+            return self._upsert_sharded(fields)
+        
+        guard = "employee_id <=> VALUES(employee_id)"
+        assignments = [f"{f} = IF({guard}, VALUES({f}), {f})" for f in fields]
+        # 没有可修改的字段时仍需要一个赋值
+        assignments = assignments or ["employee_id = employee_id"]
+        sql = f"""
+        INSERT INTO users
+        (username, password, real_name, email, phone, department_id, position_id, employee_id, status, role)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE {', '.join(assignments)}
+        """
+        params = (
+            self.username, User.hash_password(self.password) if self.password else '',
+            self.real_name, self.email, self.phone,
+            self.department_id, self.position_id, self.employee_id,
+            self.status, self.role
+        )
+        
+        def write(cursor):
+            # 工号属于已归档的用户时先恢复，用户名不能与其他归档用户重复
+            cursor.execute("SELECT id FROM users_archive WHERE employee_id=%s FOR UPDATE", (self.employee_id,))
+            archived = cursor.fetchone()
+            if archived:
+                User._restore(cursor, archived['id'])
+            User._check_archive_unique(cursor, {'username': self.username})
+            # 锁定同工号的记录，取得更新前的统计维度
+            cursor.execute(
+                "SELECT id, department_id, position_id, role, status FROM users WHERE employee_id=%s FOR UPDATE",
+                (self.employee_id,)
+            )
+            before = cursor.fetchone()
+            cursor.execute(sql, params)
+            # 影响行数：1-新增，2-更新，0-无变化或与其他用户的用户名冲突（未提供 CLIENT.FOUND_ROWS）
+            affected = cursor.rowcount
+            if affected == 1:
+                self.id = cursor.lastrowid
+                UserStats.apply_change(cursor, None, self._stat_values())
+                ChangeLog.record_upsert(cursor, 'user', self.id)
+                return True
+            if not affected:
+                # 冲突行可能是同用户名的其他用户（条件不成立，未做修改）
+                cursor.execute("SELECT id FROM users WHERE username=%s", (self.username,))
+                owner = cursor.fetchone()
+                if not before or (owner and owner['id'] != before['id']):
+                    raise DuplicateUserError('username', UNIQUE_FIELDS['username'])
+            self.id = before['id']
+            if affected:
+                after = {
+                    key: getattr(self, key) if key in fields else before[key]
+                    for key in ('department_id', 'position_id', 'role', 'status')
+                }
+                UserStats.apply_change(cursor, before, after)
+                ChangeLog.record_upsert(cursor, 'user', self.id, before['department_id'])
+            return False
+        
+        try:
+            created = db.run_in_transaction(write)
+        except pymysql.err.IntegrityError as e:
+            raise as_duplicate_error(e) from e
+        self._sync_memory_indexes()
+        return created
+    
+    def _upsert_sharded(self, fields):
+        """分片模式下按工号新增或更新：用户目录保证工号唯一，已有用户按字段更新"""
+        existing = User.get_by_employee_id(self.employee_id)
+        if existing is None:
+            try:
+                self._insert(User.hash_password(self.password) if self.password else '')
+                return True
+            except DuplicateUserError as e:
+                # 同一工号被并发创建，按更新处理
+                if e.field != 'employee_id':
+                    raise
+                existing = User.get_by_employee_id(self.employee_id)
+                if existing is None:
+                    raise
+        for field in fields:
+            setattr(existing, field, getattr(self, field))
+        existing.save()
+        self.id = existing.id
+        return False
+    
+    def _sync_memory_indexes(self):
+        """写入后让内存目录重新读取该用户，输入提示索引同步所在分片的变更"""
+        if directory_engine.loaded or suggest_index.loaded:
+            database = User._shard_of('id', self.id)
+            if directory_engine.loaded:
+                directory_engine.refresh_user(self.id, database)
+            suggest_index.sync_after_write(database)
+    
+    @staticmethod
+    def _restore(cursor, user_id):
+        """在事务中把归档的用户移回用户表（统计加回），返回是否恢复"""
+        cursor.execute(
+            "SELECT department_id, position_id, role, status FROM users_archive WHERE id=%s FOR UPDATE",
+            (user_id,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return False
+        router.guard(cursor, row['department_id'])
+        columns = ', '.join(ARCHIVE_COLUMNS)
+        cursor.execute(f"INSERT INTO users ({columns}) SELECT {columns} FROM users_archive WHERE id=%s", (user_id,))
+        cursor.execute("DELETE FROM users_archive WHERE id=%s", (user_id,))
+        UserStats.apply_change(cursor, None, row)
+        return True
+    
+    @staticmethod
+    def _check_archive_unique(cursor, values, exclude_id=None):
+        """用户名、工号不能与归档用户重复（加锁读取，与并发的归档互斥）"""
+        for field in UNIQUE_FIELDS:
+            if values.get(field) is None:
+                continue
+            cursor.execute(f"SELECT id FROM users_archive WHERE {field}=%s FOR UPDATE", (values[field],))
+            row = cursor.fetchone()
+            if row and row['id'] != exclude_id:
+                raise DuplicateUserError(field, UNIQUE_FIELDS[field])
+    
+    def _stat_values(self):
+        """当前对象的统计维度"""
+        return {
+            'department_id': self.department_id,
+            'position_id': self.position_id,
+            'role': self.role,
+            'status': self.status
+        }
+    
+    @staticmethod
+    def _shard_of(column, value):
+        """用户所在的分片：未分片时为 db；分片模式下按用户目录中的部门路由，用户不存在时返回 None"""
+        if not router.enabled:
+            return db
+        router.prepare()
+        rows = db.execute_query(f"SELECT department_id FROM user_directory WHERE {column}=%s", (value,))
+        return router.shard_for(rows[0]['department_id']) if rows else None
     
     @staticmethod
     def get_by_id(user_id):
         """根据ID获取用户（带关联查询）"""
-        sql = """
-        SELECT u.*, d.name as department_name, p.name as position_name, p.role as position_role
-        FROM users u
-        LEFT JOIN departments d ON u.department_id = d.id
-        LEFT JOIN positions p ON u.position_id = p.id
-        WHERE u.id=%s
-        """
-        result = db.execute_query(sql, (user_id,))
-        if result:
-            return User._from_dict(result[0])
-        return None
+        return User._get_by('id', user_id)
     
     @staticmethod
     def get_by_username(username):
         """根据用户名获取用户（带关联查询）"""
-        sql = """
-        SELECT u.*, d.name as department_name, p.name as position_name, p.role as position_role
-        FROM users u
-        LEFT JOIN departments d ON u.department_id = d.id
-        LEFT JOIN positions p ON u.position_id = p.id
-        WHERE u.username=%s
-        """
-        result = db.execute_query(sql, (username,))
-        if result:
-            return User._from_dict(result[0])
-        return None
+        return User._get_by('username', username)
     
     @staticmethod
     def get_by_employee_id(employee_id):
         """根据工号获取用户（带关联查询）"""
-        sql = """
-        SELECT u.*, d.name as department_name, p.name as position_name, p.role as position_role
-        FROM users u
-        LEFT JOIN departments d ON u.department_id = d.id
-        LEFT JOIN positions p ON u.position_id = p.id
-        WHERE u.employee_id=%s
-        """
-        result = db.execute_query(sql, (employee_id,))
-        if result:
-            return User._from_dict(result[0])
-        return None
+        return User._get_by('employee_id', employee_id)
+    
+    @staticmethod
+    def _get_by(column, value):
+        """按唯一列获取用户，用户表中没有时查找归档表：同一请求内相同的查找只查询一次（见 identity_map）"""
+        def load():
+            database = User._shard_of(column, value)
+            if database is None:
+                return None
+            for table, archived in (('users', 0), ('users_archive', 1)):
+                sql = f"""
+                SELECT u.*, {archived} as archived,
+                       d.name as department_name, p.name as position_name, p.role as position_role
+                FROM {table} u
+                LEFT JOIN departments d ON u.department_id = d.id
+                LEFT JOIN positions p ON u.position_id = p.id
+                WHERE u.{column}=%s
+                """
+                result = database.execute_query(sql, (value,))
+                if result:
+                    return result[0]
+            return None
+        
+        row = identity_map.lookup('user', column, value, load, keys=('id', 'username', 'employee_id'))
+        return User._from_dict(row) if row else None
     
     @staticmethod
-    def get_all(page=1, page_size=20, status=None, department_id=None, keyword=None, user_department_id=None, user_role='user'):
-        """获取用户列表（分页，支持部门和角色过滤，带关联查询）"""
+    def get_all(page=1, page_size=20, status=None, department_id=None, keyword=None, user_department_id=None,
+                user_role='user', before_id=None, include_archived=False, include_subdepartments=False):
+        """获取用户列表（分页，支持部门和角色过滤，带关联查询）
+        
+        内存目录（directory_engine）可用时直接由内存回答，否则查询数据库；
+        包含归档用户时总是查询数据库（用户表和归档表的合集）。
+        管理员和普通用户可以查看本部门及下级部门的用户（按部门闭包表连接）。
+        涉及的部门都在一个分片上时只查询该分片；分片模式下的跨分片查询（例如超级管理员）
+        并行查询所有分片后按 id 倒序归并。
+        
+        Args:
+            before_id: 键集分页游标（上一页最后一个用户的 id），提供时忽略 page，返回 id 更小的一页；
+                       跨分片查询时每个分片只需读取一页，深分页应使用游标
+            include_archived: 是否包含已归档的用户
+            include_subdepartments: department_id 筛选是否包含下级部门
+        """
         where_clauses = []
         params = []
+        # 每个部门条件允许的部门（用于选择分片，为空表示不限部门）
+        scopes = []
         
         if status is not None:
             where_clauses.append("u.status=%s")
             params.append(status)
         
         if department_id:
-            where_clauses.append("u.department_id=%s")
+            if include_subdepartments:
+                where_clauses.append(subtree_sql("u.department_id"))
+                scopes.append(department_tree.subtree(department_id))
+            else:
+                where_clauses.append("u.department_id=%s")
+                scopes.append({department_id})
             params.append(department_id)
         
         if keyword:
@@ -188,60 +593,231 @@ class User:
             keyword_pattern = f"%{keyword}%"
             params.extend([keyword_pattern, keyword_pattern, keyword_pattern])
         
-        # 基于部门的权限过滤：管理员和普通用户只能查看本部门的用户
+        # 基于部门的权限过滤：管理员和普通用户只能查看本部门及下级部门的用户
         if user_role in ['admin', 'user']:
             if user_department_id:
-                where_clauses.append("u.department_id=%s")
+                where_clauses.append(subtree_sql("u.department_id"))
                 params.append(user_department_id)
+                scopes.append(department_tree.subtree(user_department_id))
             else:
                 # 没有部门的用户（注册用户）看不到任何用户
                 where_clauses.append("1=0")  # 永远不匹配任何记录
+                scopes.append({None})
         
-        where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        offset = 0 if before_id else (page - 1) * page_size
+        served = None
+        if not include_archived:
+            served = directory_engine.query(status, department_id, keyword, user_department_id, user_role,
+                                            before_id, offset, page_size, include_subdepartments)
+        source = User._list_source(include_archived)
+        database = router.shard_for_departments(set.intersection(*map(set, scopes))) if scopes else None
+        if served is not None:
+            total, result = served
+        elif not router.enabled or database is not None:
+            database = database or db
+            total = User._count(database, where_clauses, params, source)
+            result = User._fetch_page(database, where_clauses, params, before_id, page_size, offset, source)
+        else:
+            # 跨分片：每个分片取前 offset + page_size 条，归并后截取
+            where_clauses.append(VISIBLE_USERS_SQL)
+            
+            def query(database):
+                return (
+                    User._count(database, where_clauses, params, source),
+                    User._fetch_page(database, where_clauses, params, before_id, offset + page_size, 0, source)
+                )
+            results = router.scatter(query)
+            total = sum(count for count, _ in results)
+            result = router.merge_by_id_desc([rows for _, rows in results])[offset:offset + page_size]
         
-        # 获取总数
+        users = [User._from_dict(row) for row in result]
+        return {
+            'users': users,
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'total_pages': (total + page_size - 1) // page_size,
+            'next_cursor': users[-1].id if len(users) == page_size else None
+        }
+    
+    @staticmethod
+    def _list_source(include_archived):
+        """列表查询的来源：用户表，或用户表与归档表的合集（归档的行 archived 为 1）"""
+        if not include_archived:
+            return "users"
+        columns = ', '.join(LIST_COLUMNS)
+        return f"""(
+            SELECT {columns}, 0 AS archived FROM users
+            UNION ALL
+            SELECT {columns}, 1 AS archived FROM users_archive
+        )"""
+    
+    @staticmethod
+    def _count(database, where_clauses, params, source="users"):
+        """统计符合条件的用户数（并发的相同统计合并为一次）"""
+        where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
         count_sql = f"""
         SELECT COUNT(*) as total 
-        FROM users u {where_sql}
+        FROM {source} u {where_sql}
         """
-        total_result = db.execute_query(count_sql, params)
-        total = total_result[0]['total'] if total_result else 0
-        
-        # 获取分页数据
-        offset = (page - 1) * page_size
+        total_result = database.execute_shared_query(count_sql, params, 'users.count')
+        return total_result[0]['total'] if total_result else 0
+    
+    @staticmethod
+    def _fetch_page(database, where_clauses, params, before_id, limit, offset, source="users"):
+        """按 id 倒序查询一页用户（before_id 为键集分页游标；并发的相同查询合并为一次）"""
+        clauses, page_params = list(where_clauses), list(params)
+        if before_id:
+            clauses.append("u.id < %s")
+            page_params.append(before_id)
+        where_sql = " WHERE " + " AND ".join(clauses) if clauses else ""
+        archived = "u.archived" if source != "users" else "0 as archived"
         sql = f"""
         SELECT u.id, u.username, u.real_name, u.email, u.phone, 
                u.department_id, u.position_id, u.employee_id, u.status, u.role,
-               u.created_at, u.updated_at,
+               u.created_at, u.updated_at, {archived},
                d.name as department_name, p.name as position_name, p.role as position_role
-        FROM users u
+        FROM {source} u
         LEFT JOIN departments d ON u.department_id = d.id
         LEFT JOIN positions p ON u.position_id = p.id
         {where_sql}
         ORDER BY u.id DESC
         LIMIT %s OFFSET %s
         """
-        params.extend([page_size, offset])
-        result = db.execute_query(sql, params)
+        return database.execute_shared_query(sql, page_params + [limit, offset], 'users.page')
+    
+    @staticmethod
+    def suggest(prefix, limit=10, user_department_id=None, user_role='user'):
+        """按前缀提示用户（用户名、工号、姓名，不区分大小写）
         
-        users = [User._from_dict(row) for row in result]
-        return {
-            'users': users,
-            'total': total,
-            'page': page,
-            'page_size': page_size,
-            'total_pages': (total + page_size - 1) // page_size
-        }
+        输入提示索引已加载时由内存回答（支持拼音全拼和首字母），否则按前缀查询数据库。
+        
+        Returns:
+            list: 用户字典（id、username、real_name、employee_id、department_id、status）
+        """
+        # 基于部门的权限过滤：管理员和普通用户只能查看本部门及下级部门的用户，没有部门时看不到任何用户
+        scope = None
+        if user_role in ['admin', 'user']:
+            if not user_department_id:
+                return []
+            scope = department_tree.subtree(user_department_id)
+        
+        served = suggest_index.query(prefix, scope, limit)
+        if served is not None:
+            return served
+        
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        where_clauses = ["(u.username LIKE %s OR u.employee_id LIKE %s OR u.real_name LIKE %s)"]
+        params = [pattern, pattern, pattern]
+        database = None if router.enabled else db
+        if scope:
+            where_clauses.append(subtree_sql("u.department_id"))
+            params.append(user_department_id)
+            database = router.shard_for_departments(scope)
+        if router.enabled and database is None:
+            where_clauses.append(VISIBLE_USERS_SQL)
+        sql = f"""
+        SELECT {', '.join('u.' + field for field in SUGGEST_FIELDS)}
+        FROM users u
+        WHERE {' AND '.join(where_clauses)}
+        ORDER BY u.username
+        LIMIT %s
+        """
+        if database is not None:
+            return database.execute_query(sql, params + [limit])
+        # 跨分片：每个分片取前 limit 条，合并后截取
+        results = router.scatter(lambda database: database.execute_query(sql, params + [limit]))
+        return sorted((row for rows in results for row in rows), key=lambda row: row['username'])[:limit]
     
     def delete(self):
-        """删除用户（彻底删除，从数据库中删除记录）"""
-        sql = "DELETE FROM users WHERE id=%s"
-        db.execute_update(sql, (self.id,))
+        """删除用户（彻底删除，从数据库中删除记录，包括已归档的用户）"""
+        def write(cursor):
+            cursor.execute(User._STATS_BEFORE_SQL, (self.id,))
+            before = cursor.fetchone()
+            if before:
+                router.guard(cursor, before['department_id'])
+                cursor.execute("DELETE FROM users WHERE id=%s", (self.id,))
+                UserStats.apply_change(cursor, before, None)
+                ChangeLog.record_delete(cursor, 'user', self.id, before['department_id'])
+                return
+            cursor.execute("SELECT department_id FROM users_archive WHERE id=%s FOR UPDATE", (self.id,))
+            archived = cursor.fetchone()
+            if archived:
+                router.guard(cursor, archived['department_id'])
+                cursor.execute("DELETE FROM users_archive WHERE id=%s", (self.id,))
+                ChangeLog.record_delete(cursor, 'user', self.id, archived['department_id'])
+        
+        database = User._shard_of('id', self.id)
+        if database is None:
+            return
+        database.run_in_transaction(write)
+        if router.enabled:
+            db.execute_update("DELETE FROM user_directory WHERE id=%s", (self.id,))
+        directory_engine.remove_user(self.id)
+        suggest_index.sync_after_write(database)
+    
+    @staticmethod
+    def archive_disabled(disabled_days=180, batch_size=500):
+        """把停用超过 disabled_days 天的用户分批移入归档表（各分片依次执行），返回归档的用户数
+        
+        停用时长按 updated_at 计算（停用后再有任何修改都会重新计时）。每批一个事务：
+        正在被修改的用户（行已锁定）和正在迁移分片的部门的用户本次跳过。
+        """
+        total = 0
+        for database in router.databases():
+            after_id = 0
+            while after_id is not None:
+                user_ids, after_id = database.run_in_transaction(
+                    lambda cursor: User._archive_batch(cursor, disabled_days, batch_size, after_id)
+                )
+                total += len(user_ids)
+                for user_id in user_ids:
+                    directory_engine.remove_user(user_id)
+            suggest_index.sync_after_write(database)
+        return total
+    
+    @staticmethod
+    def _archive_batch(cursor, disabled_days, batch_size, after_id):
+        """在事务中归档 id 大于 after_id 的一批用户，返回 (归档的用户 ID, 下一批的起点，没有更多时为 None)"""
+        cursor.execute(
+            """
+            SELECT id, department_id, position_id, role, status FROM users
+            WHERE status=0 AND updated_at < NOW(3) - INTERVAL %s DAY AND id > %s
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+            """,
+            (disabled_days, after_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return [], None
+        next_id = rows[-1]['id'] if len(rows) == batch_size else None
+        migrating = router.migrating_departments(cursor, {row['department_id'] for row in rows})
+        rows = [row for row in rows if row['department_id'] not in migrating]
+        if not rows:
+            return [], next_id
+        
+        user_ids = [row['id'] for row in rows]
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        columns = ', '.join(ARCHIVE_COLUMNS)
+        # 先写入归档表再删除：并发新增的用户名、工号检查（锁定读取归档表）总能看到其中一张表
+        cursor.execute(
+            f"INSERT INTO users_archive ({columns}) SELECT {columns} FROM users WHERE id IN ({placeholders})",
+            user_ids
+        )
+        cursor.execute(f"DELETE FROM users WHERE id IN ({placeholders})", user_ids)
+        deltas = Counter()
+        for row in rows:
+            deltas[UserStats.key_of(row)] -= 1
+        UserStats.apply_deltas(cursor, deltas)
+        ChangeLog.record_archive(cursor, user_ids)
+        return user_ids, next_id
     
     @staticmethod
     def _from_dict(data):
         """从字典创建用户对象"""
-        return User(
+        user = User(
             user_id=data.get('id'),
             username=data.get('username'),
             password=data.get('password'),
@@ -254,5 +830,9 @@ class User:
             status=data.get('status'),
             role=data.get('role') or data.get('position_role'),
             department_name=data.get('department_name'),
-            position_name=data.get('position_name')
+            position_name=data.get('position_name'),
+            updated_at=data.get('updated_at'),
+            archived=bool(data.get('archived'))
         )
+        user.mark_clean()
+        return user
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户统计模型
+
+user_stats 表按 (部门, 职位, 角色, 状态) 维度保存人数，用户写入时在同一事务中
+增量更新，定期从 users 表重新统计以纠正偏差。
+按部门分片时每个分片统计本分片的用户，汇总时合并各分片的结果。
+"""
+
+from collections import Counter
+
+from database import db
+from models.department_tree import tree as department_tree, subtree_sql
+from sharding import router, VISIBLE_USERS_SQL
+
+
+class UserStats:
+    """用户统计类"""
+    
+    @staticmethod
+    def key_of(row):
+        """计算一条用户记录的统计维度（空值规范化，与 reconcile 的 SQL 保持一致）"""
+        return (
+            row['department_id'] if row['department_id'] is not None else 0,
+            row['position_id'] if row['position_id'] is not None else 0,
+            row['role'] if row['role'] is not None else 'user',
+            int(row['status']) if row['status'] is not None else 0
+        )
+    
+    @staticmethod
+    def apply_change(cursor, before=None, after=None):
+        """在用户写入的事务中增量更新统计
+        
+        Args:
+            cursor: 用户写入所在事务的游标
+            before: 写入前的维度字典（新增时为 None）
+            after: 写入后的维度字典（删除时为 None）
+        """
+        deltas = Counter()
+        if before:
+            deltas[UserStats.key_of(before)] -= 1
+        if after:
+            deltas[UserStats.key_of(after)] += 1
+        UserStats.apply_deltas(cursor, deltas)
+    
+    @staticmethod
+    def apply_deltas(cursor, deltas):
+        """批量应用统计增量（批量操作汇总后一次写入）"""
+        rows = [key + (delta,) for key, delta in deltas.items() if delta]
+        if not rows:
+            return
+        cursor.executemany(
+            """
+            INSERT INTO user_stats (department_id, position_id, role, status, total)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE total = total + VALUES(total)
+            """,
+            rows
+        )
+    
+    @staticmethod
+    def get_summary(department_id=None, include_subdepartments=False):
+        """获取统计汇总
+        
+        Args:
+            department_id: 只统计指定部门（None 表示全部）
+            include_subdepartments: 是否包含指定部门的下级部门
+        """
+        where_sql = "WHERE s.total <> 0"
+        params = []
+        database = None
+        if department_id is not None:
+            if include_subdepartments:
+                where_sql += " AND " + subtree_sql("s.department_id")
+                database = router.shard_for_departments(department_tree.subtree(department_id))
+            else:
+                where_sql += " AND s.department_id=%s"
+                database = router.shard_for(department_id)
+            params.append(department_id)
+        
+        sql = f"""
+        SELECT s.department_id, s.position_id, s.role, s.status, s.total,
+               d.name as department_name, p.name as position_name
+        FROM user_stats s
+        LEFT JOIN departments d ON s.department_id = d.id
+        LEFT JOIN positions p ON s.position_id = p.id
+        {where_sql}
+        """
+        if database is not None:
+            rows = database.execute_query(sql, params)
+        else:
+            rows = [
+                row for shard_rows in router.scatter(lambda database: database.execute_query(sql, params))
+                for row in shard_rows
+            ]
+        
+        by_department = {}
+        by_position = {}
+        by_role = Counter()
+        by_status = Counter()
+        total = 0
+        for row in rows:
+            count = row['total']
+            total += count
+            active = count if row['status'] == 1 else 0
+            
+            dept = by_department.setdefault(row['department_id'], {
+                'department_id': row['department_id'] or None,
+                'department': row['department_name'],
+                'total': 0,
+                'active': 0
+            })
+            dept['total'] += count
+            dept['active'] += active
+            
+            pos = by_position.setdefault(row['position_id'], {
+                'position_id': row['position_id'] or None,
+                'position': row['position_name'],
+                'total': 0,
+                'active': 0
+            })
+            pos['total'] += count
+            pos['active'] += active
+            
+            by_role[row['role']] += count
+            by_status[row['status']] += count
+        
+        return {
+            'total': total,
+            'by_department': sorted(by_department.values(), key=lambda d: d['department_id'] or 0),
+            'by_position': sorted(by_position.values(), key=lambda p: p['position_id'] or 0),
+            'by_role': [{'role': role, 'total': count} for role, count in sorted(by_role.items())],
+            'by_status': [{'status': status, 'total': count} for status, count in sorted(by_status.items())]
+        }
+    
+    @staticmethod
+    def reconcile_all():
+        """依次纠正每个分片的统计，返回被纠正的维度数量"""
+        return sum(UserStats.reconcile(database) for database in router.databases())
+    
+    @staticmethod
+    def reconcile(database=None):
+        """从 users 表重新统计并纠正偏差，返回被纠正的维度数量
+        
+        先锁定 user_stats 全表再读取 users：已开始写统计的事务会先提交，
+        之后的写入会等待本次纠正完成后再叠加增量，因此不会重复计数。
+        多个 worker 同时运行时通过命名锁保证只有一个执行。
+        分片模式下不统计正在迁入或已迁出的部门（由迁移在切换时转移统计）。
+        """
+        database = database or db
+        lock = database.lock_name('user_stats_reconcile')
+        where_sql = f"WHERE {VISIBLE_USERS_SQL}" if router.enabled else ""
+        with database.transaction() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (lock,))
+            row = cursor.fetchone()
+            if not row or not row['locked']:
+                return 0
+            try:
+                cursor.execute(
+                    "SELECT department_id, position_id, role, status, total FROM user_stats FOR UPDATE"
+                )
+                current = {UserStats.key_of(r): r['total'] for r in cursor.fetchall()}
+                
+                cursor.execute(f"""
+                SELECT COALESCE(department_id, 0) AS department_id,
+                       COALESCE(position_id, 0) AS position_id,
+                       COALESCE(role, 'user') AS role,
+                       COALESCE(status, 0) AS status,
+                       COUNT(*) AS total
+                FROM users u
+                {where_sql}
+                GROUP BY 1, 2, 3, 4
+                """)
+                actual = {UserStats.key_of(r): r['total'] for r in cursor.fetchall()}
+                
+                deltas = Counter()
+                for key in set(current) | set(actual):
+                    diff = actual.get(key, 0) - current.get(key, 0)
+                    if diff:
+                        deltas[key] = diff
+                UserStats.apply_deltas(cursor, deltas)
+                cursor.execute("DELETE FROM user_stats WHERE total = 0")
+                return len(deltas)
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (lock,))
@@ -32,6 +32,11 @@ echo "检查数据库连接..."
 $PYTHON init_db.py
 echo ""
 
+# 构建静态资源（带指纹的预压缩文件）
+echo "构建静态资源..."
+$PYTHON build_assets.py
+echo ""
+
 # 启动 Flask 应用
 echo "启动薪酬计算管理系统..."
 echo "访问地址: http://localhost:5000"
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服务端会话存储模块
+
+会话数据保存在服务端（本地 SQLite 文件或 MySQL），浏览器 Cookie 中只保存
+经过签名的会话 ID。签名密钥从配置加载，进程重启和多 worker 部署时保持不变。
+"""
+
+import abc
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+DEFAULT_SESSION_CONFIG = {
+    'backend': 'sqlite',
+    'sqlite_path': 'instance/sessions.db',
+    'lifetime': 8 * 3600,
+    'refresh_interval': 60,
+    'cache_ttl': 5,
+    'cache_size': 10000
+}
+
+_serializer = TaggedJSONSerializer()
+
+
+def load_secret_key(config, key_file='instance/secret_key'):
+    """加载稳定的会话签名密钥
+    
+    优先级：环境变量 SECRET_KEY > config.json 中的 app.secret_key > 本地密钥文件。
+    密钥文件不存在时生成一次并持久化，同一主机上的所有 worker 共享。
+    """
+    secret_key = os.environ.get('SECRET_KEY') or config.get('app', {}).get('secret_key')
+    if secret_key:
+        return secret_key
+    
+    os.makedirs(os.path.dirname(key_file) or '.', exist_ok=True)
+    try:
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    
+    # 其他 worker 可能正在写入，等待文件内容就绪
+    for _ in range(50):
+        with open(key_file, 'r') as f:
+            secret_key = f.read().strip()
+        if secret_key:
+            return secret_key
+        time.sleep(0.1)
+    raise RuntimeError(f"会话密钥文件为空: {key_file}")
+
+
+class SessionStore(abc.ABC):
+    """会话存储后端基类"""
+    
+    @abc.abstractmethod
+    def load(self, sid):
+        """读取会话，返回 (data, expires_at)；不存在或已过期返回 None"""
+    
+    @abc.abstractmethod
+    def create(self, sid, data, user_id, expires_at):
+        """保存新会话"""
+    
+    @abc.abstractmethod
+    def update(self, sid, data, user_id, expires_at):
+        """更新已有的会话，返回会话是否仍然存在
+        
+        会话已被删除（如用户被停用时强制下线）或已过期时不写入：
+        请求结束时不能把已失效的会话重新写回。
+        """
+    
+    @abc.abstractmethod
+    def touch(self, sid, expires_at):
+        """延长会话有效期，返回会话是否仍然存在（已删除或已过期时不写入）"""
+    
+    @abc.abstractmethod
+    def delete(self, sid):
+        """删除会话"""
+    
+    @abc.abstractmethod
+    def delete_user(self, user_id):
+        """删除某个用户的全部会话"""
+    
+    @abc.abstractmethod
+    def purge_expired(self):
+        """清理过期会话"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """本地 SQLite 会话存储（同一主机上的多个 worker 共享）"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            sid TEXT PRIMARY KEY,
+            user_id INTEGER,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions (user_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+    
+    def _connection(self):
+        """每个线程使用独立连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def load(self, sid):
+        row = self._connection().execute(
+            "SELECT data, expires_at FROM sessions WHERE sid=? AND expires_at>?",
+            (sid, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+    
+    def create(self, sid, data, user_id, expires_at):
+        self._connection().execute(
+            "INSERT INTO sessions (sid, user_id, data, expires_at) VALUES (?, ?, ?, ?)",
+            (sid, user_id, data, expires_at)
+        )
+    
+    def update(self, sid, data, user_id, expires_at):
+        cursor = self._connection().execute(
+            "UPDATE sessions SET user_id=?, data=?, expires_at=? WHERE sid=? AND expires_at>?",
+            (user_id, data, expires_at, sid, time.time())
+        )
+        return cursor.rowcount > 0
+    
+    def touch(self, sid, expires_at):
+        cursor = self._connection().execute(
+            "UPDATE sessions SET expires_at=? WHERE sid=? AND expires_at>?", (expires_at, sid, time.time())
+        )
+        return cursor.rowcount > 0
+    
+    def delete(self, sid):
+        self._connection().execute("DELETE FROM sessions WHERE sid=?", (sid,))
+    
+    def delete_user(self, user_id):
+        self._connection().execute("DELETE FROM sessions WHERE user_id=?", (user_id,))
+    
+    def purge_expired(self):
+        self._connection().execute("DELETE FROM sessions WHERE expires_at<=?", (time.time(),))
+
+
+class MySQLSessionStore(SessionStore):
+    """MySQL 会话存储（多台主机共享）
+    
+    写入直接使用主库连接，不经过 execute_update：会话写入发生在每个请求结束时，
+    不应记录为业务写入（使会话在时间窗口内改读主库，或为记录 GTID 多建立连接）。
+    """
+    
+    def __init__(self, database):
+        self.db = database
+        self._table_ready = False
+    
+    def _execute(self, sql, params=None):
+        """在主库上执行一条写语句，返回影响的行数"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                return cursor.rowcount
+            finally:
+                cursor.close()
+    
+    def _ensure_table(self):
+        """首次使用时创建会话表"""
+        if self._table_ready:
+            return
+        self._execute("""
+        CREATE TABLE IF NOT EXISTS `sessions` (
+            `sid` VARCHAR(64) PRIMARY KEY COMMENT '会话ID',
+            `user_id` INT COMMENT '用户ID',
+            `data` TEXT NOT NULL COMMENT '会话数据',
+            `expires_at` DOUBLE NOT NULL COMMENT '过期时间（Unix 时间戳）',
+            INDEX `idx_user_id` (`user_id`),
+            INDEX `idx_expires_at` (`expires_at`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='会话表';
+        """)
+        self._table_ready = True
+    
+    def load(self, sid):
+        self._ensure_table()
+        # 会话必须读主库，避免复制延迟导致刚登录的会话丢失
+        result = self.db.execute_query(
+            "SELECT data, expires_at FROM sessions WHERE sid=%s AND expires_at>%s",
+            (sid, time.time()),
+            use_primary=True
+        )
+        return (result[0]['data'], result[0]['expires_at']) if result else None
+    
+    def create(self, sid, data, user_id, expires_at):
+        self._ensure_table()
+        self._execute(
+            "INSERT INTO sessions (sid, user_id, data, expires_at) VALUES (%s, %s, %s, %s)",
+            (sid, user_id, data, expires_at)
+        )
+    
+    def update(self, sid, data, user_id, expires_at):
+        self._ensure_table()
+        # 影响行数按实际修改计算，expires_at 每次都会变化，因此 0 表示会话已不存在或已过期
+        return self._execute(
+            "UPDATE sessions SET user_id=%s, data=%s, expires_at=%s WHERE sid=%s AND expires_at>%s",
+            (user_id, data, expires_at, sid, time.time())
+        ) > 0
+    
+    def touch(self, sid, expires_at):
+        self._ensure_table()
+        return self._execute(
+            "UPDATE sessions SET expires_at=%s WHERE sid=%s AND expires_at>%s", (expires_at, sid, time.time())
+        ) > 0
+    
+    def delete(self, sid):
+        self._ensure_table()
+        self._execute("DELETE FROM sessions WHERE sid=%s", (sid,))
+    
+    def delete_user(self, user_id):
+        self._ensure_table()
+        self._execute("DELETE FROM sessions WHERE user_id=%s", (user_id,))
+    
+    def purge_expired(self):
+        self._ensure_table()
+        self._execute("DELETE FROM sessions WHERE expires_at<=%s", (time.time(),))
+
+
+class SessionCache:
+    """进程内会话读缓存
+    
+    缓存条目在 ttl 秒后失效，因此其他 worker 的失效操作最多延迟 ttl 秒生效。
+    """
+    
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get(self, sid):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry['cached_at'] + self.ttl < time.monotonic() or entry['expires_at'] <= time.time():
+                del self._entries[sid]
+                return None
+            return entry
+    
+    def put(self, sid, data, user_id, expires_at):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries.clear()
+            self._entries[sid] = {
+                'data': data,
+                'user_id': user_id,
+                'expires_at': expires_at,
+                'cached_at': time.monotonic()
+            }
+    
+    def discard(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+    
+    def discard_user(self, user_id):
+        with self._lock:
+            for sid in [sid for sid, e in self._entries.items() if e['user_id'] == user_id]:
+                del self._entries[sid]
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """服务端会话对象"""
+    
+    def __init__(self, initial=None, sid=None, expires_at=None, new=False):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+    
+    def regenerate(self):
+        """更换会话 ID（登录时调用，防止会话固定攻击）"""
+        if self.sid and not self.new:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """基于服务端存储的 Flask 会话接口
+    
+    - Cookie 中只保存签名后的会话 ID
+    - 读取经过进程内缓存，写入同时更新缓存
+    - 每次访问滑动延长有效期，refresh_interval 秒内最多写回一次
+    """
+    
+    session_class = ServerSession
+    
+    def __init__(self, store, lifetime=8 * 3600, refresh_interval=60, cache_ttl=5, cache_size=10000):
+        self.store = store
+        self.lifetime = lifetime
+        self.refresh_interval = refresh_interval
+        self.cache = SessionCache(cache_ttl, cache_size)
+        self._last_purge = 0.0
+    
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+    
+    def _load(self, sid):
+        """读取会话（先查缓存）"""
+        entry = self.cache.get(sid)
+        if entry is not None:
+            return entry['data'], entry['expires_at']
+        loaded = self.store.load(sid)
+        if loaded is None:
+            return None
+        raw, expires_at = loaded
+        data = _serializer.loads(raw)
+        self.cache.put(sid, data, data.get('user_id'), expires_at)
+        return data, expires_at
+    
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('utf-8')
+            except BadSignature:
+                sid = None
+            if sid:
+                loaded = self._load(sid)
+                if loaded is not None:
+                    data, expires_at = loaded
+                    return self.session_class(dict(data), sid=sid, expires_at=expires_at)
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+    
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+            self.cache.discard(session.previous_sid)
+            session.previous_sid = None
+        
+        # 会话被清空：删除服务端数据和 Cookie
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                self.cache.discard(session.sid)
+            if session.modified or not session.new:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        
+        now = time.time()
+        expires_at = now + self.lifetime
+        if session.new:
+            data = dict(session)
+            self.store.create(session.sid, _serializer.dumps(data), data.get('user_id'), expires_at)
+            self.cache.put(session.sid, data, data.get('user_id'), expires_at)
+        elif session.modified or session.expires_at is None \
+                or session.expires_at - now < self.lifetime - self.refresh_interval:
+            # 已有的会话只更新（未修改时只滑动过期，限制写回频率）：
+            # 请求处理期间会话被强制失效时不写回，客户端需要重新登录
+            data = dict(session)
+            if session.modified:
+                exists = self.store.update(session.sid, _serializer.dumps(data), data.get('user_id'), expires_at)
+            else:
+                exists = self.store.touch(session.sid, expires_at)
+            if not exists:
+                self.cache.discard(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+                return
+            self.cache.put(session.sid, data, data.get('user_id'), expires_at)
+        else:
+            return
+        
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid.encode('utf-8')).decode('utf-8'),
+            max_age=self.lifetime,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+        self._maybe_purge(now)
+    
+    def _maybe_purge(self, now):
+        """定期清理过期会话"""
+        if now - self._last_purge < 600:
+            return
+        self._last_purge = now
+        try:
+            self.store.purge_expired()
+        except Exception as e:
+            print(f"清理过期会话失败: {e}")
+    
+    def load_cookie(self, secret_key, cookie):
+        """按 Cookie 值读取会话数据（供 Flask 之外的服务使用），无效或过期时返回 None"""
+        try:
+            sid = Signer(secret_key, salt='server-side-session').unsign(cookie).decode('utf-8')
+        except BadSignature:
+            return None
+        loaded = self._load(sid)
+        return dict(loaded[0]) if loaded is not None else None
+    
+    def invalidate_user(self, user_id):
+        """使某个用户的全部会话失效（用户被停用或删除时调用）"""
+        self.store.delete_user(user_id)
+        self.cache.discard_user(user_id)
+
+
+def create_session_interface(config, database=None):
+    """根据配置创建会话接口
+    
+    Args:
+        config: config.json 的完整内容，读取其中的 session 段
+        database: MySQL 后端使用的 Database 实例
+    """
+    options = dict(DEFAULT_SESSION_CONFIG)
+    options.update(config.get('session', {}))
+    
+    backend = options['backend']
+    if backend == 'sqlite':
+        store = SQLiteSessionStore(options['sqlite_path'])
+    elif backend == 'mysql':
+        if database is None:
+            from database import db as database
+        store = MySQLSessionStore(database)
+    else:
+        raise ValueError(f"不支持的会话存储后端: {backend}")
+    
+    return ServerSideSessionInterface(
+        store,
+        lifetime=options['lifetime'],
+        refresh_interval=options['refresh_interval'],
+        cache_ttl=options['cache_ttl'],
+        cache_size=options['cache_size']
+    )
+
+
+def load_config(config_file='config.json'):
+    """读取配置文件"""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
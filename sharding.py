@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按部门分片
+
+用户数据按部门分布到多个 MySQL 库（分片）。部门 -> 分片的映射保存在默认分片（主库）的
+shard_map 表中，未登记的部门和未分配部门的用户属于默认分片。
+- 只涉及一个部门的查询和写入路由到该部门所在的分片
+- 跨部门的列表、搜索、计数并行查询所有分片，按 id 倒序归并
+- 部门和职位是引用数据，在默认分片维护，写入后同步到各分片（分片上的关联查询和外键使用）
+- 用户目录 user_directory 在默认分片分配用户 ID，并保证用户名、工号全局唯一
+- 部门可以在线迁移到其他分片：python sharding.py move <部门ID> <分片名>
+
+未配置 database.shards 时只有默认分片，路由直接返回 db，行为与单库一致。
+创建路由不访问数据库：引用数据同步和用户目录填充在首次路由时执行（失败时下次路由重试）。
+"""
+
+import argparse
+import contextvars
+import heapq
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import db, Database, DatabaseUnavailable
+
+# 跨分片查询排除迁移中重复的数据，每个用户只在一个分片上可见：
+# incoming-正在迁入（数据尚未接管），moved-已迁出（等待清理）
+VISIBLE_USERS_SQL = """NOT EXISTS (
+    SELECT 1 FROM shard_departments m
+    WHERE m.department_id = u.department_id AND m.state IN ('incoming', 'moved')
+)"""
+# 按部门存放用户的表（迁移部门时一并复制和清理）
+USER_TABLES = ('users', 'users_archive')
+# 引用数据表：分片上的副本与默认分片保持一致
+REFERENCE_TABLES = ('departments', 'positions')
+# 迁移部门时每批复制、清理的用户数
+MOVE_BATCH_SIZE = 500
+
+
+def upsert_rows(cursor, table, rows):
+    """按主键写入完整行（已存在则覆盖），用于复制引用数据和迁移用户"""
+    if not rows:
+        return
+    columns = list(rows[0])
+    column_sql = ', '.join(f"`{column}`" for column in columns)
+    placeholders = ', '.join(['%s'] * len(columns))
+    assignments = ', '.join(f"`{column}` = VALUES(`{column}`)" for column in columns if column != 'id')
+    cursor.executemany(
+        f"INSERT INTO `{table}` ({column_sql}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {assignments}",
+        [tuple(row[column] for column in columns) for row in rows]
+    )
+
+
+class ShardRouter:
+    """部门分片路由"""
+    
+    def __init__(self, default, shards=(), map_ttl=5, max_workers=8):
+        self.max_workers = max_workers
+        self._map_lock = threading.Lock()
+        self._prepare_lock = threading.Lock()
+        self._executor = None
+        self.configure(default, shards, map_ttl)
+    
+    def configure(self, default, shards=(), map_ttl=5):
+        """设置默认分片和其他分片（不访问数据库），首次路由时重新同步引用数据"""
+        self.default = default
+        self._shards = {'default': default}
+        for shard in shards:
+            self._shards[shard.shard_name] = shard
+        self.map_ttl = map_ttl
+        self._map = {}
+        self._map_loaded_at = None
+        # 首次路由前同步引用数据、填充用户目录
+        self._prepared = False
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(self.max_workers, len(self._shards)),
+            thread_name_prefix='shard'
+        ) if len(self._shards) > 1 else None
+    
+    @staticmethod
+    def shards_of(default):
+        """按默认库配置中的 database.shards 创建分片库（继承默认库的配置和连接函数）"""
+        return [
+            Database(default.config_file, connector=default.connector, shard=shard, config=default.source_config)
+            for shard in default.config.shards
+        ]
+    
+    @staticmethod
+    def from_config(default):
+        """按 database.shards 创建路由（不访问数据库）"""
+        return ShardRouter(default, ShardRouter.shards_of(default), default.config.shard_map_ttl)
+    
+    def reload(self):
+        """默认库重新配置后（create_app）按新配置重建分片"""
+        self.configure(self.default, ShardRouter.shards_of(self.default), self.default.config.shard_map_ttl)
+    
+    @property
+    def enabled(self):
+        """是否配置了多个分片"""
+        return len(self._shards) > 1
+    
+    def names(self):
+        return list(self._shards)
+    
+    def get(self, name):
+        """按名称获取分片，不存在时抛出 KeyError"""
+        return self._shards[name]
+    
+    def databases(self):
+        return list(self._shards.values())
+    
+    def prepare(self):
+        """首次路由前把引用数据同步到各分片并填充用户目录（只成功执行一次）"""
+        if self._prepared or not self.enabled:
+            return
+        with self._prepare_lock:
+            if not self._prepared:
+                self.sync_reference()
+                self.backfill_directory()
+                self._prepared = True
+    
+    # ------------------------------------------------------------------
+    # 部门分片映射
+    # ------------------------------------------------------------------
+    
+    def _department_map(self):
+        """部门 -> 分片名称（缓存 map_ttl 秒）"""
+        now = time.monotonic()
+        loaded_at = self._map_loaded_at
+        if loaded_at is not None and now - loaded_at < self.map_ttl:
+            return self._map
+        with self._map_lock:
+            if self._map_loaded_at is None or now - self._map_loaded_at >= self.map_ttl:
+                rows = self.default.execute_query(
+                    "SELECT department_id, shard FROM shard_map", use_primary=True
+                )
+                self._map = {row['department_id']: row['shard'] for row in rows}
+                self._map_loaded_at = time.monotonic()
+        return self._map
+    
+    def invalidate(self):
+        """下次路由时重新读取映射"""
+        self._map_loaded_at = None
+    
+    def shard_name_for(self, department_id):
+        if not self.enabled:
+            return 'default'
+        self.prepare()
+        if department_id is None:
+            return 'default'
+        name = self._department_map().get(department_id, 'default')
+        # 映射指向未配置的分片时按默认分片处理，避免整个部门不可用
+        return name if name in self._shards else 'default'
+    
+    def shard_for(self, department_id):
+        """部门所在的分片（未登记的部门为默认分片）"""
+        return self._shards[self.shard_name_for(department_id)]
+    
+    def shard_for_departments(self, department_ids):
+        """一组部门共同所在的分片；分布在多个分片时返回 None（调用方查询所有分片）"""
+        names = {self.shard_name_for(department_id) for department_id in department_ids} or {'default'}
+        return self._shards[names.pop()] if len(names) == 1 else None
+    
+    def guard(self, cursor, department_id):
+        """在用户写入事务中检查部门的迁移状态
+        
+        以共享锁读取状态行：迁移冻结部门时需等待已开始的写事务提交，
+        冻结后的写入直接失败（客户端稍后重试）；路由缓存过期写到了已迁出的分片时也会失败。
+        """
+        if not self.enabled or department_id is None:
+            return
+        cursor.execute(
+            "SELECT state FROM shard_departments WHERE department_id=%s LOCK IN SHARE MODE",
+            (department_id,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return
+        self.invalidate()
+        self.default.mark_unavailable()
+        if row['state'] == 'moved':
+            raise DatabaseUnavailable('部门数据已迁移到其他分片，请重试', retry_after=1)
+        raise DatabaseUnavailable('部门数据正在迁移，请稍后重试', retry_after=max(1, self.map_ttl))
+    
+    def migrating_departments(self, cursor, department_ids):
+        """批量写入时的检查：返回其中正在迁移或已迁出的部门（共享锁读取，调用方跳过这些部门的用户）"""
+        department_ids = sorted(d for d in department_ids if d is not None)
+        if not self.enabled or not department_ids:
+            return set()
+        cursor.execute(
+            f"""
+            SELECT department_id FROM shard_departments
+            WHERE department_id IN ({', '.join(['%s'] * len(department_ids))}) LOCK IN SHARE MODE
+            """,
+            department_ids
+        )
+        return {row['department_id'] for row in cursor.fetchall()}
+    
+    # ------------------------------------------------------------------
+    # 跨分片查询
+    # ------------------------------------------------------------------
+    
+    def scatter(self, func):
+        """在所有分片上并行执行 func(database)，按分片顺序返回结果
+        
+        每个任务复制当前上下文，请求期限和读一致性标记在工作线程中同样生效。
+        """
+        if not self.enabled:
+            return [func(self.default)]
+        self.prepare()
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, func, database)
+            for database in self._shards.values()
+        ]
+        return [future.result() for future in futures]
+    
+    @staticmethod
+    def merge_by_id_desc(results):
+        """归并各分片按 id 倒序排列的结果（迁移过程中同一用户可能短暂出现在两个分片，只保留一条）"""
+        merged = []
+        last_id = None
+        for row in heapq.merge(*results, key=lambda r: -r['id']):
+            if row['id'] != last_id:
+                merged.append(row)
+                last_id = row['id']
+        return merged
+    
+    # ------------------------------------------------------------------
+    # 引用数据和用户目录
+    # ------------------------------------------------------------------
+    
+    def replicate(self, table, row_id):
+        """把默认分片上的一条引用数据同步到其他分片"""
+        if not self.enabled:
+            return
+        rows = self.default.execute_query(f"SELECT * FROM `{table}` WHERE id=%s", (row_id,), use_primary=True)
+        for database in self.databases()[1:]:
+            database.run_in_transaction(lambda cursor: upsert_rows(cursor, table, rows))
+    
+    def sync_reference(self):
+        """把默认分片的部门、职位和部门层级全量同步到其他分片，返回同步的行数"""
+        if not self.enabled:
+            return 0
+        synced = 0
+        for table in REFERENCE_TABLES:
+            rows = self.default.execute_query(f"SELECT * FROM `{table}` ORDER BY id", use_primary=True)
+            for database in self.databases()[1:]:
+                database.run_in_transaction(lambda cursor: upsert_rows(cursor, table, rows))
+                synced += len(rows)
+        return synced + self.replicate_closure()
+    
+    def replicate_closure(self):
+        """把默认分片的部门闭包表整体同步到其他分片（部门层级变化后调用），返回同步的行数"""
+        if not self.enabled:
+            return 0
+        rows = self.default.execute_query(
+            "SELECT ancestor_id, descendant_id, depth FROM department_closure", use_primary=True
+        )
+        values = [(row['ancestor_id'], row['descendant_id'], row['depth']) for row in rows]
+        
+        def replace(cursor):
+            cursor.execute("DELETE FROM department_closure")
+            cursor.executemany(
+                "INSERT INTO department_closure (ancestor_id, descendant_id, depth) VALUES (%s, %s, %s)",
+                values
+            )
+        
+        for database in self.databases()[1:]:
+            database.run_in_transaction(replace)
+        return len(values) * (len(self._shards) - 1)
+    
+    def backfill_directory(self):
+        """首次启用分片时，用默认分片的现有用户填充用户目录"""
+        with self.default.transaction() as cursor:
+            cursor.execute("SELECT 1 FROM user_directory LIMIT 1")
+            if cursor.fetchone():
+                return
+            cursor.execute("""
+            INSERT IGNORE INTO user_directory (id, username, employee_id, department_id)
+            SELECT id, username, employee_id, department_id FROM users
+            """)
+    
+    # ------------------------------------------------------------------
+    # 在线迁移部门
+    # ------------------------------------------------------------------
+    
+    def move_department(self, department_id, target_name, batch_size=MOVE_BATCH_SIZE, log=print):
+        """把部门的用户在线迁移到另一个分片
+        
+        1. 目标分片标记为 incoming（跨分片查询不可见），记录源分片当前的变更序号
+        2. 分批复制用户，再按源分片的变更日志补齐复制期间的修改（写入不受影响）
+        3. 源分片冻结该部门（等待已开始的写事务提交，之后的写入失败重试），最后补齐一次
+        4. 切换：源分片标记为 moved 并扣除统计，目标分片接管统计和变更日志，更新映射
+        5. 等待各进程的映射缓存过期后，分批删除源分片上的数据
+        冻结只持续最后一次补齐和切换的时间。
+        """
+        from models.user_stats import UserStats
+        from models.change_log import ChangeLog
+        
+        if not self.enabled:
+            raise ValueError('未配置分片')
+        target = self.get(target_name)
+        self.invalidate()
+        source = self.shard_for(department_id)
+        if source is target:
+            log(f"部门 {department_id} 已在分片 {target_name}")
+            return 0
+        
+        state = source.execute_query(
+            "SELECT state FROM shard_departments WHERE department_id=%s", (department_id,), use_primary=True
+        )
+        if state and state[0]['state'] == 'moved':
+            # 上次迁移在源分片交出数据后中断，继续完成切换
+            log(f"继续完成部门 {department_id} 的切换")
+            return self._finish_move(source, target, department_id, batch_size, log)
+        
+        # 1. 目标分片准备接收
+        self.sync_reference()
+        target.execute_update(
+            """
+            INSERT INTO shard_departments (department_id, state) VALUES (%s, 'incoming')
+            ON DUPLICATE KEY UPDATE state='incoming'
+            """,
+            (department_id,)
+        )
+        # 清理上次中断的迁移留下的副本
+        for table in USER_TABLES:
+            target.execute_update(f"DELETE FROM {table} WHERE department_id=%s", (department_id,))
+        rows = source.execute_query("SELECT value FROM change_log_state WHERE name='seq'", use_primary=True)
+        since = rows[0]['value'] if rows else 0
+        
+        # 2. 分批复制（包括已归档的用户），然后补齐复制期间的修改
+        copied = 0
+        for table in USER_TABLES:
+            last_id = 0
+            while True:
+                rows = source.execute_query(
+                    f"SELECT * FROM {table} WHERE department_id=%s AND id>%s ORDER BY id LIMIT %s",
+                    (department_id, last_id, batch_size),
+                    use_primary=True
+                )
+                if not rows:
+                    break
+                target.run_in_transaction(lambda cursor: upsert_rows(cursor, table, rows))
+                copied += len(rows)
+                last_id = rows[-1]['id']
+        log(f"已复制 {copied} 个用户（含已归档的用户）")
+        since = self._catch_up(source, target, department_id, since, batch_size)
+        
+        # 3. 冻结源分片上的写入，最后补齐一次
+        source.execute_update(
+            """
+            INSERT INTO shard_departments (department_id, state) VALUES (%s, 'frozen')
+            ON DUPLICATE KEY UPDATE state='frozen'
+            """,
+            (department_id,)
+        )
+        try:
+            self._catch_up(source, target, department_id, since, batch_size)
+            moved_ids = [
+                row['id'] for row in source.execute_query(
+                    "SELECT id FROM users WHERE department_id=%s ORDER BY id", (department_id,), use_primary=True
+                )
+            ]
+            
+            # 4. 目标分片记录变更日志（下游从目标分片的变更中取得这些用户）
+            for start in range(0, len(moved_ids), batch_size):
+                batch = moved_ids[start:start + batch_size]
+                
+                def record_upserts(cursor):
+                    for user_id in batch:
+                        ChangeLog.record_upsert(cursor, 'user', user_id)
+                target.run_in_transaction(record_upserts)
+            
+            # 源分片交出数据：标记为已迁出并扣除统计（与标记在同一事务中）
+            def release_source(cursor):
+                cursor.execute(
+                    "UPDATE shard_departments SET state='moved' WHERE department_id=%s",
+                    (department_id,)
+                )
+                UserStats.apply_deltas(cursor, self._department_stats(cursor, department_id, -1))
+                for user_id in moved_ids:
+                    ChangeLog.record_move(cursor, 'user', user_id, target.shard_name, department_id)
+            source.run_in_transaction(release_source)
+        except Exception:
+            # 交出数据前失败：解除冻结，部门仍由源分片提供服务，可重新执行迁移
+            source.execute_update(
+                "DELETE FROM shard_departments WHERE department_id=%s AND state='frozen'",
+                (department_id,)
+            )
+            raise
+        return self._finish_move(source, target, department_id, batch_size, log)
+    
+    def _finish_move(self, source, target, department_id, batch_size, log):
+        """目标分片接管统计、更新映射并清理源分片（可重复执行）"""
+        from models.user_stats import UserStats
+        
+        def accept_target(cursor):
+            cursor.execute(
+                "SELECT state FROM shard_departments WHERE department_id=%s FOR UPDATE",
+                (department_id,)
+            )
+            row = cursor.fetchone()
+            if not row or row['state'] != 'incoming':
+                return
+            UserStats.apply_deltas(cursor, self._department_stats(cursor, department_id, 1))
+            cursor.execute("DELETE FROM shard_departments WHERE department_id=%s", (department_id,))
+        target.run_in_transaction(accept_target)
+        
+        self.default.execute_update(
+            """
+            INSERT INTO shard_map (department_id, shard) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE shard=VALUES(shard)
+            """,
+            (department_id, target.shard_name)
+        )
+        self.invalidate()
+        rows = target.execute_query(
+            "SELECT COUNT(*) AS total FROM users WHERE department_id=%s", (department_id,), use_primary=True
+        )
+        moved = rows[0]['total'] if rows else 0
+        log(f"部门 {department_id} 已切换到分片 {target.shard_name}（{moved} 个用户）")
+        
+        # 5. 映射缓存过期前仍可能有进程从源分片读取
+        time.sleep(self.map_ttl)
+        for table in USER_TABLES:
+            while source.execute_update(
+                f"DELETE FROM {table} WHERE department_id=%s LIMIT %s", (department_id, batch_size)
+            ):
+                pass
+        log(f"已清理分片 {source.shard_name} 上的数据")
+        return moved
+    
+    @staticmethod
+    def _department_stats(cursor, department_id, sign):
+        """当前分片上某部门各统计维度的人数（乘以 sign）"""
+        from models.user_stats import UserStats
+        
+        cursor.execute(
+            """
+            SELECT department_id, position_id, role, status, COUNT(*) AS total
+            FROM users WHERE department_id=%s
+            GROUP BY department_id, position_id, role, status
+            """,
+            (department_id,)
+        )
+        return {UserStats.key_of(row): sign * row['total'] for row in cursor.fetchall()}
+    
+    @staticmethod
+    def _catch_up(source, target, department_id, since, batch_size):
+        """按源分片变更日志中 since 之后的用户变更重新复制（包括归档、恢复），返回新的同步位置"""
+        while True:
+            rows = source.execute_query(
+                """
+                SELECT seq, entity_id FROM change_log
+                WHERE entity='user' AND seq > %s
+                ORDER BY seq LIMIT %s
+                """,
+                (since, batch_size),
+                use_primary=True
+            )
+            if not rows:
+                return since
+            since = rows[-1]['seq']
+            ids = sorted({row['entity_id'] for row in rows})
+            placeholders = ', '.join(['%s'] * len(ids))
+            current = source.execute_query(
+                f"SELECT * FROM users WHERE id IN ({placeholders})", ids, use_primary=True
+            )
+            keep = [row for row in current if row['department_id'] == department_id]
+            drop = sorted(set(ids) - {row['id'] for row in keep})
+            archived = source.execute_query(
+                f"SELECT * FROM users_archive WHERE id IN ({placeholders}) AND department_id=%s",
+                ids + [department_id],
+                use_primary=True
+            )
+            
+            def apply(cursor):
+                upsert_rows(cursor, 'users', keep)
+                if drop:
+                    # 只删除本部门的副本（跨分片调动到目标分片的用户不受影响）
+                    cursor.execute(
+                        f"DELETE FROM users WHERE id IN ({', '.join(['%s'] * len(drop))}) AND department_id=%s",
+                        drop + [department_id]
+                    )
+                # 归档表的副本与源分片一致（归档、恢复或删除了的用户）
+                cursor.execute(
+                    f"DELETE FROM users_archive WHERE id IN ({placeholders}) AND department_id=%s",
+                    ids + [department_id]
+                )
+                upsert_rows(cursor, 'users_archive', archived)
+            target.run_in_transaction(apply)
+    
+    def status(self):
+        """各分片的部门和熔断状态（用于监控和迁移前检查）"""
+        mapping = self._department_map() if self.enabled else {}
+        shards = []
+        for name, database in self._shards.items():
+            shards.append({
+                'name': name,
+                'database': database.config.database,
+                'host': database.config.host,
+                'departments': sorted(d for d, s in mapping.items() if s == name),
+                'breaker': database.breaker.status()
+            })
+        return shards
+
+
+# 全局分片路由
+router = ShardRouter.from_config(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按部门分片：查看映射、在线迁移部门')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='查看各分片及其部门')
+    move = subparsers.add_parser('move', help='把部门在线迁移到另一个分片')
+    move.add_argument('department_id', type=int, help='部门ID')
+    move.add_argument('shard', help='目标分片名称（default 表示默认分片）')
+    move.add_argument('--batch-size', type=int, default=MOVE_BATCH_SIZE, help='每批复制、清理的用户数')
+    args = parser.parse_args()
+    
+    if args.command == 'status':
+        for shard in router.status():
+            departments = ', '.join(str(d) for d in shard['departments']) or '未登记的部门'
+            print(f"{shard['name']}: {shard['host']}/{shard['database']}  部门: {departments}")
+        return 0
+    
+    if not router.enabled:
+        print('未配置分片（database.shards）', file=sys.stderr)
+        return 1
+    if args.shard not in router.names():
+        print(f"未知的分片: {args.shard}", file=sys.stderr)
+        return 1
+    router.move_department(args.department_id, args.shard, batch_size=args.batch_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
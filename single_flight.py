@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发相同读取的合并（single-flight）
+
+同一时刻多个请求执行相同的只读查询时（例如上班时间大量用户同时打开页面），
+只有第一个请求（leader）真正查询数据库，其余请求等待并共享它的结果：
+- 线程：do() 适用于多线程 worker（Flask）以及在线程池中访问数据库的 asyncio 服务
+- 协程：do_async() 在事件循环中等待，不占用线程；leader 在线程池中执行查询，
+  同时与线程中的相同查询合并
+
+共享的结果是同一个对象，调用方不得修改。leader 失败时（包括超出它自己的请求期限）
+等待的请求各自重新查询，不共享异常；等待超过 timeout 时抛出 WaitTimeout。
+"""
+
+import asyncio
+import contextvars
+import threading
+from collections import Counter
+
+# leader 失败时返回给协程等待方的标记
+_FAILED = object()
+
+
+class WaitTimeout(TimeoutError):
+    """等待相同调用的结果超时"""
+
+
+class _Call:
+    """一次进行中的读取"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+    
+    def __init__(self):
+        self._calls = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        # (标签, 计数项) -> 次数：leader 实际执行、shared 共享结果、retried leader 失败后自行执行、timeouts 等待超时
+        self.counters = Counter()
+    
+    def _count(self, label, name):
+        with self._lock:
+            self.counters[(label, name)] += 1
+    
+    def do(self, key, func, label='default', timeout=None):
+        """执行 func()；相同 key 的调用正在进行时等待并返回它的结果
+        
+        Args:
+            key: 可哈希的键，相同的键表示结果可以共享
+            func: 无参函数
+            label: 统计使用的标签
+            timeout: 等待其他调用的最长时间（秒），None 表示不限
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        
+        if not leader:
+            if not call.done.wait(timeout):
+                self._count(label, 'timeouts')
+                raise WaitTimeout('等待相同查询的结果超时')
+            if not call.failed:
+                self._count(label, 'shared')
+                return call.result
+            self._count(label, 'retried')
+            return func()
+        
+        self._count(label, 'leader')
+        try:
+            call.result = func()
+            return call.result
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    async def do_async(self, key, func, label='default', timeout=None):
+        """协程版本：func 为阻塞函数，由 leader 在线程池中执行（带上当前上下文）
+        
+        参数同 do()；等待超过 timeout 时抛出 WaitTimeout，leader 的查询不受影响。
+        """
+        loop = asyncio.get_running_loop()
+        future_key = (id(loop), key)
+        with self._lock:
+            future = self._futures.get(future_key)
+            leader = future is None
+            if leader:
+                future = self._futures[future_key] = loop.create_future()
+        
+        if not leader:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                self._count(label, 'timeouts')
+                raise WaitTimeout('等待相同查询的结果超时')
+            if result is not _FAILED:
+                self._count(label, 'shared')
+                return result
+            self._count(label, 'retried')
+            return await loop.run_in_executor(None, contextvars.copy_context().run, func)
+        
+        result = _FAILED
+        try:
+            result = await loop.run_in_executor(
+                None, contextvars.copy_context().run, self.do, key, func, label, timeout
+            )
+            return result
+        finally:
+            with self._lock:
+                del self._futures[future_key]
+            future.set_result(result)
+    
+    def status(self):
+        """按标签汇总的合并统计（用于监控）"""
+        with self._lock:
+            in_flight = len(self._calls) + len(self._futures)
+            counters = dict(self.counters)
+        labels = {}
+        for (label, name), count in sorted(counters.items()):
+            labels.setdefault(label, {'leader': 0, 'shared': 0, 'retried': 0, 'timeouts': 0})[name] = count
+        for stats in labels.values():
+            calls = stats['leader'] + stats['shared'] + stats['retried']
+            stats['coalesced_ratio'] = round(stats['shared'] / calls, 3) if calls else 0
+        return {'in_flight': in_flight, 'labels': labels}
+
+
+# 全局合并器（数据库共享查询使用）
+flights = SingleFlight()
@@ -21,11 +21,11 @@ async function apiRequest(url, options = {}) {
     try {
         const fullUrl = `${API_BASE_URL}${url}`;
         const response = await fetch(fullUrl, {
+            ...options,
             headers: {
                 'Content-Type': 'application/json',
                 ...options.headers
-            },
-            ...options
+            }
         });
         
         // 检查响应是否成功
@@ -51,7 +51,10 @@ async function apiRequest(url, options = {}) {
         }
     } catch (error) {
         // 网络错误或其他错误
-        if (error.name === 'TypeError' && error.message.includes('fetch')) {
+        if (error.name === 'AbortError') {
+            // 请求被更新的请求取代，由调用方忽略
+            throw error;
+        } else if (error.name === 'TypeError' && error.message.includes('fetch')) {
             console.error('API请求错误: 网络连接失败，请检查服务器是否运行', error);
             throw new Error('无法连接到服务器，请检查网络连接或服务器是否正常运行');
         } else {
@@ -61,9 +64,122 @@ async function apiRequest(url, options = {}) {
     }
 }
 
-// GET 请求
-async function apiGet(url) {
-    return apiRequest(url, { method: 'GET' });
+// GET 请求（可传入 AbortSignal 取消）
+async function apiGet(url, signal = undefined) {
+    return apiRequest(url, { method: 'GET', signal });
+}
+
+// 判断是否为被取消的请求
+function isAbortError(error) {
+    return error && error.name === 'AbortError';
+}
+
+// 防抖：在最后一次调用 wait 毫秒后才执行
+function debounce(fn, wait = 300) {
+    let timer = null;
+    return function(...args) {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn.apply(this, args), wait);
+    };
+}
+
+// ===== 基础数据缓存（内存 + sessionStorage，按 ETag 重新验证） =====
+
+const apiCacheStoragePrefix = 'apiCache_v1:';
+const apiMemoryCache = new Map();
+const apiRevalidations = new Map();
+
+function readApiCache(url) {
+    if (apiMemoryCache.has(url)) {
+        return apiMemoryCache.get(url);
+    }
+    try {
+        const raw = sessionStorage.getItem(apiCacheStoragePrefix + url);
+        if (raw) {
+            const entry = JSON.parse(raw);
+            apiMemoryCache.set(url, entry);
+            return entry;
+        }
+    } catch (error) {
+        console.warn('读取接口缓存失败', error);
+    }
+    return null;
+}
+
+function writeApiCache(url, entry) {
+    apiMemoryCache.set(url, entry);
+    try {
+        sessionStorage.setItem(apiCacheStoragePrefix + url, JSON.stringify(entry));
+    } catch (error) {
+        console.warn('写入接口缓存失败', error);
+    }
+}
+
+// 写入页面内嵌的数据：视为本页面已验证过，之后按 ETag 重新验证
+function seedApiCache(url, data, etag = null) {
+    writeApiCache(url, { etag, data });
+    apiMemoryCache.get(url).validated = true;
+}
+
+// 清除缓存（不传参数时清除全部）
+function invalidateApiCache(urlPrefix = '') {
+    Array.from(apiMemoryCache.keys()).forEach(url => {
+        if (url.startsWith(urlPrefix)) apiMemoryCache.delete(url);
+    });
+    Object.keys(sessionStorage).forEach(key => {
+        if (key.startsWith(apiCacheStoragePrefix + urlPrefix)) sessionStorage.removeItem(key);
+    });
+}
+
+// 带 If-None-Match 的重新验证；304 时沿用缓存
+async function revalidateApiCache(url, entry) {
+    const headers = entry?.etag ? { 'If-None-Match': entry.etag } : {};
+    const response = await fetch(`${API_BASE_URL}${url}`, { method: 'GET', headers });
+    if (response.status === 304 && entry) {
+        return { entry, changed: false };
+    }
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    const data = await response.json();
+    const fresh = { etag: response.headers.get('ETag'), data };
+    writeApiCache(url, fresh);
+    return { entry: fresh, changed: true };
+}
+
+/**
+ * 带缓存的 GET 请求（用于部门、职位等变化很少的数据）
+ * - 本页面已验证过的缓存直接返回
+ * - sessionStorage 中的缓存先返回，后台按 ETag 重新验证，数据变化时调用 onUpdate
+ * - 同一 URL 的并发请求共享一次网络请求
+ */
+async function apiGetCached(url, { onUpdate = null } = {}) {
+    const entry = readApiCache(url);
+    if (entry && entry.validated) {
+        return entry.data;
+    }
+    
+    let pending = apiRevalidations.get(url);
+    if (!pending) {
+        pending = revalidateApiCache(url, entry)
+            .then(result => {
+                result.entry.validated = true;
+                apiMemoryCache.set(url, result.entry);
+                return result;
+            })
+            .finally(() => apiRevalidations.delete(url));
+        apiRevalidations.set(url, pending);
+    }
+    
+    if (entry) {
+        pending
+            .then(result => {
+                if (result.changed && onUpdate) onUpdate(result.entry.data);
+            })
+            .catch(error => console.warn('重新验证缓存失败', error));
+        return entry.data;
+    }
+    return (await pending).entry.data;
 }
 
 // POST 请求
@@ -75,10 +191,11 @@ async function apiPost(url, data) {
 }
 
 // PUT 请求
-async function apiPut(url, data) {
+async function apiPut(url, data, headers = {}) {
     return apiRequest(url, {
         method: 'PUT',
-        body: JSON.stringify(data)
+        body: JSON.stringify(data),
+        headers
     });
 }
 
@@ -0,0 +1,229 @@
+// 用户表格渲染器：按用户 ID 做键控差异更新，行数较多时切换为虚拟滚动
+
+// 超过该行数时启用虚拟滚动
+const virtualScrollThreshold = 200;
+// 可视区域上下额外渲染的行数
+const virtualScrollOverscan = 10;
+// 未测量到实际行高前使用的默认行高（像素）
+const defaultRowHeight = 49;
+
+class UserTableRenderer {
+    /**
+     * @param {HTMLTableElement} table 表格元素
+     * @param {Object} options
+     *   - columnCount: 列数
+     *   - renderCells(user): 返回每一列单元格 HTML 的数组
+     *   - emptyText: 无数据时的提示
+     *   - actions: { 动作名: (userId, event) => void }，由表格上的单个委托监听器分发
+     *   - virtualThreshold: 启用虚拟滚动的行数阈值
+     */
+    constructor(table, options) {
+        this.table = table;
+        this.tbody = table.tBodies[0];
+        this.container = table.closest('.table-container') || table.parentElement;
+        this.columnCount = options.columnCount;
+        this.renderCells = options.renderCells;
+        this.emptyText = options.emptyText || '暂无数据';
+        this.actions = options.actions || {};
+        this.virtualThreshold = options.virtualThreshold ?? virtualScrollThreshold;
+        
+        this.users = [];
+        this.indexById = new Map();
+        // 已渲染的行：id -> { tr, cells: [html] }
+        this.rendered = new Map();
+        this.virtual = false;
+        this.rowHeight = defaultRowHeight;
+        this.rowHeightMeasured = false;
+        this.windowStart = -1;
+        this.windowEnd = -1;
+        this.scrollFrame = null;
+        
+        this.topSpacer = this.createSpacer();
+        this.bottomSpacer = this.createSpacer();
+        
+        this.onClick = this.onClick.bind(this);
+        this.onScroll = this.onScroll.bind(this);
+        this.table.addEventListener('click', this.onClick);
+        this.container.addEventListener('scroll', this.onScroll, { passive: true });
+    }
+    
+    createSpacer() {
+        const tr = document.createElement('tr');
+        tr.className = 'virtual-spacer';
+        tr.setAttribute('aria-hidden', 'true');
+        const td = document.createElement('td');
+        td.colSpan = this.columnCount;
+        tr.appendChild(td);
+        return tr;
+    }
+    
+    // 单个委托监听器处理全部行内按钮
+    onClick(event) {
+        const button = event.target.closest('[data-action]');
+        if (!button || !this.tbody.contains(button)) return;
+        const row = button.closest('tr[data-user-id]');
+        const handler = this.actions[button.dataset.action];
+        if (row && handler) {
+            handler(Number(row.dataset.userId), event);
+        }
+    }
+    
+    // 替换全部数据
+    setUsers(users) {
+        this.users = users || [];
+        this.indexById = new Map(this.users.map((user, index) => [user.id, index]));
+        
+        if (this.users.length === 0) {
+            this.showMessage(this.emptyText);
+            return;
+        }
+        this.clearMessage();
+        
+        const virtual = this.users.length > this.virtualThreshold;
+        if (virtual !== this.virtual) {
+            this.setVirtual(virtual);
+        }
+        if (this.virtual) {
+            this.windowStart = -1;
+            this.renderWindow();
+        } else {
+            this.reconcile(this.users, null);
+        }
+    }
+    
+    // 更新单个用户（只修改发生变化的单元格）
+    updateUser(userId, changes) {
+        const index = this.indexById.get(userId);
+        if (index === undefined) return false;
+        const user = Object.assign(this.users[index], changes);
+        const entry = this.rendered.get(userId);
+        if (entry) {
+            this.patchRow(entry, user);
+        }
+        return true;
+    }
+    
+    // 移除单个用户
+    removeUser(userId) {
+        const index = this.indexById.get(userId);
+        if (index === undefined) return false;
+        this.users.splice(index, 1);
+        this.setUsers(this.users);
+        return true;
+    }
+    
+    getUser(userId) {
+        const index = this.indexById.get(userId);
+        return index === undefined ? null : this.users[index];
+    }
+    
+    // 显示提示行（加载中、加载失败等）
+    showMessage(text) {
+        this.setVirtual(false);
+        this.tbody.innerHTML = `<tr class="table-message"><td colspan="${this.columnCount}" class="text-center">${text}</td></tr>`;
+    }
+    
+    clearMessage() {
+        this.tbody.querySelectorAll('tr:not([data-user-id]):not(.virtual-spacer)').forEach(tr => tr.remove());
+    }
+    
+    clear() {
+        this.rendered.forEach(entry => entry.tr.remove());
+        this.rendered.clear();
+        this.topSpacer.remove();
+        this.bottomSpacer.remove();
+        this.windowStart = this.windowEnd = -1;
+    }
+    
+    setVirtual(enabled) {
+        this.clear();
+        this.virtual = enabled;
+        this.container.classList.toggle('virtual-scroll', enabled);
+        this.table.classList.toggle('virtual-rows', enabled);
+        if (enabled) {
+            this.tbody.appendChild(this.topSpacer);
+            this.tbody.appendChild(this.bottomSpacer);
+        }
+    }
+    
+    onScroll() {
+        if (!this.virtual || this.scrollFrame !== null) return;
+        this.scrollFrame = requestAnimationFrame(() => {
+            this.scrollFrame = null;
+            this.renderWindow();
+        });
+    }
+    
+    // 虚拟滚动：只渲染可视区域附近的行
+    renderWindow() {
+        const viewport = this.container.clientHeight || 600;
+        const headerHeight = this.table.tHead ? this.table.tHead.offsetHeight : 0;
+        const scrollTop = Math.max(0, this.container.scrollTop - headerHeight);
+        const total = this.users.length;
+        
+        const start = Math.max(0, Math.floor(scrollTop / this.rowHeight) - virtualScrollOverscan);
+        const end = Math.min(total, Math.ceil((scrollTop + viewport) / this.rowHeight) + virtualScrollOverscan);
+        if (start === this.windowStart && end === this.windowEnd) return;
+        this.windowStart = start;
+        this.windowEnd = end;
+        
+        this.topSpacer.firstChild.style.height = `${start * this.rowHeight}px`;
+        this.bottomSpacer.firstChild.style.height = `${(total - end) * this.rowHeight}px`;
+        this.reconcile(this.users.slice(start, end), this.bottomSpacer);
+        
+        // 首次渲染后按实际行高校准
+        const first = this.rendered.values().next().value;
+        if (!this.rowHeightMeasured && first && first.tr.offsetHeight) {
+            this.rowHeightMeasured = true;
+            if (first.tr.offsetHeight === this.rowHeight) return;
+            this.rowHeight = first.tr.offsetHeight;
+            this.windowStart = -1;
+            this.renderWindow();
+        }
+    }
+    
+    // 键控差异更新：复用已有行，只修改变化的单元格，并按顺序放置
+    reconcile(users, beforeNode) {
+        const keep = new Set(users.map(user => user.id));
+        this.rendered.forEach((entry, id) => {
+            if (!keep.has(id)) {
+                entry.tr.remove();
+                this.rendered.delete(id);
+            }
+        });
+        
+        let cursor = this.virtual ? this.topSpacer.nextSibling : this.tbody.firstChild;
+        users.forEach(user => {
+            let entry = this.rendered.get(user.id);
+            if (entry) {
+                this.patchRow(entry, user);
+            } else {
+                entry = this.createRow(user);
+                this.rendered.set(user.id, entry);
+            }
+            if (entry.tr !== cursor) {
+                this.tbody.insertBefore(entry.tr, cursor || beforeNode);
+            } else {
+                cursor = cursor.nextSibling;
+            }
+        });
+    }
+    
+    createRow(user) {
+        const tr = document.createElement('tr');
+        tr.dataset.userId = user.id;
+        const cells = this.renderCells(user);
+        tr.innerHTML = cells.map(html => `<td>${html}</td>`).join('');
+        return { tr, cells };
+    }
+    
+    patchRow(entry, user) {
+        const cells = this.renderCells(user);
+        for (let i = 0; i < cells.length; i++) {
+            if (cells[i] !== entry.cells[i]) {
+                entry.tr.children[i].innerHTML = cells[i];
+            }
+        }
+        entry.cells = cells;
+    }
+}
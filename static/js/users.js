@@ -1,7 +1,7 @@
 // 用户管理页面 JavaScript
 
 let currentPage = 1;
-const pageSize = 20;
+let pageSize = 20;
 const columnDefaultWidths = [70, 120, 110, 110, 110, 110, 210, 140, 110, 90, 170];
 const columnWidthStorageKey = 'userTableColumnWidths_v1';
 const gradientStorageKey = 'userTableHeaderGradient_v1';
@@ -10,6 +10,18 @@ const gradientDefaults = {
     end: '#764ba2'
 };
 const minimumColumnWidth = 70;
+// 预取页面的有效期（毫秒）
+const pageCacheTtl = 30000;
+
+// 用户表格渲染器（键控差异更新 + 虚拟滚动）
+let usersTable = null;
+// 已加载/预取的分页数据：url -> { promise, loadedAt }
+const userPageCache = new Map();
+let usersRequestController = null;
+let usersRequestUrl = null;
+let lastPagination = null;
+// 正在编辑的用户的版本号（保存时通过 If-Match 检查是否已被他人修改）
+let editingUserVersion = null;
 
 // 获取角色名称
 function getRoleName(role) {
@@ -31,24 +43,25 @@ function getActionButtons(user) {
     
     let buttons = '';
     
+    // 按钮通过 data-action 由表格上的委托监听器处理
     if (canEdit) {
-        buttons += `<button class="btn btn-primary btn-sm" onclick="editUser(${user.id})">编辑</button>`;
+        buttons += `<button class="btn btn-primary btn-sm" data-action="edit">编辑</button>`;
     }
     
     if (canDisable && user.id !== currentUserId) {
         if (isActive) {
-            buttons += `<button class="btn btn-warning btn-sm" onclick="disableUser(${user.id})">停用</button>`;
+            buttons += `<button class="btn btn-warning btn-sm" data-action="disable">停用</button>`;
         } else {
-            buttons += `<button class="btn btn-success btn-sm" onclick="enableUser(${user.id})">启用</button>`;
+            buttons += `<button class="btn btn-success btn-sm" data-action="enable">启用</button>`;
         }
     }
     
     if (canDelete && user.id !== currentUserId) {
-        buttons += `<button class="btn btn-danger btn-sm" onclick="deleteUser(${user.id})">删除</button>`;
+        buttons += `<button class="btn btn-danger btn-sm" data-action="delete">删除</button>`;
     }
     
     if (!buttons) {
-        buttons = `<button class="btn btn-secondary btn-sm" onclick="viewUser(${user.id})">查看</button>`;
+        buttons = `<button class="btn btn-secondary btn-sm" data-action="view">查看</button>`;
     }
     
     return buttons;
@@ -61,77 +74,333 @@ function viewUser(userId) {
 
 // 页面加载时初始化
 document.addEventListener('DOMContentLoaded', function() {
+    // 其他页面（如表格基准测试页）只复用本文件中的渲染函数
+    if (!document.getElementById('usersTable')) return;
+    initUsersTable();
     initTableAppearanceControls();
     initColumnResizing();
-    loadUsers();
-    loadDepartments();
-    loadPositions();
+    initSearchInput();
+    initPageSizeSelect();
+    // 首屏数据填充缓存后再加载，三个列表直接命中缓存
+    applyBootstrapData().finally(() => {
+        loadUsers();
+        loadDepartments();
+        loadPositions();
+    });
+    initLiveUpdates();
 });
 
-// 加载用户列表
+function initUsersTable() {
+    const table = document.getElementById('usersTable');
+    if (!table) return;
+    usersTable = new UserTableRenderer(table, {
+        columnCount: 11,
+        renderCells: getUserCells,
+        emptyText: '暂无用户数据',
+        actions: {
+            edit: (userId) => editUser(userId),
+            view: (userId) => viewUser(userId),
+            disable: (userId) => disableUser(userId),
+            enable: (userId) => enableUser(userId),
+            delete: (userId) => deleteUser(userId)
+        }
+    });
+}
+
+// 每页条数（查看整个部门时可调大，行数较多时表格自动切换为虚拟滚动）
+function initPageSizeSelect() {
+    const select = document.getElementById('pageSize');
+    if (!select) return;
+    select.value = String(pageSize);
+    select.addEventListener('change', () => {
+        pageSize = Number(select.value) || 20;
+        searchUsers();
+    });
+}
+
+// 输入关键词时自动搜索（防抖），回车立即搜索
+function initSearchInput() {
+    const input = document.getElementById('searchKeyword');
+    if (!input) return;
+    const debouncedSearch = debounce(searchUsers, 300);
+    input.addEventListener('input', debouncedSearch);
+    input.addEventListener('keydown', (event) => {
+        if (event.key === 'Enter') {
+            event.preventDefault();
+            searchUsers();
+        }
+    });
+}
+
+// 根据当前筛选条件构造列表 URL
+function buildUsersUrl(page) {
+    const keyword = (document.getElementById('searchKeyword')?.value || '').trim();
+    const status = document.getElementById('filterStatus')?.value || '';
+    const departmentId = document.getElementById('filterDepartment')?.value || '';
+    
+    let url = `/api/users?page=${page}&page_size=${pageSize}`;
+    if (keyword) url += `&keyword=${encodeURIComponent(keyword)}`;
+    if (status) url += `&status=${status}`;
+    // 选择部门时同时显示下级部门的用户
+    if (departmentId) url += `&department_id=${departmentId}&include_subdepartments=1`;
+    return url;
+}
+
+// 读取分页数据（优先使用未过期的预取结果）
+function fetchUsersPage(url, signal) {
+    const cached = userPageCache.get(url);
+    if (cached && Date.now() - cached.loadedAt < pageCacheTtl) {
+        return cached.promise;
+    }
+    const promise = apiGet(url, signal);
+    userPageCache.set(url, { promise, loadedAt: Date.now() });
+    promise.catch(() => {
+        if (userPageCache.get(url)?.promise === promise) {
+            userPageCache.delete(url);
+        }
+    });
+    return promise;
+}
+
+// 预取下一页
+function prefetchNextPage(pagination) {
+    if (!pagination || pagination.page >= pagination.total_pages) return;
+    const url = buildUsersUrl(pagination.page + 1);
+    if (userPageCache.has(url)) return;
+    fetchUsersPage(url).catch(() => {});
+}
+
+// 读取首屏数据：优先使用页面内嵌的数据，没有时一次请求 /api/bootstrap
+async function loadBootstrapData() {
+    const script = document.getElementById('usersBootstrap');
+    if (script) {
+        script.remove();
+        try {
+            return JSON.parse(script.textContent);
+        } catch (error) {
+            console.warn('解析首屏数据失败', error);
+        }
+    }
+    try {
+        const response = await apiGet(`/api/bootstrap?page_size=${pageSize}`);
+        return response.success ? response.data : null;
+    } catch (error) {
+        console.warn('获取首屏数据失败', error);
+        return null;
+    }
+}
+
+// 使用首屏数据填充缓存，首次加载不再分别请求各个接口
+async function applyBootstrapData() {
+    const bootstrap = await loadBootstrapData();
+    if (!bootstrap) return;
+    
+    const { users, departments, positions } = bootstrap;
+    if (users && users.url === buildUsersUrl(currentPage)) {
+        userPageCache.set(users.url, { promise: Promise.resolve(users.response), loadedAt: Date.now() });
+    }
+    [departments, positions].forEach(item => {
+        if (item) seedApiCache(item.url, item.response, item.etag);
+    });
+}
+
+// 数据发生变化后清除分页缓存
+function invalidateUserPages() {
+    userPageCache.clear();
+}
+
+// 加载用户列表（新的请求会取消尚未完成的旧请求）
 async function loadUsers() {
+    if (usersRequestController) {
+        usersRequestController.abort();
+        // 被取消的请求不能再被复用
+        userPageCache.delete(usersRequestUrl);
+    }
+    const controller = new AbortController();
+    const url = buildUsersUrl(currentPage);
+    usersRequestController = controller;
+    usersRequestUrl = url;
+    
     try {
-        const keyword = document.getElementById('searchKeyword')?.value || '';
-        const status = document.getElementById('filterStatus')?.value || '';
-        const departmentId = document.getElementById('filterDepartment')?.value || '';
-        
-        let url = `/api/users?page=${currentPage}&page_size=${pageSize}`;
-        if (keyword) url += `&keyword=${encodeURIComponent(keyword)}`;
-        if (status) url += `&status=${status}`;
-        if (departmentId) url += `&department_id=${departmentId}`;
-        
-        const response = await apiGet(url);
+        const response = await fetchUsersPage(url, controller.signal);
+        if (controller.signal.aborted) return;
         
         if (response.success) {
             renderUsersTable(response.data.users);
             renderPagination(response.data.pagination);
+            prefetchNextPage(response.data.pagination);
         } else {
             showToast('加载用户列表失败: ' + response.message, 'error');
         }
     } catch (error) {
+        if (isAbortError(error) || controller.signal.aborted) return;
         showToast('加载用户列表失败: ' + error.message, 'error');
-        document.getElementById('usersTableBody').innerHTML = 
-            '<tr><td colspan="11" class="text-center">加载失败，请刷新重试</td></tr>';
+        usersTable.showMessage('加载失败，请刷新重试');
+    } finally {
+        if (usersRequestController === controller) {
+            usersRequestController = null;
+            usersRequestUrl = null;
+        }
     }
 }
 
-// 渲染用户表格
+// 渲染用户表格（按用户 ID 复用已有行，只更新变化的单元格）
 function renderUsersTable(users) {
-    const tbody = document.getElementById('usersTableBody');
-    
-    if (!users || users.length === 0) {
-        tbody.innerHTML = '<tr><td colspan="11" class="text-center">暂无用户数据</td></tr>';
+    usersTable.setUsers(users);
+}
+
+// 一行中各列的 HTML
+function getUserCells(user) {
+    const isActive = Number(user.status) === 1;
+    const statusClass = isActive ? 'active' : 'inactive';
+    const statusText = isActive ? '启用' : '禁用';
+    return [
+        String(user.id),
+        user.username || '-',
+        user.real_name || '-',
+        user.employee_id || '-',
+        user.department || '-',
+        user.position || '-',
+        user.email || '-',
+        user.phone || '-',
+        `<span class="role-badge role-${user.role}">${getRoleName(user.role)}</span>`,
+        `<span class="status-badge status-${statusClass}">${statusText}</span>`,
+        `<div class="action-buttons">${getActionButtons(user)}</div>`
+    ];
+}
+
+// 原位更新一行（编辑、停用、启用后无需重新加载整页）
+function patchUserRow(userId, changes) {
+    return usersTable.updateUser(userId, changes);
+}
+
+// 从当前页移除一行
+function removeUserRow(userId) {
+    usersTable.removeUser(userId);
+    if (lastPagination) {
+        lastPagination.total = Math.max(0, lastPagination.total - 1);
+        renderPagination(lastPagination);
+    }
+}
+
+// ===== 实时更新（服务器推送变更，只刷新受影响的行） =====
+
+let liveEvents = null;
+const scheduleLiveReload = debounce(() => {
+    invalidateUserPages();
+    loadUsers();
+}, 500);
+
+function initLiveUpdates() {
+    if (!window.EventSource) return;
+    liveEvents = new EventSource(`${API_BASE_URL}/api/events`);
+    let disconnected = false;
+    
+    liveEvents.addEventListener('ready', () => {
+        // 断线期间的变更无法补发，重连后整体刷新
+        if (disconnected) {
+            disconnected = false;
+            scheduleLiveReload();
+        }
+    });
+    liveEvents.addEventListener('change', (event) => {
+        try {
+            handleLiveChange(JSON.parse(event.data));
+        } catch (error) {
+            console.warn('处理实时变更失败', error);
+        }
+    });
+    liveEvents.addEventListener('reset', scheduleLiveReload);
+    liveEvents.addEventListener('error', () => {
+        disconnected = true;
+        // 登录失效等情况下服务器直接拒绝连接，不再重试
+        if (liveEvents.readyState === EventSource.CLOSED) {
+            liveEvents = null;
+        }
+    });
+    window.addEventListener('beforeunload', () => liveEvents && liveEvents.close());
+}
+
+function handleLiveChange(change) {
+    if (change.entity === 'department') {
+        invalidateApiCache('/api/departments');
+        loadDepartments();
+        scheduleLiveReload();
+    } else if (change.entity === 'position') {
+        invalidateApiCache('/api/positions');
+        loadPositions();
+        scheduleLiveReload();
+    } else if (change.entity === 'user') {
+        handleLiveUserChange(change);
+    }
+}
+
+// 当前页中的用户只刷新这一行；其他用户的变化可能影响分页，延迟重新加载
+function handleLiveUserChange(change) {
+    if (!usersTable || !usersTable.getUser(change.id)) {
+        scheduleLiveReload();
         return;
     }
-    
-    tbody.innerHTML = users.map(user => `
-        <tr>
-            <td>${user.id}</td>
-            <td>${user.username || '-'}</td>
-            <td>${user.real_name || '-'}</td>
-            <td>${user.employee_id || '-'}</td>
-            <td>${user.department || '-'}</td>
-            <td>${user.position || '-'}</td>
-            <td>${user.email || '-'}</td>
-            <td>${user.phone || '-'}</td>
-            <td><span class="role-badge role-${user.role}">${getRoleName(user.role)}</span></td>
-            ${(() => {
-                const isActive = Number(user.status) === 1;
-                const statusClass = isActive ? 'active' : 'inactive';
-                const statusText = isActive ? '启用' : '禁用';
-                return `<td><span class="status-badge status-${statusClass}">${statusText}</span></td>`;
-            })()}
-            <td>
-                <div class="action-buttons">
-                    ${getActionButtons(user)}
-                </div>
-            </td>
-        </tr>
-    `).join('');
+    // 归档的用户不在默认列表中，与删除一样移除
+    if (change.op === 'delete' || change.op === 'archive') {
+        invalidateUserPages();
+        removeUserRow(change.id);
+        return;
+    }
+    refreshUserRow(change.id);
+}
+
+async function refreshUserRow(userId) {
+    let response;
+    try {
+        response = await apiGet(`/api/users/${userId}`);
+    } catch (error) {
+        // 已删除或已调出本部门
+        invalidateUserPages();
+        removeUserRow(userId);
+        return;
+    }
+    if (!response.success) return;
+    invalidateUserPages();
+    const user = response.data;
+    if (!userMatchesFilters(user)) {
+        scheduleLiveReload();
+        return;
+    }
+    patchUserRow(userId, user);
+}
+
+// 关键词匹配由服务器判断，这里只检查状态和部门筛选
+function userMatchesFilters(user) {
+    const status = document.getElementById('filterStatus')?.value || '';
+    const departmentId = document.getElementById('filterDepartment')?.value || '';
+    if (status && String(user.status) !== status) return false;
+    if (departmentId && !isInDepartmentTree(user.department_id, departmentId)) return false;
+    return true;
+}
+
+// 部门是否为指定部门本身或它的下级部门（按部门缓存中的 parent_id 向上查找）
+function isInDepartmentTree(departmentId, ancestorId) {
+    const byId = new Map((window.departmentsCache || []).map(d => [String(d.id), d]));
+    let current = departmentId == null ? null : String(departmentId);
+    const visited = new Set();
+    while (current && !visited.has(current)) {
+        if (current === String(ancestorId)) return true;
+        visited.add(current);
+        const department = byId.get(current);
+        current = department && department.parent_id != null ? String(department.parent_id) : null;
+    }
+    return false;
+}
+
+// 下拉框中按层级缩进显示部门（接口按层级顺序返回）
+function departmentOptionLabel(department) {
+    return '\u3000'.repeat(department.depth || 0) + department.name;
 }
 
 // 渲染分页
 function renderPagination(pagination) {
+    lastPagination = pagination;
     const paginationDiv = document.getElementById('pagination');
     if (!pagination || pagination.total_pages <= 1) {
         paginationDiv.innerHTML = '';
@@ -163,73 +432,85 @@ function searchUsers() {
 
 // 加载部门列表（用于筛选和表单）
 async function loadDepartments(options = {}) {
-    const { refreshFilter = true, refreshForm = true } = options;
     try {
-        const response = await apiGet('/api/departments?status=1');
-        if (response.success) {
-            const departments = response.data || [];
-            window.departmentsCache = departments;
-            
-            if (refreshFilter) {
-                const filterSelect = document.getElementById('filterDepartment');
-                if (filterSelect) {
-                    const previousValue = filterSelect.value;
-                    filterSelect.innerHTML = '<option value="">全部部门</option>' +
-                        departments.map(d => `<option value="${d.id}">${d.name}</option>`).join('');
-                    if (previousValue && filterSelect.querySelector(`option[value="${previousValue}"]`)) {
-                        filterSelect.value = previousValue;
-                    }
-                }
+        const response = await apiGetCached('/api/departments?status=1', {
+            // 后台重新验证发现数据变化时刷新下拉框
+            onUpdate: (fresh) => renderDepartmentOptions(fresh, options)
+        });
+        renderDepartmentOptions(response, options);
+    } catch (error) {
+        console.error('加载部门列表失败:', error);
+    }
+}
+
+function renderDepartmentOptions(response, options = {}) {
+    const { refreshFilter = true, refreshForm = true } = options;
+    if (!response.success) return;
+    const departments = response.data || [];
+    window.departmentsCache = departments;
+    
+    if (refreshFilter) {
+        const filterSelect = document.getElementById('filterDepartment');
+        if (filterSelect) {
+            const previousValue = filterSelect.value;
+            filterSelect.innerHTML = '<option value="">全部部门</option>' +
+                departments.map(d => `<option value="${d.id}">${departmentOptionLabel(d)}</option>`).join('');
+            if (previousValue && filterSelect.querySelector(`option[value="${previousValue}"]`)) {
+                filterSelect.value = previousValue;
             }
-            
-            if (refreshForm) {
-                const formSelect = document.getElementById('department');
-                if (formSelect) {
-                    const previousValue = formSelect.value;
-                    formSelect.innerHTML = '<option value="">请选择部门</option>' +
-                        departments.map(d => `<option value="${d.id}">${d.name}</option>`).join('');
-                    if (previousValue && formSelect.querySelector(`option[value="${previousValue}"]`)) {
-                        formSelect.value = previousValue;
-                    }
-                }
+        }
+    }
+    
+    if (refreshForm) {
+        const formSelect = document.getElementById('department');
+        if (formSelect) {
+            const previousValue = formSelect.value;
+            formSelect.innerHTML = '<option value="">请选择部门</option>' +
+                departments.map(d => `<option value="${d.id}">${departmentOptionLabel(d)}</option>`).join('');
+            if (previousValue && formSelect.querySelector(`option[value="${previousValue}"]`)) {
+                formSelect.value = previousValue;
             }
         }
-    } catch (error) {
-        console.error('加载部门列表失败:', error);
     }
 }
 
 // 加载职位列表（用于表单）
 async function loadPositions(options = {}) {
-    const { refreshForm = true } = options;
     try {
-        const response = await apiGet('/api/positions?status=1');
-        if (response.success && refreshForm) {
-            const positions = response.data || [];
-            window.positionsCache = positions;
-            const positionSelect = document.getElementById('position');
-            
-            if (positionSelect) {
-                const previousValue = positionSelect.value;
-                positionSelect.innerHTML = '<option value="">请选择职位</option>' +
-                    positions.map(p => `<option value="${p.id}" data-role="${p.role}">${p.name}</option>`).join('');
-                if (previousValue && positionSelect.querySelector(`option[value="${previousValue}"]`)) {
-                    positionSelect.value = previousValue;
-                }
-                
-                positionSelect.onchange = function() {
-                    updateRoleDisplayFromPosition();
-                };
-            }
-        }
-        
-        // 确保初始化时同步更新角色显示
-        updateRoleDisplayFromPosition();
+        const response = await apiGetCached('/api/positions?status=1', {
+            onUpdate: (fresh) => renderPositionOptions(fresh, options)
+        });
+        renderPositionOptions(response, options);
     } catch (error) {
         console.error('加载职位列表失败:', error);
     }
 }
 
+function renderPositionOptions(response, options = {}) {
+    const { refreshForm = true } = options;
+    if (response.success && refreshForm) {
+        const positions = response.data || [];
+        window.positionsCache = positions;
+        const positionSelect = document.getElementById('position');
+        
+        if (positionSelect) {
+            const previousValue = positionSelect.value;
+            positionSelect.innerHTML = '<option value="">请选择职位</option>' +
+                positions.map(p => `<option value="${p.id}" data-role="${p.role}">${p.name}</option>`).join('');
+            if (previousValue && positionSelect.querySelector(`option[value="${previousValue}"]`)) {
+                positionSelect.value = previousValue;
+            }
+            
+            positionSelect.onchange = function() {
+                updateRoleDisplayFromPosition();
+            };
+        }
+    }
+    
+    // 确保初始化时同步更新角色显示
+    updateRoleDisplayFromPosition();
+}
+
 function updateRoleDisplayFromPosition() {
     const positionSelect = document.getElementById('position');
     const roleInput = document.getElementById('role');
@@ -256,6 +537,7 @@ async function openUserModal(userId = null, readOnly = false) {
     
     form.reset();
     document.getElementById('userId').value = '';
+    editingUserVersion = null;
     
     // 重新加载部门和职位列表（仅刷新表单）
     await loadDepartments({ refreshFilter: false, refreshForm: true });
@@ -272,6 +554,7 @@ async function openUserModal(userId = null, readOnly = false) {
             const response = await apiGet(`/api/users/${userId}`);
             if (response.success) {
                 const user = response.data;
+                editingUserVersion = user.version || null;
                 document.getElementById('userId').value = user.id;
                 document.getElementById('username').value = user.username || '';
                 document.getElementById('realName').value = user.real_name || '';
@@ -383,8 +666,9 @@ async function saveUser(event) {
     try {
         let response;
         if (userId) {
-            // 更新用户
-            response = await apiPut(`/api/users/${userId}`, formData);
+            // 更新用户（版本不一致时返回 412，提示刷新后重试）
+            const headers = editingUserVersion ? { 'If-Match': `"${editingUserVersion}"` } : {};
+            response = await apiPut(`/api/users/${userId}`, formData, headers);
         } else {
             // 创建用户
             if (!password) {
@@ -397,8 +681,11 @@ async function saveUser(event) {
         if (response.success) {
             showToast(userId ? '用户更新成功' : '用户创建成功', 'success');
             closeUserModal();
-            loadUsers();
-            loadDepartments(); // 重新加载部门列表（用于筛选）
+            invalidateUserPages();
+            // 编辑后原位更新该行；新建用户（或该行不在当前页）时重新加载列表
+            if (!userId || !patchUserRow(Number(userId), response.data)) {
+                loadUsers();
+            }
         } else {
             showToast('操作失败: ' + response.message, 'error');
         }
@@ -422,7 +709,8 @@ async function deleteUser(userId) {
         const response = await apiDelete(`/api/users/${userId}`);
         if (response.success) {
             showToast('用户已彻底删除', 'success');
-            loadUsers();
+            invalidateUserPages();
+            removeUserRow(userId);
         } else {
             showToast('删除失败: ' + response.message, 'error');
         }
@@ -440,7 +728,8 @@ async function disableUser(userId) {
         const response = await apiPost(`/api/users/${userId}/disable`, {});
         if (response.success) {
             showToast('用户已停用', 'success');
-            loadUsers();
+            invalidateUserPages();
+            if (!patchUserRow(userId, { status: 0 })) loadUsers();
         } else {
             showToast('停用失败: ' + response.message, 'error');
         }
@@ -458,7 +747,8 @@ async function enableUser(userId) {
         const response = await apiPost(`/api/users/${userId}/enable`, {});
         if (response.success) {
             showToast('用户已启用', 'success');
-            loadUsers();
+            invalidateUserPages();
+            if (!patchUserRow(userId, { status: 1 })) loadUsers();
         } else {
             showToast('启用失败: ' + response.message, 'error');
         }
@@ -560,16 +850,33 @@ function initColumnResizing() {
     let startWidth = 0;
     let targetIndex = null;
     let activeHandle = null;
+    let pendingWidth = null;
+    let resizeFrame = null;
     
+    // 每帧最多调整一次列宽，避免拖动时对整张表反复重排
     const onPointerMove = (event) => {
         if (targetIndex === null) return;
         const delta = event.clientX - startX;
-        const newWidth = Math.max(minimumColumnWidth, startWidth + delta);
-        setColumnWidth(targetIndex, newWidth);
+        pendingWidth = Math.max(minimumColumnWidth, startWidth + delta);
+        if (resizeFrame !== null) return;
+        resizeFrame = requestAnimationFrame(() => {
+            resizeFrame = null;
+            if (targetIndex !== null && pendingWidth !== null) {
+                setColumnWidth(targetIndex, pendingWidth);
+            }
+        });
     };
     
     const onPointerUp = () => {
         if (targetIndex === null) return;
+        if (resizeFrame !== null) {
+            cancelAnimationFrame(resizeFrame);
+            resizeFrame = null;
+        }
+        if (pendingWidth !== null) {
+            setColumnWidth(targetIndex, pendingWidth);
+            pendingWidth = null;
+        }
         document.removeEventListener('pointermove', onPointerMove);
         document.removeEventListener('pointerup', onPointerUp);
         if (activeHandle) {
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户输入提示索引
+
+表单中选择用户时按输入前缀提示，不访问 MySQL：
+- 每个用户的索引键：用户名、工号、姓名，以及姓名的拼音全拼和首字母
+  （安装 pypinyin 后生效，例如 "zxm"、"zhaox" 都能找到 赵小明），不区分大小写
+- 有序数组：(键, 用户 ID) 按键排序，前缀查询即二分定位后顺序读取，
+  完全匹配排在前面；全部用户一份，每个部门各一份（数据权限过滤不需要逐条判断，
+  可见范围包含下级部门时归并这些部门的数组）
+
+保持最新：启动时各分片在一致性快照中全量加载，之后按变更日志序号增量同步
+（定时任务同步其他进程的写入，本进程写入后立即同步所在分片）；变更日志已被清理时
+全量重新加载。未加载完成时返回 None，调用方回退到 SQL 前缀查询。
+"""
+
+import bisect
+import heapq
+import threading
+import time
+
+from models.change_log import ChangeLog, ChangeLogPurged
+from sharding import router
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # pypinyin 为可选依赖，未安装时不支持拼音提示
+    lazy_pinyin = None
+
+# 提示结果中的用户字段
+SUGGEST_FIELDS = ('id', 'username', 'real_name', 'employee_id', 'department_id', 'status')
+DEPARTMENT = SUGGEST_FIELDS.index('department_id')
+# 一次同步最多读取的变更条数
+SYNC_BATCH_SIZE = 500
+
+
+def pinyin_keys(text):
+    """姓名的拼音全拼和首字母（不含汉字或未安装 pypinyin 时为空）"""
+    if not lazy_pinyin or not text or text.isascii():
+        return set()
+    return {
+        ''.join(lazy_pinyin(text)).casefold(),
+        ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER)).casefold()
+    }
+
+
+def index_keys(data):
+    """用户的全部索引键"""
+    keys = {data[name].casefold() for name in ('username', 'employee_id', 'real_name') if data.get(name)}
+    return keys | pinyin_keys(data.get('real_name'))
+
+
+class SuggestIndex:
+    """用户输入提示索引"""
+    
+    def __init__(self):
+        self.enabled = True
+        self.sync_interval = 2
+        self.default_limit = 10
+        self.max_limit = 50
+        # 用户 ID -> (提示字段元组, 索引键)
+        self._users = None
+        # 部门 ID（None 表示全部用户）-> 有序的 (键, 用户 ID) 列表
+        self._entries = {}
+        # 各分片已同步到的变更序号
+        self._seqs = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.counters = {'served': 0, 'fallbacks': 0, 'synced_changes': 0, 'reloads': 0}
+    
+    def configure(self, config):
+        """按 config.json 的 suggest 配置"""
+        self.enabled = config.get('enabled', self.enabled)
+        self.sync_interval = config.get('sync_interval', self.sync_interval)
+        self.default_limit = config.get('default_limit', self.default_limit)
+        self.max_limit = config.get('max_limit', self.max_limit)
+    
+    @property
+    def loaded(self):
+        return self.enabled and self._users is not None
+    
+    # ------------------------------------------------------------------
+    # 加载与同步
+    # ------------------------------------------------------------------
+    
+    def refresh(self):
+        """定时任务入口：未加载时全量加载，否则增量同步"""
+        if not self.enabled:
+            return 0
+        if self._users is None:
+            return self.reload()
+        return self.sync()
+    
+    @staticmethod
+    def _load_shard(database):
+        """在一致性快照中读取一个分片的全部用户，返回 (用户列表, 变更序号)"""
+        with database.transaction() as cursor:
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            cursor.execute("SELECT value FROM change_log_state WHERE name='seq'")
+            row = cursor.fetchone()
+            cursor.execute(f"SELECT {', '.join(SUGGEST_FIELDS)} FROM users")
+            return cursor.fetchall(), row['value'] if row else 0
+    
+    def reload(self):
+        """全量加载（加载期间继续使用旧数据，完成后整体替换），返回用户数"""
+        with self._sync_lock:
+            users, seqs = {}, {}
+            for database in router.databases():
+                rows, seqs[database.shard_name] = self._load_shard(database)
+                # 部门迁移过程中同一用户可能出现在两个分片，按 ID 去重
+                for row in rows:
+                    users[row['id']] = (tuple(row[name] for name in SUGGEST_FIELDS), index_keys(row))
+            entries = {None: []}
+            for user_id, (fields, keys) in users.items():
+                scoped = entries.setdefault(fields[DEPARTMENT], [])
+                for key in keys:
+                    entries[None].append((key, user_id))
+                    scoped.append((key, user_id))
+            for items in entries.values():
+                items.sort()
+            with self._lock:
+                self._users = users
+                self._entries = entries
+                self._seqs = seqs
+                self._synced_at = time.monotonic()
+            self.counters['reloads'] += 1
+            return len(users)
+    
+    def sync(self, database=None):
+        """按变更日志同步用户的新增、修改、删除和归档（默认同步所有分片），返回处理的变更数"""
+        if not self.loaded:
+            return 0
+        databases = [database] if database is not None else router.databases()
+        applied = 0
+        with self._sync_lock:
+            for shard in databases:
+                try:
+                    applied += self._sync_shard(shard)
+                except ChangeLogPurged:
+                    # 落后于已清理的删除记录：无法增量同步
+                    break
+            else:
+                self._synced_at = time.monotonic()
+                self.counters['synced_changes'] += applied
+                return applied
+        return self.reload()
+    
+    def _sync_shard(self, database):
+        name = database.shard_name
+        applied = 0
+        while True:
+            result = ChangeLog.get_changes(since=self._seqs.get(name, 0), limit=SYNC_BATCH_SIZE,
+                                           database=database)
+            with self._lock:
+                for change in result['changes']:
+                    if change['entity'] != 'user':
+                        continue
+                    if change['op'] == 'upsert':
+                        self._upsert(change['data'])
+                    elif change['op'] in ('delete', 'archive'):
+                        # 归档的用户不再提示
+                        self._remove(change['id'])
+                    # move：目标分片的变更日志中有新的快照
+                    applied += 1
+                self._seqs[name] = result['next_since']
+            if not result['has_more']:
+                return applied
+    
+    def sync_after_write(self, database):
+        """本进程写入用户后调用：立即同步所在分片（失败时由定时任务补齐）"""
+        if not self.loaded or database is None:
+            return
+        try:
+            self.sync(database)
+        except Exception as e:
+            print(f"输入提示索引同步失败: {e}")
+    
+    def _upsert(self, data):
+        """写入一个用户的索引（调用方持有 _lock）"""
+        self._remove(data['id'])
+        fields = tuple(data.get(name) for name in SUGGEST_FIELDS)
+        keys = index_keys(data)
+        self._users[data['id']] = (fields, keys)
+        for entries in (self._entries[None], self._entries.setdefault(fields[DEPARTMENT], [])):
+            for key in keys:
+                bisect.insort(entries, (key, data['id']))
+    
+    def _remove(self, user_id):
+        """删除一个用户的索引（调用方持有 _lock）"""
+        record = self._users.pop(user_id, None)
+        if record is None:
+            return
+        fields, keys = record
+        for entries in (self._entries[None], self._entries.get(fields[DEPARTMENT], [])):
+            for key in keys:
+                index = bisect.bisect_left(entries, (key, user_id))
+                if index < len(entries) and entries[index] == (key, user_id):
+                    del entries[index]
+    
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    
+    def department_of(self, user_id):
+        """索引中用户所属的部门：(是否已知, 部门 ID)"""
+        if not self.loaded:
+            return False, None
+        record = self._users.get(user_id)
+        return record is not None, record[0][DEPARTMENT] if record else None
+    
+    def query(self, prefix, scope=None, limit=10):
+        """按前缀查询用户
+        
+        Args:
+            prefix: 输入的前缀（不区分大小写）
+            scope: 可见的部门 ID 集合（本部门及下级部门），None 表示全部用户（超级管理员）
+            limit: 最多返回的用户数
+        
+        Returns:
+            list: 用户字典（完全匹配在前，其余按匹配的键排序）；未加载时返回 None
+        """
+        if not self.loaded:
+            if self.enabled:
+                self.counters['fallbacks'] += 1
+            return None
+        prefix = prefix.casefold()
+        result, seen = [], set()
+        with self._lock:
+            # 多个部门时按键归并各部门的有序数组
+            scopes = [None] if scope is None else scope
+            matches = heapq.merge(*(self._prefix_entries(self._entries.get(d, []), prefix) for d in scopes))
+            for key, user_id in matches:
+                if len(result) >= limit:
+                    break
+                if user_id not in seen:
+                    seen.add(user_id)
+                    result.append(dict(zip(SUGGEST_FIELDS, self._users[user_id][0])))
+        self.counters['served'] += 1
+        return result
+    
+    @staticmethod
+    def _prefix_entries(entries, prefix):
+        """有序数组中以 prefix 开头的 (键, 用户 ID)"""
+        index = bisect.bisect_left(entries, (prefix,))
+        while index < len(entries) and entries[index][0].startswith(prefix):
+            yield entries[index]
+            index += 1
+    
+    def status(self):
+        """加载和同步状态（用于监控）"""
+        users = self._users
+        return {
+            'enabled': self.enabled,
+            'loaded': users is not None,
+            'pinyin': lazy_pinyin is not None,
+            'users': len(users) if users is not None else 0,
+            'keys': len(self._entries.get(None, [])),
+            'staleness': round(time.monotonic() - self._synced_at, 3) if self._synced_at else None,
+            'counters': dict(self.counters)
+        }
+
+
+# 全局输入提示索引（由应用按配置启用）
+index = SuggestIndex()
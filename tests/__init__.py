@@ -0,0 +1 @@
+# tests 包
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试公共夹具
+
+应用使用全局的 db 和分片路由，每个测试用 create_app 按测试配置重新设置它们，
+连接函数指向 mysql_stub 中的桩服务器（每个测试一组新的 SQLite 库），结束后恢复默认配置。
+后台任务、内存用户目录和输入提示索引默认关闭，需要的测试自行开启。
+"""
+
+import copy
+
+import pymysql
+import pytest
+
+from app import create_app
+from database import db
+from jobs import jobs
+from models.department_tree import tree as department_tree
+from models.user import User
+from sharding import router
+from tests.mysql_stub import StubCluster
+
+# 初始化数据中的部门和职位 ID（database.DEFAULT_DEPARTMENTS、DEFAULT_POSITIONS 的插入顺序）
+GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT = 1, 2
+GENERAL_MANAGER, MINISTER, DEPARTMENT_ADMIN, STAFF = 1, 2, 3, 4
+PASSWORD = 'secret123'
+
+BASE_CONFIG = {
+    'database': {
+        'host': 'primary',
+        'database': 'salary_management',
+        'request_deadline': 5,
+        'retry_backoff': 0,
+        'shard_map_ttl': 0
+    },
+    'app': {'secret_key': 'test-secret-key'},
+    'session': {'backend': 'sqlite'},
+    'ui': {'bootstrap': True},
+    'directory_engine': {'enabled': False},
+    'suggest': {'enabled': False},
+    'archive': {'enabled': False}
+}
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    """本测试的桩服务器（按 host 区分）"""
+    return StubCluster(str(tmp_path))
+
+
+@pytest.fixture
+def make_app(cluster, tmp_path):
+    """按测试配置创建应用：make_app(**database) 中的参数覆盖 database 配置段"""
+    def factory(**database):
+        config = copy.deepcopy(BASE_CONFIG)
+        config['database'].update(database)
+        config['session']['sqlite_path'] = str(tmp_path / 'sessions.db')
+        db.connector = cluster.connect
+        app = create_app(config)
+        app.config['TESTING'] = True
+        # 测试不运行后台任务，需要时直接调用任务函数
+        jobs.reset()
+        department_tree.invalidate()
+        return app
+    
+    yield factory
+    
+    jobs.reset()
+    db.connector = pymysql.connect
+    db.configure()
+    router.reload()
+    department_tree.invalidate()
+
+
+@pytest.fixture
+def app(make_app):
+    """单库（未分片、没有副本）的应用"""
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def create_user(username, department_id=GENERAL_DEPARTMENT, position_id=STAFF, **fields):
+    """直接通过模型创建用户（默认为综合部的员工），返回 User"""
+    fields.setdefault('real_name', username)
+    fields.setdefault('employee_id', username.upper())
+    user = User(username=username, password=PASSWORD, department_id=department_id,
+                position_id=position_id, **fields)
+    user.save()
+    return user
+
+
+def login(client, username):
+    """以 create_user 创建的用户登录"""
+    response = client.post('/api/users/login', json={'username': username, 'password': PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return response
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试使用的 MySQL 桩服务器（SQLite 实现）
+
+把应用发出的 MySQL 语句改写为 SQLite 可以执行的形式后执行，每个库是一个 SQLite 文件，
+没有 MySQL 的环境中也能测试多个分片库之间真实的数据流动（建表语句同样来自 database.py）。
+只覆盖本项目用到的语法：
+- %s 占位符、INSERT IGNORE、ON DUPLICATE KEY UPDATE（VALUES(col)）、DELETE ... LIMIT、IF()、<=>
+- FOR UPDATE、LOCK IN SHARE MODE、SKIP LOCKED 去掉（测试在单进程中顺序执行，不需要行锁）
+- NOW(3)、NOW() - INTERVAL n 单位（或 时间参数 - INTERVAL n 单位）、LAST_INSERT_ID(expr)、GREATEST、GET_LOCK、RELEASE_LOCK
+- 建表语句去掉注释、引擎、内联索引，ON UPDATE CURRENT_TIMESTAMP 改为触发器
+- information_schema 查询、SHOW REPLICA STATUS、@@GLOBAL.gtid_executed、GTID_SUBSET
+唯一键冲突转换为 pymysql 的 1062 错误（错误信息的格式与 MySQL 8.0.19 之后一致）。
+ON DUPLICATE KEY UPDATE 的影响行数与 MySQL 相同：新增为 1，修改为 2，冲突行没有变化为 0。
+"""
+
+import os
+import re
+import sqlite3
+
+import pymysql
+
+# 时间以毫秒精度的本地时间字符串保存，按声明类型 TIMESTAMP 读取为 datetime
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+INTERVAL_UNITS = {'SECOND': 'seconds', 'MINUTE': 'minutes', 'HOUR': 'hours', 'DAY': 'days'}
+
+_COMMENT_RE = re.compile(r"\s+COMMENT\s*=?\s*'[^']*'")
+_TABLE_OPTIONS_RE = re.compile(r"\)\s*ENGINE=[^;]*;?\s*$")
+_INLINE_INDEX_RE = re.compile(r",\s*(?:UNIQUE\s+)?(?:INDEX|KEY)\s+`\w+`\s*\([^)]*\)")
+_ON_UPDATE_RE = re.compile(r"`(\w+)`([^,\n]*?)\s+ON UPDATE CURRENT_TIMESTAMP(?:\(\d\))?")
+_TABLE_NAME_RE = re.compile(r"CREATE TABLE IF NOT EXISTS `(\w+)`")
+_COLUMN_QUERY_RE = re.compile(r"TABLE_NAME = '(\w+)' AND COLUMN_NAME = '(\w+)'")
+_UPSERT_RE = re.compile(r"\s+ON DUPLICATE KEY UPDATE\s+(.*)$", re.S)
+_INSERT_TABLE_RE = re.compile(r"^\s*INSERT\s+INTO\s+`?(\w+)`?", re.I)
+_DELETE_LIMIT_RE = re.compile(r"^\s*DELETE FROM (\w+) WHERE (.*?)\s+LIMIT \?\s*$", re.S)
+_INTERVAL_RE = re.compile(r"(NOW\(\d?\)|\?)\s*-\s*INTERVAL \? (SECOND|MINUTE|HOUR|DAY)")
+_DUPLICATE_RE = re.compile(r"UNIQUE constraint failed: ([\w.]+)")
+
+
+def _interval_base(base):
+    """INTERVAL 运算的起点：当前时间，或时间参数"""
+    return '?' if base == '?' else "'now', 'localtime'"
+
+
+def split_assignments(sql):
+    """按顶层逗号拆分赋值列表，返回 [(列名, 表达式)]"""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, char in enumerate(sql):
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and not depth and char == ',':
+            parts.append(sql[start:i])
+            start = i + 1
+    parts.append(sql[start:])
+    return [tuple(part.strip() for part in assignment.split('=', 1)) for assignment in parts]
+
+
+def translate_ddl(sql):
+    """把 database.py 的建表语句改写为 SQLite 语法，返回 (建表语句, 触发器语句列表)"""
+    table = _TABLE_NAME_RE.search(sql).group(1)
+    sql = _COMMENT_RE.sub('', sql)
+    sql = _TABLE_OPTIONS_RE.sub(')', sql.strip())
+    sql = _INLINE_INDEX_RE.sub('', sql)
+    triggers = [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS `{table}_{column}_on_update` AFTER UPDATE ON `{table}`
+        FOR EACH ROW WHEN NEW.`{column}` IS OLD.`{column}`
+        BEGIN UPDATE `{table}` SET `{column}` = {NOW_SQL} WHERE rowid = NEW.rowid; END
+        """
+        for column, _ in _ON_UPDATE_RE.findall(sql)
+    ]
+    sql = _ON_UPDATE_RE.sub(r"`\1`\2", sql)
+    sql = sql.replace('INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT')
+    sql = re.sub(r"DATETIME(\(\d\))?", 'TIMESTAMP', sql)
+    sql = re.sub(r"CURRENT_TIMESTAMP(\(\d\))?", f"({NOW_SQL})", sql)
+    return sql, triggers
+
+
+def translate(sql):
+    """把一条 DML 语句改写为 SQLite 语法"""
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r"\s+FOR UPDATE( SKIP LOCKED)?|\s+LOCK IN SHARE MODE", '', sql)
+    sql = sql.replace('INSERT IGNORE', 'INSERT OR IGNORE')
+    sql = sql.replace('START TRANSACTION WITH CONSISTENT SNAPSHOT', 'BEGIN')
+    sql = sql.replace('@@GLOBAL.gtid_executed', 'GTID_EXECUTED()')
+    sql = re.sub(r"\bGREATEST\(", 'MAX(', sql)
+    sql = re.sub(r"LIKE \?", r"LIKE ? ESCAPE '\\'", sql)
+    sql = _INTERVAL_RE.sub(
+        lambda m: (
+            f"strftime('%Y-%m-%d %H:%M:%f', {_interval_base(m.group(1))}, "
+            f"'-' || ? || ' {INTERVAL_UNITS[m.group(2)]}')"
+        ),
+        sql
+    )
+    # 查询结果中的当前时间按 TIMESTAMP 类型读取
+    sql = re.sub(r"NOW\(\d?\) AS (\w+)", rf'{NOW_SQL} AS "\1 [timestamp]"', sql)
+    sql = re.sub(r"NOW\(\d?\)", NOW_SQL, sql)
+    sql = re.sub(r"\bIF\(", 'IIF(', sql)
+    sql = sql.replace('<=>', ' IS ')
+    upsert = _UPSERT_RE.search(sql)
+    if upsert:
+        assignments = split_assignments(re.sub(r"VALUES\(`?(\w+)`?\)", r"excluded.\1", upsert.group(1)))
+        # 与 MySQL 一样，冲突行的值没有变化时不修改（影响行数为 0）
+        changed = ' OR '.join(f"{column} IS NOT ({value})" for column, value in assignments)
+        sql = (sql[:upsert.start()] + " ON CONFLICT DO UPDATE SET "
+               + ', '.join(f"{column} = {value}" for column, value in assignments) + f" WHERE {changed}")
+    delete = _DELETE_LIMIT_RE.match(sql)
+    if delete:
+        table, where = delete.groups()
+        sql = f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)"
+    return sql
+
+
+def as_mysql_error(error):
+    """把 SQLite 的错误转换为 pymysql 对应的错误"""
+    message = str(error)
+    duplicate = _DUPLICATE_RE.search(message)
+    if isinstance(error, sqlite3.IntegrityError) and duplicate:
+        return pymysql.err.IntegrityError(1062, f"Duplicate entry for key '{duplicate.group(1)}'")
+    if isinstance(error, sqlite3.IntegrityError):
+        return pymysql.err.IntegrityError(1452, message)
+    if 'database is locked' in message:
+        return pymysql.err.OperationalError(1205, 'Lock wait timeout exceeded; try restarting transaction')
+    return pymysql.err.ProgrammingError(1064, message)
+
+
+class StubCursor:
+    """DictCursor 的替代：结果为字典列表"""
+    
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = -1
+        self.lastrowid = None
+    
+    def execute(self, sql, params=None):
+        server = self.connection.server
+        server.statements.append(' '.join(sql.split()))
+        if server.fail_queries is not None and not sql.lstrip().upper().startswith('SHOW'):
+            raise server.fail_queries
+        params = list(params or ())
+        self.rows, self.rowcount = self.connection.run(sql, params, self)
+        return self.rowcount
+    
+    def executemany(self, sql, seq_of_params):
+        total = 0
+        for params in seq_of_params:
+            total += max(self.execute(sql, params), 0)
+        self.rowcount = total
+        return total
+    
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+    
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StubConnection:
+    """一个库上的连接（未指定库时只能执行 CREATE DATABASE）"""
+    
+    def __init__(self, server, database):
+        self.server = server
+        self.database = database
+        self._last_insert_id = 0
+        path = server.path(database) if database else ':memory:'
+        self._db = sqlite3.connect(
+            path,
+            timeout=1,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            check_same_thread=False
+        )
+        self._db.create_function('LAST_INSERT_ID', -1, self._last_insert_id_function)
+        self._db.create_function('GET_LOCK', 2, lambda name, timeout: 1)
+        self._db.create_function('RELEASE_LOCK', 1, lambda name: 1)
+        self._db.create_function('GTID_EXECUTED', 0, lambda: server.gtid_executed)
+        self._db.create_function('GTID_SUBSET', 2, lambda a, b: int(set(a.split(',')) <= set(b.split(','))))
+    
+    def _last_insert_id_function(self, *args):
+        if args:
+            self._last_insert_id = args[0]
+        return self._last_insert_id
+    
+    def run(self, sql, params, cursor):
+        """执行一条语句，返回 (结果行, 影响行数)"""
+        statement = sql.strip()
+        upper = statement.upper()
+        if upper.startswith(('CREATE DATABASE', 'ALTER TABLE')):
+            # 建库由 SQLite 文件承担；新建的表已是当前结构，不需要迁移
+            return [], 0
+        if upper.startswith(('SHOW REPLICA STATUS', 'SHOW SLAVE STATUS')):
+            lag = self.server.replica_lag
+            return ([{'Seconds_Behind_Source': lag, 'Seconds_Behind_Master': lag}], 1) if lag is not None else ([], 0)
+        if 'information_schema.STATISTICS' in statement:
+            return [], 0
+        if 'information_schema.COLUMNS' in statement:
+            table, column = _COLUMN_QUERY_RE.search(statement).groups()
+            columns = {row[1] for row in self._db.execute(f"PRAGMA table_info(`{table}`)")}
+            return ([{'precision': 3, '1': 1}], 1) if column in columns else ([], 0)
+        try:
+            if upper.startswith('CREATE TABLE'):
+                ddl, triggers = translate_ddl(statement)
+                self._db.execute(ddl)
+                for trigger in triggers:
+                    self._db.execute(trigger)
+                return [], 0
+            if _UPSERT_RE.search(statement):
+                return [], self._run_upsert(statement, params, cursor)
+            result = self._db.execute(translate(statement), params)
+        except sqlite3.Error as e:
+            raise as_mysql_error(e) from e
+        if result.description is None:
+            if result.lastrowid:
+                cursor.lastrowid = result.lastrowid
+            return [], result.rowcount
+        names = [column[0] for column in result.description]
+        rows = [dict(zip(names, row)) for row in result.fetchall()]
+        return rows, len(rows)
+    
+    def _run_upsert(self, statement, params, cursor):
+        """执行 INSERT ... ON DUPLICATE KEY UPDATE，按 MySQL 的规则返回影响行数（新增 1，修改 2，无变化 0）"""
+        table = _INSERT_TABLE_RE.match(statement).group(1)
+        count_sql = f"SELECT COUNT(*) FROM `{table}`"
+        before = self._db.execute(count_sql).fetchone()[0]
+        result = self._db.execute(translate(statement), params)
+        if not result.rowcount:
+            return 0
+        if self._db.execute(count_sql).fetchone()[0] > before:
+            cursor.lastrowid = result.lastrowid
+            return 1
+        return 2
+    
+    def cursor(self, *args, **kwargs):
+        return StubCursor(self)
+    
+    def begin(self):
+        pass
+    
+    def commit(self):
+        self._db.commit()
+    
+    def rollback(self):
+        self._db.rollback()
+    
+    def ping(self, reconnect=False):
+        pass
+    
+    def close(self):
+        self._db.close()
+
+
+class StubServer:
+    """一台 MySQL 实例：可以模拟连接失败、查询失败、复制延迟和 GTID"""
+    
+    def __init__(self, host, directory):
+        self.host = host
+        self.directory = directory
+        # 连接失败（2003）
+        self.down = False
+        # 查询时抛出的异常（None 表示正常；复制状态检查不受影响）
+        self.fail_queries = None
+        # 作为副本时的复制延迟（秒），None 表示不是副本或复制已停止
+        self.replica_lag = None
+        self.gtid_executed = ''
+        # 执行过的语句（改写前，空白已合并），用于断言路由
+        self.statements = []
+        self.connections = 0
+    
+    def path(self, database):
+        return os.path.join(self.directory, f"{self.host}-{database}.sqlite3")
+    
+    def connect(self, **params):
+        if self.down:
+            raise pymysql.err.OperationalError(2003, f"Can't connect to MySQL server on '{self.host}'")
+        self.connections += 1
+        return StubConnection(self, params.get('database'))
+    
+    def queries(self, fragment):
+        """执行过的包含 fragment 的语句"""
+        return [sql for sql in self.statements if fragment in sql]
+    
+    def rows(self, database, sql, params=()):
+        """直接读取某个库（不经过应用，用于断言数据）"""
+        connection = StubConnection(self, database)
+        try:
+            return connection.run(sql, list(params), connection.cursor())[0]
+        finally:
+            connection.close()
+
+
+class StubCluster:
+    """按 host 区分的一组桩服务器，connect 可作为 Database 的连接函数"""
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self.servers = {}
+    
+    def server(self, host):
+        if host not in self.servers:
+            self.servers[host] = StubServer(host, self.directory)
+        return self.servers[host]
+    
+    def connect(self, **params):
+        return self.server(params['host']).connect(**params)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+停用用户归档测试：超过期限的停用用户移入归档表、归档后仍可按 ID 查找、
+重新启用时在同一事务中恢复、新用户的用户名和工号不能与归档用户重复
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import db
+from models.change_log import ChangeLog
+from models.user import User, DuplicateUserError
+from models.user_stats import UserStats
+from tests.conftest import create_user, login, GENERAL_DEPARTMENT, GENERAL_MANAGER, PASSWORD, STAFF
+
+DISABLED_DAYS = 180
+
+
+def disable(username, days_ago):
+    """停用用户，并把停用时间改为 days_ago 天前"""
+    user = User.get_by_username(username)
+    user.status = 0
+    user.save()
+    db.execute_update(
+        "UPDATE users SET updated_at=%s WHERE id=%s",
+        (datetime.now() - timedelta(days=days_ago), user.id)
+    )
+    return user
+
+
+def table_of(user_id):
+    tables = [table for table in ('users', 'users_archive')
+              if db.execute_query(f"SELECT id FROM {table} WHERE id=%s", (user_id,))]
+    assert len(tables) == 1
+    return tables[0]
+
+
+@pytest.fixture
+def archived(app):
+    """综合部的 alice（在用）、carol（刚停用）、bob（停用超过期限，已归档）"""
+    create_user('admin', position_id=GENERAL_MANAGER)
+    for name in ('alice', 'bob', 'carol'):
+        create_user(name)
+    disable('carol', DISABLED_DAYS - 1)
+    bob = disable('bob', DISABLED_DAYS + 1)
+    assert User.archive_disabled(DISABLED_DAYS) == 1
+    return bob
+
+
+def test_users_disabled_past_the_cutoff_are_moved(archived):
+    assert table_of(archived.id) == 'users_archive'
+    assert table_of(User.get_by_username('carol').id) == 'users'
+    assert table_of(User.get_by_username('alice').id) == 'users'
+    # 统计不再包含归档的用户，变更日志记录 archive
+    assert UserStats.get_summary()['total'] == 3
+    changes = ChangeLog.get_changes()['changes']
+    assert [change['op'] for change in changes if change['id'] == archived.id and change['entity'] == 'user'] \
+        == ['archive']
+    # 已归档的用户不再重复归档
+    assert User.archive_disabled(DISABLED_DAYS) == 0
+
+
+def test_archived_users_are_still_found(archived):
+    for user in (User.get_by_id(archived.id), User.get_by_username('bob'), User.get_by_employee_id('BOB')):
+        assert user.id == archived.id
+        assert user.archived
+        assert user.status == 0
+    # 默认列表不包含归档用户
+    users = User.get_all(user_role='super_admin')
+    assert 'bob' not in {user.username for user in users['users']}
+    users = User.get_all(user_role='super_admin', include_archived=True)
+    assert 'bob' in {user.username for user in users['users']}
+
+
+def test_enabling_restores_the_user(archived, client):
+    login(client, 'admin')
+    
+    response = client.post(f'/api/users/{archived.id}/enable')
+    
+    assert response.status_code == 200
+    assert table_of(archived.id) == 'users'
+    user = User.get_by_id(archived.id)
+    assert (user.status, user.archived) == (1, False)
+    assert UserStats.get_summary()['total'] == 4
+    assert User.verify_password(PASSWORD, user.password)
+
+
+def test_a_failed_enable_leaves_the_user_archived(archived, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('写入变更日志失败')
+    
+    user = User.get_by_id(archived.id)
+    user.status = 1
+    with monkeypatch.context() as patch:
+        patch.setattr(ChangeLog, 'record_upsert', fail)
+        with pytest.raises(RuntimeError):
+            user.save()
+    
+    # 恢复和修改在同一事务中回滚
+    assert table_of(archived.id) == 'users_archive'
+    assert User.get_by_id(archived.id).status == 0
+    assert UserStats.get_summary()['total'] == 3
+
+
+def test_new_users_cannot_take_an_archived_username_or_employee_id(archived, client):
+    with pytest.raises(DuplicateUserError) as raised:
+        create_user('bob', employee_id='E100')
+    assert raised.value.field == 'username'
+    with pytest.raises(DuplicateUserError) as raised:
+        create_user('robert', employee_id='BOB')
+    assert raised.value.field == 'employee_id'
+    
+    # 修改在用用户时同样检查
+    alice = User.get_by_username('alice')
+    alice.username = 'bob'
+    with pytest.raises(DuplicateUserError):
+        alice.save()
+    
+    login(client, 'admin')
+    response = client.post('/api/users', json={
+        'username': 'bob', 'password': PASSWORD, 'real_name': '鲍勃', 'department_id': GENERAL_DEPARTMENT, 'position_id': STAFF
+    })
+    assert response.status_code == 400
+    assert response.get_json()['field'] == 'username'
+    assert table_of(archived.id) == 'users_archive'
+
+
+def test_users_without_employee_ids_do_not_conflict(app):
+    create_user('dave', employee_id=None)
+    disable('dave', DISABLED_DAYS + 1)
+    assert User.archive_disabled(DISABLED_DAYS) == 1
+    
+    assert create_user('erin', employee_id=None).id
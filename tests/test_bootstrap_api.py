@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面初始化数据接口测试：GET /api/bootstrap 的内容与各接口单独返回的一致
+"""
+
+from app import BOOTSTRAP_MAX_PAGE_SIZE
+from models.user import User
+from tests.conftest import create_user, login, GENERAL_MANAGER, SHIPPING_DEPARTMENT
+
+# User._get_by 查询用户表的语句
+USER_LOOKUP_SQL = 'SELECT u.*, 0 as archived'
+
+
+def bootstrap(client, query=''):
+    response = client.get(f'/api/bootstrap{query}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def test_bootstrap_replaces_the_four_first_load_requests(client, cluster):
+    admin = create_user('admin', position_id=GENERAL_MANAGER)
+    for i in range(3):
+        create_user(f'user{i}', department_id=SHIPPING_DEPARTMENT)
+    login(client, 'admin')
+    cluster.server('primary').statements.clear()
+    
+    data = bootstrap(client)
+    
+    # 当前用户只读取一次，列表的数据权限由身份映射回答
+    assert len(cluster.server('primary').queries(USER_LOOKUP_SQL)) == 1
+    assert data['current_user'] == client.get('/api/users/current').get_json()['data']
+    assert data['permissions'] == {
+        'role': 'super_admin', 'can_edit': True, 'can_delete': True, 'can_disable': True,
+        'current_user_id': admin.id
+    }
+    for name in ('users', 'departments', 'positions'):
+        item = data[name]
+        assert item['response'] == client.get(item['url']).get_json(), name
+    assert data['users']['url'] == '/api/users?page=1&page_size=20'
+    assert data['users']['response']['data']['pagination']['total'] == 4
+
+
+def test_bootstrap_follows_the_sessions_permissions(client):
+    create_user('admin', position_id=GENERAL_MANAGER)
+    staff = create_user('sailor', department_id=SHIPPING_DEPARTMENT)
+    create_user('deckhand', department_id=SHIPPING_DEPARTMENT)
+    login(client, 'sailor')
+    
+    data = bootstrap(client)
+    
+    assert data['permissions'] == {
+        'role': 'user', 'can_edit': False, 'can_delete': False, 'can_disable': False,
+        'current_user_id': staff.id
+    }
+    users = data['users']['response']['data']['users']
+    assert sorted(user['username'] for user in users) == ['deckhand', 'sailor']
+
+
+def test_users_can_be_left_out_and_page_size_is_clamped(client):
+    create_user('admin', position_id=GENERAL_MANAGER)
+    login(client, 'admin')
+    
+    data = bootstrap(client, '?users=0')
+    assert data['users'] is None
+    assert data['departments']['response']['success']
+    
+    assert bootstrap(client, '?page_size=1000')['users']['url'] == \
+        f'/api/users?page=1&page_size={BOOTSTRAP_MAX_PAGE_SIZE}'
+    assert bootstrap(client, '?page_size=0')['users']['url'] == '/api/users?page=1&page_size=1'
+
+
+def test_bootstrap_requires_a_valid_session(client):
+    # 未登录时与其他接口一样跳转到登录页
+    assert client.get('/api/bootstrap').status_code == 302
+    
+    admin = create_user('admin', position_id=GENERAL_MANAGER)
+    login(client, 'admin')
+    User.get_by_id(admin.id).delete()
+    response = client.get('/api/bootstrap')
+    assert response.status_code == 401
+    assert not response.get_json()['success']
+    # 会话已清除
+    assert client.get('/api/bootstrap').status_code == 302
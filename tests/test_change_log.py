@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变更日志压缩测试：同一实体只保留最新记录、过期删除标记的清理和清理位置，
+以及 GET /api/changes 对过期同步位置返回 410、之后的位置正常分页
+"""
+
+from datetime import datetime, timedelta
+
+from database import db
+from models.change_log import ChangeLog
+from models.user import User
+from tests.conftest import create_user, login, GENERAL_MANAGER
+
+RETENTION = 30 * 86400
+
+
+def change_rows():
+    return db.execute_query("SELECT seq, entity, entity_id, op FROM change_log ORDER BY seq")
+
+
+def purged_through():
+    return db.execute_query("SELECT value FROM change_log_state WHERE name='purged_through'")[0]['value']
+
+
+def write_history():
+    """新增、修改和删除用户（删除之后还有写入），返回被删除的用户"""
+    create_user('admin', position_id=GENERAL_MANAGER)
+    for name in ('alice', 'bob', 'carol'):
+        create_user(name)
+    for real_name in ('爱丽丝', '艾丽斯'):
+        alice = User.get_by_username('alice')
+        alice.real_name = real_name
+        alice.save()
+    bob = User.get_by_username('bob')
+    bob.delete()
+    carol = User.get_by_username('carol')
+    carol.real_name = '卡罗尔'
+    carol.save()
+    create_user('dave')
+    return bob
+
+
+def age_tombstones(days):
+    db.execute_update(
+        "UPDATE change_log SET created_at=%s WHERE op='delete'",
+        (datetime.now() - timedelta(days=days),)
+    )
+
+
+def test_compaction_keeps_the_newest_row_per_entity(app):
+    write_history()
+    rows = change_rows()
+    newest = {}
+    for row in rows:
+        newest[(row['entity'], row['entity_id'])] = row
+    
+    removed = ChangeLog.compact(RETENTION)
+    
+    assert removed == len(rows) - len(newest)
+    assert change_rows() == sorted(newest.values(), key=lambda row: row['seq'])
+    # 删除标记在保留期内，仍然保留
+    assert [row['op'] for row in change_rows()].count('delete') == 1
+    assert purged_through() == 0
+    # 再次压缩没有可删除的记录
+    assert ChangeLog.compact(RETENTION) == 0
+
+
+def test_expired_tombstones_are_purged_and_the_position_advances(app):
+    bob = write_history()
+    tombstone = db.execute_query("SELECT seq FROM change_log WHERE op='delete'")[0]['seq']
+    age_tombstones(29)
+    ChangeLog.compact(RETENTION)
+    assert purged_through() == 0
+    
+    age_tombstones(31)
+    ChangeLog.compact(RETENTION)
+    
+    assert not db.execute_query("SELECT seq FROM change_log WHERE entity='user' AND entity_id=%s", (bob.id,))
+    assert purged_through() == tombstone
+    # 其他实体的最新快照不受影响
+    assert {row['op'] for row in change_rows()} == {'upsert'}
+
+
+def test_changes_api_rejects_positions_before_the_purge(client):
+    write_history()
+    age_tombstones(31)
+    ChangeLog.compact(RETENTION)
+    purged = purged_through()
+    login(client, 'admin')
+    
+    response = client.get(f'/api/changes?since={purged - 1}')
+    assert response.status_code == 410
+    assert response.get_json()['data'] == {'purged_through': purged}
+    
+    # 从清理位置开始分页读取，直到没有更多变更
+    expected = [row['seq'] for row in change_rows() if row['seq'] > purged]
+    seen, since, pages = [], purged, 0
+    while True:
+        response = client.get(f'/api/changes?since={since}&limit=2')
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        seen += [change['seq'] for change in data['changes']]
+        since, pages = data['next_since'], pages + 1
+        if not data['has_more']:
+            break
+        assert len(data['changes']) == 2
+    assert seen == expected
+    assert pages == len(expected) // 2 + 1
+    assert since == expected[-1]
+    
+    # 从头同步不受清理影响
+    full = client.get('/api/changes?since=0').get_json()['data']
+    assert [change['seq'] for change in full['changes']] == [row['seq'] for row in change_rows()]
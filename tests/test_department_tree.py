@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+部门层级测试：移动子树时拒绝形成环、闭包表与按 parent_id 重新计算的结果一致、
+移动后按子树筛选的列表和层级缓存（ttl 秒）、部门名称重复
+"""
+
+import pytest
+
+from database import db
+from models.department import Department
+from models.department_tree import tree as department_tree
+from tests.conftest import (create_user, login, GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT, GENERAL_MANAGER,
+                            DEPARTMENT_ADMIN)
+
+
+def closure():
+    rows = db.execute_query("SELECT ancestor_id, descendant_id, depth FROM department_closure")
+    return {(row['ancestor_id'], row['descendant_id'], row['depth']) for row in rows}
+
+
+def expected_closure():
+    """按 parent_id 重新计算的传递闭包"""
+    parents = {row['id']: row['parent_id'] for row in db.execute_query("SELECT id, parent_id FROM departments")}
+    paths = set()
+    for department_id in parents:
+        ancestor, depth = department_id, 0
+        while ancestor is not None:
+            paths.add((ancestor, department_id, depth))
+            ancestor, depth = parents[ancestor], depth + 1
+    return paths
+
+
+@pytest.fixture
+def hierarchy(app, client):
+    """综合部 > 事业部 > 船舶 > 船员，事业部、船舶、船员各有一个用户；以总经理登录"""
+    parent_id, departments = GENERAL_DEPARTMENT, {}
+    for name in ('事业部', '船舶', '船员'):
+        department = Department(name=name, parent_id=parent_id)
+        department.save()
+        departments[name] = parent_id = department.id
+        create_user(f'user{department.id}', department_id=department.id)
+    create_user('admin', position_id=GENERAL_MANAGER)
+    login(client, 'admin')
+    return departments
+
+
+def move(client, department_id, parent_id):
+    return client.put(f'/api/departments/{department_id}', json={'parent_id': parent_id})
+
+
+def listed(client, department_id):
+    response = client.get(f'/api/users?department_id={department_id}&include_subdepartments=1&page_size=100')
+    assert response.status_code == 200
+    return {user['department_id'] for user in response.get_json()['data']['users']}
+
+
+def test_moving_a_department_under_itself_or_a_descendant_is_rejected(hierarchy, client):
+    before = closure()
+    for parent_id in (hierarchy['事业部'], hierarchy['船舶'], hierarchy['船员']):
+        response = move(client, hierarchy['事业部'], parent_id)
+        assert response.status_code == 400
+        assert not response.get_json()['success']
+    assert move(client, hierarchy['事业部'], 9999).status_code == 400
+    
+    assert closure() == before
+    assert Department.get_by_id(hierarchy['事业部']).parent_id == GENERAL_DEPARTMENT
+
+
+def test_the_closure_matches_the_parent_links_after_moves(hierarchy, client):
+    assert closure() == expected_closure()
+    
+    assert move(client, hierarchy['事业部'], SHIPPING_DEPARTMENT).status_code == 200
+    assert closure() == expected_closure()
+    # 移到中间层级、成为顶级部门
+    assert move(client, hierarchy['船员'], GENERAL_DEPARTMENT).status_code == 200
+    assert closure() == expected_closure()
+    assert move(client, hierarchy['船舶'], None).status_code == 200
+    assert closure() == expected_closure()
+    assert (hierarchy['船舶'], hierarchy['船舶'], 0) in closure()
+
+
+def test_subtree_listings_follow_the_move(hierarchy, client):
+    moved = {hierarchy['事业部'], hierarchy['船舶'], hierarchy['船员']}
+    assert moved <= listed(client, GENERAL_DEPARTMENT)
+    
+    assert move(client, hierarchy['事业部'], SHIPPING_DEPARTMENT).status_code == 200
+    
+    assert listed(client, SHIPPING_DEPARTMENT) == moved
+    assert not moved & listed(client, GENERAL_DEPARTMENT)
+    assert department_tree.subtree(SHIPPING_DEPARTMENT) == moved | {SHIPPING_DEPARTMENT}
+    # 船务部的部门管理员可以查看移入的用户
+    create_user('shipping_admin', department_id=SHIPPING_DEPARTMENT, position_id=DEPARTMENT_ADMIN)
+    other = client.application.test_client()
+    login(other, 'shipping_admin')
+    user = db.execute_query("SELECT id FROM users WHERE department_id=%s", (hierarchy['船员'],))[0]
+    assert other.get(f"/api/users/{user['id']}").status_code == 200
+
+
+def test_moves_by_other_processes_show_up_after_the_ttl(hierarchy):
+    assert hierarchy['事业部'] in department_tree.subtree(GENERAL_DEPARTMENT)
+    
+    # 其他进程的移动：本进程的缓存没有失效
+    db.run_in_transaction(lambda cursor: Department._move_subtree(cursor, hierarchy['事业部'], SHIPPING_DEPARTMENT))
+    assert hierarchy['事业部'] in department_tree.subtree(GENERAL_DEPARTMENT)
+    
+    department_tree._loaded_at -= department_tree.ttl
+    assert hierarchy['事业部'] not in department_tree.subtree(GENERAL_DEPARTMENT)
+    assert hierarchy['船员'] in department_tree.subtree(SHIPPING_DEPARTMENT)
+
+
+def test_duplicate_department_names_are_rejected(hierarchy, client):
+    shipping = Department.get_by_id(SHIPPING_DEPARTMENT).name
+    
+    response = client.put(f"/api/departments/{hierarchy['船舶']}", json={'name': shipping})
+    
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '部门名称已存在'
+    assert Department.get_by_id(hierarchy['船舶']).name == '船舶'
+    with pytest.raises(ValueError):
+        Department(name='船舶', parent_id=GENERAL_DEPARTMENT).save()
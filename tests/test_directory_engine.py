@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存用户目录测试：由内存回答列表查询（结果与 SQL 查询一致）、写入后同步、回退到 SQL
+
+同一查询分别在启用和停用内存目录时执行，比较两次的结果；内存回答时主库上不应出现
+列表查询语句。
+"""
+
+import time
+
+import pytest
+
+from database import db, ReadConsistency
+from directory_engine import engine as directory_engine
+from models.change_log import ChangeLog
+from models.department import Department
+from models.user import User
+from tests.conftest import create_user, GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT, DEPARTMENT_ADMIN
+
+PAGE_SQL = 'ORDER BY u.id DESC LIMIT'
+
+
+@pytest.fixture
+def engine(app, cluster):
+    """已加载的内存目录：综合部及其下级部门「档案室」、船务部各有若干用户"""
+    archive_room = Department(name='档案室', parent_id=GENERAL_DEPARTMENT)
+    archive_room.save()
+    create_user('zhangsan', real_name='张三', email='zs@example.com')
+    create_user('lisi', real_name='李四', department_id=archive_room.id)
+    create_user('wangwu', real_name='王五', department_id=SHIPPING_DEPARTMENT, status=0)
+    create_user('Zhaoliu', real_name='赵六', department_id=SHIPPING_DEPARTMENT)
+    create_user('admin', department_id=GENERAL_DEPARTMENT, position_id=DEPARTMENT_ADMIN)
+    directory_engine.configure({'enabled': True, 'max_staleness': 60})
+    directory_engine.reload()
+    yield directory_engine
+    directory_engine.configure({'enabled': False})
+
+
+def listing(**filters):
+    filters.setdefault('user_role', 'super_admin')
+    result = User.get_all(**filters)
+    return result['total'], result['next_cursor'], [user.to_dict() for user in result['users']]
+
+
+def listing_from_sql(**filters):
+    directory_engine.enabled = False
+    try:
+        return listing(**filters)
+    finally:
+        directory_engine.enabled = True
+
+
+def names(**filters):
+    return [user['username'] for user in listing(**filters)[2]]
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'page': 2, 'page_size': 2},
+    {'status': 0},
+    {'department_id': SHIPPING_DEPARTMENT},
+    {'department_id': GENERAL_DEPARTMENT, 'include_subdepartments': True},
+    {'keyword': 'zhao'},
+    {'keyword': 'ZS'},
+    {'keyword': '三'},
+    {'keyword': 'no-such-user'},
+    {'user_role': 'admin', 'user_department_id': GENERAL_DEPARTMENT},
+    {'user_role': 'user', 'user_department_id': None}
+], ids=['all', 'page-2', 'status', 'department', 'subtree', 'keyword', 'keyword-case', 'keyword-one-char',
+        'keyword-miss', 'admin-scope', 'no-department'])
+def test_queries_are_answered_from_memory_like_sql(engine, cluster, filters):
+    primary = cluster.server('primary')
+    primary.statements.clear()
+    
+    served = listing(**filters)
+    
+    assert not primary.queries(PAGE_SQL)
+    assert served == listing_from_sql(**filters)
+    assert engine.counters['served'] >= 1
+
+
+def test_cursor_pagination_from_memory(engine, cluster):
+    cluster.server('primary').statements.clear()
+    pages, cursor = [], None
+    while True:
+        total, cursor, users = listing(page_size=2, before_id=cursor)
+        pages.append([user['id'] for user in users])
+        if cursor is None:
+            break
+    
+    assert not cluster.server('primary').queries(PAGE_SQL)
+    assert total == 5
+    assert sum(pages, []) == [user['id'] for user in listing_from_sql(page_size=10)[2]]
+
+
+def test_writes_in_this_process_are_visible_immediately(engine):
+    create_user('newcomer', department_id=SHIPPING_DEPARTMENT)
+    user = User.get_by_username('zhangsan')
+    user.department_id = SHIPPING_DEPARTMENT
+    user.save()
+    User.get_by_username('Zhaoliu').delete()
+    
+    assert names(department_id=SHIPPING_DEPARTMENT) == ['newcomer', 'wangwu', 'zhangsan']
+    assert listing(department_id=SHIPPING_DEPARTMENT) == listing_from_sql(department_id=SHIPPING_DEPARTMENT)
+    assert engine.status()['users'] == 5
+
+
+def test_writes_from_other_processes_arrive_by_polling(engine):
+    lisi = User.get_by_username('lisi')
+    
+    # 绕过模型层写入，相当于其他进程的修改和删除
+    db.execute_update("UPDATE users SET real_name=%s WHERE username=%s", ('张三丰', 'zhangsan'))
+    
+    def delete(cursor):
+        cursor.execute("DELETE FROM users WHERE id=%s", (lisi.id,))
+        ChangeLog.record_delete(cursor, 'user', lisi.id)
+    db.run_in_transaction(delete)
+    
+    assert 'lisi' in names()
+    assert not names(keyword='三丰')
+    
+    assert engine.poll() >= 2
+    assert 'lisi' not in names()
+    assert names(keyword='三丰') == ['zhangsan']
+    assert listing() == listing_from_sql()
+
+
+def test_stale_or_write_window_queries_fall_back_to_sql(engine, cluster):
+    primary = cluster.server('primary')
+    fallbacks = engine.counters['fallbacks']
+    
+    # LIKE 通配符按 SQL 语义处理
+    primary.statements.clear()
+    listing(keyword='zhang%')
+    assert primary.queries(PAGE_SQL)
+    
+    # 当前会话刚写入过：读主库
+    primary.statements.clear()
+    marker = ReadConsistency()
+    marker.written_at = time.time()
+    token = db.bind_consistency(marker)
+    try:
+        listing()
+    finally:
+        db.unbind_consistency(token)
+    assert primary.queries(PAGE_SQL)
+    
+    # 轮询落后超过 max_staleness
+    engine.configure({'enabled': True, 'max_staleness': 0})
+    time.sleep(0.01)
+    primary.statements.clear()
+    assert listing() == listing_from_sql()
+    assert primary.queries(PAGE_SQL)
+    assert not engine.status()['ready']
+    
+    assert engine.counters['fallbacks'] == fallbacks + 3
+    # 轮询后重新由内存回答
+    engine.configure({'enabled': True, 'max_staleness': 60})
+    engine.refresh()
+    primary.statements.clear()
+    listing()
+    assert not primary.queries(PAGE_SQL)
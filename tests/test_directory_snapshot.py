@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+人员目录快照测试：写入后按 ID、用户名、工号查找（包括未命中和空工号），
+文件替换后读取器切换而旧记录仍可读取，魔数或格式版本不对时报错，以及从数据库导出
+"""
+
+import os
+
+import pytest
+
+from directory_snapshot import (DirectorySnapshot, SnapshotReader, SnapshotFormatError, write_snapshot,
+                                export_snapshot, current_seqs, HEADER, MAGIC, FORMAT_VERSION)
+from models.user import User
+from tests.conftest import create_user, GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT, MINISTER
+
+DEPARTMENTS = [(1, '综合部', 1), (2, '船务部', 1)]
+POSITIONS = [(1, '总经理', 'super_admin', 1), (4, '员工', 'user', 1), (5, '审计', 'auditor', 1)]
+USERS = [
+    (3, 'alice', '爱丽丝', 'E001', 1, 4, 'user', 1),
+    (7, 'bob', '鲍勃', None, 2, 1, 'super_admin', 0),
+    (12, 'carol', '卡罗尔', 'E012', None, None, None, 1),
+    (40, '张三', '张三', 'E040', 2, 5, 'auditor', 1),
+]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'directory.snapshot')
+    write_snapshot(path, USERS, DEPARTMENTS, POSITIONS, {'default': 42})
+    return path
+
+
+def test_lookups_by_id_username_and_employee_id(path):
+    snapshot = DirectorySnapshot(path)
+    try:
+        assert snapshot.user_count == len(USERS)
+        assert snapshot.seqs == {'default': 42}
+        alice = snapshot.get_by_employee_id('E001')
+        assert alice.to_dict() == {
+            'id': 3, 'username': 'alice', 'real_name': '爱丽丝', 'employee_id': 'E001',
+            'department_id': 1, 'department': '综合部', 'position_id': 4, 'position': '员工',
+            'role': 'user', 'status': 1
+        }
+        for user_id, username, *_ in USERS:
+            assert snapshot.get_by_id(user_id).username == username
+            assert snapshot.get_by_username(username).id == user_id
+        assert snapshot.get_by_username('张三').role == 'auditor'
+        assert snapshot.position_role(5) == 'auditor'
+        
+        # 未命中
+        for missing in (0, 4, 41, None):
+            assert snapshot.get_by_id(missing) is None
+        assert snapshot.get_by_username('dave') is None
+        assert snapshot.get_by_username('') is None
+        assert snapshot.get_by_employee_id('E002') is None
+        
+        # 空工号、空部门和职位
+        bob = snapshot.get_by_id(7)
+        assert (bob.employee_id, bob.status, bob.department) == (None, 0, '船务部')
+        assert snapshot.get_by_employee_id(None) is None
+        carol = snapshot.get_by_username('carol')
+        assert (carol.department_id, carol.position_id, carol.department, carol.role) == (None, None, None, 'user')
+        assert [user.id for user in snapshot] == [3, 7, 12, 40]
+    finally:
+        snapshot.close()
+
+
+def test_empty_snapshots_have_no_users(tmp_path):
+    path = str(tmp_path / 'empty.snapshot')
+    write_snapshot(path, [], [], [], {})
+    snapshot = DirectorySnapshot(path)
+    assert snapshot.user_count == 0
+    assert snapshot.get_by_id(1) is None
+    assert snapshot.get_by_username('alice') is None
+    snapshot.close()
+
+
+def test_the_reader_switches_to_a_replaced_file(path):
+    reader = SnapshotReader(path, check_interval=0)
+    old = reader.get_by_username('alice')
+    assert not reader.refresh()
+    
+    users = [(3, 'alice', '新名', 'E001', 2, 4, 'user', 1), (50, 'dave', '戴夫', 'E050', 1, 4, 'user', 1)]
+    write_snapshot(path, users, DEPARTMENTS, POSITIONS, {'default': 43})
+    
+    new = reader.get_by_username('alice')
+    assert (new.real_name, new.department) == ('新名', '船务部')
+    assert reader.get_by_username('bob') is None
+    assert reader.get_by_employee_id('E050').id == 50
+    assert reader.snapshot.seqs == {'default': 43}
+    # 切换前取得的记录仍引用旧快照
+    assert (old.real_name, old.department) == ('爱丽丝', '综合部')
+
+
+def test_a_broken_replacement_keeps_the_current_snapshot(path, tmp_path):
+    reader = SnapshotReader(path, check_interval=0)
+    broken = tmp_path / 'broken.snapshot'
+    broken.write_bytes(b'NOTASNAP' * 4)
+    os.replace(broken, path)
+    
+    assert not reader.refresh()
+    assert reader.get_by_username('alice').id == 3
+
+
+def rewrite_header(path, magic=MAGIC, version=FORMAT_VERSION):
+    with open(path, 'r+b') as f:
+        _, _, count, reserved = HEADER.unpack(f.read(HEADER.size))
+        f.seek(0)
+        f.write(HEADER.pack(magic, version, count, reserved))
+
+
+def test_bad_magic_or_version_is_rejected(path, tmp_path):
+    rewrite_header(path, version=FORMAT_VERSION + 1)
+    with pytest.raises(SnapshotFormatError):
+        DirectorySnapshot(path)
+    
+    rewrite_header(path, magic=b'NOTASNAP')
+    with pytest.raises(SnapshotFormatError):
+        DirectorySnapshot(path)
+    
+    truncated = tmp_path / 'truncated.snapshot'
+    truncated.write_bytes(MAGIC)
+    with pytest.raises(SnapshotFormatError):
+        DirectorySnapshot(str(truncated))
+
+
+def test_export_matches_the_database(app, tmp_path):
+    create_user('alice', employee_id='E001')
+    create_user('bob', department_id=SHIPPING_DEPARTMENT, position_id=MINISTER, employee_id=None)
+    path = str(tmp_path / 'export.snapshot')
+    
+    meta = export_snapshot(path, batch_size=1)
+    
+    assert meta['users'] == 2
+    snapshot = DirectorySnapshot(path)
+    try:
+        for username in ('alice', 'bob'):
+            user = User.get_by_username(username)
+            record = snapshot.get_by_username(username)
+            assert (record.id, record.employee_id, record.department_id, record.role) == \
+                (user.id, user.employee_id, user.department_id, user.role)
+        assert snapshot.get_by_employee_id('E001').department_id == GENERAL_DEPARTMENT
+        assert snapshot.seqs == meta['seqs'] == current_seqs()
+    finally:
+        snapshot.close()
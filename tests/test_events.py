@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变更推送测试：按订阅者的部门范围分发，调出和删除的用户通知原部门
+
+消息中心在测试中不运行轮询线程（订阅前先 stop），由测试直接调用 poll_once。
+推送需要的原部门取自变更日志，消息中心启动前就存在的用户同样通知原部门。
+"""
+
+import pytest
+
+from database import db
+from events import EventBroker
+from models.change_log import ChangeLog
+from models.user import User
+from tests.conftest import create_user, GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT
+
+
+@pytest.fixture
+def broker(app):
+    """新启动的消息中心：返回 (消息中心, 部门 -> 收到的消息, 船务部的用户)"""
+    sailor = create_user('sailor', department_id=SHIPPING_DEPARTMENT)
+    create_user('clerk', department_id=GENERAL_DEPARTMENT)
+    broker = EventBroker()
+    broker.stop()
+    received = {GENERAL_DEPARTMENT: [], SHIPPING_DEPARTMENT: [], None: []}
+    for department, events in received.items():
+        broker.subscribe({department} if department else None, events.append)
+    # 第一次轮询只确定起始位置
+    broker.poll_once()
+    return broker, received, sailor
+
+
+def user_events(events):
+    return [(event['op'], event['id'], event['department_id'], event['previous_department_id'])
+            for event in events if event['entity'] == 'user']
+
+
+def test_transfers_notify_the_previous_department(broker):
+    broker, received, sailor = broker
+    user = User.get_by_id(sailor.id)
+    user.department_id = GENERAL_DEPARTMENT
+    user.save()
+    
+    broker.poll_once()
+    
+    expected = [('upsert', sailor.id, GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT)]
+    assert user_events(received[SHIPPING_DEPARTMENT]) == expected
+    assert user_events(received[GENERAL_DEPARTMENT]) == expected
+    assert user_events(received[None]) == expected
+    change = ChangeLog.get_changes()['changes'][-1]
+    assert change['data']['previous_department_id'] == SHIPPING_DEPARTMENT
+
+
+def test_edits_within_a_department_stay_in_that_department(broker):
+    broker, received, sailor = broker
+    user = User.get_by_id(sailor.id)
+    user.real_name = '水手'
+    user.save()
+    
+    broker.poll_once()
+    
+    assert user_events(received[SHIPPING_DEPARTMENT]) == [('upsert', sailor.id, SHIPPING_DEPARTMENT, None)]
+    assert not received[GENERAL_DEPARTMENT]
+
+
+def test_deletes_notify_the_department_the_user_was_in(broker):
+    broker, received, sailor = broker
+    User.get_by_id(sailor.id).delete()
+    
+    broker.poll_once()
+    
+    assert user_events(received[SHIPPING_DEPARTMENT]) == [('delete', sailor.id, None, SHIPPING_DEPARTMENT)]
+    assert not received[GENERAL_DEPARTMENT]
+    rows = db.execute_query("SELECT data FROM change_log WHERE op='delete' AND entity_id=%s", (sailor.id,))
+    assert ChangeLog._load_data(rows[0]['data']) == {'department_id': SHIPPING_DEPARTMENT}
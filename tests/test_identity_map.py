@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求内身份映射测试：同一请求中相同的查找只查询一次、写入后清空、调试模式的响应头
+"""
+
+import pytest
+
+from database import db
+from models import identity_map
+from models.identity_map import IdentityMap
+from models.position import Position
+from models.user import User
+from tests.conftest import create_user, login, GENERAL_MANAGER, STAFF
+
+# User._get_by 查询用户表的语句
+USER_LOOKUP_SQL = 'SELECT u.*, 0 as archived'
+
+
+@pytest.fixture
+def bound(app):
+    """为当前上下文绑定一个身份映射（请求中由应用绑定）"""
+    identity = IdentityMap()
+    token = identity_map.bind(identity)
+    yield identity
+    identity_map.unbind(token)
+
+
+def lookups(cluster):
+    return len(cluster.server('primary').queries(USER_LOOKUP_SQL))
+
+
+def test_lookups_by_any_unique_key_hit_the_map(bound, cluster):
+    alice = create_user('alice', employee_id='E001')
+    cluster.server('primary').statements.clear()
+    bound.counters.clear()
+    
+    first = User.get_by_username('alice')
+    assert User.get_by_id(alice.id).username == 'alice'
+    assert User.get_by_employee_id('E001').id == alice.id
+    assert User.get_by_username('alice').id == alice.id
+    
+    assert lookups(cluster) == 1
+    assert bound.counters == {'misses': 1, 'hits': 3}
+    # 每次查找构造新的对象：修改未保存的字段不影响其他查找
+    first.real_name = '未保存'
+    assert User.get_by_id(alice.id).real_name == 'alice'
+
+
+def test_missing_records_are_remembered(bound, cluster):
+    cluster.server('primary').statements.clear()
+    
+    assert User.get_by_username('nobody') is None
+    assert User.get_by_username('nobody') is None
+    
+    # 用户表和归档表各查询一次
+    assert len(cluster.server('primary').queries("WHERE u.username=%s")) == 2
+    assert bound.counters['hits'] == 1
+
+
+def test_other_entities_share_the_map(bound):
+    assert Position.get_by_id(STAFF).name == Position.get_by_name('员工').name
+    assert bound.counters == {'misses': 1, 'hits': 1}
+
+
+def test_writes_clear_the_map(bound, cluster):
+    alice = create_user('alice')
+    User.get_by_id(alice.id)
+    
+    user = User.get_by_id(alice.id)
+    user.real_name = '新名'
+    user.save()
+    assert User.get_by_id(alice.id).real_name == '新名'
+    
+    # 模型之外的直接写入同样清空；没有修改任何行的写入不清空
+    db.execute_update("UPDATE users SET phone=%s WHERE id=%s", ('123', alice.id))
+    assert User.get_by_id(alice.id).phone == '123'
+    db.execute_update("UPDATE users SET phone=%s WHERE id=%s", ('456', -1))
+    User.get_by_id(alice.id)
+    
+    assert bound.counters['invalidations'] >= 2
+    assert bound.counters['hits'] == 2
+
+
+def test_lookups_without_a_bound_map_always_query(app, cluster):
+    alice = create_user('alice')
+    cluster.server('primary').statements.clear()
+    
+    User.get_by_id(alice.id)
+    User.get_by_id(alice.id)
+    
+    assert lookups(cluster) == 2
+
+
+def identity_header(response):
+    header = response.headers.get('X-Identity-Map')
+    return dict(item.split('=') for item in header.split(', ')) if header else None
+
+
+def test_each_request_gets_its_own_map(app, client, cluster):
+    create_user('admin', position_id=GENERAL_MANAGER)
+    alice = create_user('alice')
+    login(client, 'admin')
+    
+    cluster.server('primary').statements.clear()
+    client.get(f'/api/users/{alice.id}')
+    client.get(f'/api/users/{alice.id}')
+    # 映射随请求结束丢弃：第二个请求重新查询
+    assert len(cluster.server('primary').queries("WHERE u.id=%s")) >= 2
+
+
+def test_debug_responses_report_the_counters(app, client):
+    admin = create_user('admin', position_id=GENERAL_MANAGER)
+    login(client, 'admin')
+    
+    assert identity_header(client.get(f'/api/users/{admin.id}')) is None
+    
+    app.debug = True
+    # 修改自己：目标用户和当前用户是同一条记录，第二次查找由映射回答
+    response = client.put(f'/api/users/{admin.id}', json={'real_name': '新名'})
+    assert response.status_code == 200
+    assert identity_header(response) == {'hits': '1', 'misses': '1', 'invalidations': '1'}
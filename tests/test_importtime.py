@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动检查测试：导入 app 并创建应用时不连接数据库（普通配置和分片配置），且在导入预算之内
+
+导入在子进程中执行（benchmarks.importtime.measure_import），耗时取多次中的最短一次。
+测试与其他进程并行运行时耗时波动较大，这里只拦截明显的退化（预算的 BUDGET_SLACK 倍）；
+严格的预算由 python -m benchmarks.importtime 检查。
+"""
+
+import pytest
+
+from benchmarks.importtime import measure_import, sharded_config, total_us, DEFAULT_BUDGET_MS
+
+REPEAT = 3
+BUDGET_SLACK = 2
+
+
+@pytest.mark.parametrize('sharded', [False, True], ids=['default', 'sharded'])
+def test_app_starts_without_the_database_within_budget(sharded):
+    config = sharded_config() if sharded else None
+    best = None
+    for _ in range(REPEAT):
+        entries, error = measure_import('app', config)
+        # 子进程中的 pymysql.connect 一旦被调用（即使异常被捕获）就以错误退出
+        assert error is None, error
+        elapsed = total_us(entries, 'app')
+        best = elapsed if best is None else min(best, elapsed)
+    assert 0 < best / 1000 <= DEFAULT_BUDGET_MS * BUDGET_SLACK
+
+
+def test_connecting_during_startup_is_reported(tmp_path, monkeypatch):
+    # 启动时连接数据库并吞掉异常的模块
+    (tmp_path / 'eager_module.py').write_text(
+        "import pymysql\n"
+        "try:\n"
+        "    pymysql.connect(host='primary')\n"
+        "except Exception:\n"
+        "    pass\n",
+        encoding='utf-8'
+    )
+    monkeypatch.setenv('PYTHONPATH', str(tmp_path))
+    
+    _, error = measure_import('eager_module', sharded_config())
+    
+    assert '启动时访问了数据库' in error
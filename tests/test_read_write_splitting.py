@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+读写分离测试：副本选择、延迟排除、副本故障回退，以及写后读主库（时间窗口和 GTID）
+
+副本是主库 SQLite 文件的副本（sync_replica 复制一次），之后主库的写入在副本上看不到，
+读到的值即可说明查询由哪个库回答。
+"""
+
+import shutil
+import time
+
+import pymysql
+import pytest
+
+from database import db, ReadConsistency
+from tests.conftest import create_user, login, GENERAL_MANAGER
+
+USER_SQL = "SELECT real_name FROM users WHERE username=%s"
+
+
+def sync_replica(cluster, host, lag=0):
+    """把主库的当前数据复制到副本，并设置副本报告的复制延迟"""
+    primary = cluster.server('primary')
+    replica = cluster.server(host)
+    database = db.config.database
+    shutil.copyfile(primary.path(database), replica.path(database))
+    replica.replica_lag = lag
+    return replica
+
+
+def read_name(username='alice'):
+    rows = db.execute_query(USER_SQL, (username,))
+    return rows[0]['real_name'] if rows else None
+
+
+@pytest.fixture
+def replicated(make_app, cluster):
+    """一主一从，副本已追上主库：返回 (主库, 副本)"""
+    make_app(replicas=[{'host': 'replica1'}], replica_check_interval=0)
+    create_user('alice', real_name='原名')
+    return cluster.server('primary'), sync_replica(cluster, 'replica1')
+
+
+@pytest.fixture
+def consistency():
+    """为当前上下文绑定会话的读一致性标记（请求中由应用绑定）"""
+    marker = ReadConsistency()
+    token = db.bind_consistency(marker)
+    yield marker
+    db.unbind_consistency(token)
+
+
+def test_reads_are_routed_to_a_healthy_replica(replicated):
+    primary, replica = replicated
+    primary.statements.clear()
+    
+    assert read_name() == '原名'
+    assert replica.queries(USER_SQL)
+    assert not primary.queries(USER_SQL)
+
+
+def test_use_primary_bypasses_replicas(replicated):
+    primary, replica = replicated
+    
+    db.execute_query(USER_SQL, ('alice',), use_primary=True)
+    assert primary.queries(USER_SQL)
+    assert not replica.queries(USER_SQL)
+
+
+@pytest.mark.parametrize('lag', [6, None], ids=['lag-above-limit', 'replication-stopped'])
+def test_lagging_replica_is_excluded(replicated, lag):
+    primary, replica = replicated
+    replica.replica_lag = lag
+    db.execute_update("UPDATE users SET real_name=%s WHERE username=%s", ('新名', 'alice'))
+    
+    # 副本上仍是旧值，读到新值说明回到了主库
+    assert read_name() == '新名'
+    assert not replica.queries(USER_SQL)
+    assert db.replica_status()[0]['lag'] == lag
+
+
+def test_only_replicas_within_the_lag_limit_are_chosen(make_app, cluster):
+    make_app(replicas=[{'host': 'replica1'}, {'host': 'replica2'}], replica_check_interval=0, replica_max_lag=5)
+    create_user('alice', real_name='原名')
+    behind = sync_replica(cluster, 'replica1', lag=30)
+    healthy = sync_replica(cluster, 'replica2', lag=2)
+    
+    for _ in range(20):
+        assert read_name() == '原名'
+    assert len(healthy.queries(USER_SQL)) == 20
+    assert not behind.queries(USER_SQL)
+
+
+@pytest.mark.parametrize('error', [
+    pymysql.err.InterfaceError(0, ''),
+    pymysql.err.OperationalError(2013, 'Lost connection to MySQL server during query'),
+    ConnectionResetError(104, 'Connection reset by peer')
+], ids=['interface-error', 'lost-connection', 'connection-reset'])
+def test_replica_connection_errors_fall_back_to_the_primary(make_app, cluster, error):
+    make_app(replicas=[{'host': 'replica1'}], replica_check_interval=0, replica_retry_interval=60)
+    create_user('alice', real_name='原名')
+    replica = sync_replica(cluster, 'replica1')
+    assert read_name() == '原名'
+    
+    replica.fail_queries = error
+    assert read_name() == '原名'
+    assert cluster.server('primary').queries(USER_SQL)
+    status = db.replica_status()[0]
+    assert status['failures'] == 1
+    assert not status['available']
+
+
+def test_replica_sql_errors_are_not_retried_on_the_primary(replicated):
+    primary, replica = replicated
+    replica.fail_queries = pymysql.err.ProgrammingError(1064, 'You have an error in your SQL syntax')
+    
+    with pytest.raises(pymysql.err.ProgrammingError):
+        read_name()
+    assert not primary.queries(USER_SQL)
+
+
+def test_reads_after_a_write_use_the_primary_within_the_window(replicated, consistency):
+    primary, replica = replicated
+    
+    db.execute_update("UPDATE users SET real_name=%s WHERE username=%s", ('新名', 'alice'))
+    assert consistency.written_at
+    assert read_name() == '新名'
+    
+    # 窗口过后回到副本（副本上仍是旧值）
+    consistency.written_at = time.time() - db.config.read_your_writes_window - 1
+    assert read_name() == '原名'
+
+
+def test_writes_that_change_nothing_keep_reading_from_replicas(replicated, consistency):
+    db.execute_update("UPDATE users SET real_name=%s WHERE username=%s", ('新名', 'nobody'))
+    with db.transaction() as cursor:
+        cursor.execute("SELECT id FROM users WHERE username=%s", ('alice',))
+    
+    assert not consistency.written_at
+    assert read_name() == '原名'
+
+
+def test_gtid_catch_up_ends_the_window_early(make_app, cluster, consistency):
+    make_app(replicas=[{'host': 'replica1'}], replica_check_interval=0, gtid_tracking=True)
+    create_user('alice', real_name='原名')
+    primary = cluster.server('primary')
+    replica = sync_replica(cluster, 'replica1')
+    primary.gtid_executed = 'source-uuid:1-10'
+    replica.gtid_executed = 'source-uuid:1-9'
+    
+    db.execute_update("UPDATE users SET real_name=%s WHERE username=%s", ('新名', 'alice'))
+    assert consistency.gtid == 'source-uuid:1-10'
+    # 副本未追上会话写入的事务：回到主库
+    assert read_name() == '新名'
+    assert not replica.queries(USER_SQL)
+    
+    # 副本追上后即使仍在时间窗口内也读副本
+    sync_replica(cluster, 'replica1')
+    replica.gtid_executed = 'source-uuid:1-10'
+    assert consistency.requires_primary(db.config.read_your_writes_window)
+    assert read_name() == '新名'
+    assert replica.queries(USER_SQL)
+
+
+def test_read_your_writes_follows_the_session_across_requests(make_app, cluster):
+    app = make_app(replicas=[{'host': 'replica1'}], replica_check_interval=0)
+    create_user('admin', position_id=GENERAL_MANAGER)
+    alice = create_user('alice', real_name='原名')
+    sync_replica(cluster, 'replica1')
+    client = app.test_client()
+    login(client, 'admin')
+    
+    response = client.put(f'/api/users/{alice.id}', json={'real_name': '新名'})
+    assert response.status_code == 200
+    # 下一个请求（同一会话）读到自己的写入；其他会话仍读副本
+    assert client.get(f'/api/users/{alice.id}').get_json()['data']['real_name'] == '新名'
+    other = app.test_client()
+    login(other, 'admin')
+    assert other.get(f'/api/users/{alice.id}').get_json()['data']['real_name'] == '原名'
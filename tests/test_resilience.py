@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库容错测试：熔断后快速返回 503、冷却后探测恢复、死锁和锁等待超时的有限重试、
+请求期限收紧连接和读写超时
+"""
+
+import time
+
+import pymysql
+import pytest
+
+from database import db, CircuitBreaker, Deadline, DatabaseUnavailable
+from tests.conftest import create_user, login, GENERAL_MANAGER
+
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+UPDATE_SQL = "UPDATE users SET phone=%s WHERE username=%s"
+
+
+def record_connects(cluster):
+    """记录之后每次连接的参数（连接仍交给桩服务器；在 make_app 之后调用）"""
+    attempts = []
+    
+    def connect(**params):
+        attempts.append(params)
+        return cluster.connect(**params)
+    
+    db.connector = connect
+    return attempts
+
+
+def test_failed_connects_open_the_breaker_and_requests_fail_fast(make_app, cluster):
+    app = make_app(breaker_failure_threshold=3, breaker_reset_timeout=30)
+    connects = record_connects(cluster)
+    client = app.test_client()
+    create_user('admin', position_id=GENERAL_MANAGER)
+    login(client, 'admin')
+    cluster.server('primary').down = True
+    
+    for _ in range(3):
+        response = client.get('/api/users')
+        assert response.status_code == 503
+        if db.breaker.state == 'open':
+            break
+    assert db.breaker.state == 'open'
+    
+    # 熔断期间不再尝试连接，直接返回 503 并提示重试时间
+    connects.clear()
+    response = client.get('/api/users')
+    assert response.status_code == 503
+    assert not response.get_json()['success']
+    assert response.headers['Retry-After'] == '30'
+    assert connects == []
+    assert db.breaker.status()['rejections'] >= 1
+
+
+def test_one_probe_after_the_cooldown_closes_the_breaker(make_app, cluster):
+    app = make_app(breaker_failure_threshold=1, breaker_reset_timeout=30)
+    client = app.test_client()
+    create_user('admin', position_id=GENERAL_MANAGER)
+    login(client, 'admin')
+    cluster.server('primary').down = True
+    assert client.get('/api/users').status_code == 503
+    assert db.breaker.state == 'open'
+    
+    cluster.server('primary').down = False
+    assert client.get('/api/users').status_code == 503
+    # 冷却结束：只放行一个探测请求，成功后关闭
+    db.breaker.opened_at -= 30
+    response = client.get('/api/users')
+    assert response.status_code == 200
+    assert db.breaker.status()['state'] == 'closed'
+    assert db.breaker.status()['trips'] == 1
+
+
+def test_half_open_breaker_lets_a_single_probe_through():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    
+    breaker.opened_at -= 30
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+    # 探测失败重新打开，下一次冷却后才能再探测
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    assert breaker.trips == 2
+
+
+@pytest.mark.parametrize('code', [DEADLOCK, LOCK_WAIT_TIMEOUT])
+def test_lock_errors_are_retried_then_raised(make_app, cluster, code):
+    make_app(write_retries=2, read_retries=1)
+    create_user('alice')
+    primary = cluster.server('primary')
+    primary.statements.clear()
+    primary.fail_queries = pymysql.err.OperationalError(code, 'lock error')
+    
+    with pytest.raises(pymysql.err.OperationalError) as raised:
+        db.execute_update(UPDATE_SQL, ('123', 'alice'))
+    assert raised.value.args[0] == code
+    assert len(primary.queries('UPDATE users SET phone')) == 3
+    
+    with pytest.raises(pymysql.err.OperationalError):
+        db.execute_query("SELECT id FROM users")
+    assert len(primary.queries('SELECT id FROM users')) == 2
+    
+    assert db.resilience_status()['counters'] == {'write_retries': 2, 'read_retries': 1}
+    # 锁错误说明主库可用，不计入熔断
+    assert db.breaker.state == 'closed'
+
+
+def test_a_retry_that_succeeds_returns_the_result(make_app):
+    make_app(write_retries=2)
+    attempts = []
+    
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise pymysql.err.OperationalError(DEADLOCK, 'Deadlock found when trying to get lock')
+        return 'done'
+    
+    assert db._with_retry('write', flaky) == 'done'
+    assert len(attempts) == 2
+
+
+def test_other_errors_are_not_retried(make_app, cluster):
+    make_app(write_retries=2)
+    primary = cluster.server('primary')
+    create_user('alice')
+    primary.statements.clear()
+    primary.fail_queries = pymysql.err.IntegrityError(1062, "Duplicate entry for key 'username'")
+    
+    with pytest.raises(pymysql.err.IntegrityError):
+        db.execute_update(UPDATE_SQL, ('123', 'alice'))
+    assert len(primary.queries('UPDATE users SET phone')) == 1
+
+
+def test_the_request_deadline_bounds_connection_timeouts(make_app, cluster):
+    make_app(connection_timeout=5, read_timeout=10, write_timeout=10)
+    connects = record_connects(cluster)
+    db.execute_query("SELECT 1")
+    assert connects[-1]['connect_timeout'] == 5
+    assert connects[-1]['read_timeout'] == 10
+    
+    token = db.bind_deadline(Deadline(1))
+    try:
+        db.execute_query("SELECT 1")
+    finally:
+        db.unbind_deadline(token)
+    for name in ('connect_timeout', 'read_timeout', 'write_timeout'):
+        assert 0 < connects[-1][name] <= 1
+    
+    # 期限已过：不再连接，直接报告数据库不可用
+    connects.clear()
+    deadline = Deadline(1)
+    deadline.expires_at = time.monotonic() - 1
+    token = db.bind_deadline(deadline)
+    try:
+        with pytest.raises(DatabaseUnavailable):
+            db.execute_query("SELECT 1")
+    finally:
+        db.unbind_deadline(token)
+    assert connects == []
+    assert deadline.failed
+    assert db.resilience_status()['counters']['deadline_exceeded'] == 1
+    # 超时不是主库的故障，不计入熔断
+    assert db.breaker.state == 'closed'
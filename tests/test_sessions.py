@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服务端会话测试：强制下线后不再认证且不会写回会话、登录时更换会话 ID、
+未配置密钥时多个应用实例共享 instance/secret_key
+"""
+
+import copy
+import sqlite3
+
+from flask import session
+
+from app import create_app
+from database import db
+from tests.conftest import create_user, login, BASE_CONFIG, GENERAL_MANAGER
+
+
+def session_rows(app, user_id=None):
+    """会话表中的 (sid, user_id)"""
+    path = app.config['APP_CONFIG']['session']['sqlite_path']
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT sid, user_id FROM sessions").fetchall()
+    return [row for row in rows if user_id is None or row[1] == user_id]
+
+
+def session_cookie(client, app):
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+    return cookie.value if cookie else None
+
+
+def test_invalidated_users_are_logged_out(app, client):
+    create_user('admin', position_id=GENERAL_MANAGER)
+    alice = create_user('alice')
+    login(client, 'alice')
+    assert client.get('/api/users/current').status_code == 200
+    assert len(session_rows(app, alice.id)) == 1
+    
+    admin = app.test_client()
+    login(admin, 'admin')
+    assert admin.post(f'/api/users/{alice.id}/disable').status_code == 200
+    
+    assert client.get('/api/users/current').status_code == 401
+    assert client.get('/api/users').status_code == 302
+    assert session_rows(app, alice.id) == []
+
+
+def test_a_request_in_flight_does_not_write_back_an_invalidated_session(app, client):
+    alice = create_user('alice')
+    login(client, 'alice')
+    interface = app.session_interface
+    cookie = session_cookie(client, app)
+    
+    headers = {'Cookie': f"{app.config['SESSION_COOKIE_NAME']}={cookie}"}
+    with app.test_request_context('/', headers=headers):
+        assert session['user_id'] == alice.id
+        # 请求处理期间用户被强制下线，请求结束时会话被修改
+        interface.invalidate_user(alice.id)
+        session['last_page'] = '/users'
+        response = app.response_class()
+        interface.save_session(app, session, response)
+    
+    assert session_rows(app, alice.id) == []
+    # Cookie 同时被删除
+    assert 'Max-Age=0' in response.headers['Set-Cookie']
+    assert client.get('/api/users/current').status_code == 401
+
+
+def test_login_regenerates_the_session_id(app, client):
+    create_user('alice')
+    login(client, 'alice')
+    first = session_cookie(client, app)
+    [(first_sid, _)] = session_rows(app)
+    
+    login(client, 'alice')
+    
+    assert session_cookie(client, app) != first
+    [(second_sid, _)] = session_rows(app)
+    assert second_sid != first_sid
+    # 旧的会话 ID 不能再使用
+    stale = app.test_client()
+    stale.set_cookie(app.config['SESSION_COOKIE_NAME'], first)
+    assert stale.get('/api/users/current').status_code == 401
+
+
+def test_apps_without_a_configured_key_share_the_key_file(make_app, cluster, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    # 由 make_app 在测试结束时恢复全局的 db 和分片路由
+    make_app()
+    config = copy.deepcopy(BASE_CONFIG)
+    del config['app']
+    config['session']['sqlite_path'] = str(tmp_path / 'sessions.db')
+    db.connector = cluster.connect
+    
+    first, second = create_app(copy.deepcopy(config)), create_app(copy.deepcopy(config))
+    
+    key = (tmp_path / 'instance' / 'secret_key').read_text().strip()
+    assert first.secret_key == second.secret_key == key
+    # 一个实例签发的会话在另一个实例上有效
+    create_user('alice')
+    client = first.test_client()
+    login(client, 'alice')
+    other = second.test_client()
+    other.set_cookie(second.config['SESSION_COOKIE_NAME'], session_cookie(client, first))
+    assert other.get('/api/users/current').status_code == 200
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按部门分片测试：单分片路由、跨分片归并分页、在线迁移部门
+
+默认分片是主库 primary 上的 salary_management，分片 shard1 在另一台桩服务器上，
+两者是独立的 SQLite 库，断言直接读取各库中的数据。
+"""
+
+import pytest
+
+from database import DatabaseUnavailable
+from models.user import User
+from models.user_stats import UserStats
+from sharding import router
+from tests.conftest import create_user, GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT, GENERAL_MANAGER
+
+DEFAULT_DB = 'salary_management'
+SHARD_DB = 'salary_shard1'
+PAGE_SQL = 'ORDER BY u.id DESC LIMIT'
+
+
+@pytest.fixture
+def sharded(make_app, cluster):
+    """两个分片，船务部在 shard1 上：返回 (默认分片服务器, shard1 服务器)"""
+    make_app(shards=[{'name': 'shard1', 'host': 'shard1', 'database': SHARD_DB}])
+    # 部门中还没有用户时迁移只更新映射
+    router.move_department(SHIPPING_DEPARTMENT, 'shard1', log=lambda message: None)
+    return cluster.server('primary'), cluster.server('shard1')
+
+
+def user_ids(server, database, department_id):
+    rows = server.rows(database, "SELECT id FROM users WHERE department_id=%s ORDER BY id", (department_id,))
+    return [row['id'] for row in rows]
+
+
+def list_all(page_size, **filters):
+    """按游标翻完全部页，返回每页的用户 ID"""
+    pages, cursor = [], None
+    while True:
+        result = User.get_all(page_size=page_size, before_id=cursor, user_role='super_admin', **filters)
+        pages.append([user.id for user in result['users']])
+        cursor = result['next_cursor']
+        if cursor is None:
+            return pages, result['total']
+
+
+def test_users_are_stored_on_their_department_shard(sharded):
+    primary, shard = sharded
+    alice = create_user('alice', department_id=GENERAL_DEPARTMENT)
+    bob = create_user('bob', department_id=SHIPPING_DEPARTMENT)
+    
+    assert user_ids(primary, DEFAULT_DB, GENERAL_DEPARTMENT) == [alice.id]
+    assert user_ids(shard, SHARD_DB, SHIPPING_DEPARTMENT) == [bob.id]
+    assert not user_ids(primary, DEFAULT_DB, SHIPPING_DEPARTMENT)
+    # ID 由默认分片的用户目录统一分配
+    directory = primary.rows(DEFAULT_DB, "SELECT id, department_id FROM user_directory ORDER BY id")
+    assert directory == [
+        {'id': alice.id, 'department_id': GENERAL_DEPARTMENT},
+        {'id': bob.id, 'department_id': SHIPPING_DEPARTMENT}
+    ]
+
+
+def test_single_department_queries_touch_only_that_shard(sharded):
+    primary, shard = sharded
+    create_user('alice', department_id=GENERAL_DEPARTMENT)
+    bob = create_user('bob', department_id=SHIPPING_DEPARTMENT)
+    primary.statements.clear()
+    shard.statements.clear()
+    
+    result = User.get_all(department_id=SHIPPING_DEPARTMENT, user_role='super_admin')
+    assert [user.id for user in result['users']] == [bob.id]
+    assert result['total'] == 1
+    assert shard.queries(PAGE_SQL)
+    assert not primary.queries(PAGE_SQL)
+    
+    assert User.get_by_id(bob.id).username == 'bob'
+    assert UserStats.get_summary(SHIPPING_DEPARTMENT)['total'] == 1
+
+
+def test_cross_shard_pages_are_merged_in_id_order(sharded):
+    primary, shard = sharded
+    created = [
+        create_user(f'user{i}', department_id=(GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT)[i % 3 == 0]).id
+        for i in range(10)
+    ]
+    primary.statements.clear()
+    shard.statements.clear()
+    
+    pages, total = list_all(page_size=3)
+    assert total == 10
+    assert pages == [sorted(created, reverse=True)[i:i + 3] for i in range(0, 10, 3)]
+    # 每页并行查询两个分片
+    assert len(shard.queries(PAGE_SQL)) == len(pages)
+    assert len(primary.queries(PAGE_SQL)) == len(pages)
+    
+    # 按页码分页与游标分页结果一致
+    second = User.get_all(page=2, page_size=3, user_role='super_admin')
+    assert [user.id for user in second['users']] == pages[1]
+
+
+def test_moving_a_department_relocates_its_users_online(sharded):
+    primary, shard = sharded
+    admin = create_user('admin', department_id=GENERAL_DEPARTMENT, position_id=GENERAL_MANAGER)
+    staff = [create_user(f'staff{i}', department_id=GENERAL_DEPARTMENT) for i in range(5)]
+    before = UserStats.get_summary()
+    moved_ids = sorted([admin.id] + [user.id for user in staff])
+    late = []
+    
+    def log(message):
+        # 复制完成后、冻结前的写入由变更日志补齐
+        if message.startswith('已复制'):
+            user = User.get_by_id(staff[0].id)
+            user.real_name = '迁移中修改'
+            user.save()
+            late.append(create_user('late', department_id=GENERAL_DEPARTMENT).id)
+    
+    moved = router.move_department(GENERAL_DEPARTMENT, 'shard1', batch_size=2, log=log)
+    
+    assert moved == len(moved_ids) + 1
+    assert user_ids(shard, SHARD_DB, GENERAL_DEPARTMENT) == moved_ids + late
+    assert not user_ids(primary, DEFAULT_DB, GENERAL_DEPARTMENT)
+    assert router.shard_name_for(GENERAL_DEPARTMENT) == 'shard1'
+    assert not shard.rows(SHARD_DB, "SELECT * FROM shard_departments")
+    assert User.get_by_id(staff[0].id).real_name == '迁移中修改'
+    
+    # 源分片记录迁移，下游从目标分片的变更日志取得这些用户
+    moves = primary.rows(DEFAULT_DB, "SELECT entity_id FROM change_log WHERE op='move' ORDER BY entity_id")
+    assert [row['entity_id'] for row in moves] == moved_ids + late
+    upserts = shard.rows(SHARD_DB, "SELECT DISTINCT entity_id FROM change_log WHERE entity='user'")
+    assert {row['entity_id'] for row in upserts} == set(moved_ids + late)
+    
+    # 统计随用户迁移（总数只多出迁移期间新增的用户），之后的写入路由到新分片
+    assert UserStats.get_summary()['total'] == before['total'] + 1
+    user = User.get_by_id(staff[1].id)
+    user.real_name = '迁移后修改'
+    assert user.save()
+    assert shard.rows(SHARD_DB, "SELECT real_name FROM users WHERE id=%s", (staff[1].id,)) == [
+        {'real_name': '迁移后修改'}
+    ]
+    pages, total = list_all(page_size=4)
+    assert total == len(moved_ids) + 1
+    assert sum(pages, []) == sorted(moved_ids + late, reverse=True)
+
+
+def test_writes_to_a_frozen_department_fail_fast(sharded):
+    primary, shard = sharded
+    alice = create_user('alice', department_id=GENERAL_DEPARTMENT)
+    primary_db = router.get('default')
+    primary_db.execute_update(
+        "INSERT INTO shard_departments (department_id, state) VALUES (%s, 'frozen')", (GENERAL_DEPARTMENT,)
+    )
+    
+    user = User.get_by_id(alice.id)
+    user.real_name = '冻结期间修改'
+    with pytest.raises(DatabaseUnavailable):
+        user.save()
+    assert primary.rows(DEFAULT_DB, "SELECT real_name FROM users WHERE id=%s", (alice.id,)) == [
+        {'real_name': 'alice'}
+    ]
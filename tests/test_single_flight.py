@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发相同读取合并测试：线程和协程中的合并、leader 失败后各自重试、等待超时，
+以及 execute_shared_query 的合并和请求期限
+
+leader 的函数阻塞在 release 事件上，等待方启动后再放行；等待方在 leader 结束前取得
+进行中的调用（启动后留出 SETTLE 秒），否则会自己成为 leader，断言的执行次数随之不符。
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from database import db, Deadline, DatabaseUnavailable, ReadConsistency
+from single_flight import SingleFlight, WaitTimeout, flights
+
+SETTLE = 0.1
+WAITERS = 5
+
+
+class BlockingCall:
+    """阻塞到 release 的函数：记录执行次数，前 fail_times 次执行抛出异常"""
+    
+    def __init__(self, result='result', fail_times=0):
+        self.result = result
+        self.fail_times = fail_times
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+    
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        self.started.set()
+        self.release.wait(5)
+        if calls <= self.fail_times:
+            raise RuntimeError('查询失败')
+        return self.result
+
+
+def run_concurrently(flight, call, key='key', waiters=WAITERS, **kwargs):
+    """leader 开始执行后启动等待方，放行后返回各调用的结果（异常作为结果返回）"""
+    def invoke():
+        try:
+            return flight.do(key, call, 'test', **kwargs)
+        except Exception as e:
+            return e
+    
+    with ThreadPoolExecutor(max_workers=waiters + 1) as pool:
+        leader = pool.submit(invoke)
+        assert call.started.wait(5)
+        followers = [pool.submit(invoke) for _ in range(waiters)]
+        time.sleep(SETTLE)
+        call.release.set()
+        return leader.result(), [future.result() for future in followers]
+
+
+def test_concurrent_calls_share_the_leaders_result():
+    flight = SingleFlight()
+    call = BlockingCall(result=['shared'])
+    
+    leader, followers = run_concurrently(flight, call)
+    
+    assert call.calls == 1
+    assert all(result is leader for result in followers)
+    stats = flight.status()
+    assert stats['in_flight'] == 0
+    assert stats['labels']['test'] == {
+        'leader': 1, 'shared': WAITERS, 'retried': 0, 'timeouts': 0,
+        'coalesced_ratio': round(WAITERS / (WAITERS + 1), 3)
+    }
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    calls = []
+    for key in ('a', 'b', 'a'):
+        flight.do(key, lambda: calls.append(key))
+    assert len(calls) == 3
+    assert flight.counters[('default', 'leader')] == 3
+
+
+def test_followers_retry_when_the_leader_fails():
+    flight = SingleFlight()
+    call = BlockingCall(fail_times=1)
+    
+    leader, followers = run_concurrently(flight, call)
+    
+    # 异常不共享：等待方各自重新执行
+    assert isinstance(leader, RuntimeError)
+    assert followers == ['result'] * WAITERS
+    assert call.calls == 1 + WAITERS
+    assert flight.counters[('test', 'retried')] == WAITERS
+
+
+def test_waiting_longer_than_the_timeout_raises():
+    flight = SingleFlight()
+    call = BlockingCall()
+    
+    leader, followers = run_concurrently(flight, call, timeout=SETTLE / 2)
+    
+    # leader 不受等待方超时的影响
+    assert leader == 'result'
+    assert all(isinstance(result, WaitTimeout) for result in followers)
+    assert flight.counters[('test', 'timeouts')] == WAITERS
+    assert call.calls == 1
+
+
+async def gather_async(flight, call, key='key', waiters=WAITERS, **kwargs):
+    """协程版本的 run_concurrently"""
+    leader = asyncio.ensure_future(flight.do_async(key, call, 'test', **kwargs))
+    while not call.started.is_set():
+        await asyncio.sleep(0.01)
+    followers = [asyncio.ensure_future(flight.do_async(key, call, 'test', **kwargs)) for _ in range(waiters)]
+    await asyncio.sleep(SETTLE)
+    call.release.set()
+    results = await asyncio.gather(leader, *followers, return_exceptions=True)
+    return results[0], results[1:]
+
+
+def test_coroutines_share_the_leaders_result():
+    flight = SingleFlight()
+    call = BlockingCall(result=['shared'])
+    
+    leader, followers = asyncio.run(gather_async(flight, call))
+    
+    assert call.calls == 1
+    assert all(result is leader for result in followers)
+    assert flight.status()['in_flight'] == 0
+
+
+def test_coroutine_followers_retry_when_the_leader_fails():
+    flight = SingleFlight()
+    call = BlockingCall(fail_times=1)
+    
+    leader, followers = asyncio.run(gather_async(flight, call))
+    
+    assert isinstance(leader, RuntimeError)
+    assert followers == ['result'] * WAITERS
+    assert flight.counters[('test', 'retried')] == WAITERS
+
+
+def test_coroutine_waiters_time_out():
+    flight = SingleFlight()
+    call = BlockingCall()
+    
+    leader, followers = asyncio.run(gather_async(flight, call, timeout=SETTLE / 2))
+    
+    assert leader == 'result'
+    assert all(isinstance(result, WaitTimeout) for result in followers)
+    assert flight.counters[('test', 'timeouts')] == WAITERS
+    assert flight.status()['in_flight'] == 0
+
+
+def test_coroutines_coalesce_with_threads():
+    flight = SingleFlight()
+    call = BlockingCall()
+    
+    async def main():
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            leader = pool.submit(flight.do, 'key', call, 'test')
+            while not call.started.is_set():
+                await asyncio.sleep(0.01)
+            follower = asyncio.ensure_future(flight.do_async('key', call, 'test'))
+            await asyncio.sleep(SETTLE)
+            call.release.set()
+            return leader.result(), await follower
+    
+    assert asyncio.run(main()) == ('result', 'result')
+    assert call.calls == 1
+
+
+# ----------------------------------------------------------------------
+# execute_shared_query
+# ----------------------------------------------------------------------
+
+SQL = "SELECT COUNT(*) AS total FROM users"
+
+
+def hold_shared_query(pool, call):
+    """在另一个线程中以 execute_shared_query 的键执行阻塞的调用（相当于进行中的相同查询）"""
+    key = (db.shard_name, db.config.database, SQL, ())
+    leader = pool.submit(flights.do, key, call, 'test')
+    assert call.started.wait(5)
+    return leader
+
+
+def test_shared_queries_join_an_in_flight_query(app):
+    call = BlockingCall(result=[{'total': 42}])
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = hold_shared_query(pool, call)
+        follower = pool.submit(db.execute_shared_query, SQL)
+        time.sleep(SETTLE)
+        call.release.set()
+        assert follower.result() is leader.result()
+
+
+def test_shared_query_waits_are_bounded_by_the_request_deadline(app):
+    call = BlockingCall()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        hold_shared_query(pool, call)
+        token = db.bind_deadline(Deadline(SETTLE / 2))
+        try:
+            with pytest.raises(DatabaseUnavailable):
+                db.execute_shared_query(SQL)
+        finally:
+            db.unbind_deadline(token)
+            call.release.set()
+    assert db.resilience_status()['counters']['deadline_exceeded'] == 1
+
+
+def test_sessions_in_the_write_window_query_alone(app):
+    call = BlockingCall()
+    marker = ReadConsistency()
+    marker.written_at = time.time()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        hold_shared_query(pool, call)
+        token = db.bind_consistency(marker)
+        try:
+            assert db.execute_shared_query(SQL) == [{'total': 0}]
+        finally:
+            db.unbind_consistency(token)
+            call.release.set()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输入提示索引测试：前缀匹配、部门范围、写入后同步、/api/users/suggest 接口
+
+拼音提示依赖可选的 pypinyin，未安装时跳过对应的测试。
+"""
+
+import pytest
+
+from models.department import Department
+from models.user import User
+from suggest_index import index as suggest_index
+from tests.conftest import (create_user, login, GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT, GENERAL_MANAGER,
+                            DEPARTMENT_ADMIN)
+
+PREFIX_SQL = 'LIKE'
+
+
+@pytest.fixture
+def index(app):
+    """已加载的输入提示索引：综合部及其下级部门「档案室」、船务部各有若干用户"""
+    archive_room = Department(name='档案室', parent_id=GENERAL_DEPARTMENT)
+    archive_room.save()
+    create_user('admin', position_id=GENERAL_MANAGER, real_name='管理员', employee_id='A001')
+    create_user('zhaoxm', real_name='赵小明', employee_id='E001')
+    create_user('zhao', real_name='赵大', employee_id='E002', department_id=archive_room.id)
+    create_user('Zhaoli', real_name='赵丽', employee_id='E003', department_id=SHIPPING_DEPARTMENT)
+    create_user('qian', real_name='钱多', employee_id='E010', department_id=SHIPPING_DEPARTMENT)
+    suggest_index.configure({'enabled': True, 'max_limit': 3})
+    suggest_index.reload()
+    yield suggest_index
+    suggest_index.configure({'enabled': False, 'max_limit': 50})
+
+
+def usernames(users):
+    return [user['username'] for user in users]
+
+
+def test_prefixes_match_username_employee_id_and_name(index, cluster):
+    primary = cluster.server('primary')
+    primary.statements.clear()
+    
+    # 不区分大小写，完全匹配在前
+    assert usernames(User.suggest('ZHAO', user_role='super_admin')) == ['zhao', 'Zhaoli', 'zhaoxm']
+    assert usernames(User.suggest('e00', user_role='super_admin')) == ['zhaoxm', 'zhao', 'Zhaoli']
+    assert usernames(User.suggest('e01', user_role='super_admin')) == ['qian']
+    assert usernames(User.suggest('赵小', user_role='super_admin')) == ['zhaoxm']
+    assert usernames(User.suggest('e00', limit=2, user_role='super_admin')) == ['zhaoxm', 'zhao']
+    assert User.suggest('nobody', user_role='super_admin') == []
+    assert User.suggest('e001', user_role='super_admin')[0] == {
+        'id': User.get_by_username('zhaoxm').id, 'username': 'zhaoxm', 'real_name': '赵小明',
+        'employee_id': 'E001', 'department_id': GENERAL_DEPARTMENT, 'status': 1
+    }
+    
+    assert not primary.queries(PREFIX_SQL)
+    assert index.counters['served'] == 7
+
+
+def test_suggestions_follow_the_department_scope(index):
+    # 综合部的用户可以看到下级部门「档案室」的用户，看不到船务部的用户
+    general = User.suggest('zhao', user_department_id=GENERAL_DEPARTMENT, user_role='admin')
+    assert set(usernames(general)) == {'zhao', 'zhaoxm'}
+    shipping = User.suggest('e', user_department_id=SHIPPING_DEPARTMENT, user_role='user')
+    assert usernames(shipping) == ['Zhaoli', 'qian']
+    # 没有部门的用户看不到任何用户
+    assert User.suggest('zhao', user_role='user') == []
+
+
+def test_writes_are_synced_from_the_change_log(index):
+    create_user('zhaoyun', real_name='赵云', department_id=SHIPPING_DEPARTMENT)
+    user = User.get_by_username('zhaoxm')
+    user.username = 'xiaoming'
+    user.save()
+    User.get_by_username('Zhaoli').delete()
+    
+    assert usernames(User.suggest('zhaoy', user_role='super_admin')) == ['zhaoyun']
+    assert User.suggest('zhaoxm', user_role='super_admin') == []
+    assert User.suggest('e003', user_role='super_admin') == []
+    assert usernames(User.suggest('xiao', user_role='super_admin')) == ['xiaoming']
+    
+    # 其他进程的写入（本进程不立即同步）由定时同步补齐
+    index.enabled = False
+    create_user('sunquan', real_name='孙权')
+    index.enabled = True
+    assert User.suggest('sun', user_role='super_admin') == []
+    assert index.refresh() >= 1
+    assert usernames(User.suggest('sun', user_role='super_admin')) == ['sunquan']
+
+
+def test_falls_back_to_sql_when_not_loaded(app, cluster):
+    create_user('zhaoxm', real_name='赵小明', employee_id='E001')
+    create_user('zhao_', real_name='赵某', employee_id='E002')
+    primary = cluster.server('primary')
+    
+    assert usernames(User.suggest('ZHAO', user_role='super_admin')) == ['zhao_', 'zhaoxm']
+    # LIKE 通配符按字面匹配
+    assert usernames(User.suggest('zhao_', user_role='super_admin')) == ['zhao_']
+    assert primary.queries(PREFIX_SQL)
+
+
+def test_pinyin_full_spelling_and_initials(index):
+    pytest.importorskip('pypinyin')
+    index.reload()
+    
+    assert usernames(User.suggest('zxm', user_role='super_admin')) == ['zhaoxm']
+    assert usernames(User.suggest('zhaoxiao', user_role='super_admin')) == ['zhaoxm']
+    assert set(usernames(User.suggest('zl', user_role='super_admin'))) == {'Zhaoli'}
+    assert index.status()['pinyin']
+
+
+def test_suggest_api(index, client):
+    login(client, 'admin')
+    
+    response = client.get('/api/users/suggest?q=e00')
+    assert response.status_code == 200
+    assert usernames(response.get_json()['data']['users']) == ['zhaoxm', 'zhao', 'Zhaoli']
+    # limit 限制在 1 到 max_limit 之间
+    assert len(client.get('/api/users/suggest?q=e&limit=100').get_json()['data']['users']) == 3
+    assert len(client.get('/api/users/suggest?q=e&limit=0').get_json()['data']['users']) == 1
+    assert client.get('/api/users/suggest?q=%20').status_code == 400
+    
+    create_user('shipping_admin', department_id=SHIPPING_DEPARTMENT, position_id=DEPARTMENT_ADMIN)
+    other = client.application.test_client()
+    login(other, 'shipping_admin')
+    assert set(usernames(other.get('/api/users/suggest?q=zhao').get_json()['data']['users'])) == {'Zhaoli'}
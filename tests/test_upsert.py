@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按工号新增或更新用户测试：User.upsert_by_employee_id 的新增、更新和用户名冲突，
+以及 Idempotency-Key 的重放、请求体不一致、处理中和服务器错误后释放
+"""
+
+import hashlib
+import json
+
+import pytest
+
+from database import db
+from models.idempotency import IdempotencyKey
+from models.user import User, DuplicateUserError
+from tests.conftest import create_user, login, GENERAL_MANAGER, MINISTER, SHIPPING_DEPARTMENT, STAFF
+
+
+def upsert(employee_id, fields=None, **values):
+    user = User(employee_id=employee_id, role=None, **values)
+    return user, user.upsert_by_employee_id(fields if fields is not None else list(values))
+
+
+def test_creates_then_updates_by_employee_id(app):
+    user, created = upsert('E001', username='alice', real_name='爱丽丝', password='secret123',
+                           department_id=SHIPPING_DEPARTMENT, position_id=STAFF)
+    assert created
+    saved = User.get_by_employee_id('E001')
+    assert (saved.id, saved.username, saved.role) == (user.id, 'alice', 'user')
+    
+    # 只修改列出的字段，其他字段保持原值
+    again, created = upsert('E001', fields=['real_name', 'position_id'], username='alice',
+                            real_name='新名', phone='123', position_id=MINISTER)
+    assert not created
+    assert again.id == user.id
+    saved = User.get_by_employee_id('E001')
+    assert (saved.real_name, saved.phone, saved.role) == ('新名', None, 'admin')
+    assert saved.department_id == SHIPPING_DEPARTMENT
+    assert User.verify_password('secret123', saved.password)
+    assert len(db.execute_query("SELECT id FROM users WHERE employee_id='E001'")) == 1
+    
+    # 数据没有变化
+    assert not upsert('E001', fields=['real_name'], username='alice', real_name='新名')[1]
+
+
+def test_a_username_of_another_employee_is_a_duplicate(app):
+    other = create_user('alice', employee_id='E001', real_name='爱丽丝')
+    
+    with pytest.raises(DuplicateUserError) as raised:
+        upsert('E002', username='alice', real_name='冒名')
+    assert raised.value.field == 'username'
+    
+    # 已有用户改用别人的用户名同样冲突
+    create_user('bob', employee_id='E003')
+    with pytest.raises(DuplicateUserError):
+        upsert('E003', username='alice', real_name='鲍勃')
+    
+    row = db.execute_query("SELECT * FROM users WHERE id=%s", (other.id,))[0]
+    assert (row['username'], row['employee_id'], row['real_name']) == ('alice', 'E001', '爱丽丝')
+    assert User.get_by_employee_id('E002') is None
+    assert User.get_by_employee_id('E003').username == 'bob'
+
+
+# ----------------------------------------------------------------------
+# Idempotency-Key
+# ----------------------------------------------------------------------
+
+URL = '/api/users/by-employee-id/E001'
+BODY = {'username': 'alice', 'real_name': '爱丽丝', 'department_id': SHIPPING_DEPARTMENT}
+
+
+@pytest.fixture
+def admin_client(client):
+    admin = create_user('admin', position_id=GENERAL_MANAGER)
+    login(client, 'admin')
+    client.admin = admin
+    return client
+
+
+def put(client, body, key='key-1'):
+    return client.put(URL, json=body, headers={'Idempotency-Key': key})
+
+
+def test_retries_with_the_same_key_replay_the_response(admin_client):
+    first = put(admin_client, BODY)
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+    
+    replay = put(admin_client, BODY)
+    assert replay.status_code == 201
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_json() == first.get_json()
+    # 重放不再执行写入：仍然只有一次新增
+    assert len(db.execute_query("SELECT seq FROM change_log WHERE entity='user' AND op='upsert'")) == 2
+    
+    # 新的键正常执行（数据没有变化，返回 200）
+    assert put(admin_client, BODY, key='key-2').status_code == 200
+
+
+def test_a_key_reused_for_a_different_body_is_rejected(admin_client):
+    assert put(admin_client, BODY).status_code == 201
+    
+    response = put(admin_client, dict(BODY, real_name='别的'))
+    assert response.status_code == 422
+    assert not response.get_json()['success']
+    assert User.get_by_employee_id('E001').real_name == '爱丽丝'
+
+
+def test_a_key_still_in_flight_is_a_conflict(admin_client):
+    body = json.dumps(BODY).encode()
+    scope = f"{admin_client.admin.id}:PUT {URL}"
+    assert IdempotencyKey.reserve(scope, 'key-1', hashlib.sha256(body).hexdigest()) is None
+    
+    response = admin_client.put(URL, data=body, content_type='application/json',
+                                headers={'Idempotency-Key': 'key-1'})
+    assert response.status_code == 409
+    assert User.get_by_employee_id('E001') is None
+
+
+def test_server_errors_release_the_key(admin_client, monkeypatch):
+    def fail(self, fields):
+        raise RuntimeError('数据库异常')
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(User, 'upsert_by_employee_id', fail)
+        assert put(admin_client, BODY).status_code == 500
+    assert not db.execute_query("SELECT * FROM idempotency_keys")
+    
+    # 使用同一个键重试时正常执行
+    response = put(admin_client, BODY)
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+    assert put(admin_client, BODY).headers['Idempotent-Replayed'] == 'true'
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户统计测试：增量维护的 /api/users/stats 与按用户表 COUNT(*) 分组的结果一致，
+统计被改乱后 UserStats.reconcile() 纠正
+"""
+
+import pytest
+
+from database import db
+from models.user import User
+from models.user_stats import UserStats
+from tests.conftest import (create_user, login, GENERAL_DEPARTMENT, SHIPPING_DEPARTMENT, GENERAL_MANAGER, MINISTER,
+                            DEPARTMENT_ADMIN)
+
+
+def counted(column):
+    """按用户表直接分组计数：{维度值: (总数, 启用数)}"""
+    rows = db.execute_query(f"""
+    SELECT {column} AS value, COUNT(*) AS total, SUM(CASE WHEN status=1 THEN 1 ELSE 0 END) AS active
+    FROM users GROUP BY {column}
+    """)
+    return {row['value']: (row['total'], row['active']) for row in rows}
+
+
+def summarized(stats):
+    """统计接口的结果，整理为与 counted 相同的形式"""
+    return {
+        'department_id': {d['department_id']: (d['total'], d['active']) for d in stats['by_department']},
+        'position_id': {p['position_id']: (p['total'], p['active']) for p in stats['by_position']},
+        'role': {r['role']: r['total'] for r in stats['by_role']},
+        'status': {s['status']: s['total'] for s in stats['by_status']},
+    }
+
+
+def assert_matches_users(stats):
+    summary = summarized(stats)
+    assert summary['department_id'] == counted('department_id')
+    assert summary['position_id'] == counted('position_id')
+    assert summary['role'] == {role: total for role, (total, _) in counted('role').items()}
+    assert summary['status'] == {status: total for status, (total, _) in counted('status').items()}
+    assert stats['total'] == db.execute_query("SELECT COUNT(*) AS total FROM users")[0]['total']
+
+
+@pytest.fixture
+def history(app):
+    """新增、调岗、调部门（包括按工号更新）、停用和删除用户"""
+    create_user('admin', position_id=GENERAL_MANAGER)
+    for name in ('alice', 'bob', 'carol', 'dave'):
+        create_user(name)
+    create_user('sailor', department_id=SHIPPING_DEPARTMENT)
+    create_user('eve', department_id=SHIPPING_DEPARTMENT, position_id=DEPARTMENT_ADMIN)
+    
+    bob = User.get_by_username('bob')
+    bob.department_id = SHIPPING_DEPARTMENT
+    bob.save()
+    carol = User.get_by_username('carol')
+    carol.position_id = MINISTER
+    carol.save()
+    dave = User.get_by_username('dave')
+    dave.status = 0
+    dave.save()
+    User.get_by_username('sailor').delete()
+    User(username='alice', employee_id='ALICE', real_name='alice', department_id=SHIPPING_DEPARTMENT,
+         role=None).upsert_by_employee_id(['department_id'])
+
+
+def test_stats_match_a_count_of_the_users_table(history, client):
+    login(client, 'admin')
+    
+    response = client.get('/api/users/stats')
+    
+    assert response.status_code == 200
+    stats = response.get_json()['data']
+    assert_matches_users(stats)
+    assert stats['total'] == 6
+    assert summarized(stats)['department_id'][SHIPPING_DEPARTMENT] == (3, 3)
+    assert summarized(stats)['status'] == {0: 1, 1: 5}
+
+
+def test_department_admins_see_their_department(history, client):
+    login(client, 'eve')
+    
+    stats = client.get('/api/users/stats').get_json()['data']
+    
+    assert [d['department_id'] for d in stats['by_department']] == [SHIPPING_DEPARTMENT]
+    assert stats['total'] == 3
+
+
+def test_reconcile_fixes_corrupted_stats(history):
+    # 计数偏差、多出的维度、缺失的维度
+    db.execute_update("UPDATE user_stats SET total = total + 5 WHERE department_id=%s AND status=1",
+                      (SHIPPING_DEPARTMENT,))
+    db.execute_update(
+        "INSERT INTO user_stats (department_id, position_id, role, status, total) VALUES (%s, %s, %s, %s, %s)",
+        (GENERAL_DEPARTMENT, GENERAL_MANAGER, 'user', 1, 3)
+    )
+    db.execute_update("DELETE FROM user_stats WHERE status=0")
+    assert UserStats.get_summary()['total'] != 6
+    
+    assert UserStats.reconcile() >= 3
+    
+    assert_matches_users(UserStats.get_summary())
+    assert not db.execute_query("SELECT * FROM user_stats WHERE total=0")
+    assert UserStats.reconcile() == 0
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户更新测试：只写入变化的字段（TrackedModel.build_update）、职位变化时才重新设置角色、
+If-Match 版本过期时返回 412
+
+版本由 updated_at 生成（精确到毫秒），连续的两次写入之间留出几毫秒，保证版本不同。
+"""
+
+import time
+
+import pytest
+
+from database import db
+from models.tracked import TrackedModel, VersionConflict
+from models.user import User
+from tests.conftest import create_user, login, GENERAL_MANAGER, MINISTER
+
+VERSION_RESOLUTION = 0.002
+
+
+def updates(cluster):
+    return cluster.server('primary').queries('UPDATE users SET')
+
+
+def test_build_update_lists_only_the_changed_columns():
+    sql, params = TrackedModel.build_update('users', {'real_name': '新名', 'phone': '123'}, {'id': 7})
+    assert sql == "UPDATE users SET real_name=%s, phone=%s WHERE id=%s"
+    assert params == ('新名', '123', 7)
+
+
+def test_saving_writes_only_the_changed_fields(app, cluster):
+    alice = create_user('alice')
+    user = User.get_by_id(alice.id)
+    cluster.server('primary').statements.clear()
+    
+    assert not user.save()
+    assert updates(cluster) == []
+    
+    user.real_name = '新名'
+    user.phone = '123'
+    assert user.save()
+    assert updates(cluster) == ["UPDATE users SET real_name=%s, phone=%s WHERE id=%s"]
+    # 保存后没有新的变化
+    assert user.changed_fields() == []
+    assert not user.save()
+
+
+def test_the_role_is_rederived_only_when_the_position_changes(app, cluster):
+    alice = create_user('alice')
+    # 角色与职位不一致（例如手工调整过），修改其他字段时保持不变
+    db.execute_update("UPDATE users SET role='admin' WHERE id=%s", (alice.id,))
+    user = User.get_by_id(alice.id)
+    cluster.server('primary').statements.clear()
+    
+    user.real_name = '新名'
+    user.save()
+    assert User.get_by_id(alice.id).role == 'admin'
+    assert not cluster.server('primary').queries('FROM positions')
+    
+    user.position_id = GENERAL_MANAGER
+    user.save()
+    assert User.get_by_id(alice.id).role == 'super_admin'
+    assert updates(cluster)[-1] == "UPDATE users SET position_id=%s, role=%s WHERE id=%s"
+
+
+def test_a_stale_version_is_a_conflict(app):
+    alice = create_user('alice')
+    first = User.get_by_id(alice.id)
+    second = User.get_by_id(alice.id)
+    time.sleep(VERSION_RESOLUTION)
+    
+    first.real_name = '先保存'
+    first.save(expected_version=first.version)
+    second.real_name = '后保存'
+    with pytest.raises(VersionConflict):
+        second.save(expected_version=second.version)
+    assert User.get_by_id(alice.id).real_name == '先保存'
+
+
+def test_if_match_with_a_stale_version_returns_412(client):
+    create_user('admin', position_id=GENERAL_MANAGER)
+    alice = create_user('alice')
+    login(client, 'admin')
+    response = client.get(f'/api/users/{alice.id}')
+    etag = response.headers['ETag']
+    assert etag.strip('"') == response.get_json()['data']['version']
+    time.sleep(VERSION_RESOLUTION)
+    
+    first = client.put(f'/api/users/{alice.id}', json={'real_name': '先保存'}, headers={'If-Match': etag})
+    assert first.status_code == 200
+    time.sleep(VERSION_RESOLUTION)
+    
+    stale = client.put(f'/api/users/{alice.id}', json={'position_id': MINISTER}, headers={'If-Match': etag})
+    assert stale.status_code == 412
+    assert not stale.get_json()['success']
+    user = User.get_by_id(alice.id)
+    assert (user.real_name, user.role) == ('先保存', 'user')
+    
+    # 使用最新的版本可以保存；不带 If-Match 时不校验
+    current = f'"{first.get_json()["data"]["version"]}"'
+    assert client.put(f'/api/users/{alice.id}', json={'position_id': MINISTER},
+                      headers={'If-Match': current}).status_code == 200
+    assert client.put(f'/api/users/{alice.id}', json={'phone': '123'}).status_code == 200
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户管理页面首屏数据测试
+
+users.js 首次加载时请求第一页用户、启用的部门和职位三个接口；页面内嵌的首屏数据
+以相同的 URL 登记这三个响应，前端据此填充缓存，不再发出这三个请求。
+测试确认内嵌的 URL 与 users.js 构造的一致、内容与接口的响应一致，部门和职位的 ETag
+与接口相同（之后的重新验证返回 304）。
+"""
+
+import json
+import os
+import re
+
+from models.department import Department
+from tests.conftest import create_user, login, GENERAL_MANAGER, DEPARTMENT_ADMIN, SHIPPING_DEPARTMENT
+
+USERS_JS = os.path.join(os.path.dirname(__file__), '..', 'static', 'js', 'users.js')
+BOOTSTRAP_RE = re.compile(r'<script id="usersBootstrap" type="application/json">(.*?)</script>', re.S)
+# users.js 首次加载请求的接口（第一页、默认每页 20 条）
+FIRST_LOAD_URLS = {
+    'users': '/api/users?page=1&page_size=20',
+    'departments': '/api/departments?status=1',
+    'positions': '/api/positions?status=1'
+}
+
+
+def embedded_bootstrap(client):
+    """渲染用户管理页面，返回内嵌的首屏数据（没有时为 None）"""
+    response = client.get('/users')
+    assert response.status_code == 200
+    match = BOOTSTRAP_RE.search(response.get_data(as_text=True))
+    return json.loads(match.group(1)) if match else None
+
+
+def test_first_load_urls_match_users_js():
+    with open(USERS_JS, encoding='utf-8') as f:
+        source = f.read()
+    assert 'let pageSize = 20;' in source
+    assert '`/api/users?page=${page}&page_size=${pageSize}`' in source
+    assert "apiGetCached('/api/departments?status=1'" in source
+    assert "apiGetCached('/api/positions?status=1'" in source
+
+
+def test_users_page_embeds_the_three_first_load_responses(client):
+    create_user('admin', position_id=GENERAL_MANAGER)
+    for i in range(3):
+        create_user(f'user{i}')
+    login(client, 'admin')
+    
+    bootstrap = embedded_bootstrap(client)
+    
+    assert {name: item['url'] for name, item in bootstrap.items()} == FIRST_LOAD_URLS
+    for name, item in bootstrap.items():
+        assert item['response'] == client.get(item['url']).get_json(), name
+    assert bootstrap['users']['response']['data']['pagination']['total'] == 4
+    # 部门、职位之后按 ETag 重新验证：数据未变化时不返回内容
+    for name in ('departments', 'positions'):
+        item = bootstrap[name]
+        revalidated = client.get(item['url'], headers={'If-None-Match': item['etag']})
+        assert revalidated.status_code == 304, name
+
+
+def test_embedded_users_follow_the_viewers_permissions(client):
+    create_user('shipping_admin', department_id=SHIPPING_DEPARTMENT, position_id=DEPARTMENT_ADMIN)
+    create_user('sailor', department_id=SHIPPING_DEPARTMENT)
+    create_user('clerk')
+    login(client, 'shipping_admin')
+    
+    users = embedded_bootstrap(client)['users']
+    
+    listed = [user['username'] for user in users['response']['data']['users']]
+    assert sorted(listed) == ['sailor', 'shipping_admin']
+    assert users['response'] == client.get(users['url']).get_json()
+
+
+def test_page_renders_without_bootstrap_when_disabled_or_failing(app, client, monkeypatch):
+    create_user('admin', position_id=GENERAL_MANAGER)
+    login(client, 'admin')
+    
+    app.config['APP_CONFIG']['ui']['bootstrap'] = False
+    assert embedded_bootstrap(client) is None
+    
+    # 生成失败时页面照常返回，由前端请求接口
+    app.config['APP_CONFIG']['ui']['bootstrap'] = True
+    
+    def fail(**kwargs):
+        raise RuntimeError('数据库不可用')
+    monkeypatch.setattr(Department, 'get_all', staticmethod(fail))
+    assert embedded_bootstrap(client) is None